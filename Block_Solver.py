@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+this file contains the divide and conquer solver of the branch length assignment (in-process sparse least squares)
+the supertree is split into blocks: connected sets of edges (subtrees, whose deeper blocks are cut off)
+with a bounded number of edges; the non-negative least squares problem is then solved in two phases
+1) the couplets local to a block (all the edges between them belong to the block) are solved independently
+for individual blocks, which gives the initial edge lengths
+2) block coordinate iterations reconcile the edges of different blocks: in every iteration, all the blocks
+are solved together (independently), each for its own edges with the edge lengths of the other blocks fixed,
+using the couplets whose paths contain an edge of the block; the edge lengths then move towards the solutions
+of the blocks, by the step (exact line search) minimizing the least square error; as the step 1 / (number of blocks)
+is the average of the individual block solutions, the error never increases
+the iterations stop once the relative decrease of the error is below the tolerance
+blocks are solved by (forked) worker processes, so that the subproblems are solved on all the cores
+"""
+
+import Header
+from Header import *
+import QP_Solver
+
+# default maximum number of edges of a block
+DEFAULT_BLOCK_SIZE = 1000
+
+# maximum number of block coordinate iterations, and the tolerance of the relative decrease of the error
+BLOCK_SOLVER_MAX_ITER = 200
+BLOCK_SOLVER_TOL = 1e-8
+
+#----------------------------------------------------
+"""
+this function splits the supertree into blocks of edges: in postorder, a node whose subtree (without the deeper
+blocks) has at least max_block_size edges starts a block, which contains the edges of that subtree
+(the root starts the last block); so a block has less than max_block_size edges below its top node
+from every child of that node
+returns the block index of every edge (indexed as in Supertree_Array) and the number of blocks
+"""
+def Get_Subtree_Blocks(Supertree_Info, max_block_size):
+  Parent = Supertree_Info.Parent.tolist()
+  no_of_edges = len(Parent)
+  Subtree_Size = [1] * no_of_edges
+  Is_Block_Top = [False] * no_of_edges
+  for node_idx in range(no_of_edges):
+    if (Subtree_Size[node_idx] >= max_block_size) or (Parent[node_idx] < 0):
+      Is_Block_Top[node_idx] = True
+    else:
+      Subtree_Size[Parent[node_idx]] += Subtree_Size[node_idx]
+
+  # block indices are assigned from the root downwards (reverse postorder)
+  Block_Idx = [0] * no_of_edges
+  no_of_blocks = 0
+  for node_idx in range(no_of_edges - 1, -1, -1):
+    if (Is_Block_Top[node_idx] == True):
+      Block_Idx[node_idx] = no_of_blocks
+      no_of_blocks = no_of_blocks + 1
+    else:
+      Block_Idx[node_idx] = Block_Idx[Parent[node_idx]]
+  return numpy.array(Block_Idx, dtype=numpy.int64), no_of_blocks
+
+#----------------------------------------------------
+"""
+this class contains the subproblem of one block: its edges, the couplets (rows) whose paths contain
+an edge of the block, the matrix of these rows (all the edges, and only the edges of the block),
+and the local couplets, whose paths contain only the edges of the block
+the normal equations matrices (A^T A, dense) of the block edges, for all these rows and for the local rows,
+do not change over the iterations, so they are computed once
+"""
+class Block_Subproblem(object):
+  def __init__(self, Path_Matrix, Path_Matrix_CSC, Row_Block_Min, Row_Block_Max, Edge_Idx, block_idx):
+    self.Edge_Idx = Edge_Idx
+    self.Row_Idx = numpy.unique(Path_Matrix_CSC[:, Edge_Idx].indices)
+    self.Row_Matrix = Path_Matrix[self.Row_Idx]
+    self.Block_Matrix = self.Row_Matrix[:, Edge_Idx]
+    local = (Row_Block_Min[self.Row_Idx] == block_idx) & (Row_Block_Max[self.Row_Idx] == block_idx)
+    self.Local_Pos = numpy.nonzero(local)[0]
+    self.AtA = self.Block_Matrix.T.dot(self.Block_Matrix).toarray()
+    Local_Matrix = self.Block_Matrix[self.Local_Pos]
+    self.Local_AtA = Local_Matrix.T.dot(Local_Matrix).toarray()
+
+#----------------------------------------------------
+"""
+this function solves the subproblem of one block
+parameters: Block - subproblem of the block (Block_Subproblem)
+AvgDistMatVal - target couplet distances (rows of the least squares system)
+Budget - iteration and tolerance budgets (max_iter, tol) of the block solver
+edge_value_arr - if None, only the local couplets of the block are used (first phase); otherwise, the couplets
+whose paths contain an edge of the block are used, with the edge lengths of the other blocks fixed at edge_value_arr
+returns the (non-negative) edge lengths of the block
+"""
+def Solve_Block(Block, AvgDistMatVal, Budget, edge_value_arr):
+  max_iter, tol = Budget
+  Telemetry = QP_Solver.Solver_Telemetry(False, max_iter, tol)
+  target = AvgDistMatVal[Block.Row_Idx]
+  if edge_value_arr is None:
+    if (len(Block.Local_Pos) == 0):
+      return numpy.zeros(len(Block.Edge_Idx))
+    Atd = Block.Block_Matrix[Block.Local_Pos].T.dot(target[Block.Local_Pos])
+    return QP_Solver.Solve_NNLS_Normal_Equations(Block.Local_AtA, Atd, None, Telemetry)
+  block_init = edge_value_arr[Block.Edge_Idx]
+  # couplet distances due to the (fixed) edges of the other blocks are subtracted from the targets
+  target = target - Block.Row_Matrix.dot(edge_value_arr) + Block.Block_Matrix.dot(block_init)
+  Atd = Block.Block_Matrix.T.dot(target)
+  return QP_Solver.Solve_NNLS_Normal_Equations(Block.AtA, Atd, block_init, Telemetry)
+
+#----------------------------------------------------
+"""
+these variables contain the subproblems of the blocks, for the worker processes
+(they are set only in the worker processes, by the initializer of the pool, so that concurrent solves 
+within a process, such as the requests of a server, do not share them)
+"""
+Worker_Block_List = None
+Worker_AvgDistMatVal = None
+Worker_Budget = None
+
+def Worker_Initialize_Blocks(Block_List, AvgDistMatVal, Budget):
+  global Worker_Block_List
+  global Worker_AvgDistMatVal
+  global Worker_Budget
+  Worker_Block_List = Block_List
+  Worker_AvgDistMatVal = AvgDistMatVal
+  Worker_Budget = Budget
+
+#----------------------------------------------------
+"""
+this function solves the subproblem of one block, within a worker process (see Solve_Block)
+returns the block index and the edge lengths of the block
+"""
+def Worker_Solve_Block(arg):
+  block_idx, edge_value_arr = arg
+  return block_idx, Solve_Block(Worker_Block_List[block_idx], Worker_AvgDistMatVal, Worker_Budget, edge_value_arr)
+
+#----------------------------------------------------
+"""
+this function solves the subproblems of all the blocks, by worker processes (pool) if specified,
+or within this process, and returns the edge lengths formed by the solutions of the blocks
+"""
+def Solve_All_Blocks(Block_List, AvgDistMatVal, Budget, edge_value_arr, no_of_edges, pool):
+  block_value_arr = numpy.zeros(no_of_edges)
+  if pool is None:
+    for Block in Block_List:
+      block_value_arr[Block.Edge_Idx] = Solve_Block(Block, AvgDistMatVal, Budget, edge_value_arr)
+    return block_value_arr
+  Arg_List = [(block_idx, edge_value_arr) for block_idx in range(len(Block_List))]
+  for block_idx, curr_value_arr in pool.map(Worker_Solve_Block, Arg_List):
+    block_value_arr[Block_List[block_idx].Edge_Idx] = curr_value_arr
+  return block_value_arr
+
+#----------------------------------------------------
+"""
+this function returns the norm of the projected gradient (of half the least square error) at the edge lengths
+edge_value_arr, where residual is the difference of the couplet distances in the supertree and the target distances
+"""
+def Get_Projected_Gradient_Norm(Path_Matrix, residual, edge_value_arr):
+  w = -Path_Matrix.T.dot(residual)
+  return float(numpy.linalg.norm(numpy.where(edge_value_arr > 0, w, numpy.maximum(w, 0))))
+
+#----------------------------------------------------
+"""
+this function returns the largest step along the direction keeping the edge lengths non-negative
+"""
+def Get_Max_Step(edge_value_arr, direction):
+  negative = (direction < 0)
+  if (numpy.any(negative) == False):
+    return numpy.inf
+  return float(numpy.min(edge_value_arr[negative] / (-direction[negative])))
+
+#----------------------------------------------------
+"""
+this function returns the step of a block coordinate iteration
+1) exact line search along the direction towards the block solutions, up to the largest step keeping
+the edge lengths non-negative (at least 1, as the block solutions are non-negative)
+2) the combination of this direction and the previous step minimizing the error (two dimensional search),
+shortened if required to keep the edge lengths non-negative
+the step with the lower error is returned
+parameters: residual - couplet distances in the supertree minus the target distances
+path_direction, prev_path_step - changes of the couplet distances due to the direction and the previous step
+"""
+def Get_Block_Step(edge_value_arr, residual, direction, path_direction, prev_step, prev_path_step):
+  qq = float(numpy.dot(path_direction, path_direction))
+  rq = float(numpy.dot(residual, path_direction))
+  alpha = min(max(-rq / qq, 0.0), Get_Max_Step(edge_value_arr, direction))
+  step, path_step = alpha * direction, alpha * path_direction
+  if prev_step is None:
+    return step
+  pp = float(numpy.dot(prev_path_step, prev_path_step))
+  qp = float(numpy.dot(path_direction, prev_path_step))
+  rp = float(numpy.dot(residual, prev_path_step))
+  det = qq * pp - qp * qp
+  if (det <= 1e-12 * qq * pp):
+    return step
+  a = (-rq * pp + rp * qp) / det
+  b = (-rp * qq + rq * qp) / det
+  step2 = a * direction + b * prev_step
+  t = min(1.0, Get_Max_Step(edge_value_arr, step2))
+  path_step2 = t * (a * path_direction + b * prev_path_step)
+  new_residual, new_residual2 = residual + path_step, residual + path_step2
+  if (numpy.dot(new_residual2, new_residual2) < numpy.dot(new_residual, new_residual)):
+    return t * step2
+  return step
+
+#----------------------------------------------------
+"""
+this function solves the sparse least squares problem with non-negative edge lengths by the blocks
+of the supertree (see the description of this file)
+parameters: Path_Matrix, AvgDistMatVal - least squares system (see Build_Couplet_Edge_Matrix)
+Block_Idx, no_of_blocks - blocks of the edges (see Get_Subtree_Blocks)
+no_of_jobs - number of worker processes solving the blocks (within a worker process, the blocks are solved in it)
+edge_value_init - initial edge lengths (such as of a previous solve), used if they have a lower error
+than the solutions of the local couplets, or None
+Telemetry, init_name - budgets and log of the solver (see Solve_Sparse_LSQ_System); the budgets
+apply to the block coordinate iterations, as well as to the solvers of the blocks
+returns the array of edge lengths
+"""
+def Solve_Block_LSQ_System(Path_Matrix, AvgDistMatVal, Block_Idx, no_of_blocks, no_of_jobs=1, edge_value_init=None, \
+			   Telemetry=None, init_name='zero'):
+  if Telemetry is None:
+    Telemetry = QP_Solver.Solver_Telemetry()
+  max_iter, tol = Telemetry._GetBudget(BLOCK_SOLVER_MAX_ITER)
+  if Telemetry.tol is None:
+    tol = BLOCK_SOLVER_TOL
+  no_of_edges = Path_Matrix.shape[1]
+
+  # blocks of the edges between individual couplets
+  Row_Block_Idx = Block_Idx[Path_Matrix.indices]
+  row_start = Path_Matrix.indptr[:-1]
+  nonempty = (Path_Matrix.indptr[1:] > row_start)
+  Row_Block_Min = numpy.zeros(Path_Matrix.shape[0], dtype=numpy.int64) - 1
+  Row_Block_Max = numpy.zeros(Path_Matrix.shape[0], dtype=numpy.int64) - 1
+  if (len(Row_Block_Idx) > 0):
+    Row_Block_Min[nonempty] = numpy.minimum.reduceat(Row_Block_Idx, row_start[nonempty])
+    Row_Block_Max[nonempty] = numpy.maximum.reduceat(Row_Block_Idx, row_start[nonempty])
+  Path_Matrix_CSC = Path_Matrix.tocsc()
+  Block_List = [Block_Subproblem(Path_Matrix, Path_Matrix_CSC, Row_Block_Min, Row_Block_Max, \
+				 numpy.nonzero(Block_Idx == block_idx)[0], block_idx) for block_idx in range(no_of_blocks)]
+  del Path_Matrix_CSC
+
+  Budget = (Telemetry.max_iter, Telemetry.tol)
+  pool = None
+  if (no_of_jobs > 1) and (no_of_blocks > 1) and (multiprocessing.current_process().daemon == False):
+    pool = multiprocessing.Pool(processes=min(no_of_jobs, no_of_blocks), initializer=Worker_Initialize_Blocks, \
+				initargs=(Block_List, AvgDistMatVal, Budget))
+  try:
+    Telemetry._Start('block', init_name, no_of_edges, Path_Matrix.shape[0])
+    # first phase: local couplets of individual blocks
+    edge_value_arr = Solve_All_Blocks(Block_List, AvgDistMatVal, Budget, None, no_of_edges, pool)
+    residual = Path_Matrix.dot(edge_value_arr) - AvgDistMatVal
+    objective = float(numpy.dot(residual, residual))
+    if edge_value_init is not None:
+      init_residual = Path_Matrix.dot(edge_value_init) - AvgDistMatVal
+      if (float(numpy.dot(init_residual, init_residual)) < objective):
+	edge_value_arr = numpy.array(edge_value_init, dtype=numpy.float64)
+	residual = init_residual
+	objective = float(numpy.dot(residual, residual))
+    gradient_norm = Get_Projected_Gradient_Norm(Path_Matrix, residual, edge_value_arr)
+    Telemetry._LogIteration(0, objective, gradient_norm)
+
+    # second phase: block coordinate iterations
+    no_of_iter = 0
+    converged = (objective == 0)
+    prev_step = None
+    prev_path_step = None
+    while (converged == False) and (no_of_iter < max_iter):
+      no_of_iter = no_of_iter + 1
+      direction = Solve_All_Blocks(Block_List, AvgDistMatVal, Budget, edge_value_arr, no_of_edges, pool) - edge_value_arr
+      path_direction = Path_Matrix.dot(direction)
+      if (numpy.dot(path_direction, path_direction) == 0):
+	converged = True
+	break
+      step = Get_Block_Step(edge_value_arr, residual, direction, path_direction, prev_step, prev_path_step)
+      edge_value_arr = numpy.maximum(edge_value_arr + step, 0)
+      prev_residual = residual
+      residual = Path_Matrix.dot(edge_value_arr) - AvgDistMatVal
+      prev_step = step
+      prev_path_step = residual - prev_residual
+      prev_objective = objective
+      objective = float(numpy.dot(residual, residual))
+      gradient_norm = Get_Projected_Gradient_Norm(Path_Matrix, residual, edge_value_arr)
+      Telemetry._LogIteration(no_of_iter, objective, gradient_norm)
+      converged = ((prev_objective - objective) <= tol * prev_objective)
+    Telemetry._End(no_of_iter, objective, gradient_norm, converged, 'blocks: ' + str(no_of_blocks))
+    if pool is not None:
+      pool.close()
+  except:
+    if pool is not None:
+      pool.terminate()
+    raise
+  finally:
+    if pool is not None:
+      pool.join()
+  return edge_value_arr
+
+#----------------------------------------------------
+"""
+this function computes the branch lengths of the supertree by the blocks of the supertree
+parameters: max_block_size - maximum number of edges of a block (see Get_Subtree_Blocks)
+no_of_jobs - number of worker processes solving the blocks
+edge_value_init, Telemetry, init_name - see Solve_Block_LSQ_System
+returns the list of edge lengths (indexed as in Supertree_Array) and the least square error
+"""
+def Solve_Block_LSQ(no_of_edges, max_block_size, no_of_jobs=1, State=Default_State, edge_value_init=None, \
+		    Telemetry=None, init_name='zero'):
+  Path_Matrix, AvgDistMatVal = QP_Solver.Build_Couplet_Edge_Matrix(no_of_edges, State)
+  Block_Idx, no_of_blocks = Get_Subtree_Blocks(State.Supertree_Info, max_block_size)
+  edge_value_arr = Solve_Block_LSQ_System(Path_Matrix, AvgDistMatVal, Block_Idx, no_of_blocks, no_of_jobs, \
+					  edge_value_init, Telemetry, init_name)
+  return edge_value_arr.tolist(), QP_Solver.Compute_LSQ_Error(Path_Matrix, AvgDistMatVal, edge_value_arr)
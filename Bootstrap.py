@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+"""
+this file contains the bootstrap of the branch lengths: the source trees are resampled with replacement,
+and the branch lengths of the (fixed) supertree topology are assigned again for every replicate
+resampling only changes the multiplicities of the source trees in the weighted average couplet distances
+(the tree weights are not derived again), so the weighted couplet distances of individual source trees are
+stored once, as sparse (tree by couplet) matrices, and the averages of a replicate are their products with the
+multiplicities; the couplet by edge path matrix A of the supertree (and A^T A) is also built once, and every
+replicate is solved by the non-negative normal equations (see QP_Solver.py), starting from the branch lengths
+of the complete set of source trees (warm start)
+replicates are solved by (forked) worker processes; the multiplicities of a replicate depend only on
+the seed and the replicate index, so the results do not depend on the number of worker processes
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import QP_Solver
+import Edge_Len_Adjust
+import Edge_Len_Init
+
+# default seed of the resampling
+DEFAULT_BOOTSTRAP_SEED = 1
+
+# percentiles of the bootstrap interval
+BOOTSTRAP_PERCENTILE_LIST = [2.5, 97.5]
+
+# files (in the output directory) containing the bootstrap statistics of the edges
+BOOTSTRAP_TREE_FILENAME = 'CUSTOM_SUPERTREE_bootstrap_newick.tre'
+BOOTSTRAP_TABLE_FILENAME = 'Bootstrap_Edge_Statistics.txt'
+
+#----------------------------------------------------
+"""
+this function returns the weighted couplet distances of individual source trees, restricted to the rows
+(supported couplets) of the least squares system, as sparse matrices (source trees by rows):
+the tree weight times the couplet distance, and the tree weight
+parameters: Source_Tree_Iter - source trees (any iterable, in the order of the tree weights of the state)
+Row_Couplet_Idx - couplet indices of the rows of the least squares system
+"""
+def Get_Tree_Row_Matrices(Source_Tree_Iter, Row_Couplet_Idx, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Couplet_Row = numpy.zeros(Couplet_Info.no_of_couplets, dtype=numpy.int64) - 1
+  Couplet_Row[Row_Couplet_Idx] = numpy.arange(len(Row_Couplet_Idx))
+  tree_idx_block_list = []
+  row_block_list = []
+  dist_block_list = []
+  for tr, Curr_tree in enumerate(Source_Tree_Iter):
+    couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Curr_tree, State)
+    row_arr = Couplet_Row[couplet_idx_arr]
+    valid = (row_arr >= 0)
+    tree_idx_block_list.append(numpy.zeros(numpy.count_nonzero(valid), dtype=numpy.int64) + tr)
+    row_block_list.append(row_arr[valid])
+    dist_block_list.append(dist_arr[valid])
+  no_of_trees = len(State.Matrix_Weight_Val)
+  tree_idx_arr = numpy.concatenate(tree_idx_block_list) if (len(tree_idx_block_list) > 0) else numpy.zeros(0, dtype=numpy.int64)
+  row_arr = numpy.concatenate(row_block_list) if (len(row_block_list) > 0) else numpy.zeros(0, dtype=numpy.int64)
+  dist_arr = numpy.concatenate(dist_block_list) if (len(dist_block_list) > 0) else numpy.zeros(0)
+  weight_arr = numpy.asarray(State.Matrix_Weight_Val, dtype=numpy.float64)[tree_idx_arr]
+  shape = (no_of_trees, len(Row_Couplet_Idx))
+  Weighted_Dist_Matrix = QP_Solver.scipy.sparse.csr_matrix((weight_arr * dist_arr, (tree_idx_arr, row_arr)), shape=shape)
+  Weight_Matrix = QP_Solver.scipy.sparse.csr_matrix((weight_arr, (tree_idx_arr, row_arr)), shape=shape)
+  return Weighted_Dist_Matrix, Weight_Matrix
+
+#----------------------------------------------------
+"""
+this function solves one bootstrap replicate
+the source trees are resampled with replacement (as multiplicities of the trees), and the couplets
+which are not supported by any resampled tree are left out of the least squares system
+parameters: Bootstrap_Data - least squares system, tree matrices, initial edge lengths, seed and solver budgets 
+(see Bootstrap_Edge_Len)
+returns the array of edge lengths
+"""
+def Solve_Replicate(Bootstrap_Data, replicate_idx):
+  Path_Matrix, AtA, Weighted_Dist_Matrix, Weight_Matrix, edge_value_init, seed, Budget = Bootstrap_Data
+  no_of_trees = Weight_Matrix.shape[0]
+  Rand = numpy.random.RandomState([seed, replicate_idx])
+  Multiplicity = numpy.bincount(Rand.randint(no_of_trees, size=no_of_trees), minlength=no_of_trees).astype(numpy.float64)
+  Weight_Sum = Weight_Matrix.T.dot(Multiplicity)
+  Weighted_Dist_Sum = Weighted_Dist_Matrix.T.dot(Multiplicity)
+  supp = (Weight_Sum > 0)
+  AvgDistMatVal = numpy.zeros(len(Weight_Sum))
+  AvgDistMatVal[supp] = Weighted_Dist_Sum[supp] / Weight_Sum[supp]
+  # the couplets which are not supported by the replicate are removed from A^T A
+  unsupp_row = numpy.nonzero(supp == False)[0]
+  if (len(unsupp_row) > 0):
+    Unsupp_Path_Matrix = Path_Matrix[unsupp_row]
+    AtA = AtA - Unsupp_Path_Matrix.T.dot(Unsupp_Path_Matrix).toarray()
+  Telemetry = QP_Solver.Solver_Telemetry(False, Budget[0], Budget[1])
+  return QP_Solver.Solve_NNLS_Normal_Equations(AtA, Path_Matrix.T.dot(AvgDistMatVal), edge_value_init, \
+					       Telemetry, float(AvgDistMatVal.dot(AvgDistMatVal)), 'bootstrap')
+
+#----------------------------------------------------
+"""
+these variables contain the (shared) least squares system and the tree matrices, for the worker processes
+(they are set only in the worker processes, by the initializer of the pool, so that concurrent bootstraps
+within a process, such as of different engine objects, do not share them)
+"""
+Worker_Bootstrap_Data = None
+
+def Worker_Initialize_Bootstrap(Bootstrap_Data):
+  global Worker_Bootstrap_Data
+  Worker_Bootstrap_Data = Bootstrap_Data
+
+#----------------------------------------------------
+"""
+this function solves one bootstrap replicate, within a worker process (see Solve_Replicate)
+returns the replicate index and the array of edge lengths
+"""
+def Worker_Solve_Replicate(replicate_idx):
+  return replicate_idx, Solve_Replicate(Worker_Bootstrap_Data, replicate_idx)
+
+#----------------------------------------------------
+"""
+this function assigns the branch lengths of the supertree for the bootstrap replicates of the source trees
+parameters: Weighted_Supertree - supertree (dendropy tree) with the branch lengths assigned from all the source trees
+(the initial values of the replicates)
+Source_Tree_Iter - source trees (any iterable, in the order of the tree weights of the state)
+no_of_replicates - number of bootstrap replicates
+seed - seed of the resampling
+no_of_jobs - number of worker processes
+Telemetry - budgets of the solver (Solver_Telemetry), or None
+returns the supertree as flat arrays (Supertree_Array), and the edge lengths of the replicates
+(array of replicates by edges, indexed as in Supertree_Array)
+"""
+def Bootstrap_Edge_Len(Weighted_Supertree, Source_Tree_Iter, no_of_replicates, seed=DEFAULT_BOOTSTRAP_SEED, \
+		       no_of_jobs=1, State=Default_State, Telemetry=None):
+  if Telemetry is None:
+    Telemetry = QP_Solver.Solver_Telemetry()
+  # branches of the couplets (the path structure of the supertree) are derived once, for all the replicates
+  State.Supertree_Info = Supertree_Array(Weighted_Supertree, State.Couplet_Info)
+  State.Couplet_Info._ClearBranchArrayIdx()
+  Edge_Len_Adjust.Initialize_TaxaPairBranches(Weighted_Supertree, State)
+  Supertree_Info = State.Supertree_Info
+  no_of_edges = Supertree_Info.no_of_edges
+  Path_Matrix = QP_Solver.Build_Couplet_Edge_Matrix(no_of_edges, State)[0]
+  Weighted_Dist_Matrix, Weight_Matrix = Get_Tree_Row_Matrices(Source_Tree_Iter, \
+							      QP_Solver.Get_Path_Couplet_Idx(State), State)
+  edge_value_init = numpy.array([0.0 if (x.length is None) else float(x.length) for x in Supertree_Info.Edge_List])
+
+  AtA = Path_Matrix.T.dot(Path_Matrix).toarray()
+  Bootstrap_Data = (Path_Matrix, AtA, Weighted_Dist_Matrix, Weight_Matrix, edge_value_init, seed, \
+		    (Telemetry.max_iter, Telemetry.tol))
+  Replicate_Edge_Len = numpy.zeros((no_of_replicates, no_of_edges))
+  if (no_of_jobs <= 1) or (no_of_replicates <= 1) or (multiprocessing.current_process().daemon == True):
+    for replicate_idx in range(no_of_replicates):
+      Replicate_Edge_Len[replicate_idx] = Solve_Replicate(Bootstrap_Data, replicate_idx)
+    return Supertree_Info, Replicate_Edge_Len
+
+  pool = multiprocessing.Pool(processes=min(no_of_jobs, no_of_replicates), \
+			      initializer=Worker_Initialize_Bootstrap, initargs=(Bootstrap_Data,))
+  try:
+    for replicate_idx, edge_value_arr in pool.imap_unordered(Worker_Solve_Replicate, range(no_of_replicates)):
+      Replicate_Edge_Len[replicate_idx] = edge_value_arr
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+  return Supertree_Info, Replicate_Edge_Len
+
+#----------------------------------------------------
+"""
+this function returns the bootstrap statistics of the edges: dictionary of arrays (indexed as in Supertree_Array)
+of the mean, standard deviation and the percentiles (BOOTSTRAP_PERCENTILE_LIST) of the replicate edge lengths
+"""
+def Get_Edge_Statistics(Replicate_Edge_Len):
+  Edge_Stat = {'mean': Replicate_Edge_Len.mean(axis=0), 'sd': Replicate_Edge_Len.std(axis=0)}
+  for p in BOOTSTRAP_PERCENTILE_LIST:
+    Edge_Stat['p' + str(p)] = numpy.percentile(Replicate_Edge_Len, p, axis=0)
+  return Edge_Stat
+
+#----------------------------------------------------
+"""
+this function returns the label of a node in the newick format (quoted if required)
+"""
+def Get_Newick_Label(label):
+  if label is None:
+    return ''
+  if any([(c in label) for c in " ()[]':;,\t"]):
+    return "'" + label.replace("'", "''") + "'"
+  return label
+
+#----------------------------------------------------
+"""
+this function returns the newick string of the supertree, with the edge lengths edge_value_arr
+and the bootstrap statistics of individual edges as comments [&mean=...,sd=...,p2.5=...,p97.5=...]
+the nodes (in postorder) are combined with their children, as in the construction of Supertree_Array
+"""
+def Get_Bootstrap_Newick(Supertree_Info, edge_value_arr, Edge_Stat):
+  Stat_Name_List = ['mean', 'sd'] + ['p' + str(p) for p in BOOTSTRAP_PERCENTILE_LIST]
+  Open_Node_Stack = []
+  for node_idx in range(Supertree_Info.no_of_edges):
+    curr_node = Supertree_Info.Edge_List[node_idx].head_node
+    no_of_children = len(curr_node.child_nodes())
+    if (no_of_children == 0):
+      node_str = Get_Newick_Label(curr_node.taxon.label if (curr_node.taxon is not None) else curr_node.label)
+    else:
+      node_str = '(' + ','.join(Open_Node_Stack[-no_of_children:]) + ')' + Get_Newick_Label(curr_node.label)
+      del Open_Node_Stack[-no_of_children:]
+    if (Supertree_Info.Parent[node_idx] >= 0):
+      node_str = node_str + ':' + str(edge_value_arr[node_idx]) + \
+		 '[&' + ','.join([x + '=' + str(float(Edge_Stat[x][node_idx])) for x in Stat_Name_List]) + ']'
+    Open_Node_Stack.append(node_str)
+  return ''.join(Open_Node_Stack) + ';'
+
+#----------------------------------------------------
+"""
+this function writes the bootstrap statistics of the edges in the output directory:
+the supertree (newick, with the branch lengths of all the source trees) annotated with the statistics, and a table
+of the edges (edge index, number of taxa under the edge, branch length, and the statistics)
+"""
+def Write_Bootstrap_Output(out_dir, Supertree_Info, Replicate_Edge_Len):
+  Edge_Stat = Get_Edge_Statistics(Replicate_Edge_Len)
+  edge_value_arr = [0.0 if (x.length is None) else float(x.length) for x in Supertree_Info.Edge_List]
+  fp = open(os.path.join(out_dir, BOOTSTRAP_TREE_FILENAME), 'w')
+  fp.write(Get_Bootstrap_Newick(Supertree_Info, edge_value_arr, Edge_Stat))
+  fp.close()
+
+  Stat_Name_List = ['mean', 'sd'] + ['p' + str(p) for p in BOOTSTRAP_PERCENTILE_LIST]
+  Span_Start, Span_End = Edge_Len_Init.Get_Supertree_Node_Spans(Supertree_Info)
+  fp = open(os.path.join(out_dir, BOOTSTRAP_TABLE_FILENAME), 'w')
+  fp.write('edge_idx\tno_of_taxa\tedge_len\t' + '\t'.join(Stat_Name_List))
+  for edge_idx in numpy.nonzero(Supertree_Info.Parent >= 0)[0]:
+    fp.write('\n' + str(edge_idx) + '\t' + str(Span_End[edge_idx] - Span_Start[edge_idx]) + '\t' + str(edge_value_arr[edge_idx]) + '\t' + \
+	     '\t'.join([str(float(Edge_Stat[x][edge_idx])) for x in Stat_Name_List]))
+  fp.write('\n\n# no of bootstrap replicates: ' + str(len(Replicate_Edge_Len)) + '\n')
+  fp.close()
@@ -37,6 +37,15 @@ import UtilFunc
 from UtilFunc import *
 import Edge_Len_Adjust
 from Edge_Len_Adjust import *
+import QP_Solver
+import CSTBL_Engine
+from CSTBL_Engine import *
+import Couplet_Cache
+import Incremental_State
+import Supertree_Evaluation
+import Couplet_Sampling
+import Bootstrap
+import Couplet_Dedup
 
 ##-----------------------------------------------------
 # this function is useful to parse various options for input data processing
@@ -64,7 +73,10 @@ def parse_options():
 			  dest="topology_input_tree_file", \
 			  default="", \
 			  help="File containing custom unweighted supertree topology, such as RFS. \
-			  The supertree is built using the input trees (provided with -I option above)")
+			  The supertree is built using the input trees (provided with -I option above). \
+			  A file containing multiple topologies, or a directory of topology files, can also be provided. \
+			  Then the couplet statistics are computed once, branch lengths are assigned to every topology, \
+			  and the topologies are ranked by their least square error.")
 			  
   parser.add_option("-t", "--topform", \
 			  type="int", \
@@ -80,6 +92,211 @@ def parse_options():
 			  dest="QP_Exec_Path", \
 			  default="", \
 			  help="Absolute path of the executable for QP solver")
+
+  parser.add_option("-S", "--solver", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_Solver_Method", \
+			  default=0, \
+			  help="1 - branch lengths are computed by the external QP executable (provided with -Q option) \
+			  2 - branch lengths are computed by the in-process sparse least squares solver (requires scipy) \
+			  3 - branch lengths are computed by solving the normal equations, built directly from the supertree topology \
+			  (memory scales with the number of edges and couplets, instead of the couplet path lengths). \
+			  By default, the external executable is used if -Q option is specified, otherwise the in-process solver is used")
+    			        
+  parser.add_option("-F", "--qpformat", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_File_Format", \
+			  default=1, \
+			  help="1 - QP input and output are exchanged with the external QP executable as text files (default) \
+			  2 - QP input and output are exchanged as binary files (CSR arrays and raw float64 edge lengths). \
+			  The executable should support this format, such as QP_Solver.py of this package.")
+
+  parser.add_option("-j", "--jobs", \
+			  type="int", \
+			  action="store", \
+			  dest="no_of_jobs", \
+			  default=1, \
+			  help="Number of worker processes used to extract the couplets of the input trees \
+			  and to assign the branch lengths of multiple topologies (default 1)")
+    			        
+  parser.add_option("--stream", \
+			  action="store_true", \
+			  dest="stream_input_trees", \
+			  default=False, \
+			  help="Read the input trees one at a time (in two passes), instead of holding the complete \
+			  treelist in memory. Only the couplet statistics are stored. The -j option is not used in this mode.")
+    			        
+  parser.add_option("--fast-newick", \
+			  action="store_true", \
+			  dest="fast_newick", \
+			  default=False, \
+			  help="Read the input trees (newick format) by the lightweight newick reader of this package, \
+			  which stores the trees as flat arrays instead of dendropy objects. Files not supported by \
+			  this reader (such as NEXUS files) are read by dendropy. Not used in the streaming mode.")
+    			        
+  parser.add_option("--dedup", \
+			  action="store_true", \
+			  dest="dedup", \
+			  default=False, \
+			  help="Extract the couplets of identical input trees only once (added with the sum of their weights), \
+			  and reuse the couplets within clades repeated in different input trees (same taxa, topology and \
+			  branch lengths). The weighted average couplet distances are not changed. Not used in the streaming mode.")
+    			        
+  parser.add_option("--dedup-tol", \
+			  type="float", \
+			  action="store", \
+			  dest="dedup_tol", \
+			  default=Couplet_Dedup.DEFAULT_DEDUP_TOL, \
+			  help="Tolerance of the branch lengths of identical trees and clades (--dedup option, default 1e-9; \
+			  0 for exactly equal lengths)")
+    			        
+  parser.add_option("--keep-tree-values", \
+			  action="store_true", \
+			  dest="keep_tree_values", \
+			  default=False, \
+			  help="Keep the couplet distances of individual input trees (for diagnostics), and write them \
+			  in the file Couplet_Tree_Values.txt of the output directory. By default, only the running \
+			  weighted sums of the couplet distances are stored.")
+    			        
+  parser.add_option("--cache-dir", \
+			  type="string", \
+			  action="store", \
+			  dest="cache_dir", \
+			  default="", \
+			  help="Directory of the couplet statistics cache (default: the folder Couplet_Cache within \
+			  the output directory). Couplet statistics of the input trees are saved in this directory, \
+			  keyed by a hash of the input file contents and options, and are loaded by later executions \
+			  with the same input trees, without reading the trees again.")
+    			        
+  parser.add_option("--cache-size", \
+			  type="int", \
+			  action="store", \
+			  dest="cache_size_mb", \
+			  default=Couplet_Cache.DEFAULT_CACHE_SIZE_MB, \
+			  help="Maximum total size (in MB) of the couplet statistics cache directory. Least recently \
+			  used files are removed beyond this size (default 1024)")
+    			        
+  parser.add_option("--no-cache", \
+			  action="store_true", \
+			  dest="no_cache", \
+			  default=False, \
+			  help="Do not use the couplet statistics cache")
+    			        
+  parser.add_option("--state-dir", \
+			  type="string", \
+			  action="store", \
+			  dest="state_dir", \
+			  default="", \
+			  help="Directory where the state of the branch length assignment (couplet statistics, \
+			  tree weights, source trees and the assigned branch lengths) is saved after the execution. \
+			  Source trees can later be added (--add-trees) or removed (--remove-trees) using this state, \
+			  without processing the other source trees again.")
+    			        
+  parser.add_option("--add-trees", \
+			  type="string", \
+			  action="store", \
+			  dest="add_trees", \
+			  default="", \
+			  help="File (same format as the -I option) of source trees to be added to the source trees \
+			  of the state saved in the --state-dir directory. The -I option is not required.")
+    			        
+  parser.add_option("--remove-trees", \
+			  type="string", \
+			  action="store", \
+			  dest="remove_trees", \
+			  default="", \
+			  help="Comma separated indices (starting from 0, as the input tree indices of the output description) \
+			  of the source trees to be removed from the state saved in the --state-dir directory. \
+			  The -I option is not required.")
+    			        
+  parser.add_option("--init-edge-len", \
+			  type="int", \
+			  action="store", \
+			  dest="init_edge_len", \
+			  default=INIT_EDGE_LEN_PREVIOUS, \
+			  help="Initial edge lengths of the in-process solvers (-S 2 or 3): \
+			  1 - branch lengths of the same topology saved in the --state-dir directory, if available, otherwise zero (default) \
+			  2 - zero \
+			  3 - averaged lengths of the matching edges of the source trees \
+			  4 - neighbor joining style estimate from the average couplet distances")
+    			        
+  parser.add_option("--solver-log", \
+			  action="store_true", \
+			  dest="solver_log", \
+			  default=False, \
+			  help="Write the convergence of the in-process solvers (objective value, gradient norm \
+			  and time of individual iterations) as JSON records in the file Solver_Log.jsonl of the output directory")
+    			        
+  parser.add_option("--max-iter", \
+			  type="int", \
+			  action="store", \
+			  dest="max_iter", \
+			  default=None, \
+			  help="Maximum number of iterations of the in-process solvers (default: set by the solver)")
+    			        
+  parser.add_option("--solver-tol", \
+			  type="float", \
+			  action="store", \
+			  dest="solver_tol", \
+			  default=None, \
+			  help="Convergence tolerance of the in-process solvers (default 1e-12)")
+    			        
+  parser.add_option("--sample-couplets", \
+			  type="int", \
+			  action="store", \
+			  dest="sample_paths", \
+			  default=0, \
+			  help="Approximate mode for large taxa sets: number of sampled couplets for every supertree edge \
+			  (default 0: all the supported couplets are used). Branch lengths are computed from the sampled couplets \
+			  by the in-process sparse least squares solver, and the least square error is estimated from held out couplets.")
+    			        
+  parser.add_option("--sample-seed", \
+			  type="int", \
+			  action="store", \
+			  dest="sample_seed", \
+			  default=Couplet_Sampling.DEFAULT_SAMPLE_SEED, \
+			  help="Seed of the couplet sampling (--sample-couplets option)")
+    			        
+  parser.add_option("--block-size", \
+			  type="int", \
+			  action="store", \
+			  dest="block_size", \
+			  default=0, \
+			  help="Solve the in-process sparse least squares problem (-S 2, or --sample-couplets) by the subtrees \
+			  of the supertree having at most (about) this number of edges, on -j worker processes, reconciled by \
+			  block coordinate iterations (default 0: the complete problem is solved at once)")
+    			        
+  parser.add_option("--profile", \
+			  action="store_true", \
+			  dest="profile", \
+			  default=False, \
+			  help="Record the wall clock time, CPU time and memory usage of individual phases, and counters \
+			  (number of couplets, edges and the total path length), in the JSON file Profile.json of the output directory")
+    			        
+  parser.add_option("--evaluate", \
+			  action="store_true", \
+			  dest="evaluate", \
+			  default=False, \
+			  help="Evaluate the weighted supertree against the source trees (least square error and RF distance \
+			  of individual source trees), in the file Supertree_Evaluation.txt of the output directory")
+    			        
+  parser.add_option("--bootstrap", \
+			  type="int", \
+			  action="store", \
+			  dest="no_of_replicates", \
+			  default=0, \
+			  help="Bootstrap the branch lengths of the weighted supertree with this number of replicates \
+			  (source trees resampled with replacement, solved on -j worker processes); the mean, standard deviation \
+			  and the 2.5 and 97.5 percentiles of individual edges are written in the output directory (default 0: no bootstrap)")
+    			        
+  parser.add_option("--bootstrap-seed", \
+			  type="int", \
+			  action="store", \
+			  dest="bootstrap_seed", \
+			  default=Bootstrap.DEFAULT_BOOTSTRAP_SEED, \
+			  help="Seed of the resampling of the source trees (--bootstrap option)")
     			        
   opts, args = parser.parse_args()
   return opts, args
@@ -97,25 +314,91 @@ def main():
   else:
     INPUT_FILE_FORMAT = 'nexus'
   INPUT_FILENAME = opts.INP_FILENAME
-  TOPOLOGY_INPUT_TREE_FILENAME = opts.topology_input_tree_file
+  # a directory of topology files may also be specified (trailing separator is removed)
+  TOPOLOGY_INPUT_TREE_FILENAME = opts.topology_input_tree_file.rstrip('/')
+  STREAM_INPUT_TREES = opts.stream_input_trees
+  KEEP_TREE_VALUES = opts.keep_tree_values
   if (opts.topology_file_format == 1):
     TOPOLOGY_FILE_FORMAT = 'newick'
   else:
     TOPOLOGY_FILE_FORMAT = 'nexus'
   NO_OF_LOOPS = 15
-  METHOD_OF_QP = 3
+  if (opts.QP_Solver_Method == 0):
+    if (opts.QP_Exec_Path == ""):
+      METHOD_OF_QP = QP_SOLVER_SPARSE_LSQ
+    else:
+      METHOD_OF_QP = QP_SOLVER_EXTERNAL_EXEC
+  else:
+    METHOD_OF_QP = opts.QP_Solver_Method
   """
   abspath function converts input possibly relative path into an absoloute path
   """
-  if (opts.QP_Exec_Path == ""):
-    print '******** THERE IS NO PATH FOR QP SOLVER (GNU_BFGS2) IS PROVIDED - RETURN **********'
+  if (METHOD_OF_QP == QP_SOLVER_EXTERNAL_EXEC):
+    if (opts.QP_Exec_Path == ""):
+      print '******** THERE IS NO PATH FOR QP SOLVER (GNU_BFGS2) IS PROVIDED - RETURN **********'
+      return
+    QP_EXEC_PATH = os.path.abspath(opts.QP_Exec_Path)
+  elif (METHOD_OF_QP == QP_SOLVER_SPARSE_LSQ):
+    if (QP_Solver.SCIPY_AVAILABLE == False):
+      print '******** IN-PROCESS SOLVER REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+      return
+    QP_EXEC_PATH = ''
+  elif (METHOD_OF_QP == QP_SOLVER_NORMAL_EQN):
+    QP_EXEC_PATH = ''
+  else:
+    print '******** INVALID QP SOLVER OPTION - RETURN **********'
     return
-  QP_EXEC_PATH = os.path.abspath(opts.QP_Exec_Path)
   
-  if (INPUT_FILENAME == ""):
+  if opts.init_edge_len not in INIT_EDGE_LEN_NAME:
+    print '******** INVALID INITIAL EDGE LENGTH OPTION - RETURN **********'
+    return
+  if (opts.max_iter is not None) and (opts.max_iter <= 0):
+    print '******** INVALID ITERATION BUDGET OF THE SOLVER - RETURN **********'
+    return
+  if (opts.sample_paths < 0):
+    print '******** INVALID NUMBER OF SAMPLED COUPLETS - RETURN **********'
+    return
+  if (opts.block_size < 0) or ((opts.block_size > 0) and (METHOD_OF_QP != QP_SOLVER_SPARSE_LSQ) and (opts.sample_paths == 0)):
+    print '******** BLOCK SIZE REQUIRES THE IN-PROCESS SPARSE LEAST SQUARES SOLVER (-S 2) - RETURN **********'
+    return
+  if (opts.sample_paths > 0) and (QP_Solver.SCIPY_AVAILABLE == False):
+    print '******** COUPLET SAMPLING REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+    return
+  if (opts.dedup_tol < 0):
+    print '******** INVALID TOLERANCE OF THE DEDUPLICATION - RETURN **********'
+    return
+  if (opts.dedup == True) and (opts.stream_input_trees == True):
+    print '******** DEDUPLICATION CANNOT BE USED IN THE STREAMING MODE - RETURN **********'
+    return
+  if (opts.no_of_replicates < 0):
+    print '******** INVALID NUMBER OF BOOTSTRAP REPLICATES - RETURN **********'
+    return
+  if (opts.no_of_replicates > 0) and (QP_Solver.SCIPY_AVAILABLE == False):
+    print '******** BOOTSTRAP REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+    return
+  if (opts.no_of_replicates > 0) and (opts.sample_paths > 0):
+    print '******** BOOTSTRAP CANNOT BE USED WITH COUPLET SAMPLING - RETURN **********'
+    return
+  
+  """
+  in the incremental mode, source trees are added to (or removed from) the state saved in the state directory
+  """
+  INCREMENTAL_UPDATE = (opts.add_trees != "") or (opts.remove_trees != "")
+  if (INCREMENTAL_UPDATE == True):
+    if (opts.state_dir == ""):
+      print '******** SOURCE TREES CAN BE ADDED OR REMOVED ONLY WITH A STATE DIRECTORY (--state-dir) - RETURN **********'
+      return
+    try:
+      Remove_Idx_List = [int(x) for x in opts.remove_trees.split(',') if (x.strip() != '')]
+    except ValueError:
+      print '******** INVALID INDICES OF THE SOURCE TREES TO BE REMOVED - RETURN **********'
+      return
+    print 'state directory containing the source trees: ', opts.state_dir
+  elif (INPUT_FILENAME == ""):
     print '******** THERE IS NO INPUT FILE (CONTAINING THE SOURCE TREES) SPECIFIED - RETURN **********'
     return
-  print 'input filename containing the source trees: ', INPUT_FILENAME
+  else:
+    print 'input filename containing the source trees: ', INPUT_FILENAME
   
   if (TOPOLOGY_INPUT_TREE_FILENAME == ""):
     print '******** THERE IS NO CUSTOM SUPERTREE TOPOLOGY FILE SPECIFIED - RETURN **********'
@@ -151,71 +434,165 @@ def main():
   dir_of_curr_exec = dir_of_topology_inp_file + 'CUSTOM_SUPERTREE_QP'   
   # create the directory
   if (os.path.isdir(dir_of_curr_exec) == False):
-    mkdr_cmd = 'mkdir ' + dir_of_curr_exec
-    os.system(mkdr_cmd)         
+    os.mkdir(dir_of_curr_exec)
   # append the current output directory in the text file
   Output_Text_File = dir_of_curr_exec + '/' + 'Complete_Output_Description.txt'
 
   print 'Output_Text_File: ', Output_Text_File
 
-  print 'QP_EXEC_PATH: ', QP_EXEC_PATH
+  if (METHOD_OF_QP == QP_SOLVER_EXTERNAL_EXEC):
+    print 'QP_EXEC_PATH: ', QP_EXEC_PATH
+  elif (METHOD_OF_QP == QP_SOLVER_SPARSE_LSQ):
+    print 'QP solver: in-process sparse least squares'
+  else:
+    print 'QP solver: in-process normal equations'
 
   # note the program beginning time 
   start_timestamp = time.time()
     
+  """
+  the engine object contains the complete state of this branch length assignment
+  """
+  Curr_Context = CSTBL_Context(METHOD_OF_QP, QP_EXEC_PATH, opts.QP_File_Format, opts.no_of_jobs, \
+				KEEP_TREE_VALUES, ROOTED_TREE, PRESERVE_UNDERSCORE, opts.fast_newick, \
+				opts.init_edge_len, opts.solver_log, opts.max_iter, opts.solver_tol, \
+				opts.sample_paths, opts.sample_seed, opts.block_size, opts.dedup, opts.dedup_tol)
+  if (opts.profile == True):
+    Curr_Context.Profiler = Phase_Recorder()
+  Profiler = Curr_Context.Profiler
+  
   #-------------------------------------  
   """ 
   read the input treelist file
+  in the streaming mode, the input trees are read one at a time (in two passes)
+  and only the couplet statistics are kept in memory
+  if the couplet statistics of the same input file are cached, they are loaded instead
   """
-  Input_Treelist = Read_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME)  
-
-  fp = open(Output_Text_File, 'w')      
-  #-------------------------------------    
+  if (INCREMENTAL_UPDATE == True):
+    """
+    the couplet statistics are loaded from the saved state, and only the couplets of the added 
+    and the removed trees (and the trees whose weights are changed) are processed
+    """
+    Profiler._Start('state_load')
+    if (Curr_Context._LoadState(opts.state_dir) == False):
+      return
+    Profiler._End()
+    Profiler._Start('incremental_update')
+    Add_Tree_String_List = []
+    if (opts.add_trees != ""):
+      Add_Tree_String_List = Incremental_State.Get_Source_Tree_Strings(opts.add_trees, INPUT_FILE_FORMAT, \
+								      ROOTED_TREE, PRESERVE_UNDERSCORE)
+    no_of_reweighted_trees = Curr_Context._UpdateSourceTrees(Add_Tree_String_List, Remove_Idx_List)
+    Profiler._End()
+    if (no_of_reweighted_trees < 0):
+      return
+    print 'source trees added: ', len(Add_Tree_String_List), ' removed: ', len(set(Remove_Idx_List)), \
+      ' other trees with changed weights: ', no_of_reweighted_trees
+  else:
+    if (opts.no_cache == True):
+      cache_dir = None
+    elif (opts.cache_dir != ""):
+      cache_dir = opts.cache_dir
+    else:
+      cache_dir = dir_of_curr_exec + '/' + 'Couplet_Cache'
+    Curr_Context._ReadSourceTrees(INPUT_FILENAME, INPUT_FILE_FORMAT, STREAM_INPUT_TREES, cache_dir, opts.cache_size_mb)
+    if Curr_Context.Cache_Filename is not None:
+      print 'couplet statistics are loaded from the cache file: ', Curr_Context.Cache_Filename
+  
   """
-  from the input trees, note the number of taxa (total)
+  from the input trees, note the complete set of taxa, and assign integer indices to individual taxa
+  couplet support counts are derived from the taxa sets of individual trees
+  and the weights of individual trees are computed from these support counts
+  then individual trees are processed to find the couplet relations within those trees
   """
-  for tr_idx in range(len(Input_Treelist)):
-    taxa_labels_curr_tree = Input_Treelist[tr_idx].infer_taxa().labels()
-    if (DEBUG_LEVEL > 1):
-      fp.write('\n Tree no : ' + str(tr_idx+1) +  'no of leaf nodes: ' + str(len(taxa_labels_curr_tree)))
-    if (DEBUG_LEVEL > 2):
-      fp.write('\n taxa set belonging to current tree: ' + str(taxa_labels_curr_tree))
-    for i in range(len(taxa_labels_curr_tree)):
-      if taxa_labels_curr_tree[i] not in COMPLETE_INPUT_TAXA_LIST:
-	COMPLETE_INPUT_TAXA_LIST.append(taxa_labels_curr_tree[i])
-  
-  number_of_taxa = len(COMPLETE_INPUT_TAXA_LIST)
+  Curr_Context._DeriveCoupletStatistics()
+  number_of_taxa = len(Curr_Context.COMPLETE_INPUT_TAXA_LIST)
   
-  """ 
-  now process individual trees to find the couplet relations within those trees
-  """
-  for tr_idx in range(len(Input_Treelist)):
-    DeriveCoupletRelations(Input_Treelist[tr_idx], tr_idx)
-      
+  fp = open(Output_Text_File, 'w')
+  if (DEBUG_LEVEL > 1):
+    fp.write('\n no of input trees: ' + str(Curr_Context.no_of_source_trees))
   if (DEBUG_LEVEL >= 0):
     fp.write('\n  total no of taxa: ' + str(number_of_taxa))
+  if Curr_Context.Dedup_Info is not None:
+    fp.write('\n  no of distinct input trees: ' + str(Curr_Context.Dedup_Info['no_of_distinct_trees']) + \
+	     ' -- repeated clades: ' + str(Curr_Context.Dedup_Info['no_of_repeated_clades']) + \
+	     ' reused clades: ' + str(Curr_Context.Dedup_Info['no_of_reused_clades']))
   if (DEBUG_LEVEL > 1):
-    fp.write('\n len COMPLETE_INPUT_TAXA_LIST: ' + str(COMPLETE_INPUT_TAXA_LIST))
-    fp.write('\n len TaxaPair_Reln_Dict : ' + str(len(TaxaPair_Reln_Dict)))
+    fp.write('\n len COMPLETE_INPUT_TAXA_LIST: ' + str(Curr_Context.COMPLETE_INPUT_TAXA_LIST))
+    fp.write('\n no of supported couplets : ' + str(Curr_Context.Couplet_Info._GetNoSupportedCouplets()))
   
   # close the output file
   fp.close()
   
+  if (KEEP_TREE_VALUES == True):
+    WriteCoupletTreeValues(dir_of_curr_exec + '/' + 'Couplet_Tree_Values.txt', Curr_Context)
+  
   """ 
-  read the custom supertree topology from the specified input custom topology file
+  read the custom supertree topology (or multiple candidate topologies) 
+  from the specified input custom topology file (or directory)
   """
-  Final_Supertree = Read_Input_Tree(ROOTED_TREE, PRESERVE_UNDERSCORE, TOPOLOGY_FILE_FORMAT, TOPOLOGY_INPUT_TREE_FILENAME)    
-  fp = open(Output_Text_File, 'a')
-  fp.write('\n\n ---output supertree  without branch length information (in newick format): ' + Final_Supertree.as_newick_string())
-  fp.close()
-
-  # this function assigns the branch length information on the generated supertree
-  AssignBranchLen(Final_Supertree, Input_Treelist, QP_EXEC_PATH, Output_Text_File)
+  Profiler._Start('topology_reading')
+  Topology_List = Read_Input_Topologies(ROOTED_TREE, PRESERVE_UNDERSCORE, TOPOLOGY_FILE_FORMAT, TOPOLOGY_INPUT_TREE_FILENAME)
+  Profiler._End()
+  if (len(Topology_List) == 0):
+    print '******** THERE IS NO SUPERTREE TOPOLOGY IN THE SPECIFIED FILE / DIRECTORY - RETURN **********'
+    return
   
-  out_treefilename = dir_of_curr_exec + '/' + 'CUSTOM_SUPERTREE_with_branch_length_newick.tre'
-  outfile = open(out_treefilename, 'w')
-  outfile.write(Final_Supertree.as_newick_string())
-  outfile.close()
+  # branch lengths of the topologies are assigned and written in the output directory
+  Solve_Topologies_To_Directory(Curr_Context, Topology_List, dir_of_curr_exec, Output_Text_File, opts.no_of_jobs)
+  
+  """
+  evaluate the weighted supertree (of every topology) against the source trees
+  """
+  if (opts.evaluate == True):
+    Profiler._Start('evaluation')
+    for topology_name, Curr_Supertree in Topology_List:
+      if (len(Topology_List) == 1):
+	dir_of_curr_topology = dir_of_curr_exec
+      else:
+	dir_of_curr_topology = dir_of_curr_exec + '/' + topology_name
+      Weighted_Supertree = Read_Input_Topologies(ROOTED_TREE, PRESERVE_UNDERSCORE, 'newick', \
+				dir_of_curr_topology + '/' + 'CUSTOM_SUPERTREE_with_branch_length_newick.tre')[0][1]
+      Eval_List, Summary = Supertree_Evaluation.Evaluate_Supertree(Weighted_Supertree, \
+				Supertree_Evaluation.Get_Source_Tree_Iter(Curr_Context, INPUT_FILENAME, INPUT_FILE_FORMAT), \
+				Curr_Context)
+      Supertree_Evaluation.Write_Supertree_Evaluation(dir_of_curr_topology + '/' + Supertree_Evaluation.EVALUATION_FILENAME, \
+						      Eval_List, Summary)
+      print 'evaluation of the supertree (', topology_name, ') -- least square error: ', Summary['lsq_error'], \
+	' mean RF distance: ', Summary['mean_RF']
+    Profiler._End()
+  
+  """
+  bootstrap of the branch lengths: the weighted supertree (of every topology) is solved again 
+  for the replicates of the source trees (resampled with replacement)
+  """
+  if (opts.no_of_replicates > 0):
+    Profiler._Start('bootstrap')
+    for topology_name, Curr_Supertree in Topology_List:
+      if (len(Topology_List) == 1):
+	dir_of_curr_topology = dir_of_curr_exec
+      else:
+	dir_of_curr_topology = dir_of_curr_exec + '/' + topology_name
+      Weighted_Supertree = Read_Input_Topologies(ROOTED_TREE, PRESERVE_UNDERSCORE, 'newick', \
+				dir_of_curr_topology + '/' + 'CUSTOM_SUPERTREE_with_branch_length_newick.tre')[0][1]
+      Supertree_Info, Replicate_Edge_Len = Bootstrap.Bootstrap_Edge_Len(Weighted_Supertree, \
+				Supertree_Evaluation.Get_Source_Tree_Iter(Curr_Context, INPUT_FILENAME, INPUT_FILE_FORMAT), \
+				opts.no_of_replicates, opts.bootstrap_seed, opts.no_of_jobs, Curr_Context, Curr_Context.Telemetry)
+      Bootstrap.Write_Bootstrap_Output(dir_of_curr_topology, Supertree_Info, Replicate_Edge_Len)
+      print 'bootstrap of the branch lengths (', topology_name, ') -- replicates: ', opts.no_of_replicates
+    Profiler._End()
+  
+  """
+  save the state, so that source trees can later be added or removed
+  """
+  if (opts.state_dir != ""):
+    Profiler._Start('state_save')
+    if (INCREMENTAL_UPDATE == True):
+      Curr_Context._SaveState(opts.state_dir)
+    else:
+      Curr_Context._SaveState(opts.state_dir, Incremental_State.Get_Source_Tree_Strings(INPUT_FILENAME, \
+								    INPUT_FILE_FORMAT, ROOTED_TREE, PRESERVE_UNDERSCORE))
+    Profiler._End()
   
   # note the timestamp
   # this will signify the time required for tree reading and couplet feature extraction
@@ -223,19 +600,13 @@ def main():
   fp = open(Output_Text_File, 'a')
   fp.write('\n \n\n ===============>>>>>>>>>>>>>>> TIME COMPLEXITY : complete method execution: ' + str(end_timestamp - start_timestamp))
   fp.close()
-          
-  #--------------------------------------------------------------  
-  # delete the storage variables associated with the current execution 
-  
-  # clear the dictionaries
-  TaxaPair_Reln_Dict.clear()
-  EdgeInfoDict.clear()
-  
-  # clear the lists associated
-  if (len(COMPLETE_INPUT_TAXA_LIST) > 0):
-    COMPLETE_INPUT_TAXA_LIST[:] = []
-  if (len(Matrix_Weight_Val) > 0):
-    Matrix_Weight_Val[:] = []
+  
+  if (opts.profile == True):
+    Profiler._WriteReport(dir_of_curr_exec + '/' + PROFILE_FILENAME, \
+			  {'input_file': INPUT_FILENAME, 'topology_file': TOPOLOGY_INPUT_TREE_FILENAME, \
+			  'solver': METHOD_OF_QP, 'jobs': opts.no_of_jobs, 'no_of_topologies': len(Topology_List), \
+			  'lsq_error': (Curr_Context.LSQ_Error if (len(Topology_List) == 1) else None), \
+			  'solver_summary': Curr_Context.Telemetry.Summary_List})
       
 #-----------------------------------------------------
 if __name__ == "__main__":
@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+
+##---------------------------------------------
+"""
+this program assigns the branch lengths of the supertree topologies of many datasets (jobs) in one execution
+jobs are listed in a manifest file; every line contains the file of input trees and the file
+(or directory) of the supertree topologies, separated by tab, optionally followed by the job name
+(empty lines and lines starting with # are skipped; relative paths are relative to the manifest file)
+individual jobs are executed by (forked) worker processes, at most a given number at a time,
+so that the packages are imported only once; a job exceeding its time or memory budget is terminated
+every job writes its outputs (same as CSTBL.py) and its status in its own directory,
+and a summary table of all the jobs is written at the end
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import QP_Solver
+import CSTBL_Engine
+from CSTBL_Engine import *
+import signal
+import traceback
+
+# file (in the directory of a job) containing the status of the job
+JOB_STATUS_FILENAME = 'Job_Status.json'
+# file (in the directory of a job) containing the messages printed by the job
+JOB_LOG_FILENAME = 'Job_Log.txt'
+# summary files of the batch (in the output directory)
+BATCH_SUMMARY_FILENAME = 'Batch_Summary.txt'
+BATCH_SUMMARY_JSON_FILENAME = 'Batch_Summary.json'
+# interval (in seconds) of checking the running jobs
+JOB_POLL_INTERVAL = 0.1
+
+# status of the jobs
+JOB_STATUS_OK = 'ok'
+JOB_STATUS_FAILED = 'failed'
+JOB_STATUS_TIMEOUT = 'timeout'
+JOB_STATUS_MEMORY_LIMIT = 'memory_limit'
+JOB_STATUS_KILLED = 'killed'
+JOB_STATUS_NOT_RUN = 'not_run'
+
+# columns of the summary table
+BATCH_SUMMARY_COLUMN_LIST = ['job', 'status', 'wall_time_sec', 'peak_rss_kb', 'no_of_trees', 'no_of_taxa', \
+			      'no_of_topologies', 'lsq_error', 'message']
+
+##-----------------------------------------------------
+"""
+this function reads the jobs of a manifest file
+parameters: manifest_filename - manifest file, out_dir - output directory of the batch
+returns the list of jobs (dictionaries of the job name, the input tree file, the topology file / directory
+and the output directory of the job), or None in case of an error
+"""
+def Read_Batch_Manifest(manifest_filename, out_dir):
+  base_dir = os.path.dirname(os.path.abspath(manifest_filename))
+  Job_List = []
+  job_name_set = set()
+  fp = open(manifest_filename, 'r')
+  for line_no, line in enumerate(fp):
+    line = line.strip()
+    if (line == '') or (line.startswith('#') == True):
+      continue
+    if ('\t' in line):
+      field_list = [x.strip() for x in line.split('\t') if (x.strip() != '')]
+    else:
+      field_list = line.split()
+    if (len(field_list) < 2) or (len(field_list) > 3):
+      print '******** INVALID LINE ' + str(line_no + 1) + ' OF THE MANIFEST FILE - RETURN **********'
+      fp.close()
+      return None
+    if (len(field_list) == 3):
+      job_name = field_list[2]
+    else:
+      job_name = 'job_' + str(len(Job_List) + 1)
+    if (job_name in job_name_set) or (os.path.basename(job_name) != job_name) or (job_name.startswith('.') == True):
+      print '******** INVALID OR DUPLICATE JOB NAME ' + job_name + ' IN THE MANIFEST FILE - RETURN **********'
+      fp.close()
+      return None
+    job_name_set.add(job_name)
+    Job_List.append({'name': job_name, \
+		      'input_file': os.path.join(base_dir, field_list[0]), \
+		      'topology_file': os.path.join(base_dir, field_list[1]).rstrip('/'), \
+		      'output_dir': os.path.join(out_dir, job_name)})
+  fp.close()
+  return Job_List
+
+##-----------------------------------------------------
+"""
+this function returns the current resident set size (in KB) of a process, or None if it is not available
+"""
+def Get_Process_RSS(pid):
+  try:
+    fp = open('/proc/' + str(pid) + '/statm', 'r')
+    no_of_pages = int(fp.read().split()[1])
+    fp.close()
+  except (IOError, IndexError, ValueError):
+    return None
+  return no_of_pages * (os.sysconf('SC_PAGE_SIZE') // 1024)
+
+##-----------------------------------------------------
+"""
+this function executes one job: the couplet statistics of the input trees are derived, and the branch
+lengths of the supertree topologies are assigned, writing the same outputs as CSTBL.py in the job directory
+parameters: Job - job (see Read_Batch_Manifest), opts - options of the batch,
+METHOD_OF_QP and QP_EXEC_PATH - solver of the branch lengths
+returns a dictionary of the job results (number of input trees, taxa and topologies, least square error)
+"""
+def Run_Batch_Job(Job, opts, METHOD_OF_QP, QP_EXEC_PATH):
+  ROOTED_TREE = True
+  PRESERVE_UNDERSCORE = True
+  INPUT_FILE_FORMAT = 'newick' if (opts.inp_file_format == 1) else 'nexus'
+  TOPOLOGY_FILE_FORMAT = 'newick' if (opts.topology_file_format == 1) else 'nexus'
+  dir_of_curr_exec = Job['output_dir']
+  Output_Text_File = dir_of_curr_exec + '/' + 'Complete_Output_Description.txt'
+
+  Curr_Context = CSTBL_Context(METHOD_OF_QP, QP_EXEC_PATH, opts.QP_File_Format, 1, False, \
+				ROOTED_TREE, PRESERVE_UNDERSCORE, opts.fast_newick)
+  if (opts.profile == True):
+    Curr_Context.Profiler = Phase_Recorder()
+
+  Curr_Context._ReadSourceTrees(Job['input_file'], INPUT_FILE_FORMAT, opts.stream_input_trees)
+  Curr_Context._DeriveCoupletStatistics()
+  fp = open(Output_Text_File, 'w')
+  fp.write('\n  total no of taxa: ' + str(len(Curr_Context.COMPLETE_INPUT_TAXA_LIST)))
+  fp.close()
+
+  Curr_Context.Profiler._Start('topology_reading')
+  Topology_List = Read_Input_Topologies(ROOTED_TREE, PRESERVE_UNDERSCORE, TOPOLOGY_FILE_FORMAT, Job['topology_file'])
+  Curr_Context.Profiler._End()
+  Result = {'no_of_trees': Curr_Context.no_of_source_trees, \
+	    'no_of_taxa': len(Curr_Context.COMPLETE_INPUT_TAXA_LIST), \
+	    'no_of_topologies': len(Topology_List), \
+	    'lsq_error': None}
+  if (len(Topology_List) == 0):
+    Result['message'] = 'no supertree topology in the topology file'
+    return Result
+
+  LSQ_Error_List = Solve_Topologies_To_Directory(Curr_Context, Topology_List, dir_of_curr_exec, Output_Text_File)
+  # with multiple topologies, the least error is reported
+  Result['lsq_error'] = min(LSQ_Error_List)
+  if (opts.profile == True):
+    Curr_Context.Profiler._WriteReport(dir_of_curr_exec + '/' + PROFILE_FILENAME, \
+				      {'input_file': Job['input_file'], 'topology_file': Job['topology_file'], \
+				      'solver': METHOD_OF_QP, 'no_of_topologies': len(Topology_List)})
+  return Result
+
+##-----------------------------------------------------
+"""
+this function writes the status of a job in its directory
+"""
+def Write_Job_Status(Job, Status):
+  fp = open(os.path.join(Job['output_dir'], JOB_STATUS_FILENAME), 'w')
+  fp.write(json.dumps(Status, indent=2, sort_keys=True) + '\n')
+  fp.close()
+
+##-----------------------------------------------------
+"""
+this function is executed by the worker process of a job
+the worker is placed in its own process group, so that the job (including an external QP executable)
+can be terminated as a whole; the messages of the job are written in its log file
+"""
+def Batch_Job_Worker(Job, opts, METHOD_OF_QP, QP_EXEC_PATH):
+  os.setpgrp()
+  fp_log = open(os.path.join(Job['output_dir'], JOB_LOG_FILENAME), 'w')
+  sys.stdout.flush()
+  sys.stderr.flush()
+  os.dup2(fp_log.fileno(), 1)
+  os.dup2(fp_log.fileno(), 2)
+
+  start_timestamp = time.time()
+  Status = {'job': Job['name'], 'input_file': Job['input_file'], 'topology_file': Job['topology_file']}
+  try:
+    Status.update(Run_Batch_Job(Job, opts, METHOD_OF_QP, QP_EXEC_PATH))
+    Status['status'] = JOB_STATUS_FAILED if ('message' in Status) else JOB_STATUS_OK
+  except MemoryError:
+    Status['status'] = JOB_STATUS_MEMORY_LIMIT
+    Status['message'] = 'out of memory'
+  except Exception, e:
+    traceback.print_exc()
+    Status['status'] = JOB_STATUS_FAILED
+    Status['message'] = (type(e).__name__ + ': ' + str(e)).strip()
+  Status['wall_time_sec'] = time.time() - start_timestamp
+  Status['peak_rss_kb'] = Phase_Recorder()._GetPeakRSS()
+  sys.stdout.flush()
+  Write_Job_Status(Job, Status)
+  fp_log.close()
+
+##-----------------------------------------------------
+"""
+this function terminates the worker process of a job (and the other processes of its process group)
+"""
+def Terminate_Job_Worker(Worker):
+  try:
+    os.killpg(Worker.pid, signal.SIGKILL)
+  except OSError:
+    # the worker has not yet created its process group
+    Worker.terminate()
+  Worker.join()
+
+##-----------------------------------------------------
+"""
+this function executes the jobs, at most no_of_jobs of them at a time
+parameters:
+1) Job_List: jobs (see Read_Batch_Manifest)
+2) opts: options of the batch
+3) METHOD_OF_QP, QP_EXEC_PATH: solver of the branch lengths
+4) no_of_jobs: maximum number of jobs executed at a time
+5) timeout_sec: wall clock time budget of a job (0 for no budget)
+6) max_memory_mb: resident memory budget of a job (0 for no budget); the resident memory of a worker process
+is checked periodically (every JOB_POLL_INTERVAL seconds)
+returns the list of status of individual jobs (in the order of the jobs)
+"""
+def Run_Batch(Job_List, opts, METHOD_OF_QP, QP_EXEC_PATH, no_of_jobs=1, timeout_sec=0, max_memory_mb=0):
+  Status_List = [None] * len(Job_List)
+  # running jobs: (job index, worker process, start time, peak resident memory seen by this process)
+  Running_List = []
+  next_job_idx = 0
+  while (next_job_idx < len(Job_List)) or (len(Running_List) > 0):
+    # start the next jobs
+    while (next_job_idx < len(Job_List)) and (len(Running_List) < no_of_jobs):
+      Job = Job_List[next_job_idx]
+      print 'starting job: ', Job['name']
+      try:
+	if (os.path.isdir(Job['output_dir']) == False):
+	  os.makedirs(Job['output_dir'])
+      except OSError, e:
+	Status_List[next_job_idx] = {'job': Job['name'], 'status': JOB_STATUS_NOT_RUN, 'message': str(e)}
+	next_job_idx = next_job_idx + 1
+	continue
+      Worker = multiprocessing.Process(target=Batch_Job_Worker, args=(Job, opts, METHOD_OF_QP, QP_EXEC_PATH))
+      Worker.start()
+      Running_List.append([next_job_idx, Worker, time.time(), 0])
+      next_job_idx = next_job_idx + 1
+
+    time.sleep(JOB_POLL_INTERVAL)
+
+    # check the running jobs
+    Remaining_List = []
+    for Running_Job in Running_List:
+      job_idx, Worker, start_time, peak_rss = Running_Job
+      Job = Job_List[job_idx]
+      curr_rss = Get_Process_RSS(Worker.pid)
+      if curr_rss is not None:
+	peak_rss = max(peak_rss, curr_rss)
+	Running_Job[3] = peak_rss
+      Status = None
+      if (Worker.is_alive() == True):
+	if (timeout_sec > 0) and (time.time() - start_time > timeout_sec):
+	  Terminate_Job_Worker(Worker)
+	  Status = {'status': JOB_STATUS_TIMEOUT, 'message': 'time budget of ' + str(timeout_sec) + ' seconds is exceeded'}
+	elif (max_memory_mb > 0) and (peak_rss > max_memory_mb * 1024):
+	  Terminate_Job_Worker(Worker)
+	  Status = {'status': JOB_STATUS_MEMORY_LIMIT, 'message': 'memory budget of ' + str(max_memory_mb) + ' MB is exceeded'}
+	else:
+	  Remaining_List.append(Running_Job)
+	  continue
+	Status.update({'job': Job['name'], 'input_file': Job['input_file'], 'topology_file': Job['topology_file'], \
+		       'wall_time_sec': time.time() - start_time, 'peak_rss_kb': peak_rss})
+	Write_Job_Status(Job, Status)
+      else:
+	Worker.join()
+	status_filename = os.path.join(Job['output_dir'], JOB_STATUS_FILENAME)
+	if (Worker.exitcode == 0) and (os.path.isfile(status_filename) == True):
+	  fp = open(status_filename, 'r')
+	  Status = json.load(fp)
+	  fp.close()
+	else:
+	  Status = {'job': Job['name'], 'input_file': Job['input_file'], 'topology_file': Job['topology_file'], \
+		    'status': JOB_STATUS_KILLED, 'message': 'worker process exited with code ' + str(Worker.exitcode), \
+		    'wall_time_sec': time.time() - start_time, 'peak_rss_kb': peak_rss}
+	  Write_Job_Status(Job, Status)
+      print 'job: ', Job['name'], ' status: ', Status['status']
+      Status_List[job_idx] = Status
+    Running_List = Remaining_List
+
+  return Status_List
+
+##-----------------------------------------------------
+"""
+this function writes the summary of the jobs, as a tab separated table and as a JSON file
+"""
+def Write_Batch_Summary(out_dir, Status_List):
+  fp = open(os.path.join(out_dir, BATCH_SUMMARY_FILENAME), 'w')
+  fp.write('\t'.join(BATCH_SUMMARY_COLUMN_LIST))
+  for Status in Status_List:
+    fp.write('\n' + '\t'.join([str(Status.get(x, '')).replace('\t', ' ').replace('\n', ' ') \
+				for x in BATCH_SUMMARY_COLUMN_LIST]))
+  fp.write('\n')
+  fp.close()
+
+  Count_Dict = dict()
+  for Status in Status_List:
+    Count_Dict[Status['status']] = Count_Dict.get(Status['status'], 0) + 1
+  fp = open(os.path.join(out_dir, BATCH_SUMMARY_JSON_FILENAME), 'w')
+  fp.write(json.dumps({'status_count': Count_Dict, 'jobs': Status_List}, indent=2, sort_keys=True) + '\n')
+  fp.close()
+  return Count_Dict
+
+##-----------------------------------------------------
+# this function is useful to parse various options for the batch execution
+def parse_options():
+  parser = OptionParser()
+
+  parser.add_option("-M", "--manifest", \
+			  type="string", \
+			  action="store", \
+			  dest="manifest_file", \
+			  default="", \
+			  help="Manifest file of the jobs: every line contains the file of input trees and the file \
+			  (or directory) of supertree topologies, separated by tab, optionally followed by the job name")
+
+  parser.add_option("-o", "--output", \
+			  type="string", \
+			  action="store", \
+			  dest="out_dir", \
+			  default="", \
+			  help="Output directory of the batch: the outputs of individual jobs are placed in directories \
+			  named after the jobs, and the summary of the jobs in the files Batch_Summary.txt and Batch_Summary.json")
+
+  parser.add_option("-j", "--jobs", \
+			  type="int", \
+			  action="store", \
+			  dest="no_of_jobs", \
+			  default=1, \
+			  help="Number of jobs executed at a time (default 1)")
+
+  parser.add_option("--timeout", \
+			  type="float", \
+			  action="store", \
+			  dest="timeout_sec", \
+			  default=0, \
+			  help="Wall clock time budget (in seconds) of a job (default 0: no budget)")
+
+  parser.add_option("--max-memory", \
+			  type="int", \
+			  action="store", \
+			  dest="max_memory_mb", \
+			  default=0, \
+			  help="Resident memory budget (in MB) of a job (default 0: no budget)")
+
+  parser.add_option("-p", "--inpform", \
+			  type="int", \
+			  action="store", \
+			  dest="inp_file_format", \
+			  default=1, \
+			  help="1 - format of the input tree files is NEWICK (default) 2 - NEXUS")
+
+  parser.add_option("-t", "--topform", \
+			  type="int", \
+			  action="store", \
+			  dest="topology_file_format", \
+			  default=1, \
+			  help="1 - format of the topology files is NEWICK (default) 2 - NEXUS")
+
+  parser.add_option("-Q", "--QPExec", \
+			  type="string", \
+			  action="store", \
+			  dest="QP_Exec_Path", \
+			  default="", \
+			  help="Absolute path of the executable for QP solver")
+
+  parser.add_option("-S", "--solver", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_Solver_Method", \
+			  default=0, \
+			  help="Solver of the branch lengths, same as CSTBL.py (1 - external QP executable, \
+			  2 - in-process sparse least squares, 3 - normal equations)")
+
+  parser.add_option("-F", "--qpformat", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_File_Format", \
+			  default=1, \
+			  help="Format of the files exchanged with the external QP executable, same as CSTBL.py")
+
+  parser.add_option("--stream", \
+			  action="store_true", \
+			  dest="stream_input_trees", \
+			  default=False, \
+			  help="Read the input trees one at a time (in two passes), same as CSTBL.py")
+
+  parser.add_option("--fast-newick", \
+			  action="store_true", \
+			  dest="fast_newick", \
+			  default=False, \
+			  help="Read the input trees by the lightweight newick reader, same as CSTBL.py")
+
+  parser.add_option("--profile", \
+			  action="store_true", \
+			  dest="profile", \
+			  default=False, \
+			  help="Write the profile of the phases of individual jobs (Profile.json of the job directories)")
+
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+''' main function '''
+def main():
+  opts, args = parse_options()
+
+  if (opts.manifest_file == ""):
+    print '******** THERE IS NO MANIFEST FILE SPECIFIED - RETURN **********'
+    return
+  if (opts.out_dir == ""):
+    print '******** THERE IS NO OUTPUT DIRECTORY SPECIFIED - RETURN **********'
+    return
+  if (opts.no_of_jobs < 1) or (opts.timeout_sec < 0) or (opts.max_memory_mb < 0):
+    print '******** INVALID NUMBER OF JOBS, TIME OR MEMORY BUDGET - RETURN **********'
+    return
+
+  if (opts.QP_Solver_Method == 0):
+    if (opts.QP_Exec_Path == ""):
+      METHOD_OF_QP = QP_SOLVER_SPARSE_LSQ
+    else:
+      METHOD_OF_QP = QP_SOLVER_EXTERNAL_EXEC
+  else:
+    METHOD_OF_QP = opts.QP_Solver_Method
+  if (METHOD_OF_QP == QP_SOLVER_EXTERNAL_EXEC):
+    if (opts.QP_Exec_Path == ""):
+      print '******** THERE IS NO PATH FOR QP SOLVER (GNU_BFGS2) IS PROVIDED - RETURN **********'
+      return
+    QP_EXEC_PATH = os.path.abspath(opts.QP_Exec_Path)
+  elif (METHOD_OF_QP == QP_SOLVER_SPARSE_LSQ):
+    if (QP_Solver.SCIPY_AVAILABLE == False):
+      print '******** IN-PROCESS SOLVER REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+      return
+    QP_EXEC_PATH = ''
+  elif (METHOD_OF_QP == QP_SOLVER_NORMAL_EQN):
+    QP_EXEC_PATH = ''
+  else:
+    print '******** INVALID QP SOLVER OPTION - RETURN **********'
+    return
+
+  out_dir = os.path.abspath(opts.out_dir)
+  if (os.path.isdir(out_dir) == False):
+    os.makedirs(out_dir)
+  Job_List = Read_Batch_Manifest(opts.manifest_file, out_dir)
+  if Job_List is None:
+    return
+  print 'number of jobs in the manifest: ', len(Job_List)
+
+  start_timestamp = time.time()
+  Status_List = Run_Batch(Job_List, opts, METHOD_OF_QP, QP_EXEC_PATH, opts.no_of_jobs, opts.timeout_sec, opts.max_memory_mb)
+  Count_Dict = Write_Batch_Summary(out_dir, Status_List)
+
+  print '\n', '\t'.join(BATCH_SUMMARY_COLUMN_LIST[:-1])
+  for Status in Status_List:
+    print '\t'.join([str(Status.get(x, '')) for x in BATCH_SUMMARY_COLUMN_LIST[:-1]])
+  print '\n jobs: ', len(Job_List), ' -- ', ', '.join([x + ': ' + str(Count_Dict[x]) for x in sorted(Count_Dict)])
+  print ' total time: ', time.time() - start_timestamp
+
+#-----------------------------------------------------
+if __name__ == "__main__":
+    main()
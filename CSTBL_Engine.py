@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+
+"""
+this file contains the engine object for branch length assignment of supertrees
+an engine (CSTBL_Context) owns the complete state of one branch length assignment
+(input taxa, tree weights, couplet statistics and the edges of the supertree)
+so that multiple assignments can be carried out within one process,
+either one after another or concurrently (in different threads)
+
+typical usage:
+  Curr_Context = CSTBL_Context(QP_SOLVER_SPARSE_LSQ)
+  Curr_Context._ReadSourceTrees('source_trees.tre')
+  Curr_Context._ReadTopology('supertree_topology.tre')
+  Weighted_Supertree = Curr_Context._Solve('out_dir/Complete_Output_Description.txt')
+
+the state can be saved in a directory (_SaveState), and later loaded (_LoadState) to add or remove
+a few source trees (_UpdateSourceTrees) without processing the other source trees again
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import Edge_Len_Adjust
+from Edge_Len_Adjust import *
+import QP_Solver
+import Couplet_Cache
+import Incremental_State
+import Couplet_Sampling
+import Couplet_Dedup
+import tempfile
+import shutil
+
+# engine object and candidate topologies accessed by the worker processes which assign
+# the branch lengths of multiple topologies; they are set by the initializer of individual (forked) workers
+# so that the couplet statistics are shared with the workers, without sending them
+Worker_Context = None
+Worker_Topology_List = []
+Worker_Output_Text_File_List = []
+
+##-----------------------------------------------------
+"""
+this function initializes a worker process which assigns the branch lengths of candidate topologies
+"""
+def Worker_Initialize_Solve(Curr_Context, Topology_List, Output_Text_File_List):
+  global Worker_Context
+  global Worker_Topology_List
+  global Worker_Output_Text_File_List
+  Worker_Context = Curr_Context
+  Worker_Topology_List = Topology_List
+  Worker_Output_Text_File_List = Output_Text_File_List
+
+##-----------------------------------------------------
+"""
+this function is executed by a worker process, for one candidate topology
+returns the index of the topology, the newick string of the weighted topology, its least square error,
+the number of couplets scored by the error, and the phases recorded by the profiler of the worker
+"""
+def Worker_Solve_Topology(topology_idx):
+  Worker_Context.Profiler.Phase_List = []
+  Worker_Context._SetTopology(Worker_Topology_List[topology_idx])
+  Weighted_Supertree = Worker_Context._Solve(Worker_Output_Text_File_List[topology_idx])
+  return topology_idx, Weighted_Supertree.as_newick_string(), Worker_Context.LSQ_Error, \
+	 Worker_Context.No_Of_Scored_Couplets, Worker_Context.Profiler.Phase_List
+
+##-----------------------------------------------------
+"""
+this class contains the source trees, the supertree topology, the solver settings
+and (as a CSTBL_State) the state of the branch length assignment
+couplet statistics are derived once from the source trees, and reused for any number of solves
+"""
+class CSTBL_Context(CSTBL_State):
+  """
+  parameters:
+  1) QP_Method: solver of the branch length assignment (QP_SOLVER_EXTERNAL_EXEC, QP_SOLVER_SPARSE_LSQ
+  or QP_SOLVER_NORMAL_EQN)
+  2) QP_Executable: path of the QP executable (for the external solver)
+  3) QP_File_Format: format (text or binary) of the files exchanged with the external QP executable
+  4) no_of_jobs: number of worker processes to extract the couplets of the source trees
+  5) keep_tree_values: if True, the couplet distances of individual source trees are also kept
+  6) ROOTED_TREE, PRESERVE_UNDERSCORE: options to read the trees
+  7) FAST_NEWICK: if True, newick source trees are read by the lightweight newick reader (see Read_Input_Treelist)
+  8) init_edge_len: initial edge lengths of the in-process solvers (one of the INIT_EDGE_LEN_* values)
+  9) solver_log: if True, convergence of the in-process solvers is written to Solver_Log.jsonl (output directory)
+  10) max_iter, solver_tol: iteration and tolerance budgets of the in-process solvers (None for the defaults)
+  11) sample_paths: if positive, branch lengths are computed from a sample of the couplets, with this number 
+  of couplets for every supertree edge (see Couplet_Sampling.py); sample_seed is the seed of the sampling
+  12) block_size: if positive, the in-process sparse least squares problem is solved by the blocks (subtrees)
+  of the supertree with at most (about) this number of edges, by no_of_jobs worker processes (see Block_Solver.py)
+  13) dedup: if True, identical source trees and repeated clades are extracted once (see Couplet_Dedup.py),
+  with the tolerance dedup_tol of the branch lengths
+  """
+  def __init__(self, QP_Method=QP_SOLVER_SPARSE_LSQ, QP_Executable='', QP_File_Format=QP_FILE_FORMAT_TEXT, \
+		no_of_jobs=1, keep_tree_values=False, ROOTED_TREE=True, PRESERVE_UNDERSCORE=True, FAST_NEWICK=False, \
+		init_edge_len=INIT_EDGE_LEN_PREVIOUS, solver_log=False, max_iter=None, solver_tol=None, \
+		sample_paths=0, sample_seed=Couplet_Sampling.DEFAULT_SAMPLE_SEED, block_size=0, dedup=False, \
+		dedup_tol=Couplet_Dedup.DEFAULT_DEDUP_TOL):
+    CSTBL_State.__init__(self)
+    self.QP_Method = QP_Method
+    self.QP_Executable = QP_Executable
+    self.QP_File_Format = QP_File_Format
+    self.no_of_jobs = no_of_jobs
+    self.keep_tree_values = keep_tree_values
+    self.ROOTED_TREE = ROOTED_TREE
+    self.PRESERVE_UNDERSCORE = PRESERVE_UNDERSCORE
+    self.FAST_NEWICK = FAST_NEWICK
+    self.init_edge_len = init_edge_len
+    self.sample_paths = sample_paths
+    self.sample_seed = sample_seed
+    self.block_size = block_size
+    self.dedup = dedup
+    self.dedup_tol = dedup_tol
+    # numbers of distinct source trees, and of repeated and reused clades (None without the deduplication)
+    self.Dedup_Info = None
+    # budgets and convergence summary (Summary_List) of the in-process solvers
+    self.Telemetry = QP_Solver.Solver_Telemetry(solver_log, max_iter, solver_tol)
+    # source trees (None if they are read in the streaming mode)
+    self.Source_Treelist = []
+    self.no_of_source_trees = 0
+    # True if the couplet statistics are derived from the current source trees
+    self.Statistics_Valid = False
+    # supertree topology, whose branch lengths are assigned
+    self.Supertree = None
+    # least square error of the last solve, and the number of couplets scored by it
+    self.LSQ_Error = None
+    self.No_Of_Scored_Couplets = None
+    # cache file from which the couplet statistics are loaded (None if they are derived from the source trees)
+    self.Cache_Filename = None
+    # newick strings and taxa indices of the source trees, if the state is loaded from a directory (see _LoadState)
+    self.Tree_String_List = None
+    self.Tree_Taxa_Idx_List = None
+    # edge lengths of the last solve (indexed as in Supertree_Array) and the key of its topology
+    # a later solve of the same topology starts from these edge lengths (in-process solvers)
+    self.Edge_Len = None
+    self.Topology_Key = None
+
+  """
+  adds source trees (any sequence of dendropy trees, such as a TreeList, or trees read by the lightweight newick reader)
+  couplet statistics are derived again at the next solve
+  """
+  def _AddSourceTrees(self, Input_Treelist):
+    if self.Source_Treelist is None:
+      print '******** SOURCE TREES ARE ALREADY SUMMARIZED (STREAMING MODE OR CACHE) - CANNOT ADD TREES **********'
+      return
+    self.Source_Treelist.extend(Input_Treelist)
+    self.no_of_source_trees = len(self.Source_Treelist)
+    self.Statistics_Valid = False
+
+  """
+  reads source trees from a file
+  if stream is True, the trees are not kept in memory: the couplet statistics are derived
+  while reading the file (in two passes), and no other source tree can be added later
+  if cache_dir is specified, the couplet statistics are loaded from (or saved in) the cache directory,
+  whose total size is limited to cache_size_mb MB; if they are loaded, the trees are not read at all
+  (and no other source tree can be added later)
+  the cache is not used with the keep_tree_values option, or if other source trees are already added
+  """
+  def _ReadSourceTrees(self, INPUT_FILENAME, INPUT_FILE_FORMAT='newick', stream=False, cache_dir=None, \
+			cache_size_mb=Couplet_Cache.DEFAULT_CACHE_SIZE_MB):
+    if (cache_dir is not None) and ((self.keep_tree_values == True) or (self.Source_Treelist is None) \
+				    or (len(self.Source_Treelist) > 0)):
+      cache_dir = None
+    if cache_dir is not None:
+      self.Profiler._Start('cache_load')
+      cache_key = Couplet_Cache.Get_Cache_Key(INPUT_FILENAME, INPUT_FILE_FORMAT, self.ROOTED_TREE, self.PRESERVE_UNDERSCORE, \
+					      (self.dedup_tol if (self.dedup == True) else None))
+      no_of_trees = Couplet_Cache.Load_Cached_Statistics(cache_dir, cache_key, self)
+      self.Profiler._End()
+      if (no_of_trees >= 0):
+	self.Source_Treelist = None
+	self.no_of_source_trees = no_of_trees
+	self.Statistics_Valid = True
+	self.Cache_Filename = Couplet_Cache.Get_Cache_Filename(cache_dir, cache_key)
+	return
+    
+    if (stream == False):
+      self.Profiler._Start('tree_reading')
+      self._AddSourceTrees(Read_Input_Treelist(self.ROOTED_TREE, self.PRESERVE_UNDERSCORE, \
+					      INPUT_FILE_FORMAT, INPUT_FILENAME, self.FAST_NEWICK))
+      self.Profiler._End()
+    elif (self.Source_Treelist is None) or (len(self.Source_Treelist) > 0):
+      print '******** SOURCE TREES ARE ALREADY ADDED - CANNOT READ TREES IN THE STREAMING MODE **********'
+      return
+    else:
+      self._Clear()
+      self.Source_Treelist = None
+      # trees are read (twice) while deriving the couplet statistics
+      self.Profiler._Start('streaming_couplet_statistics')
+      self.no_of_source_trees = Derive_Couplet_Statistics_Streaming(self.ROOTED_TREE, self.PRESERVE_UNDERSCORE, \
+					INPUT_FILE_FORMAT, INPUT_FILENAME, self.keep_tree_values, self)
+      self.Profiler._End()
+      self.Statistics_Valid = True
+    
+    if cache_dir is not None:
+      self._DeriveCoupletStatistics()
+      self.Profiler._Start('cache_store')
+      Couplet_Cache.Store_Cached_Statistics(cache_dir, cache_key, cache_size_mb * (1 << 20), self)
+      self.Profiler._End()
+
+  """
+  derives the couplet statistics and the weights of the source trees
+  taxa are indexed in the order of their first occurrence in the source trees
+  """
+  def _DeriveCoupletStatistics(self):
+    if (self.Statistics_Valid == True):
+      return
+    self._Clear()
+    self.Profiler._Start('taxa_collection')
+    taxa_label_set = set()
+    for curr_tree in self.Source_Treelist:
+      for label in Get_Tree_Taxa_Labels(curr_tree):
+	if label not in taxa_label_set:
+	  taxa_label_set.add(label)
+	  self.COMPLETE_INPUT_TAXA_LIST.append(label)
+    self.Couplet_Info._Initialize(self.COMPLETE_INPUT_TAXA_LIST, self.keep_tree_values)
+    self.Profiler._End()
+    self.Profiler._Start('couplet_support')
+    DeriveCoupletSupport(self.Source_Treelist, self)
+    self.Profiler._End()
+    self.Profiler._Start('assign_matrix_weights')
+    AssignMatrixWeights(self.Source_Treelist, self)
+    self.Profiler._End()
+    self.Profiler._Start('derive_couplet_relations')
+    if (self.dedup == True):
+      self.Dedup_Info = Couplet_Dedup.DeriveCoupletRelations_Dedup(self.Source_Treelist, self.no_of_jobs, \
+								   self.dedup_tol, self)
+      for key in self.Dedup_Info:
+	self.Profiler._SetCounter(key, self.Dedup_Info[key])
+    else:
+      DeriveCoupletRelations_AllTrees(self.Source_Treelist, self.no_of_jobs, self)
+    self.Profiler._End()
+    self.Statistics_Valid = True
+
+  """
+  saves the state (couplet statistics, tree weights, source trees and the edge lengths of the last solve)
+  in a directory, so that source trees can later be added or removed (see _LoadState and _UpdateSourceTrees)
+  parameter: Tree_String_List - newick strings of the source trees (in their order); not required 
+  if the state is loaded from a directory (see Incremental_State.Get_Source_Tree_Strings)
+  returns True if the state is saved
+  """
+  def _SaveState(self, state_dir, Tree_String_List=None):
+    if Tree_String_List is None:
+      Tree_String_List = self.Tree_String_List
+    if (Tree_String_List is None) or (len(Tree_String_List) != self.no_of_source_trees):
+      print '******** NEWICK STRINGS OF THE SOURCE TREES ARE NOT AVAILABLE - STATE IS NOT SAVED **********'
+      return False
+    self._DeriveCoupletStatistics()
+    if (self.Tree_Taxa_Idx_List is None) or (len(self.Tree_Taxa_Idx_List) != self.no_of_source_trees):
+      Input_Treelist = self.Source_Treelist
+      if Input_Treelist is None:
+	Input_Treelist = Incremental_State.Parse_Tree_Strings(Tree_String_List, self.COMPLETE_INPUT_TAXA_LIST, \
+							      self.ROOTED_TREE, self.PRESERVE_UNDERSCORE)
+      self.Tree_Taxa_Idx_List = Incremental_State.Get_Tree_Taxa_Idx_List(Input_Treelist, self)
+    Incremental_State.Write_State(state_dir, Tree_String_List, self.Tree_Taxa_Idx_List, self.Edge_Len, \
+				  self.Topology_Key, self)
+    self.Tree_String_List = Tree_String_List
+    return True
+
+  """
+  loads a state saved by _SaveState; the source trees are not read
+  (and, as in the streaming mode, other source trees can only be added by _UpdateSourceTrees)
+  returns True if the state is loaded
+  """
+  def _LoadState(self, state_dir):
+    if (Incremental_State.Has_Saved_State(state_dir) == False):
+      print '******** THERE IS NO SAVED STATE IN THE DIRECTORY ' + state_dir + ' - RETURN **********'
+      return False
+    self.Tree_String_List, self.Tree_Taxa_Idx_List, self.Edge_Len, self.Topology_Key = \
+      Incremental_State.Read_State(state_dir, self)
+    self.Source_Treelist = None
+    self.no_of_source_trees = len(self.Tree_String_List)
+    self.Statistics_Valid = True
+    self.Cache_Filename = None
+    return True
+
+  """
+  adds and removes source trees of a loaded state (see _LoadState), updating only the affected couplets
+  and the weights of the trees sharing a couplet whose support count crossed 2
+  parameters: Add_Tree_String_List - newick strings of the trees to be added
+  Remove_Idx_List - indices of the trees to be removed (indices before this update)
+  remaining trees keep their order, and the added trees are placed after them
+  returns the number of remaining trees whose weights are changed (-1 in case of an error)
+  """
+  def _UpdateSourceTrees(self, Add_Tree_String_List=[], Remove_Idx_List=[]):
+    if self.Tree_String_List is None:
+      print '******** THERE IS NO SAVED STATE LOADED - CANNOT UPDATE THE SOURCE TREES **********'
+      return -1
+    for tr in Remove_Idx_List:
+      if (tr < 0) or (tr >= self.no_of_source_trees):
+	print '******** INVALID INDEX OF A SOURCE TREE TO BE REMOVED: ' + str(tr) + ' - RETURN **********'
+	return -1
+    self.Tree_String_List, self.Tree_Taxa_Idx_List, no_of_reweighted_trees = \
+      Incremental_State.Update_Couplet_Statistics(self.Tree_String_List, self.Tree_Taxa_Idx_List, \
+						  Add_Tree_String_List, Remove_Idx_List, \
+						  self.ROOTED_TREE, self.PRESERVE_UNDERSCORE, self)
+    self.no_of_source_trees = len(self.Tree_String_List)
+    return no_of_reweighted_trees
+
+  """
+  sets the (unweighted) supertree topology, whose branch lengths are to be assigned
+  """
+  def _SetTopology(self, Supertree):
+    self.Supertree = Supertree
+    self.LSQ_Error = None
+    self.No_Of_Scored_Couplets = None
+
+  """
+  reads the supertree topology from a file
+  """
+  def _ReadTopology(self, TOPOLOGY_FILENAME, TOPOLOGY_FILE_FORMAT='newick'):
+    self._SetTopology(Read_Input_Tree(self.ROOTED_TREE, self.PRESERVE_UNDERSCORE, \
+				      TOPOLOGY_FILE_FORMAT, TOPOLOGY_FILENAME))
+
+  """
+  assigns the branch lengths of the supertree topology
+  parameter: Output_Text_File - text file containing the output descriptions; the files exchanged
+  with the solver are placed in its directory. If None, a temporary directory is used (and removed).
+  returns the supertree (with the assigned branch lengths), or None in case of an error
+  """
+  def _Solve(self, Output_Text_File=None):
+    if self.Supertree is None:
+      print '******** THERE IS NO SUPERTREE TOPOLOGY SPECIFIED - RETURN **********'
+      return None
+    if (self.Source_Treelist is not None) and (len(self.Source_Treelist) == 0):
+      print '******** THERE IS NO SOURCE TREE SPECIFIED - RETURN **********'
+      return None
+    self._DeriveCoupletStatistics()
+
+    # edges of the supertree and the branches between the couplets are derived again for this solve
+    self.Supertree_Info = None
+    self.Couplet_Info._ClearBranchArrayIdx()
+
+    # edge lengths of a previous solve of the same topology are the initial values (warm start)
+    topology_key = Incremental_State.Get_Topology_Key(self.Supertree)
+    edge_value_init = None
+    if (self.Edge_Len is not None) and (self.Topology_Key == topology_key):
+      edge_value_init = self.Edge_Len
+
+    temp_dir = None
+    if Output_Text_File is None:
+      temp_dir = tempfile.mkdtemp(prefix='CSTBL_')
+      Output_Text_File = os.path.join(temp_dir, 'Complete_Output_Description.txt')
+    try:
+      self.LSQ_Error = AssignBranchLen(self.Supertree, self.Source_Treelist, self.QP_Executable, \
+				      Output_Text_File, self.QP_Method, self.QP_File_Format, self, edge_value_init, \
+				      self.init_edge_len, self.Telemetry, self.sample_paths, self.sample_seed, \
+				      self.block_size, self.no_of_jobs)
+    finally:
+      if temp_dir is not None:
+	shutil.rmtree(temp_dir, ignore_errors=True)
+    self.No_Of_Scored_Couplets = Get_No_Of_Scored_Couplets(self)
+    self.Edge_Len = [curr_edge.length for curr_edge in self.Supertree_Info.Edge_List]
+    self.Topology_Key = topology_key
+    return self.Supertree
+
+  """
+  assigns the branch lengths of multiple candidate topologies, using the same couplet statistics
+  parameters: 
+  1) Topology_List: list of (unweighted) supertree topologies
+  2) Output_Text_File_List: output description file of individual topologies (None for temporary files)
+  the files exchanged with the solver are placed in its directory, so these files should be in different directories
+  3) no_of_jobs: number of worker processes; if more than 1, individual topologies are solved by 
+  (forked) worker processes, otherwise the topologies are solved one after another (and are weighted in place)
+  returns the list of (newick string of the weighted topology, least square error, number of couplets scored
+  by the error) for individual topologies
+  phases recorded by the profiler while solving a topology are marked by the index of that topology
+  """
+  def _SolveTopologies(self, Topology_List, Output_Text_File_List=None, no_of_jobs=1):
+    if Output_Text_File_List is None:
+      Output_Text_File_List = [None] * len(Topology_List)
+    if (self.Source_Treelist is not None) and (len(self.Source_Treelist) == 0):
+      print '******** THERE IS NO SOURCE TREE SPECIFIED - RETURN **********'
+      return None
+    # the statistics are derived before the worker processes are forked
+    self._DeriveCoupletStatistics()
+    
+    Result_List = [None] * len(Topology_List)
+    if (no_of_jobs <= 1) or (len(Topology_List) <= 1):
+      for topology_idx in range(len(Topology_List)):
+	no_of_phases = len(self.Profiler.Phase_List)
+	self._SetTopology(Topology_List[topology_idx])
+	Weighted_Supertree = self._Solve(Output_Text_File_List[topology_idx])
+	Result_List[topology_idx] = (Weighted_Supertree.as_newick_string(), self.LSQ_Error, self.No_Of_Scored_Couplets)
+	for phase in self.Profiler.Phase_List[no_of_phases:]:
+	  phase['topology'] = topology_idx
+      return Result_List
+    
+    pool = multiprocessing.Pool(processes=min(no_of_jobs, len(Topology_List)), \
+				initializer=Worker_Initialize_Solve, \
+				initargs=(self, list(Topology_List), list(Output_Text_File_List)))
+    try:
+      for topology_idx, newick_str, lsq_error, no_of_scored_couplets, Phase_List in \
+	pool.imap_unordered(Worker_Solve_Topology, range(len(Topology_List))):
+	Result_List[topology_idx] = (newick_str, lsq_error, no_of_scored_couplets)
+	for phase in Phase_List:
+	  phase['topology'] = topology_idx
+	self.Profiler.Phase_List.extend(Phase_List)
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+    return Result_List
+
+##-----------------------------------------------------
+"""
+this function assigns the branch lengths of one or more candidate topologies, and writes the outputs
+parameters:
+1) Curr_Context: engine object (CSTBL_Context) containing the source trees or their couplet statistics
+2) Topology_List: list of (name, topology) pairs, as returned by Read_Input_Topologies
+3) dir_of_curr_exec: output directory; with multiple topologies, the outputs of individual topologies 
+are placed in separate directories (named after the topologies) within it, and the topologies are ranked 
+by their least square errors (Topology_Ranking.txt, with the number of couplets scored by every error)
+4) Output_Text_File: text file containing the output descriptions
+5) no_of_jobs: number of worker processes assigning the branch lengths of multiple topologies
+returns the list of least square errors of individual topologies
+"""
+def Solve_Topologies_To_Directory(Curr_Context, Topology_List, dir_of_curr_exec, Output_Text_File, no_of_jobs=1):
+  if (len(Topology_List) == 1):
+    Final_Supertree = Topology_List[0][1]
+    fp = open(Output_Text_File, 'a')
+    fp.write('\n\n ---output supertree  without branch length information (in newick format): ' + Final_Supertree.as_newick_string())
+    fp.close()
+
+    # this function assigns the branch length information on the generated supertree
+    Curr_Context._SetTopology(Final_Supertree)
+    Curr_Context._Solve(Output_Text_File)
+    LSQ_Error_List = [Curr_Context.LSQ_Error]
+    
+    Curr_Context.Profiler._Start('write_output')
+    out_treefilename = dir_of_curr_exec + '/' + 'CUSTOM_SUPERTREE_with_branch_length_newick.tre'
+    outfile = open(out_treefilename, 'w')
+    outfile.write(Final_Supertree.as_newick_string())
+    outfile.close()
+    Curr_Context.Profiler._End()
+  else:
+    """
+    multiple candidate topologies: the outputs of individual topologies are placed 
+    in separate directories (named after the topologies) within the output directory
+    """
+    Output_Text_File_List = []
+    for topology_name, Curr_Supertree in Topology_List:
+      dir_of_curr_topology = dir_of_curr_exec + '/' + topology_name
+      if (os.path.isdir(dir_of_curr_topology) == False):
+	os.mkdir(dir_of_curr_topology)
+      Curr_Output_Text_File = dir_of_curr_topology + '/' + 'Complete_Output_Description.txt'
+      fp = open(Curr_Output_Text_File, 'w')
+      fp.write('\n\n ---output supertree  without branch length information (in newick format): ' + Curr_Supertree.as_newick_string())
+      fp.close()
+      Output_Text_File_List.append(Curr_Output_Text_File)
+    
+    # branch lengths of all the topologies are assigned using the same couplet statistics
+    Result_List = Curr_Context._SolveTopologies([x[1] for x in Topology_List], Output_Text_File_List, no_of_jobs)
+    LSQ_Error_List = [x[1] for x in Result_List]
+    
+    Curr_Context.Profiler._Start('write_output')
+    for topology_idx in range(len(Topology_List)):
+      out_treefilename = dir_of_curr_exec + '/' + Topology_List[topology_idx][0] + '/' + 'CUSTOM_SUPERTREE_with_branch_length_newick.tre'
+      outfile = open(out_treefilename, 'w')
+      outfile.write(Result_List[topology_idx][0])
+      outfile.close()
+    Curr_Context.Profiler._End()
+    
+    """
+    rank the topologies by their least square errors (lower error is better)
+    the error of every solver is computed over the supported couplets whose both taxa are in the topology,
+    so that the number of these couplets is written next to the error (topologies missing some taxa score 
+    fewer couplets); among equal errors, the topology scoring more couplets is ranked first
+    """
+    Rank_List = sorted(range(len(Topology_List)), key=lambda x: (Result_List[x][1], -Result_List[x][2]))
+    fp = open(dir_of_curr_exec + '/' + 'Topology_Ranking.txt', 'w')
+    fp.write('rank\ttopology\tleast_square_error\tno_of_couplets')
+    print '\n rank \t topology \t least square error \t number of couplets'
+    for rank in range(len(Rank_List)):
+      topology_idx = Rank_List[rank]
+      fp.write('\n' + str(rank + 1) + '\t' + Topology_List[topology_idx][0] + '\t' + str(Result_List[topology_idx][1]) + \
+	       '\t' + str(Result_List[topology_idx][2]))
+      print ' ', (rank + 1), '\t', Topology_List[topology_idx][0], '\t', Result_List[topology_idx][1], '\t', \
+	Result_List[topology_idx][2]
+    fp.close()
+    
+    fp = open(Output_Text_File, 'a')
+    fp.write('\n\n number of candidate topologies: ' + str(len(Topology_List)) + \
+      ' -- ranking (by least square error) is written in the file Topology_Ranking.txt')
+    fp.close()
+  
+  
+  return LSQ_Error_List
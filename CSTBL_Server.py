@@ -0,0 +1,653 @@
+#!/usr/bin/env python
+
+##---------------------------------------------
+"""
+this program is a long lived server assigning the branch lengths of supertree topologies
+the couplet statistics of one or more input treelists are kept resident (in engine objects, CSTBL_Context),
+so that the requests do not pay for the start up, the package imports, and reading the input trees
+requests and responses are JSON objects, one per line, exchanged over a Unix socket (one request at a time
+per connection, multiple connections are served concurrently) or over the standard input and output
+(requests are served concurrently, and the responses are written as they complete, with their "id")
+
+request fields (only "input_file" and the topology are required to solve a topology):
+  id - any value, copied to the response
+  command - "solve" (default), "load" (input treelist only), "unload", "status" or "shutdown"
+  input_file, input_format - input treelist file ("newick" or "nexus", default "newick")
+  topology - newick string of the supertree topology, or topology_file (and topology_format)
+  solver - 1 (external QP executable of the server), 2 (sparse least squares) or 3 (normal equations)
+  init_edge_len, max_iter, solver_tol, sample_couplets, sample_seed, block_size - same as the CSTBL.py options
+  evaluate - if true, the weighted supertree is also evaluated against the input trees (see Supertree_Evaluation.py)
+response fields: id, status ("ok" or "error"), message (errors), newick (weighted supertree), lsq_error,
+no_of_trees, no_of_taxa, resident (true if the treelist was already loaded), evaluation (summary), time_sec
+
+the input trees are always read in the streaming mode (or the couplet statistics are loaded from the cache),
+so only the couplet statistics of a treelist are resident; the treelist is loaded again if its file changes
+the total size of the resident statistics and the number of treelists are bounded: the least recently used
+treelists which are idle (not serving a request) are evicted, and idle treelists may also expire
+requests on the same treelist are solved one at a time, requests on different treelists concurrently
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import QP_Solver
+import CSTBL_Engine
+from CSTBL_Engine import *
+import Couplet_Cache
+import Couplet_Sampling
+import Supertree_Evaluation
+import threading
+import SocketServer
+import traceback
+
+# default number of requests served at a time (standard input mode)
+DEFAULT_NO_OF_THREADS = 4
+
+# commands of the requests
+SERVER_COMMAND_SOLVE = 'solve'
+SERVER_COMMAND_LOAD = 'load'
+SERVER_COMMAND_UNLOAD = 'unload'
+SERVER_COMMAND_STATUS = 'status'
+SERVER_COMMAND_SHUTDOWN = 'shutdown'
+
+# status of the responses
+RESPONSE_STATUS_OK = 'ok'
+RESPONSE_STATUS_ERROR = 'error'
+
+##-----------------------------------------------------
+"""
+this exception reports an invalid request (the message is returned in the response)
+"""
+class Request_Error(Exception):
+  pass
+
+##-----------------------------------------------------
+"""
+this function returns the memory (in bytes) of the couplet statistics of an engine object
+"""
+def Get_Statistics_Size(Curr_Context):
+  Couplet_Info = Curr_Context.Couplet_Info
+  return Couplet_Info.Support_Count.nbytes + Couplet_Info.Weighted_Dist_Sum.nbytes + Couplet_Info.Weight_Sum.nbytes + \
+	  8 * (len(Curr_Context.Matrix_Weight_Val) + len(Curr_Context.Tree_Taxa_Count))
+
+##-----------------------------------------------------
+"""
+this class is a resident input treelist: the engine object containing its couplet statistics,
+the modification time and size of the input file when it was loaded, and the time of its last use
+the lock of an entry is held while it is loaded, and while a request is served with it
+an entry is pinned (no_of_pins) from its lookup in the registry until the request using it completes,
+so that it is not evicted while a request waits for its lock
+"""
+class Treelist_Entry(object):
+  def __init__(self, input_file, input_format):
+    self.input_file = input_file
+    self.input_format = input_format
+    self.Context = None
+    self.File_Stamp = None
+    self.size = 0
+    self.last_used = time.time()
+    self.no_of_requests = 0
+    self.no_of_pins = 0
+    self.Lock = threading.Lock()
+
+##-----------------------------------------------------
+"""
+this class contains the resident treelists (least recently used first) and the settings of the server
+parameters:
+1) METHOD_OF_QP, QP_EXEC_PATH, QP_File_Format: default solver of the branch lengths
+2) cache_dir, cache_size_mb: couplet statistics cache (see Couplet_Cache.py), so that an evicted
+treelist is loaded again without reading its trees; None if the cache is not used
+3) max_memory_mb, max_treelists: budgets of the resident statistics (0 for no budget)
+4) idle_timeout_sec: treelists not used for this time are evicted (0 for no timeout)
+"""
+class CSTBL_Server_State(object):
+  def __init__(self, METHOD_OF_QP, QP_EXEC_PATH='', QP_File_Format=QP_FILE_FORMAT_TEXT, cache_dir=None, \
+		cache_size_mb=Couplet_Cache.DEFAULT_CACHE_SIZE_MB, max_memory_mb=0, max_treelists=0, idle_timeout_sec=0):
+    self.METHOD_OF_QP = METHOD_OF_QP
+    self.QP_EXEC_PATH = QP_EXEC_PATH
+    self.QP_File_Format = QP_File_Format
+    self.cache_dir = cache_dir
+    self.cache_size_mb = cache_size_mb
+    self.max_memory_mb = max_memory_mb
+    self.max_treelists = max_treelists
+    self.idle_timeout_sec = idle_timeout_sec
+    # resident treelists, keyed by the input file and format, in the order of their last use
+    self.Entry_List = []
+    self.Registry_Lock = threading.Lock()
+    self.start_timestamp = time.time()
+    self.no_of_loads = 0
+    self.no_of_evictions = 0
+
+  """
+  returns the entry of an input treelist (created if required), marked as the most recently used
+  the entry is pinned in the same step as its lookup; the caller unpins it by _ReleaseEntry
+  """
+  def _GetEntry(self, input_file, input_format):
+    self.Registry_Lock.acquire()
+    try:
+      Entry = None
+      for Curr_Entry in self.Entry_List:
+	if (Curr_Entry.input_file == input_file) and (Curr_Entry.input_format == input_format):
+	  Entry = Curr_Entry
+	  break
+      if Entry is None:
+	Entry = Treelist_Entry(input_file, input_format)
+      else:
+	self.Entry_List.remove(Entry)
+      self.Entry_List.append(Entry)
+      Entry.last_used = time.time()
+      Entry.no_of_pins = Entry.no_of_pins + 1
+      return Entry
+    finally:
+      self.Registry_Lock.release()
+
+  """
+  unpins an entry returned by _GetEntry
+  """
+  def _ReleaseEntry(self, Entry):
+    self.Registry_Lock.acquire()
+    Entry.no_of_pins = Entry.no_of_pins - 1
+    self.Registry_Lock.release()
+
+  """
+  loads the couplet statistics of an entry (whose lock is held by the caller), unless they are resident
+  and the input file is not changed since they were loaded
+  returns True if the statistics were already resident
+  """
+  def _LoadEntry(self, Entry):
+    try:
+      File_Stat = os.stat(Entry.input_file)
+    except OSError, e:
+      raise Request_Error('input file cannot be read: ' + str(e))
+    File_Stamp = (File_Stat.st_mtime, File_Stat.st_size)
+    if (Entry.Context is not None) and (Entry.File_Stamp == File_Stamp):
+      return True
+    Curr_Context = CSTBL_Context(self.METHOD_OF_QP, self.QP_EXEC_PATH, self.QP_File_Format)
+    Curr_Context._ReadSourceTrees(Entry.input_file, Entry.input_format, True, self.cache_dir, self.cache_size_mb)
+    Curr_Context._DeriveCoupletStatistics()
+    if (Curr_Context.no_of_source_trees == 0):
+      raise Request_Error('there is no source tree in the input file')
+    Entry.Context = Curr_Context
+    Entry.File_Stamp = File_Stamp
+    Entry.size = Get_Statistics_Size(Curr_Context)
+    self.Registry_Lock.acquire()
+    self.no_of_loads = self.no_of_loads + 1
+    self.Registry_Lock.release()
+    return False
+
+  """
+  evicts idle treelists: treelists not used within the idle timeout, then the least recently used treelists,
+  as long as the resident statistics exceed the memory budget or the number of treelists exceeds its budget
+  treelists used by a request (pinned entries) and the most recently used treelist are never evicted
+  returns the number of evicted treelists
+  """
+  def _EvictIdleEntries(self):
+    self.Registry_Lock.acquire()
+    try:
+      no_of_evicted = 0
+      curr_time = time.time()
+      # the most recently used treelist is kept (unless it expires)
+      for Entry in self.Entry_List[:-1]:
+	resident_size = sum([x.size for x in self.Entry_List if (x.Context is not None)])
+	no_of_resident = len([x for x in self.Entry_List if (x.Context is not None)])
+	expired = (self.idle_timeout_sec > 0) and (curr_time - Entry.last_used > self.idle_timeout_sec)
+	over_memory = (self.max_memory_mb > 0) and (resident_size > self.max_memory_mb * (1 << 20))
+	over_count = (self.max_treelists > 0) and (no_of_resident > self.max_treelists)
+	if (expired == False) and (over_memory == False) and (over_count == False):
+	  continue
+	# a pinned entry may be locked (or about to be locked) by a request
+	if (Entry.no_of_pins > 0):
+	  continue
+	if Entry.Context is not None:
+	  no_of_evicted = no_of_evicted + 1
+	  print 'evicting the treelist: ', Entry.input_file
+	Entry.Context = None
+	Entry.size = 0
+	self.Entry_List.remove(Entry)
+      self.no_of_evictions = self.no_of_evictions + no_of_evicted
+      return no_of_evicted
+    finally:
+      self.Registry_Lock.release()
+
+  """
+  removes an entry (waiting until it is idle); the entry stays registered (without its statistics)
+  if other requests have pinned it, since they load the treelist again
+  returns True if the treelist was resident
+  """
+  def _UnloadEntry(self, input_file, input_format):
+    Entry = self._GetEntry(input_file, input_format)
+    try:
+      Entry.Lock.acquire()
+      try:
+	was_resident = (Entry.Context is not None)
+	Entry.Context = None
+	Entry.size = 0
+	self.Registry_Lock.acquire()
+	if (Entry.no_of_pins == 1) and (Entry in self.Entry_List):
+	  self.Entry_List.remove(Entry)
+	self.Registry_Lock.release()
+      finally:
+	Entry.Lock.release()
+    finally:
+      self._ReleaseEntry(Entry)
+    return was_resident
+
+  """
+  returns the status of the server: resident treelists (least recently used first) and counters
+  """
+  def _GetStatus(self):
+    self.Registry_Lock.acquire()
+    try:
+      Treelist_Status_List = [{'input_file': x.input_file, 'input_format': x.input_format, 'size_mb': x.size / float(1 << 20), \
+			      'no_of_trees': x.Context.no_of_source_trees, 'no_of_taxa': len(x.Context.COMPLETE_INPUT_TAXA_LIST), \
+			      'no_of_requests': x.no_of_requests, 'idle_sec': time.time() - x.last_used, \
+			      'busy': x.Lock.locked()} for x in self.Entry_List if (x.Context is not None)]
+      return {'treelists': Treelist_Status_List, 'resident_mb': sum([x['size_mb'] for x in Treelist_Status_List]), \
+	      'no_of_loads': self.no_of_loads, 'no_of_evictions': self.no_of_evictions, \
+	      'uptime_sec': time.time() - self.start_timestamp}
+    finally:
+      self.Registry_Lock.release()
+
+##-----------------------------------------------------
+"""
+this function returns the (unweighted) supertree topology of a request
+"""
+def Get_Request_Topology(Request):
+  try:
+    if (Request.get('topology') is not None):
+      return dendropy.Tree.get_from_string(str(Request['topology']), schema='newick', \
+					    preserve_underscores=True, default_as_rooted=True)
+    if (Request.get('topology_file') is not None):
+      return Read_Input_Tree(True, True, str(Request.get('topology_format', 'newick')), str(Request['topology_file']))
+  except Exception, e:
+    raise Request_Error('supertree topology cannot be read: ' + (type(e).__name__ + ': ' + str(e)).strip())
+  raise Request_Error('there is no supertree topology (topology or topology_file) in the request')
+
+##-----------------------------------------------------
+"""
+this function applies the solver options of a request to the engine object of a treelist
+(whose lock is held); options not in the request are set to the defaults of the server
+"""
+def Set_Request_Solver_Options(Curr_Context, Request, Server_State):
+  METHOD_OF_QP = int(Request.get('solver', Server_State.METHOD_OF_QP))
+  if METHOD_OF_QP not in [QP_SOLVER_EXTERNAL_EXEC, QP_SOLVER_SPARSE_LSQ, QP_SOLVER_NORMAL_EQN]:
+    raise Request_Error('invalid solver: ' + str(METHOD_OF_QP))
+  if (METHOD_OF_QP == QP_SOLVER_EXTERNAL_EXEC) and (Server_State.QP_EXEC_PATH == ''):
+    raise Request_Error('there is no QP executable specified for the server')
+  if (METHOD_OF_QP != QP_SOLVER_NORMAL_EQN) and (QP_Solver.SCIPY_AVAILABLE == False) and \
+	((METHOD_OF_QP == QP_SOLVER_SPARSE_LSQ) or (int(Request.get('sample_couplets', 0)) > 0)):
+    raise Request_Error('in-process solver requires scipy, which is not installed')
+  init_edge_len = int(Request.get('init_edge_len', INIT_EDGE_LEN_PREVIOUS))
+  if init_edge_len not in INIT_EDGE_LEN_NAME:
+    raise Request_Error('invalid initial edge length option: ' + str(init_edge_len))
+  max_iter = Request.get('max_iter')
+  if (max_iter is not None) and (int(max_iter) <= 0):
+    raise Request_Error('invalid iteration budget of the solver')
+  sample_paths = int(Request.get('sample_couplets', 0))
+  block_size = int(Request.get('block_size', 0))
+  if (sample_paths < 0) or (block_size < 0):
+    raise Request_Error('invalid number of sampled couplets or block size')
+  if (block_size > 0) and (METHOD_OF_QP != QP_SOLVER_SPARSE_LSQ) and (sample_paths == 0):
+    raise Request_Error('block size requires the in-process sparse least squares solver')
+  Curr_Context.QP_Method = METHOD_OF_QP
+  Curr_Context.init_edge_len = init_edge_len
+  Curr_Context.sample_paths = sample_paths
+  Curr_Context.sample_seed = int(Request.get('sample_seed', Couplet_Sampling.DEFAULT_SAMPLE_SEED))
+  Curr_Context.block_size = block_size
+  Curr_Context.Telemetry = QP_Solver.Solver_Telemetry(False, None if (max_iter is None) else int(max_iter), \
+						      None if (Request.get('solver_tol') is None) else float(Request['solver_tol']))
+
+##-----------------------------------------------------
+"""
+this function serves one request, and returns its response (a dictionary)
+"""
+def Serve_Request(Request, Server_State):
+  start_timestamp = time.time()
+  Response = {'id': Request.get('id')}
+  try:
+    command = Request.get('command', SERVER_COMMAND_SOLVE)
+    if (command == SERVER_COMMAND_STATUS):
+      Response.update(Server_State._GetStatus())
+    elif (command == SERVER_COMMAND_SHUTDOWN):
+      Response['message'] = 'server is shutting down'
+    elif command in [SERVER_COMMAND_SOLVE, SERVER_COMMAND_LOAD, SERVER_COMMAND_UNLOAD]:
+      if (Request.get('input_file') is None):
+	raise Request_Error('there is no input file (input_file) in the request')
+      input_file = os.path.abspath(str(Request['input_file']))
+      input_format = str(Request.get('input_format', 'newick'))
+      if input_format not in ['newick', 'nexus']:
+	raise Request_Error('invalid input file format: ' + input_format)
+      if (command == SERVER_COMMAND_UNLOAD):
+	Response['resident'] = Server_State._UnloadEntry(input_file, input_format)
+      else:
+	Response.update(Serve_Treelist_Request(command, Request, input_file, input_format, Server_State))
+	Server_State._EvictIdleEntries()
+    else:
+      raise Request_Error('invalid command: ' + str(command))
+    Response['status'] = RESPONSE_STATUS_OK
+  except Request_Error, e:
+    Response['status'] = RESPONSE_STATUS_ERROR
+    Response['message'] = str(e)
+  except Exception, e:
+    traceback.print_exc()
+    Response['status'] = RESPONSE_STATUS_ERROR
+    Response['message'] = (type(e).__name__ + ': ' + str(e)).strip()
+  Response['time_sec'] = time.time() - start_timestamp
+  return Response
+
+##-----------------------------------------------------
+"""
+this function serves a request using the statistics of an input treelist (loaded if they are not resident):
+"load" returns only the description of the treelist, "solve" assigns the branch lengths of the topology
+"""
+def Serve_Treelist_Request(command, Request, input_file, input_format, Server_State):
+  Curr_Topology = None
+  if (command == SERVER_COMMAND_SOLVE):
+    Curr_Topology = Get_Request_Topology(Request)
+  Entry = Server_State._GetEntry(input_file, input_format)
+  try:
+    Entry.Lock.acquire()
+    try:
+      Response = {'resident': Server_State._LoadEntry(Entry)}
+      Entry.no_of_requests = Entry.no_of_requests + 1
+      Curr_Context = Entry.Context
+      Response['no_of_trees'] = Curr_Context.no_of_source_trees
+      Response['no_of_taxa'] = len(Curr_Context.COMPLETE_INPUT_TAXA_LIST)
+      if (command == SERVER_COMMAND_SOLVE):
+	Set_Request_Solver_Options(Curr_Context, Request, Server_State)
+	Curr_Context._SetTopology(Curr_Topology)
+	try:
+	  Weighted_Supertree = Curr_Context._Solve()
+	finally:
+	  # only the couplet statistics stay resident
+	  Curr_Context.Supertree_Info = None
+	  Curr_Context.Couplet_Info._ClearBranchArrayIdx()
+	if Weighted_Supertree is None:
+	  raise Request_Error('branch lengths are not assigned')
+	Response['newick'] = Weighted_Supertree.as_newick_string()
+	Response['lsq_error'] = Curr_Context.LSQ_Error
+	Response['solver_summary'] = Curr_Context.Telemetry.Summary_List
+	if (Request.get('evaluate', False) == True):
+	  Response['evaluation'] = Supertree_Evaluation.Evaluate_Supertree(Weighted_Supertree, \
+				      Supertree_Evaluation.Get_Source_Tree_Iter(Curr_Context, input_file, input_format), \
+				      Curr_Context)[1]
+      Entry.last_used = time.time()
+      return Response
+    finally:
+      Entry.Lock.release()
+  finally:
+    Server_State._ReleaseEntry(Entry)
+
+##-----------------------------------------------------
+"""
+this function parses a request line, and returns the request (dictionary) or an error response
+"""
+def Parse_Request_Line(line):
+  try:
+    Request = json.loads(line)
+  except ValueError, e:
+    return None, {'id': None, 'status': RESPONSE_STATUS_ERROR, 'message': 'invalid JSON request: ' + str(e)}
+  if (isinstance(Request, dict) == False):
+    return None, {'id': None, 'status': RESPONSE_STATUS_ERROR, 'message': 'request is not a JSON object'}
+  return Request, None
+
+##-----------------------------------------------------
+"""
+this class serves the requests of one connection of the Unix socket, one at a time
+"""
+class Socket_Request_Handler(SocketServer.StreamRequestHandler):
+  def handle(self):
+    while True:
+      line = self.rfile.readline()
+      if (line == ''):
+	break
+      if (line.strip() == ''):
+	continue
+      Request, Response = Parse_Request_Line(line)
+      if Request is not None:
+	Response = Serve_Request(Request, self.server.Server_State)
+      self.wfile.write(json.dumps(Response) + '\n')
+      self.wfile.flush()
+      if (Request is not None) and (Request.get('command') == SERVER_COMMAND_SHUTDOWN):
+	# shutdown waits for serve_forever, so it is called from another thread
+	threading.Thread(target=self.server.shutdown).start()
+	break
+
+class Threaded_Unix_Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+  daemon_threads = True
+
+##-----------------------------------------------------
+"""
+this function serves the requests over a Unix socket, until a shutdown request
+"""
+def Serve_Socket(socket_path, Server_State):
+  if (os.path.exists(socket_path) == True):
+    os.remove(socket_path)
+  Server = Threaded_Unix_Server(socket_path, Socket_Request_Handler)
+  Server.Server_State = Server_State
+  print 'serving the requests on the socket: ', socket_path
+  sys.stdout.flush()
+  try:
+    Server.serve_forever()
+  finally:
+    Server.server_close()
+    if (os.path.exists(socket_path) == True):
+      os.remove(socket_path)
+
+##-----------------------------------------------------
+"""
+this function redirects the standard output to the standard error, so that the standard output of the
+standard input mode contains only the responses, and the messages of the server and of the solver
+(otherwise printed to the standard output) are written to the standard error
+returns the stream writing to the original standard output
+"""
+def Get_Response_Stream():
+  sys.stdout.flush()
+  Response_Stream = os.fdopen(os.dup(1), 'w')
+  os.dup2(2, 1)
+  return Response_Stream
+
+##-----------------------------------------------------
+"""
+this function serves the requests of the standard input, at most no_of_threads at a time, until the end
+of the input or a shutdown request; the responses are written to Response_Stream (see Get_Response_Stream) 
+as they complete
+"""
+def Serve_Stdin(Server_State, Response_Stream, no_of_threads=DEFAULT_NO_OF_THREADS):
+  Write_Lock = threading.Lock()
+  Thread_Slot = threading.BoundedSemaphore(no_of_threads)
+
+  def Write_Response(Response):
+    Write_Lock.acquire()
+    try:
+      Response_Stream.write(json.dumps(Response) + '\n')
+      Response_Stream.flush()
+    finally:
+      Write_Lock.release()
+
+  def Serve_Stdin_Request(Request):
+    try:
+      Write_Response(Serve_Request(Request, Server_State))
+    finally:
+      Thread_Slot.release()
+
+  Thread_List = []
+  while True:
+    line = sys.stdin.readline()
+    if (line == ''):
+      break
+    if (line.strip() == ''):
+      continue
+    Request, Response = Parse_Request_Line(line)
+    if Request is None:
+      Write_Response(Response)
+      continue
+    Thread_Slot.acquire()
+    Curr_Thread = threading.Thread(target=Serve_Stdin_Request, args=(Request,))
+    Curr_Thread.start()
+    Thread_List = [x for x in Thread_List if (x.is_alive() == True)] + [Curr_Thread]
+    if (Request.get('command') == SERVER_COMMAND_SHUTDOWN):
+      break
+  for Curr_Thread in Thread_List:
+    Curr_Thread.join()
+  Response_Stream.close()
+
+##-----------------------------------------------------
+# this function is useful to parse various options for the server
+def parse_options():
+  parser = OptionParser()
+
+  parser.add_option("--socket", \
+			  type="string", \
+			  action="store", \
+			  dest="socket_path", \
+			  default="", \
+			  help="Unix socket on which the requests are served (default: requests are read from the \
+			  standard input, and the responses are written to the standard output)")
+
+  parser.add_option("-I", "--INPFILE", \
+			  type="string", \
+			  action="append", \
+			  dest="INP_FILENAME_LIST", \
+			  default=[], \
+			  help="Input treelist file loaded at the start (may be repeated); other treelists are loaded \
+			  by the first request using them")
+
+  parser.add_option("-p", "--inpform", \
+			  type="int", \
+			  action="store", \
+			  dest="inp_file_format", \
+			  default=1, \
+			  help="1 - format of the input treelist files loaded at the start is NEWICK (default) 2 - NEXUS")
+
+  parser.add_option("-Q", "--QPExec", \
+			  type="string", \
+			  action="store", \
+			  dest="QP_Exec_Path", \
+			  default="", \
+			  help="Absolute path of the executable for QP solver")
+
+  parser.add_option("-S", "--solver", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_Solver_Method", \
+			  default=0, \
+			  help="Default solver of the branch lengths, same as CSTBL.py (1 - external QP executable, \
+			  2 - in-process sparse least squares, 3 - normal equations)")
+
+  parser.add_option("-F", "--qpformat", \
+			  type="int", \
+			  action="store", \
+			  dest="QP_File_Format", \
+			  default=1, \
+			  help="Format of the files exchanged with the external QP executable, same as CSTBL.py")
+
+  parser.add_option("--cache-dir", \
+			  type="string", \
+			  action="store", \
+			  dest="cache_dir", \
+			  default="", \
+			  help="Directory of the couplet statistics cache, so that evicted treelists are loaded again \
+			  without reading their trees (default: no cache)")
+
+  parser.add_option("--cache-size", \
+			  type="int", \
+			  action="store", \
+			  dest="cache_size_mb", \
+			  default=Couplet_Cache.DEFAULT_CACHE_SIZE_MB, \
+			  help="Maximum total size (in MB) of the couplet statistics cache directory")
+
+  parser.add_option("--max-memory", \
+			  type="int", \
+			  action="store", \
+			  dest="max_memory_mb", \
+			  default=0, \
+			  help="Budget (in MB) of the resident couplet statistics; least recently used idle treelists \
+			  are evicted beyond it (default 0: no budget)")
+
+  parser.add_option("--max-treelists", \
+			  type="int", \
+			  action="store", \
+			  dest="max_treelists", \
+			  default=0, \
+			  help="Maximum number of resident treelists (default 0: no limit)")
+
+  parser.add_option("--idle-timeout", \
+			  type="float", \
+			  action="store", \
+			  dest="idle_timeout_sec", \
+			  default=0, \
+			  help="Treelists not used for this number of seconds are evicted (default 0: no timeout)")
+
+  parser.add_option("--threads", \
+			  type="int", \
+			  action="store", \
+			  dest="no_of_threads", \
+			  default=DEFAULT_NO_OF_THREADS, \
+			  help="Maximum number of requests of the standard input served at a time (default 4)")
+
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+''' main function '''
+def main():
+  opts, args = parse_options()
+
+  if (opts.max_memory_mb < 0) or (opts.max_treelists < 0) or (opts.idle_timeout_sec < 0) or (opts.no_of_threads < 1):
+    print '******** INVALID MEMORY BUDGET, NUMBER OF TREELISTS, IDLE TIMEOUT OR NUMBER OF THREADS - RETURN **********'
+    return
+
+  if (opts.QP_Solver_Method == 0):
+    if (opts.QP_Exec_Path == ""):
+      METHOD_OF_QP = QP_SOLVER_SPARSE_LSQ
+    else:
+      METHOD_OF_QP = QP_SOLVER_EXTERNAL_EXEC
+  else:
+    METHOD_OF_QP = opts.QP_Solver_Method
+  if (METHOD_OF_QP == QP_SOLVER_EXTERNAL_EXEC):
+    if (opts.QP_Exec_Path == ""):
+      print '******** THERE IS NO PATH FOR QP SOLVER (GNU_BFGS2) IS PROVIDED - RETURN **********'
+      return
+    QP_EXEC_PATH = os.path.abspath(opts.QP_Exec_Path)
+  elif (METHOD_OF_QP == QP_SOLVER_SPARSE_LSQ):
+    if (QP_Solver.SCIPY_AVAILABLE == False):
+      print '******** IN-PROCESS SOLVER REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+      return
+    QP_EXEC_PATH = ''
+  elif (METHOD_OF_QP == QP_SOLVER_NORMAL_EQN):
+    QP_EXEC_PATH = ''
+  else:
+    print '******** INVALID QP SOLVER OPTION - RETURN **********'
+    return
+
+  cache_dir = None
+  if (opts.cache_dir != ""):
+    cache_dir = os.path.abspath(opts.cache_dir)
+  Server_State = CSTBL_Server_State(METHOD_OF_QP, QP_EXEC_PATH, opts.QP_File_Format, cache_dir, opts.cache_size_mb, \
+				    opts.max_memory_mb, opts.max_treelists, opts.idle_timeout_sec)
+
+  # in the standard input mode, the messages of the treelists loaded at the start are not written to the responses
+  Response_Stream = None
+  if (opts.socket_path == ""):
+    Response_Stream = Get_Response_Stream()
+
+  # treelists loaded at the start
+  INPUT_FILE_FORMAT = 'newick' if (opts.inp_file_format == 1) else 'nexus'
+  for INPUT_FILENAME in opts.INP_FILENAME_LIST:
+    Response = Serve_Request({'command': SERVER_COMMAND_LOAD, 'input_file': INPUT_FILENAME, \
+			      'input_format': INPUT_FILE_FORMAT}, Server_State)
+    if (Response['status'] != RESPONSE_STATUS_OK):
+      print '******** INPUT TREELIST ' + INPUT_FILENAME + ' CANNOT BE LOADED: ' + Response['message'] + ' **********'
+    else:
+      print 'loaded the treelist: ', INPUT_FILENAME, ' trees: ', Response['no_of_trees'], ' taxa: ', Response['no_of_taxa']
+
+  if (opts.socket_path != ""):
+    Serve_Socket(os.path.abspath(opts.socket_path), Server_State)
+  else:
+    Serve_Stdin(Server_State, Response_Stream, opts.no_of_threads)
+
+#-----------------------------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""
+this file contains the persistent (on disk) cache of the couplet statistics
+the couplet statistics (taxa, couplet support counts, weighted couplet distance sums and weight sums)
+and the weights of the input trees are saved in a binary file, named after a hash of the input treelist
+file contents and the options to read it
+later executions with the same input trees load these statistics as memory mapped arrays,
+without reading the input trees and extracting their couplets
+"""
+
+import Header
+from Header import *
+import hashlib
+
+"""
+binary format of the couplet statistics file (all values are in native byte order)
+1) header: the 8 byte signature CACHE_SIGNATURE, followed by 4 int64 values:
+format version, number of taxa, number of input trees, number of bytes of the taxa labels
+2) taxa labels (utf-8), separated by newline characters, padded with zeros to a multiple of 8 bytes
+3) couplet support counts: int32 array of (number of couplets) entries, padded to a multiple of 8 bytes
+4) weighted couplet distance sums and weight sums: two float64 arrays of (number of couplets) entries
+5) weights of the input trees: float64 array of (number of input trees) entries
+6) number of taxa of the input trees: int64 array of (number of input trees) entries
+"""
+CACHE_SIGNATURE = 'CSTBLCST'
+CACHE_VERSION = 1
+CACHE_HEADER_SIZE = 40
+CACHE_FILE_EXTENSION = '.cst'
+
+# default limit of the total size of the cache directory (in MB)
+DEFAULT_CACHE_SIZE_MB = 1024
+
+#----------------------------------------------------
+"""
+this function returns the cache key of an input treelist file
+the key is a hash of the file contents, the options to read the trees, and the cache format version
+so that the cached statistics are invalidated whenever the input changes
+parameter: dedup_tol - tolerance of the deduplication of the input trees (see Couplet_Dedup.py), or None 
+if the trees are not deduplicated; statistics derived with deduplication have different keys, since 
+the branch lengths of the merged clades may differ up to this tolerance
+"""
+def Get_Cache_Key(INPUT_FILENAME, INPUT_FILE_FORMAT, ROOTED_TREE, PRESERVE_UNDERSCORE, dedup_tol=None):
+  key_hash = hashlib.sha1()
+  key_field_list = [str(CACHE_VERSION), INPUT_FILE_FORMAT, str(ROOTED_TREE), str(PRESERVE_UNDERSCORE)]
+  if dedup_tol is not None:
+    key_field_list.append('dedup=' + repr(float(dedup_tol)))
+  key_hash.update('\t'.join(key_field_list) + '\n')
+  fp = open(INPUT_FILENAME, 'rb')
+  while True:
+    data_block = fp.read(1 << 20)
+    if (len(data_block) == 0):
+      break
+    key_hash.update(data_block)
+  fp.close()
+  return key_hash.hexdigest()
+
+#----------------------------------------------------
+"""
+this function returns the name of the cache file of a key
+"""
+def Get_Cache_Filename(cache_dir, cache_key):
+  return os.path.join(cache_dir, cache_key + CACHE_FILE_EXTENSION)
+
+#----------------------------------------------------
+"""
+this function returns the byte offsets of the arrays within a couplet statistics file
+"""
+def Get_Cache_Offsets(no_of_taxa, no_of_trees, label_size):
+  no_of_couplets = (no_of_taxa * (no_of_taxa - 1)) // 2
+  support_offset = CACHE_HEADER_SIZE + 8 * ((label_size + 7) // 8)
+  dist_sum_offset = support_offset + 8 * ((4 * no_of_couplets + 7) // 8)
+  weight_sum_offset = dist_sum_offset + 8 * no_of_couplets
+  tree_weight_offset = weight_sum_offset + 8 * no_of_couplets
+  tree_taxa_offset = tree_weight_offset + 8 * no_of_trees
+  file_size = tree_taxa_offset + 8 * no_of_trees
+  return support_offset, dist_sum_offset, weight_sum_offset, tree_weight_offset, tree_taxa_offset, file_size
+
+#----------------------------------------------------
+"""
+this function writes the couplet statistics (and the weights of the input trees) of a state
+the file is first written with a temporary name, and then renamed
+so that a partially written file is never read
+"""
+def Write_Couplet_Statistics_File(Out_Filename, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  label_data = '\n'.join([label.encode('utf-8') if isinstance(label, unicode) else label \
+			  for label in Couplet_Info.Taxa_Label_List])
+  no_of_trees = len(State.Matrix_Weight_Val)
+  offset_list = Get_Cache_Offsets(Couplet_Info.no_of_taxa, no_of_trees, len(label_data))
+
+  temp_filename = Out_Filename + '.' + str(os.getpid()) + '.tmp'
+  fp = open(temp_filename, 'wb')
+  fp.write(CACHE_SIGNATURE)
+  numpy.array([CACHE_VERSION, Couplet_Info.no_of_taxa, no_of_trees, len(label_data)], dtype=numpy.int64).tofile(fp)
+  fp.write(label_data)
+  fp.seek(offset_list[0])
+  numpy.asarray(Couplet_Info.Support_Count, dtype=numpy.int32).tofile(fp)
+  fp.seek(offset_list[1])
+  numpy.asarray(Couplet_Info.Weighted_Dist_Sum, dtype=numpy.float64).tofile(fp)
+  numpy.asarray(Couplet_Info.Weight_Sum, dtype=numpy.float64).tofile(fp)
+  numpy.array(State.Matrix_Weight_Val, dtype=numpy.float64).tofile(fp)
+  numpy.array(State.Tree_Taxa_Count, dtype=numpy.int64).tofile(fp)
+  fp.truncate(offset_list[-1])
+  fp.close()
+  os.rename(temp_filename, Out_Filename)
+
+#----------------------------------------------------
+"""
+this function returns a (copy on write) memory mapped array of a couplet statistics file
+"""
+def Map_Cache_Array(Inp_Filename, dtype, offset, length):
+  if (length == 0):
+    return numpy.zeros(0, dtype=dtype)
+  return numpy.memmap(Inp_Filename, dtype=dtype, mode='c', offset=offset, shape=(length,)).view(numpy.ndarray)
+
+#----------------------------------------------------
+"""
+this function loads the couplet statistics (and the weights of the input trees) into a state
+per couplet arrays are memory mapped, so only the accessed parts of the file are read
+returns the number of input trees
+"""
+def Read_Couplet_Statistics_File(Inp_Filename, State=Default_State):
+  fp = open(Inp_Filename, 'rb')
+  signature = fp.read(len(CACHE_SIGNATURE))
+  header = numpy.fromfile(fp, dtype=numpy.int64, count=4)
+  if (signature != CACHE_SIGNATURE) or (len(header) < 4) or (header[0] != CACHE_VERSION):
+    fp.close()
+    raise ValueError('not a couplet statistics file (or unsupported version): ' + Inp_Filename)
+  no_of_taxa, no_of_trees, label_size = int(header[1]), int(header[2]), int(header[3])
+  label_data = fp.read(label_size)
+  fp.close()
+  offset_list = Get_Cache_Offsets(no_of_taxa, no_of_trees, label_size)
+  if (len(label_data) != label_size) or (os.path.getsize(Inp_Filename) != offset_list[-1]):
+    raise ValueError('incomplete couplet statistics file: ' + Inp_Filename)
+
+  if (no_of_taxa > 0):
+    taxa_label_list = label_data.split('\n')
+  else:
+    taxa_label_list = []
+  no_of_couplets = (no_of_taxa * (no_of_taxa - 1)) // 2
+  State._Clear()
+  State.COMPLETE_INPUT_TAXA_LIST.extend(taxa_label_list)
+  State.Couplet_Info._InitializeFromArrays(taxa_label_list, \
+				Map_Cache_Array(Inp_Filename, numpy.int32, offset_list[0], no_of_couplets), \
+				Map_Cache_Array(Inp_Filename, numpy.float64, offset_list[1], no_of_couplets), \
+				Map_Cache_Array(Inp_Filename, numpy.float64, offset_list[2], no_of_couplets))
+  State.Matrix_Weight_Val.extend(Map_Cache_Array(Inp_Filename, numpy.float64, offset_list[3], no_of_trees).tolist())
+  State.Tree_Taxa_Count.extend(Map_Cache_Array(Inp_Filename, numpy.int64, offset_list[4], no_of_trees).tolist())
+  return no_of_trees
+
+#----------------------------------------------------
+"""
+this function loads the cached couplet statistics of a key into a state, if available
+the modification time of the cache file is updated, to note its latest use (for the eviction)
+returns the number of input trees, or -1 if the statistics are not cached (or the cache file is invalid)
+"""
+def Load_Cached_Statistics(cache_dir, cache_key, State=Default_State):
+  cache_filename = Get_Cache_Filename(cache_dir, cache_key)
+  if (os.path.isfile(cache_filename) == False):
+    return -1
+  try:
+    no_of_trees = Read_Couplet_Statistics_File(cache_filename, State)
+  except (ValueError, IOError, OSError):
+    State._Clear()
+    return -1
+  try:
+    os.utime(cache_filename, None)
+  except OSError:
+    pass
+  return no_of_trees
+
+#----------------------------------------------------
+"""
+this function removes the least recently used cache files
+until the total size of the cache directory is within the given limit (in bytes)
+parameters: keep_filename - cache file which is not removed (such as the one just written)
+"""
+def Evict_Cache_Files(cache_dir, cache_size_limit, keep_filename=None):
+  cache_file_list = []
+  total_size = 0
+  for curr_filename in os.listdir(cache_dir):
+    if (curr_filename.endswith(CACHE_FILE_EXTENSION) == False):
+      continue
+    curr_filename = os.path.join(cache_dir, curr_filename)
+    try:
+      file_stat = os.stat(curr_filename)
+    except OSError:
+      continue
+    cache_file_list.append((file_stat.st_mtime, file_stat.st_size, curr_filename))
+    total_size = total_size + file_stat.st_size
+
+  # oldest (least recently used) files are removed first
+  for mtime, file_size, curr_filename in sorted(cache_file_list):
+    if (total_size <= cache_size_limit):
+      break
+    if (curr_filename == keep_filename):
+      continue
+    try:
+      os.remove(curr_filename)
+      total_size = total_size - file_size
+    except OSError:
+      pass
+
+#----------------------------------------------------
+"""
+this function saves the couplet statistics of a state in the cache directory
+and then applies the size limit (in bytes) of the cache directory
+"""
+def Store_Cached_Statistics(cache_dir, cache_key, cache_size_limit, State=Default_State):
+  if (os.path.isdir(cache_dir) == False):
+    os.makedirs(cache_dir)
+  cache_filename = Get_Cache_Filename(cache_dir, cache_key)
+  Write_Couplet_Statistics_File(cache_filename, State)
+  Evict_Cache_Files(cache_dir, cache_size_limit, cache_filename)
+  return cache_filename
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+"""
+this file contains the extraction of the couplet relations with the deduplication of identical source trees
+and of repeated clades (subtrees with the same taxa, topology and branch lengths)
+every clade of the source trees is assigned a canonical identifier: a leaf is identified by its taxon,
+and an internal node by the (sorted) identifiers of its children and the lengths of the paths to them,
+rounded to a tolerance (tol), so that the identifiers do not depend on the order of the children
+1) identical source trees (same identifier of the root) are collapsed: the couplets of such a group are
+extracted once, and added with the sum of the weights of its trees (as a multiplicity weight)
+2) the couplets whose MRCA is within a clade depend only on that clade, so for the clades repeated in different
+source trees, the couplet indices and distances within the clade are extracted once, and reused for the
+later occurrences (only the couplets of the nodes above such a clade are extracted)
+the weighted average couplet distances are the same as without the deduplication (up to the tolerance
+of the branch lengths, and the rounding of the floating point sums)
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+
+# default tolerance of the branch lengths of identical clades
+DEFAULT_DEDUP_TOL = 1e-9
+
+# minimum number of leaves of a clade whose couplets are reused
+MIN_DEDUP_CLADE_SIZE = 4
+
+# maximum total number of couplets of the reused clades kept in memory (by every process)
+MAX_DEDUP_CACHE_COUPLETS = 1 << 23
+
+#----------------------------------------------------
+"""
+this class contains the couplet indices and distances of the cached clades (indexed by the clade identifiers),
+and their total number of couplets
+"""
+class Clade_Couplet_Cache(object):
+  def __init__(self):
+    self.Clade_Dict = dict()
+    self.no_of_couplets = 0
+
+#----------------------------------------------------
+"""
+this function assigns the canonical identifiers of the clades of one tree (see the description of this file)
+parameters: Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List - tree as returned by Get_Tree_Leaf_Spans
+Clade_Id_Dict - dictionary of the identifiers of all the clades seen so far (updated)
+tol - tolerance of the branch lengths (0 for exactly equal lengths)
+returns the list of the identifiers of the internal nodes (in the order of Internal_Node_List)
+"""
+def Get_Clade_Ids(Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Clade_Id_Dict, tol):
+  # identifier and distance from the root of the topmost node (so far) of every leaf span
+  Span_Clade = dict()
+  for leaf_pos in range(len(Leaf_Taxa_Idx)):
+    Span_Clade[(leaf_pos, leaf_pos + 1)] = (Clade_Id_Dict.setdefault(int(Leaf_Taxa_Idx[leaf_pos]), len(Clade_Id_Dict)), \
+					    Leaf_Root_Dist[leaf_pos])
+  Node_Clade_Id = []
+  for curr_node_dist_from_root, boundary_list in Internal_Node_List:
+    child_key_list = []
+    for i in range(len(boundary_list) - 1):
+      child_clade_id, child_dist_from_root = Span_Clade[(boundary_list[i], boundary_list[i+1])]
+      path_len = child_dist_from_root - curr_node_dist_from_root
+      if (path_len != path_len):
+	# length not specified (nan)
+	path_len = None
+      elif (tol > 0):
+	path_len = int(round(path_len / tol))
+      child_key_list.append((child_clade_id, path_len))
+    clade_id = Clade_Id_Dict.setdefault(tuple(sorted(child_key_list)), len(Clade_Id_Dict))
+    Span_Clade[(boundary_list[0], boundary_list[-1])] = (clade_id, curr_node_dist_from_root)
+    Node_Clade_Id.append(clade_id)
+  return Node_Clade_Id
+
+#----------------------------------------------------
+"""
+this function derives the couplet relations of one tree, reusing the couplets of the cached clades
+parameters: Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List - tree as returned by Get_Tree_Leaf_Spans
+Node_Clade_Id - identifiers of its internal nodes (see Get_Clade_Ids)
+Repeated_Clade_Set - identifiers of the clades whose couplets are to be cached (repeated in the source trees)
+Clade_Cache - couplets of the cached clades (Clade_Couplet_Cache, updated)
+returns the couplet indices and the couplet distances as arrays, and the number of reused clades
+"""
+def Get_Dedup_Tree_Couplet_Arrays(Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Node_Clade_Id, \
+				  Repeated_Clade_Set, Clade_Cache, State=Default_State):
+  Clade_Dict = Clade_Cache.Clade_Dict
+  no_of_nodes = len(Internal_Node_List)
+  # nodes within a reused clade: in the reverse postorder, a node follows its ancestors
+  Within_Reused = [False] * no_of_nodes
+  Reused_Span_Stack = []
+  for k in range(no_of_nodes - 1, -1, -1):
+    boundary_list = Internal_Node_List[k][1]
+    while (len(Reused_Span_Stack) > 0) and ((boundary_list[0] < Reused_Span_Stack[-1][0]) or \
+					    (boundary_list[-1] > Reused_Span_Stack[-1][1])):
+      Reused_Span_Stack.pop()
+    if (len(Reused_Span_Stack) > 0):
+      Within_Reused[k] = True
+    elif Node_Clade_Id[k] in Clade_Dict:
+      Reused_Span_Stack.append((boundary_list[0], boundary_list[-1]))
+
+  couplet_idx_block_list = []
+  dist_block_list = []
+  no_of_reused_clades = 0
+  # processed nodes whose parents are not yet processed: (leaf span, index of the first block of the subtree)
+  Open_Node_Stack = []
+  for k in range(no_of_nodes):
+    curr_node_dist_from_root, boundary_list = Internal_Node_List[k]
+    first_block_idx = len(couplet_idx_block_list)
+    while (len(Open_Node_Stack) > 0) and (Open_Node_Stack[-1][0][0] >= boundary_list[0]) and \
+	  (Open_Node_Stack[-1][0][1] <= boundary_list[-1]):
+      first_block_idx = min(first_block_idx, Open_Node_Stack.pop()[1])
+    Open_Node_Stack.append(((boundary_list[0], boundary_list[-1]), first_block_idx))
+    if (Within_Reused[k] == True):
+      continue
+    clade_id = Node_Clade_Id[k]
+    if clade_id in Clade_Dict:
+      couplet_idx_block_list.append(Clade_Dict[clade_id][0])
+      dist_block_list.append(Clade_Dict[clade_id][1])
+      no_of_reused_clades = no_of_reused_clades + 1
+      continue
+    Block = Get_Node_Couplet_Block(Leaf_Taxa_Idx, Leaf_Root_Dist, curr_node_dist_from_root, boundary_list, State)
+    if Block is not None:
+      couplet_idx_block_list.append(Block[0])
+      dist_block_list.append(Block[1])
+    # couplets of the subtree are the blocks of its nodes (contiguous, in postorder)
+    if (clade_id in Repeated_Clade_Set) and (boundary_list[-1] - boundary_list[0] >= MIN_DEDUP_CLADE_SIZE):
+      clade_size = boundary_list[-1] - boundary_list[0]
+      if (Clade_Cache.no_of_couplets + (clade_size * (clade_size - 1)) // 2 <= MAX_DEDUP_CACHE_COUPLETS):
+	Clade_Dict[clade_id] = (numpy.concatenate(couplet_idx_block_list[first_block_idx:]), \
+				numpy.concatenate(dist_block_list[first_block_idx:]))
+	Clade_Cache.no_of_couplets = Clade_Cache.no_of_couplets + len(Clade_Dict[clade_id][0])
+
+  if (len(couplet_idx_block_list) == 0):
+    return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0), no_of_reused_clades
+  return numpy.concatenate(couplet_idx_block_list), numpy.concatenate(dist_block_list), no_of_reused_clades
+
+#----------------------------------------------------
+"""
+these variables contain the trees (as leaf spans) and the clade identifiers of the distinct source trees,
+the repeated clades, the state, and the couplets of the cached clades, for the worker processes
+"""
+Worker_Dedup_Tree_List = []
+Worker_Repeated_Clade_Set = set()
+Worker_Dedup_State = Default_State
+Worker_Clade_Cache = None
+
+def Worker_Initialize_Dedup(Tree_List, Repeated_Clade_Set, State):
+  global Worker_Dedup_Tree_List
+  global Worker_Repeated_Clade_Set
+  global Worker_Dedup_State
+  global Worker_Clade_Cache
+  Worker_Dedup_Tree_List = Tree_List
+  Worker_Repeated_Clade_Set = Repeated_Clade_Set
+  Worker_Dedup_State = State
+  Worker_Clade_Cache = Clade_Couplet_Cache()
+
+#----------------------------------------------------
+"""
+this function is executed by a worker process, for one distinct source tree
+returns the index of the distinct tree, the couplet indices and distances, and the number of reused clades
+"""
+def Worker_Get_Dedup_Tree_Couplet_Arrays(group_idx):
+  Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Node_Clade_Id = Worker_Dedup_Tree_List[group_idx]
+  couplet_idx_arr, dist_arr, no_of_reused_clades = Get_Dedup_Tree_Couplet_Arrays(Leaf_Taxa_Idx, Leaf_Root_Dist, \
+				Internal_Node_List, Node_Clade_Id, Worker_Repeated_Clade_Set, Worker_Clade_Cache, Worker_Dedup_State)
+  return group_idx, couplet_idx_arr.astype(numpy.int32), dist_arr, no_of_reused_clades
+
+#----------------------------------------------------
+"""
+this function derives couplet relations of all the input trees, with the deduplication of identical trees
+and of repeated clades (see the description of this file)
+parameters: Input_Treelist - input trees
+no_of_jobs - number of worker processes extracting the couplets of the distinct trees
+tol - tolerance of the branch lengths of identical clades
+the weights of the input trees (in Matrix_Weight_Val) should already be computed
+returns a dictionary of the number of distinct trees, the number of repeated clades and of the reused clades
+"""
+def DeriveCoupletRelations_Dedup(Input_Treelist, no_of_jobs=1, tol=DEFAULT_DEDUP_TOL, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  # identical trees are grouped by the identifiers of their roots (in the order of their first occurrence)
+  Clade_Id_Dict = dict()
+  Group_Idx_Dict = dict()
+  Tree_Group_Idx = []
+  Tree_List = []
+  Clade_Count = dict()
+  for tr_idx in range(len(Input_Treelist)):
+    Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List = Get_Tree_Leaf_Spans(Input_Treelist[tr_idx], State)
+    Node_Clade_Id = Get_Clade_Ids(Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Clade_Id_Dict, tol)
+    # a tree without any internal node (single taxon) has no couplets, and is not grouped
+    root_key = Node_Clade_Id[-1] if (len(Node_Clade_Id) > 0) else ('tree', tr_idx)
+    if root_key not in Group_Idx_Dict:
+      Group_Idx_Dict[root_key] = len(Tree_List)
+      Tree_List.append((Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Node_Clade_Id))
+      for clade_id in set(Node_Clade_Id):
+	Clade_Count[clade_id] = Clade_Count.get(clade_id, 0) + 1
+    Tree_Group_Idx.append(Group_Idx_Dict[root_key])
+  del Clade_Id_Dict, Group_Idx_Dict
+  Repeated_Clade_Set = set([x for x in Clade_Count if (Clade_Count[x] > 1)])
+  del Clade_Count
+
+  # trees of individual groups, and the sum of their weights
+  Group_Tree_List = [[] for x in Tree_List]
+  for tr_idx in range(len(Tree_Group_Idx)):
+    Group_Tree_List[Tree_Group_Idx[tr_idx]].append(tr_idx)
+
+  def Add_Group_Couplets(group_idx, couplet_idx_arr, dist_arr):
+    if (Couplet_Info.Keep_Tree_Values == True):
+      for tr_idx in Group_Tree_List[group_idx]:
+	Couplet_Info._AddTreeCouplets(tr_idx, State.Matrix_Weight_Val[tr_idx], couplet_idx_arr, dist_arr)
+    else:
+      Couplet_Info._AddTreeCouplets(Group_Tree_List[group_idx][0], \
+				    sum([State.Matrix_Weight_Val[x] for x in Group_Tree_List[group_idx]]), \
+				    couplet_idx_arr, dist_arr)
+
+  Dedup_Info = {'no_of_distinct_trees': len(Tree_List), 'no_of_repeated_clades': len(Repeated_Clade_Set), \
+		'no_of_reused_clades': 0}
+  if (no_of_jobs <= 1) or (len(Tree_List) <= 1):
+    Clade_Cache = Clade_Couplet_Cache()
+    for group_idx in range(len(Tree_List)):
+      Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, Node_Clade_Id = Tree_List[group_idx]
+      couplet_idx_arr, dist_arr, no_of_reused_clades = Get_Dedup_Tree_Couplet_Arrays(Leaf_Taxa_Idx, Leaf_Root_Dist, \
+					Internal_Node_List, Node_Clade_Id, Repeated_Clade_Set, Clade_Cache, State)
+      Add_Group_Couplets(group_idx, couplet_idx_arr, dist_arr)
+      Dedup_Info['no_of_reused_clades'] = Dedup_Info['no_of_reused_clades'] + no_of_reused_clades
+    return Dedup_Info
+
+  # every worker caches the clades of the trees it processes, so the trees are given in contiguous chunks
+  pool = multiprocessing.Pool(processes=min(no_of_jobs, len(Tree_List)), \
+			      initializer=Worker_Initialize_Dedup, initargs=(Tree_List, Repeated_Clade_Set, State))
+  try:
+    chunk_size = max(1, len(Tree_List) // (4 * no_of_jobs))
+    for group_idx, couplet_idx_arr, dist_arr, no_of_reused_clades in pool.imap(Worker_Get_Dedup_Tree_Couplet_Arrays, \
+										range(len(Tree_List)), chunk_size):
+      Add_Group_Couplets(group_idx, couplet_idx_arr, dist_arr)
+      Dedup_Info['no_of_reused_clades'] = Dedup_Info['no_of_reused_clades'] + no_of_reused_clades
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+  return Dedup_Info
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+"""
+this file contains the sampling of couplets for the approximate branch length assignment of large taxa sets
+instead of all the supported couplets (quadratic in the number of taxa), the least squares system contains
+a sample of couplets, stratified by the supertree edges: for the edge above a node v, whose nearest ancestor
+with more leaves is p, the couplets are drawn with one taxon under v and the other under p (but not under v),
+so that every such couplet path contains the edge; among the supported candidates of an edge, the couplets
+are selected with the probabilities proportional to their support counts (weighted sampling without replacement)
+the candidates of an edge are drawn again (or enumerated) until enough supported couplets are found, widening
+the outer span to further ancestors if needed; edges left without sampled couplets are reported
+the error of the assigned branch lengths over all the supported couplets is estimated from another sample of
+couplets (held out, that is, not in the least squares system), drawn uniformly among the supported couplets
+the number of sampled couplets (and the solve time) increases linearly with the number of taxa
+"""
+
+import Header
+from Header import *
+import Edge_Len_Init
+
+# default seed of the couplet sampling
+DEFAULT_SAMPLE_SEED = 1
+
+# number of candidate couplets drawn for every selected couplet of an edge (in every round)
+SAMPLE_OVERSAMPLING = 4
+
+# maximum number of rounds of drawing the candidate couplets of the edges having fewer than SAMPLE_PATHS candidates
+MAX_SAMPLE_ROUNDS = 16
+
+# an edge whose stratum contains at most this number of taxa pairs (or at most the number of candidates drawn
+# in a round) has all its taxa pairs enumerated, instead of drawn
+SAMPLE_ENUMERATE_MAX_PAIRS = 256
+
+# minimum number of held out couplets (the default is one for every supertree edge)
+MIN_HOLDOUT_SIZE = 1000
+
+# maximum number of rounds of drawing the held out couplets (if the supported couplets are sparse)
+MAX_HOLDOUT_ROUNDS = 16
+
+#----------------------------------------------------
+"""
+this function returns, for every node of Node (each having a parent), its nearest ancestor having more leaves 
+(that is, a larger leaf span), skipping the ancestors with a single child; the root is returned if there is no such ancestor
+"""
+def Get_Larger_Ancestor(Supertree_Info, Span_Size, Node):
+  Parent = Supertree_Info.Parent
+  Anc_Node = Parent[Node]
+  while True:
+    same_span = numpy.nonzero(Span_Size[Anc_Node] == Span_Size[Node])[0]
+    same_span = same_span[Parent[Anc_Node[same_span]] >= 0]
+    if (len(same_span) == 0):
+      break
+    Anc_Node[same_span] = Parent[Anc_Node[same_span]]
+  return Anc_Node
+
+#----------------------------------------------------
+"""
+this function returns the supertree edges to be sampled, and for each of them, the nearest ancestor of its
+node v having more leaves than v (the outer node of the stratum, see Get_Larger_Ancestor)
+edges which contain all the leaves (above a root with a single child) are excluded
+"""
+def Get_Edge_Strata(Supertree_Info, Span_Size):
+  Edge_Idx = numpy.nonzero(Supertree_Info.Parent >= 0)[0]
+  Outer_Node = Get_Larger_Ancestor(Supertree_Info, Span_Size, Edge_Idx)
+  valid = (Span_Size[Outer_Node] > Span_Size[Edge_Idx])
+  return Edge_Idx[valid], Outer_Node[valid]
+
+#----------------------------------------------------
+"""
+this function returns the candidate taxa pairs of the given edges (positions in Edge_Idx) with one leaf under the edge 
+(within the inner span), and the other leaf outside the edge (within the outer span)
+the pairs of the edges in Enum_Pos are enumerated, and no_of_draws pairs are drawn uniformly for the edges in Draw_Pos
+returns the edge positions and the leaf positions of the pairs
+"""
+def Get_Candidate_Pairs(Enum_Pos, Draw_Pos, no_of_draws, Inner_Start, Inner_Size, Outer_Start, Outer_Size, Rand):
+  # enumerated pairs: the k-th pair of an edge is (k / outer size, k % outer size)
+  no_of_pairs = Inner_Size[Enum_Pos] * Outer_Size[Enum_Pos]
+  enum_edge = numpy.repeat(Enum_Pos, no_of_pairs)
+  pair_start = numpy.cumsum(no_of_pairs) - no_of_pairs
+  pair_pos = numpy.arange(len(enum_edge)) - numpy.repeat(pair_start, no_of_pairs)
+  enum_pos1 = pair_pos // Outer_Size[enum_edge]
+  enum_pos2 = pair_pos % Outer_Size[enum_edge]
+  # drawn pairs
+  draw_edge = numpy.repeat(Draw_Pos, no_of_draws)
+  draw_pos1 = (Rand.random_sample(len(draw_edge)) * Inner_Size[draw_edge]).astype(numpy.int64)
+  draw_pos2 = (Rand.random_sample(len(draw_edge)) * Outer_Size[draw_edge]).astype(numpy.int64)
+  cand_edge = numpy.concatenate((enum_edge, draw_edge))
+  leaf1 = Inner_Start[cand_edge] + numpy.concatenate((enum_pos1, draw_pos1))
+  leaf2 = Outer_Start[cand_edge] + numpy.concatenate((enum_pos2, draw_pos2))
+  leaf2 = numpy.where(leaf2 >= Inner_Start[cand_edge], leaf2 + Inner_Size[cand_edge], leaf2)
+  return cand_edge, leaf1, leaf2
+
+#----------------------------------------------------
+"""
+this function samples the couplets of the least squares system, stratified by the supertree edges
+(see the description of this file): up to no_of_paths supported couplets are selected for every edge,
+using the keys u^(1 / support count) for uniform random u (the couplets with the largest keys are selected)
+the candidates of an edge are drawn again (in at most MAX_SAMPLE_ROUNDS rounds) until no_of_paths supported 
+candidates are found; if the taxa pairs of the stratum are exhausted (enumerated), or a round finds no new 
+candidate, the outer span of the edge is widened to the next ancestor having more leaves
+parameters: Supertree_Info - supertree as flat arrays (Supertree_Array)
+no_of_paths - number of sampled couplets (paths) for every supertree edge
+Rand - random number generator (numpy RandomState)
+returns the (distinct) couplet indices and the taxa indices of the sampled couplets, the sampled edges, 
+and the number of couplets selected for each of these edges (less than no_of_paths if the supported couplets
+containing the edge are not found)
+"""
+def Sample_Edge_Couplets(Supertree_Info, no_of_paths, Rand, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Leaf_Taxa_Idx = Supertree_Info.Leaf_Taxa_Idx[Supertree_Info.Is_Leaf]
+  Span_Start, Span_End = Edge_Len_Init.Get_Supertree_Node_Spans(Supertree_Info)
+  Span_Size = Span_End - Span_Start
+  Edge_Idx, Outer_Node = Get_Edge_Strata(Supertree_Info, Span_Size)
+  no_of_edges = len(Edge_Idx)
+  Inner_Start = Span_Start[Edge_Idx]
+  Inner_Size = Span_Size[Edge_Idx]
+  no_of_draws = no_of_paths * SAMPLE_OVERSAMPLING
+
+  # candidate couplets (distinct for every edge), and their number for every edge
+  cand_edge = numpy.zeros(0, dtype=numpy.int64)
+  taxa1 = numpy.zeros(0, dtype=numpy.int64)
+  taxa2 = numpy.zeros(0, dtype=numpy.int64)
+  couplet_idx = numpy.zeros(0, dtype=numpy.int64)
+  no_of_cand = numpy.zeros(no_of_edges, dtype=numpy.int64)
+  Active_Pos = numpy.arange(no_of_edges)
+  for k in range(MAX_SAMPLE_ROUNDS):
+    if (len(Active_Pos) == 0):
+      break
+    Outer_Start = Span_Start[Outer_Node]
+    Outer_Size = Span_Size[Outer_Node] - Inner_Size
+    enum = ((Inner_Size[Active_Pos] * Outer_Size[Active_Pos]) <= max(SAMPLE_ENUMERATE_MAX_PAIRS, no_of_draws))
+    round_edge, leaf1, leaf2 = Get_Candidate_Pairs(Active_Pos[enum], Active_Pos[enum == False], no_of_draws, \
+						   Inner_Start, Inner_Size, Outer_Start, Outer_Size, Rand)
+    round_taxa1 = Leaf_Taxa_Idx[leaf1]
+    round_taxa2 = Leaf_Taxa_Idx[leaf2]
+    valid = numpy.nonzero((round_taxa1 >= 0) & (round_taxa2 >= 0))[0]
+    round_edge, round_taxa1, round_taxa2 = round_edge[valid], round_taxa1[valid], round_taxa2[valid]
+    round_couplet_idx = Couplet_Info._GetCoupletIdxArr(round_taxa1, round_taxa2)
+    valid = numpy.nonzero(Couplet_Info.Support_Count[round_couplet_idx] > 0)[0]
+    
+    # a couplet drawn more than once for the same edge is a single candidate
+    cand_edge = numpy.concatenate((cand_edge, round_edge[valid]))
+    taxa1 = numpy.concatenate((taxa1, round_taxa1[valid]))
+    taxa2 = numpy.concatenate((taxa2, round_taxa2[valid]))
+    couplet_idx = numpy.concatenate((couplet_idx, round_couplet_idx[valid]))
+    valid = numpy.unique(cand_edge * Couplet_Info.no_of_couplets + couplet_idx, return_index=True)[1]
+    cand_edge, taxa1, taxa2, couplet_idx = cand_edge[valid], taxa1[valid], taxa2[valid], couplet_idx[valid]
+    prev_no_of_cand = no_of_cand
+    no_of_cand = numpy.bincount(cand_edge, minlength=no_of_edges)
+    
+    # the outer span is widened for the edges whose stratum is exhausted, or without new candidates
+    under = (no_of_cand[Active_Pos] < no_of_paths)
+    widen = under & (enum | (no_of_cand[Active_Pos] == prev_no_of_cand[Active_Pos]))
+    at_root = (Supertree_Info.Parent[Outer_Node[Active_Pos]] < 0)
+    Widen_Pos = Active_Pos[widen & (at_root == False)]
+    Outer_Node[Widen_Pos] = Get_Larger_Ancestor(Supertree_Info, Span_Size, Outer_Node[Widen_Pos])
+    # edges whose taxa pairs are all enumerated (up to the root) have no other candidate
+    Active_Pos = Active_Pos[under & ((enum & at_root) == False)]
+
+  # weighted sampling without replacement (within every edge): candidates in the decreasing order of their keys
+  key = Rand.random_sample(len(couplet_idx)) ** (1.0 / Couplet_Info.Support_Count[couplet_idx])
+  order = numpy.lexsort((-key, cand_edge))
+  cand_edge = cand_edge[order]
+  group_start = numpy.searchsorted(cand_edge, cand_edge)
+  selected = order[(numpy.arange(len(order)) - group_start) < no_of_paths]
+
+  Edge_Sample_Count = numpy.minimum(no_of_cand, no_of_paths)
+  couplet_idx, first_pos = numpy.unique(couplet_idx[selected], return_index=True)
+  return couplet_idx, taxa1[selected][first_pos], taxa2[selected][first_pos], Edge_Idx, Edge_Sample_Count
+
+#----------------------------------------------------
+"""
+this function samples (uniformly) the supported couplets between the taxa of the supertree,
+which are not in Exclude_Couplet_Idx (the couplets of the least squares system)
+parameters: no_of_samples - number of held out couplets
+Rand - random number generator (numpy RandomState)
+returns the couplet indices and the taxa indices of the held out couplets, and the number of supported
+couplets between the taxa of the supertree (counted if all the taxa are in the supertree, otherwise estimated
+from the fraction of the supported couplets among the drawn couplets)
+"""
+def Sample_Holdout_Couplets(Supertree_Info, no_of_samples, Exclude_Couplet_Idx, Rand, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Present_Taxa_Idx = numpy.nonzero(Supertree_Info.Taxon_Leaf_Node >= 0)[0]
+  no_of_present_taxa = len(Present_Taxa_Idx)
+  if (no_of_present_taxa < 2):
+    return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), 0
+
+  couplet_block_list = []
+  no_of_drawn = 0
+  no_of_drawn_supported = 0
+  no_of_collected = 0
+  for k in range(MAX_HOLDOUT_ROUNDS):
+    # distinct taxa pairs, drawn uniformly
+    pos1 = Rand.randint(no_of_present_taxa, size=(SAMPLE_OVERSAMPLING * no_of_samples))
+    pos2 = Rand.randint(no_of_present_taxa - 1, size=(SAMPLE_OVERSAMPLING * no_of_samples))
+    pos2 = numpy.where(pos2 >= pos1, pos2 + 1, pos2)
+    taxa1 = Present_Taxa_Idx[pos1]
+    taxa2 = Present_Taxa_Idx[pos2]
+    couplet_idx = Couplet_Info._GetCoupletIdxArr(taxa1, taxa2)
+    supp = (Couplet_Info.Support_Count[couplet_idx] > 0)
+    no_of_drawn = no_of_drawn + len(couplet_idx)
+    no_of_drawn_supported = no_of_drawn_supported + int(numpy.count_nonzero(supp))
+    valid = numpy.nonzero(supp & (numpy.in1d(couplet_idx, Exclude_Couplet_Idx) == False))[0]
+    couplet_block_list.append((couplet_idx[valid], taxa1[valid], taxa2[valid]))
+    no_of_collected = no_of_collected + len(valid)
+    if (no_of_collected >= 2 * no_of_samples):
+      break
+
+  couplet_idx = numpy.concatenate([x[0] for x in couplet_block_list])
+  taxa1 = numpy.concatenate([x[1] for x in couplet_block_list])
+  taxa2 = numpy.concatenate([x[2] for x in couplet_block_list])
+  first_pos = numpy.unique(couplet_idx, return_index=True)[1]
+  # distinct couplets in random order (not in the order of the couplet indices)
+  first_pos = Rand.permutation(first_pos)[:no_of_samples]
+
+  if (no_of_present_taxa == Couplet_Info.no_of_taxa):
+    no_of_supported_couplets = int(Couplet_Info._GetNoSupportedCouplets())
+  else:
+    no_of_supported_couplets = int(round((no_of_drawn_supported * 1.0 / no_of_drawn) * \
+					 ((no_of_present_taxa * (no_of_present_taxa - 1)) // 2)))
+  return couplet_idx[first_pos], taxa1[first_pos], taxa2[first_pos], no_of_supported_couplets
+
+#----------------------------------------------------
+"""
+this function returns the estimated least square error over all the supported couplets
+that is, the error of the sampled couplets, plus the mean squared error of the held out couplets
+for every other supported couplet
+"""
+def Get_Estimated_LSQ_Error(sample_error, no_of_sampled_couplets, holdout_error, no_of_holdout_couplets, \
+			    no_of_supported_couplets):
+  if (no_of_holdout_couplets == 0):
+    return sample_error
+  no_of_other_couplets = max(0, no_of_supported_couplets - no_of_sampled_couplets)
+  return sample_error + (holdout_error / no_of_holdout_couplets) * no_of_other_couplets
@@ -9,78 +9,131 @@ import Header
 from Header import *
 import UtilFunc
 from UtilFunc import *
+import QP_Solver
+import Edge_Len_Init
+import Couplet_Sampling
+import Block_Solver
 
 #----------------------------------------------------
 # new functions used for QP based branch length assignment of the unweighted supertree
 #----------------------------------------------------
 """
-this function initializes EdgeInfoDict structure 
-where individual edges of the final supertree are used as keys
+this function converts the supertree into flat arrays (Supertree_Array), stored in the state
+individual edges of the supertree are indexed in postorder, and these indices denote the variables
+of the quadratic programming
 """
-def Initialize_Edge_Dict(Inp_Tree, Output_Text_File):
-  idx = 0
-  for e in Inp_Tree.postorder_edge_iter():
-    """
-    key of edge dictionary : individual edges, represented as a pair (tail node, head node)
-    tail node signifies the parent node from which the edge starts
-    head node signifies the parent node to which the edge ends
-    """
-    key = (e.tail_node, e.head_node)
-    EdgeInfoDict.setdefault(key, idx)
-    idx = idx + 1
+def Initialize_Edge_Dict(Inp_Tree, Output_Text_File, State=Default_State):
+  State.Supertree_Info = Supertree_Array(Inp_Tree, State.Couplet_Info)
   
   if (DEBUG_LEVEL >= 2):
     fp = open(Output_Text_File, 'a')
-    for key in EdgeInfoDict:
-      fp.write('\n curr EdgeInfoDict key: ' + str(key) + ' val: ' + str(EdgeInfoDict[key]))
+    for edge_idx in range(State.Supertree_Info.no_of_edges):
+      fp.write('\n curr edge idx: ' + str(edge_idx) + ' parent edge idx: ' + str(State.Supertree_Info.Parent[edge_idx]))
     fp.close()
 
+#----------------------------------------------------
+"""
+this function computes the weight of an input tree according to its constituent taxon set
+for the taxa t1, t2, ... of the tree (in the order of infer_taxa()), the taxon ti contributes 
+to the supporting taxa count if there is a later taxon tj (j > i) such that the couplet (ti, tj)
+is supported by at least one other input tree (that is, its support count is at least 2)
+the support counts of all the couplets of the tree are checked together, as one array operation
+parameter: curr_tree_taxa_idx_list - indices of the taxa of the input tree (in the order of infer_taxa())
+"""
+def Compute_Tree_Weight(curr_tree_taxa_idx_list, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  curr_tree_taxa_idx_arr = numpy.asarray(curr_tree_taxa_idx_list, dtype=numpy.int64)
+  number_of_taxa = len(curr_tree_taxa_idx_arr)
+  i, j = numpy.triu_indices(number_of_taxa, 1)
+  couplet_idx_arr = Couplet_Info._GetCoupletIdxArr(curr_tree_taxa_idx_arr[i], curr_tree_taxa_idx_arr[j])
+  multi_support = (Couplet_Info.Support_Count[couplet_idx_arr] >= 2)
+  supp_taxa = numpy.zeros(number_of_taxa, dtype=bool)
+  supp_taxa[i[multi_support]] = True
+  # we find that both the taxa within this couplet should contribute to the 
+  # supporting taxa count - sourya
+  supp_taxa_count = 2 * int(numpy.count_nonzero(supp_taxa))
+  
+  # supporting taxa count related weight
+  supp_taxa_related_tree_weight = (1.0 / supp_taxa_count)
+  return supp_taxa_related_tree_weight
+
 #----------------------------------------------------
 """
 this function scans input trees
 and assigns weights for individual trees according to their constituent taxon set 
 """
-def AssignMatrixWeights(Source_Treelist):
-  global Matrix_Weight_Val
-  
+def AssignMatrixWeights(Source_Treelist, State=Default_State):
   for tr in range(len(Source_Treelist)):
-    supp_taxa_count = 0
-    curr_tree_taxa_set = Source_Treelist[tr].infer_taxa()
-    number_of_taxa = len(curr_tree_taxa_set)
-    for i in range(number_of_taxa - 1):
-      t1 = curr_tree_taxa_set[i]
-      for j in range(i+1, number_of_taxa):
-	t2 = curr_tree_taxa_set[j]
-	key1 = (t1.label, t2.label)
-	key2 = (t2.label, t1.label)
-	if key1 in TaxaPair_Reln_Dict:
-	  target_key = key1
-	elif key2 in TaxaPair_Reln_Dict:
-	  target_key = key2
-	else:
-	  continue
-	if (TaxaPair_Reln_Dict[target_key]._GetNoSupportTrees() >= 2):
-	  # we find that both the taxa within this couplet should contribute to the 
-	  # supporting taxa count - sourya
-	  supp_taxa_count = supp_taxa_count + 2	#1
-	  break
+    curr_tree_taxa_idx_list = [State.Couplet_Info._GetTaxonIdx(label) for label in Get_Tree_Taxa_Labels(Source_Treelist[tr])]
     
-    # supporting taxa count related weight
-    supp_taxa_related_tree_weight = (1.0 / supp_taxa_count)
-   
     # now adjust the matrix weight value of the current location
-    Matrix_Weight_Val.append(supp_taxa_related_tree_weight)
+    State.Matrix_Weight_Val.append(Compute_Tree_Weight(curr_tree_taxa_idx_list, State))
+    State.Tree_Taxa_Count.append(len(curr_tree_taxa_idx_list))
     
+#----------------------------------------------------
+"""
+this function derives the couplet statistics and the weights of the input trees
+without holding the complete input treelist in memory
+trees are read one at a time from the input file, in two passes
+1) the first pass collects the taxa set of individual trees
+every couplet of a tree is supported by that tree, so the couplet support counts, 
+and subsequently the weights of individual trees, are derived from these taxa sets
+2) the second pass extracts the couplet distances of individual trees, and accumulates 
+their weighted sums (weights of the trees are already known)
+this is the same order of computation as the in-memory mode, only the trees are read again
+parameters: ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME - same as Read_Input_Treelist
+KEEP_TREE_VALUES - if True, the couplet distances of individual input trees are also kept
+State - state where the couplet statistics and the tree weights are stored
+returns the number of input trees
+"""
+def Derive_Couplet_Statistics_Streaming(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME, \
+					KEEP_TREE_VALUES=False, State=Default_State):
+  COMPLETE_INPUT_TAXA_LIST = State.COMPLETE_INPUT_TAXA_LIST
+  Matrix_Weight_Val = State.Matrix_Weight_Val
+  Couplet_Info = State.Couplet_Info
+  
+  # first pass: taxa sets of individual trees
+  # taxa are indexed in the order of their first occurrence, same as in COMPLETE_INPUT_TAXA_LIST
+  Tree_Taxa_Idx_List = []
+  Taxa_Idx_Dict = dict()
+  for curr_tree in Stream_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME):
+    curr_tree_taxa_idx_list = []
+    for label in curr_tree.infer_taxa().labels():
+      if label not in Taxa_Idx_Dict:
+	Taxa_Idx_Dict[label] = len(COMPLETE_INPUT_TAXA_LIST)
+	COMPLETE_INPUT_TAXA_LIST.append(label)
+      curr_tree_taxa_idx_list.append(Taxa_Idx_Dict[label])
+    Tree_Taxa_Idx_List.append(numpy.array(curr_tree_taxa_idx_list, dtype=numpy.int32))
+  
+  Couplet_Info._Initialize(COMPLETE_INPUT_TAXA_LIST, KEEP_TREE_VALUES)
+  for curr_tree_taxa_idx_arr in Tree_Taxa_Idx_List:
+    Couplet_Info._AddTreeTaxaSupport(curr_tree_taxa_idx_arr)
+  for curr_tree_taxa_idx_arr in Tree_Taxa_Idx_List:
+    Matrix_Weight_Val.append(Compute_Tree_Weight(curr_tree_taxa_idx_arr, State))
+    State.Tree_Taxa_Count.append(len(curr_tree_taxa_idx_arr))
+  no_of_trees = len(Tree_Taxa_Idx_List)
+  del Tree_Taxa_Idx_List
+  
+  # second pass: weighted sums of the couplet distances
+  tr_idx = 0
+  for curr_tree in Stream_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME):
+    couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(curr_tree, State)
+    Couplet_Info._AddTreeCouplets(tr_idx, Matrix_Weight_Val[tr_idx], couplet_idx_arr, dist_arr)
+    tr_idx = tr_idx + 1
+  
+  return no_of_trees
+  
 #----------------------------------------------------
 """
 for executing QP solver, this function creates a batch file storing the required command 
 in terms of an objective function
 """
-def WriteObjectiveFunctionFile(Out_Text_GLS_input_file):
+def WriteObjectiveFunctionFile(Out_Text_GLS_input_file, State=Default_State):
+  Couplet_Info = State.Couplet_Info
   fp_txt = open(Out_Text_GLS_input_file, 'w')
   
   # first write the number of variables (unknowns) of QP
-  fp_txt.write(str(len(EdgeInfoDict)))
+  fp_txt.write(str(State.Supertree_Info.no_of_edges))
 
   """
   now for each row of the text file
@@ -88,13 +141,14 @@ def WriteObjectiveFunctionFile(Out_Text_GLS_input_file):
   then mention those branches
   and finally mention the distance matrix entry
   """
-  for taxapair_key in TaxaPair_Reln_Dict:
-    br_len_list = TaxaPair_Reln_Dict[taxapair_key]._GetBranchArrayIdxList()
+  Offset, Branch_Idx = Couplet_Info._GetBranchArrayIdxCSR()
+  AvgDistMatVal = Couplet_Info._GetAvgDistMatVal()
+  for couplet_idx in QP_Solver.Get_Path_Couplet_Idx(State):
+    br_len_list = Branch_Idx[Offset[couplet_idx]:Offset[couplet_idx+1]]
     fp_txt.write('\n' + str(len(br_len_list)))
     for j in range(len(br_len_list)):
       fp_txt.write('\t' + str(br_len_list[j]))
-    AvgDistMatVal = TaxaPair_Reln_Dict[taxapair_key]._GetAvgDistMatVal()
-    fp_txt.write('\t' + str(AvgDistMatVal))
+    fp_txt.write('\t' + str(float(AvgDistMatVal[couplet_idx])))
   
   fp_txt.close()
   
@@ -202,107 +256,237 @@ def Initialize_TaxaPairBranches(Inp_Tree):
 
 # end comment - sourya
 #----------------------------------------------------
-""" 
-this function takes inputs of two leaf nodes and their MRCA node
-branches between the couplet, with respect to their MRCA node in the derived supertree 
-are assigned to their class instance
 """
-def AddBranchInfo(node1, node2, mrca_node):
+this function writes the edges of the paths from individual nodes towards the root
+parameters: Parent - parent indices of the supertree nodes
+Branch_Idx - output array, where the path of the k th node is written from the position start_pos[k]
+start_node, start_pos, path_len - start node, output position and number of edges of individual paths
+all the paths are advanced together by one edge, so that the cost is one array operation per edge of the longest path
+"""
+def Write_Path_Edges(Parent, Branch_Idx, start_node, start_pos, path_len):
+  active = numpy.nonzero(path_len > 0)[0]
+  curr_node = start_node[active]
+  curr_pos = start_pos[active]
+  remaining_len = path_len[active]
+  while (len(curr_node) > 0):
+    Branch_Idx[curr_pos] = curr_node
+    curr_node = Parent[curr_node]
+    curr_pos = curr_pos + 1
+    remaining_len = remaining_len - 1
+    keep = (remaining_len > 0)
+    curr_node = curr_node[keep]
+    curr_pos = curr_pos[keep]
+    remaining_len = remaining_len[keep]
 
-  """ 
-  if key exists in the taxa pair information
-  then assign branch information
-  """
-  key1 = (node1.taxon.label, node2.taxon.label)
-  key2 = (node2.taxon.label, node1.taxon.label)
-  if (key1 in TaxaPair_Reln_Dict):
-    tk = key1
-  elif (key2 in TaxaPair_Reln_Dict):
-    tk = key2
-  else:
-    return
-  
-  # add branch length from the first taxa (leaf node) to the MRCA node
-  curr_node = node1
-  parent_node = curr_node.parent_node
-  while (curr_node != mrca_node) and (parent_node is not None):
-    # add this branch information to the TaxaPair_Reln_Dict
-    # key follows the rule from tail node to head node
-    key = (parent_node, curr_node)
-    TaxaPair_Reln_Dict[tk]._AddBranchArrayIdx(EdgeInfoDict[key])
-    if (DEBUG_LEVEL > 2):
-      print 'node: ', curr_node, 'parent node: ', parent_node
-      print 'MRCA - added br idx: ', EdgeInfoDict[key]
-    curr_node = parent_node
-    parent_node = parent_node.parent_node
-    
-  # add branch length from the second taxa (leaf node) to the MRCA node
-  curr_node = node2
-  parent_node = curr_node.parent_node
-  while (curr_node != mrca_node) and (parent_node is not None):
-    # add this branch information to the TaxaPair_Reln_Dict
-    # key follows the rule from tail node to head node
-    key = (parent_node, curr_node)
-    TaxaPair_Reln_Dict[tk]._AddBranchArrayIdx(EdgeInfoDict[key])
-    if (DEBUG_LEVEL > 2):
-      print 'node: ', curr_node, 'parent node: ', parent_node
-      print 'MRCA - added br idx: ', EdgeInfoDict[key]
-    curr_node = parent_node
-    parent_node = parent_node.parent_node
-  
-  if (DEBUG_LEVEL > 2):    
-    print 'curr TaxaPair_Reln_Dict key: ', tk, 'branch idx list: ', TaxaPair_Reln_Dict[tk]._GetBranchArrayIdxList()
-  
-  return
+# number of couplets whose MRCA nodes are computed together
+COUPLET_BATCH_SIZE = (1 << 16)
 
 #----------------------------------------------------
 """ 
 for individual couplets, this function assigns the branches between them
 with respect to the output supertree (currently unweighted) 
+the supertree is used as flat arrays (Supertree_Array): MRCA nodes of the couplets are found by
+binary lifting over the ancestor table, and the branches (edge indices) are written
+directly in the compressed (CSR) format of the couplet store, without any per edge lookup
+only the couplets supported by the input trees, whose taxa are present in the supertree, are considered
+branches of a couplet are listed from its first taxon to their MRCA node, and then from the second taxon,
+where the first taxon is the one which is a child of the MRCA node (if only one of them is),
+otherwise the one earlier in postorder
 """
-def Initialize_TaxaPairBranches(Inp_Tree):
-  # traverse the internal nodes of the tree in postorder fashion
-  for curr_node in Inp_Tree.postorder_internal_node_iter():
-    # list the leaf and internal children of the current node
-    curr_node_child_leaf_nodes = []
-    curr_node_child_internal_nodes = []
-    for x in curr_node.child_nodes():
-      if (x.is_leaf() == True):
-	curr_node_child_leaf_nodes.append(x)
-      else:
-	curr_node_child_internal_nodes.append(x)
-    
-    # pair of leaf nodes will be first processed
-    if (len(curr_node_child_leaf_nodes) > 1):
-      for i in range(len(curr_node_child_leaf_nodes) - 1):
-	for j in range(i+1, len(curr_node_child_leaf_nodes)):
-	  AddBranchInfo(curr_node_child_leaf_nodes[i], curr_node_child_leaf_nodes[j], curr_node)
-  
-    # one leaf node (direct descendant) and another leaf node (under one internal node)
-    # will be related by ancestor / descendant relations
-    if (len(curr_node_child_leaf_nodes) > 0) and (len(curr_node_child_internal_nodes) > 0):
-      for p in curr_node_child_leaf_nodes:
-	for q in curr_node_child_internal_nodes:
-	  for r in q.leaf_nodes():
-	    AddBranchInfo(p, r, curr_node)
+def Initialize_TaxaPairBranches(Inp_Tree, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  if State.Supertree_Info is None:
+    State.Supertree_Info = Supertree_Array(Inp_Tree, Couplet_Info)
+  Supertree_Info = State.Supertree_Info
+  Depth = Supertree_Info.Depth
+  
+  # supertree taxa (present in the input trees) in increasing taxon index
+  # so that the couplets are generated in increasing couplet index
+  Present_Taxa_Idx = numpy.nonzero(Supertree_Info.Taxon_Leaf_Node >= 0)[0]
+  
+  # for batches of couplets: couplet index, first and second leaf nodes, and number of branches from them
+  Batch_List = []
+  couplet_block_list = []
+  no_of_block_couplets = 0
+  for k in range(len(Present_Taxa_Idx)):
+    other_taxa_idx = Present_Taxa_Idx[(k+1):]
+    couplet_idx = Couplet_Info._GetCoupletIdxArr(Present_Taxa_Idx[k], other_taxa_idx)
+    supp = (Couplet_Info.Support_Count[couplet_idx] > 0)
+    if (numpy.any(supp) == True):
+      couplet_block_list.append((Present_Taxa_Idx[k], other_taxa_idx[supp], couplet_idx[supp]))
+      no_of_block_couplets = no_of_block_couplets + int(numpy.count_nonzero(supp))
+    if (no_of_block_couplets >= COUPLET_BATCH_SIZE) or ((k == len(Present_Taxa_Idx) - 1) and (no_of_block_couplets > 0)):
+      node1 = numpy.concatenate([numpy.repeat(Supertree_Info.Taxon_Leaf_Node[x[0]], len(x[1])) for x in couplet_block_list])
+      node2 = Supertree_Info.Taxon_Leaf_Node[numpy.concatenate([x[1] for x in couplet_block_list])]
+      batch_couplet_idx = numpy.concatenate([x[2] for x in couplet_block_list])
+      mrca_node = Supertree_Info._GetLCA(node1, node2)
+      len1 = Depth[node1] - Depth[mrca_node]
+      len2 = Depth[node2] - Depth[mrca_node]
+      second_first = numpy.where((len1 == 1) != (len2 == 1), len2 == 1, node2 < node1)
+      Batch_List.append((batch_couplet_idx, numpy.where(second_first, node2, node1), numpy.where(second_first, node1, node2), \
+			  numpy.where(second_first, len2, len1), numpy.where(second_first, len1, len2)))
+      couplet_block_list = []
+      no_of_block_couplets = 0
+  
+  # offsets of the branches of individual couplets
+  Row_Len = numpy.zeros(Couplet_Info.no_of_couplets, dtype=numpy.int64)
+  for batch_couplet_idx, first_node, second_node, first_len, second_len in Batch_List:
+    Row_Len[batch_couplet_idx] = first_len + second_len
+  Offset = numpy.zeros(Couplet_Info.no_of_couplets + 1, dtype=numpy.int64)
+  numpy.cumsum(Row_Len, out=Offset[1:])
+  del Row_Len
+  
+  Branch_Idx = numpy.zeros(Offset[-1], dtype=numpy.int32)
+  for batch_couplet_idx, first_node, second_node, first_len, second_len in Batch_List:
+    Write_Path_Edges(Supertree_Info.Parent, Branch_Idx, first_node, Offset[batch_couplet_idx], first_len)
+    Write_Path_Edges(Supertree_Info.Parent, Branch_Idx, second_node, Offset[batch_couplet_idx] + first_len, second_len)
+  Couplet_Info._SetBranchArrayIdxCSR(Offset, Branch_Idx)
 
-    # finally a pair of leaf nodes which are descendant of internal nodes will be related by NO_EDGE relation
-    if (len(curr_node_child_internal_nodes) > 1):
-      for i in range(len(curr_node_child_internal_nodes) - 1):
-	for j in range(i+1, len(curr_node_child_internal_nodes)):
-	  for p in curr_node_child_internal_nodes[i].leaf_nodes():
-	    for q in curr_node_child_internal_nodes[j].leaf_nodes():
-	      AddBranchInfo(p, q, curr_node)
+#----------------------------------------------------
+"""
+this function returns the total number of branches between the supported couplets (the total path length),
+that is, the number of nonzero entries of the couplet by edge matrix
+if the branch indices of the couplets are not derived (normal equations solver), 
+the path lengths are computed from the depths of the couplets and of their MRCA nodes
+"""
+def Get_Total_Path_Length(State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Supertree_Info = State.Supertree_Info
+  Offset = Couplet_Info._GetBranchArrayIdxCSR()[0]
+  if (Offset[-1] > 0):
+    return int(Offset[-1])
+  Depth = Supertree_Info.Depth
+  Present_Taxa_Idx = numpy.nonzero(Supertree_Info.Taxon_Leaf_Node >= 0)[0]
+  total_path_len = 0
+  for k in range(len(Present_Taxa_Idx)):
+    other_taxa_idx = Present_Taxa_Idx[(k+1):]
+    supp = (Couplet_Info.Support_Count[Couplet_Info._GetCoupletIdxArr(Present_Taxa_Idx[k], other_taxa_idx)] > 0)
+    if (numpy.any(supp) == False):
+      continue
+    node2 = Supertree_Info.Taxon_Leaf_Node[other_taxa_idx[supp]]
+    node1 = numpy.repeat(Supertree_Info.Taxon_Leaf_Node[Present_Taxa_Idx[k]], len(node2))
+    mrca_node = Supertree_Info._GetLCA(node1, node2)
+    total_path_len = total_path_len + int(numpy.sum(Depth[node1] + Depth[node2] - 2 * Depth[mrca_node]))
+  return total_path_len
+
+#----------------------------------------------------
+"""
+this function returns the number of couplets scored by the least square error of the supertree: the couplets
+supported by the input trees whose both taxa are in the supertree (see QP_Solver.Get_Path_Couplet_Idx)
+if the branches between the couplets are not derived (sampled couplets), the couplets are counted from the taxa of the supertree
+"""
+def Get_No_Of_Scored_Couplets(State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Offset = Couplet_Info._GetBranchArrayIdxCSR()[0]
+  if (Offset[-1] > 0):
+    return len(QP_Solver.Get_Path_Couplet_Idx(State))
+  Present_Taxa_Idx = numpy.nonzero(State.Supertree_Info.Taxon_Leaf_Node >= 0)[0]
+  no_of_scored_couplets = 0
+  for k in range(len(Present_Taxa_Idx)):
+    couplet_idx = Couplet_Info._GetCoupletIdxArr(Present_Taxa_Idx[k], Present_Taxa_Idx[(k+1):])
+    no_of_scored_couplets = no_of_scored_couplets + int(numpy.count_nonzero(Couplet_Info.Support_Count[couplet_idx] > 0))
+  return no_of_scored_couplets
+
+#----------------------------------------------------
+"""
+this function returns the sparse (CSR) couplet by edge matrix of the given couplets (rows in the given order)
+and the vector of their weighted average couplet distances
+parameters: couplet_idx, taxa1_idx, taxa2_idx - couplet indices and taxa indices of the couplets,
+whose taxa are present in the supertree
+"""
+def Get_Couplet_Path_Matrix(couplet_idx, taxa1_idx, taxa2_idx, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Supertree_Info = State.Supertree_Info
+  Depth = Supertree_Info.Depth
+  node1 = Supertree_Info.Taxon_Leaf_Node[taxa1_idx]
+  node2 = Supertree_Info.Taxon_Leaf_Node[taxa2_idx]
+  mrca_node = Supertree_Info._GetLCA(node1, node2)
+  len1 = Depth[node1] - Depth[mrca_node]
+  len2 = Depth[node2] - Depth[mrca_node]
+  row_ptr = numpy.zeros(len(couplet_idx) + 1, dtype=numpy.int64)
+  numpy.cumsum(len1 + len2, out=row_ptr[1:])
+  Branch_Idx = numpy.zeros(row_ptr[-1], dtype=numpy.int32)
+  Write_Path_Edges(Supertree_Info.Parent, Branch_Idx, node1, row_ptr[:-1], len1)
+  Write_Path_Edges(Supertree_Info.Parent, Branch_Idx, node2, row_ptr[:-1] + len1, len2)
+  Path_Matrix = QP_Solver.Get_Path_Matrix(row_ptr, Branch_Idx, Supertree_Info.no_of_edges)
+  AvgDistMatVal = Couplet_Info.Weighted_Dist_Sum[couplet_idx] / Couplet_Info.Weight_Sum[couplet_idx]
+  return Path_Matrix, AvgDistMatVal
+
+#----------------------------------------------------
+"""
+this function computes the branch lengths of the supertree from a sample of the supported couplets
+(see Couplet_Sampling.py), by the in-process sparse least squares solver
+parameters: no_of_paths - number of sampled couplets for every supertree edge
+sample_seed - seed of the couplet sampling
+Block_Size, no_of_jobs - if Block_Size is positive, the sampled system is solved by the blocks of the supertree
+with at most Block_Size edges, using no_of_jobs worker processes (see Block_Solver.py)
+edge_value_init, Telemetry, init_name - initial edge lengths, budgets and log of the solver (see Solve_Sparse_LSQ_System)
+returns the list of edge lengths (indexed as in Supertree_Array), the estimated least square error
+over all the supported couplets, and a dictionary of the sample statistics
+"""
+def Solve_Sampled_Couplets(no_of_paths, sample_seed, State=Default_State, edge_value_init=None, Telemetry=None, \
+			   init_name='zero', Block_Size=0, no_of_jobs=1):
+  Supertree_Info = State.Supertree_Info
+  Rand = numpy.random.RandomState(sample_seed)
+  Sample_Couplet_Idx, taxa1_idx, taxa2_idx, Sample_Edge_Idx, Edge_Sample_Count = \
+    Couplet_Sampling.Sample_Edge_Couplets(Supertree_Info, no_of_paths, Rand, State)
+  Path_Matrix, AvgDistMatVal = Get_Couplet_Path_Matrix(Sample_Couplet_Idx, taxa1_idx, taxa2_idx, State)
+  if (Block_Size > 0):
+    Block_Idx, no_of_blocks = Block_Solver.Get_Subtree_Blocks(Supertree_Info, Block_Size)
+    edge_value_arr = Block_Solver.Solve_Block_LSQ_System(Path_Matrix, AvgDistMatVal, Block_Idx, no_of_blocks, no_of_jobs, \
+							 edge_value_init, Telemetry, init_name)
+  else:
+    edge_value_arr = QP_Solver.Solve_Sparse_LSQ_System(Path_Matrix, AvgDistMatVal, edge_value_init, Telemetry, init_name)
+  sample_error = QP_Solver.Compute_LSQ_Error(Path_Matrix, AvgDistMatVal, edge_value_arr)
+  
+  # error of the held out couplets
+  no_of_holdout = max(Couplet_Sampling.MIN_HOLDOUT_SIZE, Supertree_Info.no_of_edges)
+  Holdout_Couplet_Idx, taxa1_idx, taxa2_idx, no_of_supported_couplets = \
+    Couplet_Sampling.Sample_Holdout_Couplets(Supertree_Info, no_of_holdout, Sample_Couplet_Idx, Rand, State)
+  Holdout_Matrix, Holdout_AvgDistMatVal = Get_Couplet_Path_Matrix(Holdout_Couplet_Idx, taxa1_idx, taxa2_idx, State)
+  holdout_error = QP_Solver.Compute_LSQ_Error(Holdout_Matrix, Holdout_AvgDistMatVal, edge_value_arr)
+  
+  Sample_Info = {'no_of_sampled_couplets': len(Sample_Couplet_Idx), 'total_path_length': int(Path_Matrix.nnz), \
+		 'no_of_holdout_couplets': len(Holdout_Couplet_Idx), 'no_of_supported_couplets': no_of_supported_couplets, \
+		 'sample_lsq_error': sample_error, 'holdout_lsq_error': holdout_error, \
+		 'sample_rms_error': math.sqrt(sample_error / max(1, len(Sample_Couplet_Idx))), \
+		 'holdout_rms_error': math.sqrt(holdout_error / max(1, len(Holdout_Couplet_Idx))), \
+		 'no_of_undercovered_edges': int(numpy.count_nonzero(Edge_Sample_Count < no_of_paths)), \
+		 'uncovered_edges': Sample_Edge_Idx[Edge_Sample_Count == 0].tolist()}
+  lsq_error = Couplet_Sampling.Get_Estimated_LSQ_Error(sample_error, len(Sample_Couplet_Idx), holdout_error, \
+						       len(Holdout_Couplet_Idx), no_of_supported_couplets)
+  return edge_value_arr.tolist(), lsq_error, Sample_Info
 
 #----------------------------------------------------
 """ 
 this function assigns branch length information on the Inp_Tree     
 parameters:
 1) Inp_Tree: derived unweighted supertree
-2) Source_Treelist: input tree collection 
+2) Source_Treelist: input tree collection (None in the streaming mode)
 3) QP_Executable: Path of the QP executable (GSL based QP solver) provided by user as an argument
+4) Output_Text_File: text file containing the output descriptions
+5) QP_Method: solver employed for the QP (external executable, in-process sparse least squares, 
+or in-process solver of the normal equations)
+6) QP_File_Format: format (text or binary) of the files exchanged with the external QP executable
+7) State: state containing the couplet statistics and the tree weights (the edges of the supertree are also stored)
+8) edge_value_init: edge lengths (indexed as in Supertree_Array) of a previous solve of the same topology,
+such as the branch lengths computed before an update of the source trees (None if not available)
+9) Init_Method: initial edge lengths of the in-process solvers (one of the INIT_EDGE_LEN_* values); 
+not used by the external QP executable
+10) Telemetry: Solver_Telemetry object, containing the iteration / tolerance budgets of the in-process solvers
+and noting their convergence (in the file Solver_Log.jsonl of the output directory, if requested)
+11) Sample_Paths: if positive, the branch lengths are computed from a sample of the supported couplets,
+with this number of couplets for every supertree edge, by the in-process sparse least squares solver
+(whatever the QP_Method), and the least square error is estimated from the held out couplets (see Couplet_Sampling.py)
+12) Sample_Seed: seed of the couplet sampling
+13) Block_Size: if positive, the in-process sparse least squares problem is solved by the blocks (subtrees)
+of the supertree with at most (about) this number of edges, by no_of_jobs worker processes (see Block_Solver.py)
+returns the least square error of the assigned branch lengths
 """
-def AssignBranchLen(Inp_Tree, Source_Treelist, QP_Executable, Output_Text_File):
+def AssignBranchLen(Inp_Tree, Source_Treelist, QP_Executable, Output_Text_File, QP_Method=QP_SOLVER_EXTERNAL_EXEC, \
+		    QP_File_Format=QP_FILE_FORMAT_TEXT, State=Default_State, edge_value_init=None, \
+		    Init_Method=INIT_EDGE_LEN_PREVIOUS, Telemetry=None, Sample_Paths=0, \
+		    Sample_Seed=Couplet_Sampling.DEFAULT_SAMPLE_SEED, Block_Size=0, no_of_jobs=1):
   """
   this is the objective function represented as a string format
   that need to be passed in QP optimization function
@@ -312,63 +496,167 @@ def AssignBranchLen(Inp_Tree, Source_Treelist, QP_Executable, Output_Text_File):
   """
   this is the weight matrix of input phylogenetic trees
   """
-  global Matrix_Weight_Val
+  Matrix_Weight_Val = State.Matrix_Weight_Val
   
   # we note the timing for branch length assignment
   start_timestamp = time.time()
 
   """
-  function to assign individual edges of the derived unweighted supertree
-  into a dictionary, 
-  so that its values and attributes can be easily accessed and modified
+  function to convert the derived unweighted supertree into flat arrays
+  where individual edges are indexed (in postorder)
   """
-  Initialize_Edge_Dict(Inp_Tree, Output_Text_File)
+  Profiler = State.Profiler
+  Profiler._Start('initialize_edge_dict')
+  Initialize_Edge_Dict(Inp_Tree, Output_Text_File, State)
+  no_of_edges = State.Supertree_Info.no_of_edges
+  Profiler._End()
   
   """
   here we process individual couplets of the output supertree
   and assign the branch indices within them 
+  the normal equations are built directly from the supertree topology, 
+  so they do not need these branch indices, and the branches of the sampled couplets are derived while sampling
   """
-  Initialize_TaxaPairBranches(Inp_Tree)
+  if (QP_Method != QP_SOLVER_NORMAL_EQN) and (Sample_Paths <= 0):
+    Profiler._Start('initialize_taxa_pair_branches')
+    Initialize_TaxaPairBranches(Inp_Tree, State)
+    Profiler._End()
   
   """
   assign weights of individual phylogenetic trees
+  (in the streaming mode, the weights are already computed while reading the input trees)
   """
-  AssignMatrixWeights(Source_Treelist)
+  if (len(Matrix_Weight_Val) == 0):
+    Profiler._Start('assign_matrix_weights')
+    AssignMatrixWeights(Source_Treelist, State)
+    Profiler._End()
+  
+  if (Profiler.enabled == True):
+    Profiler._SetCounter('no_of_source_trees', len(Matrix_Weight_Val))
+    Profiler._SetCounter('no_of_taxa', State.Couplet_Info.no_of_taxa)
+    Profiler._SetCounter('no_of_couplets', State.Couplet_Info.no_of_couplets)
+    Profiler._SetCounter('no_of_supported_couplets', State.Couplet_Info._GetNoSupportedCouplets())
+    Profiler._SetCounter('no_of_edges', no_of_edges)
+    if (Sample_Paths <= 0):
+      Profiler._SetCounter('total_path_length', Get_Total_Path_Length(State))
   
   fp1 = open(Output_Text_File, 'a')
   for i in range(len(Matrix_Weight_Val)):
     fp1.write('\n Input tree index: ' + str(i) + ' tree weight: ' + str(Matrix_Weight_Val[i]) + \
       '  no of support taxa: ' + str(1.0 / Matrix_Weight_Val[i]) + \
-      '  no of input taxa: ' + str(len(Source_Treelist[i].infer_taxa())))
+      '  no of input taxa: ' + str(State.Tree_Taxa_Count[i]))
   fp1.close()
     
   print '*** now starting GLS based QP optimization of the branch length values ***'
+  lsq_error = None
   k = Output_Text_File.rfind("/")
   Out_Text_GLS_input_file = Output_Text_File[:(k+1)] + 'GLS_input.txt'
   Out_Text_GLS_output_file = Output_Text_File[:(k+1)] + 'GLS_output.txt'
-  WriteObjectiveFunctionFile(Out_Text_GLS_input_file)
-  
-  # call the C executable to generate QP outcome
-  sys_command_str = QP_Executable + str(' ') + Out_Text_GLS_input_file + ' ' + Out_Text_GLS_output_file
-  os.system(sys_command_str)
-  
-  # now read the edge contents from the file
-  edge_value_list = []
-  fp = open(Out_Text_GLS_output_file, 'r')
-  for line in fp:
-    if (line != ''):
-      edge_value_list.append(float(line))
+  
+  if Telemetry is None:
+    Telemetry = QP_Solver.Solver_Telemetry()
+  Telemetry._OpenLog(Output_Text_File[:(k+1)] + QP_Solver.SOLVER_LOG_FILENAME)
+  
+  if (Sample_Paths > 0):
+    Profiler._Start('initial_edge_len')
+    edge_value_init, init_name = Edge_Len_Init.Get_Initial_Edge_Len(Init_Method, Source_Treelist, edge_value_init, State)
+    Profiler._End()
+    # solve the least squares problem of the sampled couplets within this process
+    Profiler._Start('solve')
+    edge_value_list, lsq_error, Sample_Info = Solve_Sampled_Couplets(Sample_Paths, Sample_Seed, State, \
+								     edge_value_init, Telemetry, init_name, Block_Size, no_of_jobs)
+    fp = open(Out_Text_GLS_output_file, 'w')
+    for val in edge_value_list:
+      fp.write(repr(val) + '\n')
+    fp.close()
+    Profiler._End()
+    if (Profiler.enabled == True):
+      for key in ['no_of_sampled_couplets', 'no_of_holdout_couplets', 'total_path_length', 'no_of_undercovered_edges']:
+	Profiler._SetCounter(key, Sample_Info[key])
+      Profiler._SetCounter('no_of_uncovered_edges', len(Sample_Info['uncovered_edges']))
+    fp = open(Output_Text_File, 'a')
+    fp.write('\n couplet sampling -- sampled couplets: ' + str(Sample_Info['no_of_sampled_couplets']) + \
+      ' (' + str(Sample_Paths) + ' for every edge)  supported couplets: ' + str(Sample_Info['no_of_supported_couplets']) + \
+      '  held out couplets: ' + str(Sample_Info['no_of_holdout_couplets']))
+    fp.write('\n couplet sampling -- RMS error of the sampled couplets: ' + str(Sample_Info['sample_rms_error']) + \
+      '  RMS error of the held out couplets: ' + str(Sample_Info['holdout_rms_error']) + \
+      '  (the least square error below is estimated)')
+    fp.write('\n couplet sampling -- edges with fewer than ' + str(Sample_Paths) + ' sampled couplets: ' + \
+      str(Sample_Info['no_of_undercovered_edges']) + '  edges without sampled couplets: ' + str(len(Sample_Info['uncovered_edges'])))
+    if (len(Sample_Info['uncovered_edges']) > 0):
+      # no sampled couplet contains these edges, so that their lengths are not determined by the sample
+      fp.write('\n couplet sampling -- edges (indices) without sampled couplets: ' + \
+	' '.join([str(x) for x in Sample_Info['uncovered_edges']]))
+    fp.close()
+  elif (QP_Method == QP_SOLVER_SPARSE_LSQ) or (QP_Method == QP_SOLVER_NORMAL_EQN):
+    # initial edge lengths of the solver
+    Profiler._Start('initial_edge_len')
+    edge_value_init, init_name = Edge_Len_Init.Get_Initial_Edge_Len(Init_Method, Source_Treelist, edge_value_init, State)
+    Profiler._End()
+    # solve the least squares problem within this process
+    Profiler._Start('solve')
+    if (QP_Method == QP_SOLVER_SPARSE_LSQ) and (Block_Size > 0):
+      edge_value_list, lsq_error = Block_Solver.Solve_Block_LSQ(no_of_edges, Block_Size, no_of_jobs, State, \
+								edge_value_init, Telemetry, init_name)
+    elif (QP_Method == QP_SOLVER_SPARSE_LSQ):
+      edge_value_list, lsq_error = QP_Solver.Solve_Sparse_LSQ(no_of_edges, State, edge_value_init, Telemetry, init_name)
+    else:
+      edge_value_list, lsq_error = QP_Solver.Solve_Normal_Equations(Inp_Tree, no_of_edges, State, edge_value_init, \
+								   Telemetry, init_name)
+    fp = open(Out_Text_GLS_output_file, 'w')
+    for val in edge_value_list:
+      fp.write(repr(val) + '\n')
+    fp.close()
+    Profiler._End()
+  elif (QP_File_Format == QP_FILE_FORMAT_BINARY):
+    Telemetry._Start('external', INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_ZERO], no_of_edges)
+    # exchange the QP input and output with the executable as binary files
+    Out_Binary_GLS_input_file = Output_Text_File[:(k+1)] + 'GLS_input.bin'
+    Out_Binary_GLS_output_file = Output_Text_File[:(k+1)] + 'GLS_output.bin'
+    Profiler._Start('objective_file_write')
+    QP_Solver.WriteObjectiveFunctionBinaryFile(Out_Binary_GLS_input_file, no_of_edges, State)
+    Profiler._End()
+    Profiler._Start('solve')
+    sys_command_str = QP_Executable + str(' ') + Out_Binary_GLS_input_file + ' ' + Out_Binary_GLS_output_file
+    os.system(sys_command_str)
+    edge_value_list = QP_Solver.ReadEdgeValueBinaryFile(Out_Binary_GLS_output_file, no_of_edges)
+    Profiler._End()
+  else:
+    Telemetry._Start('external', INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_ZERO], no_of_edges)
+    Profiler._Start('objective_file_write')
+    WriteObjectiveFunctionFile(Out_Text_GLS_input_file, State)
+    Profiler._End()
+    
+    # call the C executable to generate QP outcome
+    Profiler._Start('solve')
+    sys_command_str = QP_Executable + str(' ') + Out_Text_GLS_input_file + ' ' + Out_Text_GLS_output_file
+    os.system(sys_command_str)
+    
+    # now read the edge contents from the file
+    edge_value_list = []
+    fp = open(Out_Text_GLS_output_file, 'r')
+    for line in fp:
+      if (line != ''):
+	edge_value_list.append(float(line))
+    fp.close()
+    Profiler._End()
+  
+  if lsq_error is None:
+    # error of the edge lengths computed by the external QP executable
+    Profiler._Start('lsq_error')
+    lsq_error = QP_Solver.Compute_Couplet_Path_LSQ_Error(edge_value_list, State)
+    Profiler._End()
+    # the external QP executable does not report its iterations
+    Telemetry._End(None, lsq_error, None, True)
+  Telemetry._CloseLog()
+  fp = open(Output_Text_File, 'a')
+  fp.write('\n Least square error of the branch length assignment: ' + str(lsq_error))
   fp.close()
   
-  # assign the edge length values to the tree edges
-  for e in Inp_Tree.postorder_edge_iter():
-    # key of the dictionary 
-    # tail node signifies the parent node from which the edge starts
-    # head node signifies the parent node to which the edge ends
-    key = (e.tail_node, e.head_node)
-    # if by chance, any edge value becomes negative, this correction makes it positive
-    e.length = edge_value_list[EdgeInfoDict[key]]
-    #e.length = math.fabs(edge_value_list[EdgeInfoDict[key]])
+  # assign the edge length values to the tree edges (in the order of the edge indices)
+  Profiler._Start('write_back')
+  State.Supertree_Info._AssignEdgeLengths(edge_value_list)
+  Profiler._End()
             
   ##------------------------------------------
   print '*** end of branch length assignment ***'
@@ -378,6 +666,6 @@ def AssignBranchLen(Inp_Tree, Source_Treelist, QP_Executable, Output_Text_File):
   fp.write('\n Branch length assignment -- time required : '+ str(end_timestamp - start_timestamp))
   fp.close()
   
-  return
+  return lsq_error
   
   
\ No newline at end of file
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""
+this file contains the estimates of the supertree edge lengths, used as the initial values of the in-process solvers
+1) source tree estimate: every supertree edge defines a clade (the taxa under it); restricted to the taxa
+of a source tree, this clade may be a clade of the source tree as well, and then the length of that source
+tree edge is a sample of the supertree edge length (shared equally by the supertree edges mapped to the same
+source edge); samples are averaged with the weights of the source trees
+2) couplet estimate: the neighbor joining style (three point) estimate from the weighted average couplet distances
+for the edge above a node v with parent p, the leaves of the supertree are grouped into C (under v),
+S (under p, but not under v) and O (the other leaves); with d(X, Y) as the average couplet distance between
+the groups, the average distance from p to the leaves of C is (d(C, S) + d(C, O) - d(S, O)) / 2, which is exact
+for additive distances, and the edge length is this distance minus the average distance from v to the leaves of C
+both estimates are clipped at zero, and the edges without any estimate get the length zero
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import QP_Solver
+
+# seed of the random hash values of the taxa (the hash of a clade is the XOR of the hash values of its taxa)
+CLADE_HASH_SEED = 1
+
+#----------------------------------------------------
+"""
+this function returns the leaf spans (in postorder) of all the nodes of the supertree (including the root)
+"""
+def Get_Supertree_Node_Spans(Supertree_Info):
+  Leaf_Count = numpy.cumsum(Supertree_Info.Is_Leaf)
+  Span_Start = (Leaf_Count - Supertree_Info.Is_Leaf)[Supertree_Info.Subtree_Start]
+  return Span_Start, Leaf_Count
+
+#----------------------------------------------------
+"""
+this function returns the clades of a source tree, as leaf spans, with the lengths of the edges above them
+a clade is the set of leaves of a node having at least two children (or of a leaf); its edge extends up to
+the nearest ancestor having at least two children, so that nodes having a single child are merged into the edges
+returns the arrays Clade_Start, Clade_End (leaf spans, in the postorder of the source tree leaves) and Clade_Len
+"""
+def Get_Source_Tree_Clades(Leaf_Root_Dist, Internal_Node_List):
+  Span_Dist_Dict = dict()
+  for node_dist_from_root, boundary_list in Internal_Node_List:
+    if (len(boundary_list) >= 3):
+      Span_Dist_Dict[(boundary_list[0], boundary_list[-1])] = node_dist_from_root
+  Clade_Start = []
+  Clade_End = []
+  Clade_Len = []
+  for node_dist_from_root, boundary_list in Internal_Node_List:
+    if (len(boundary_list) < 3):
+      continue
+    for k in range(len(boundary_list) - 1):
+      if (boundary_list[k+1] - boundary_list[k] == 1):
+	child_dist_from_root = Leaf_Root_Dist[boundary_list[k]]
+      else:
+	child_dist_from_root = Span_Dist_Dict[(boundary_list[k], boundary_list[k+1])]
+      Clade_Start.append(boundary_list[k])
+      Clade_End.append(boundary_list[k+1])
+      Clade_Len.append(child_dist_from_root - node_dist_from_root)
+  return numpy.array(Clade_Start, dtype=numpy.int64), numpy.array(Clade_End, dtype=numpy.int64), numpy.array(Clade_Len)
+
+#----------------------------------------------------
+"""
+this function returns the prefix XOR of an array of hash values (with a leading zero)
+so that the XOR over any span [s, e) is the XOR of the entries e and s
+"""
+def Get_Prefix_Hash(Hash_Arr):
+  Prefix_Hash = numpy.zeros(len(Hash_Arr) + 1, dtype=numpy.int64)
+  if (len(Hash_Arr) > 0):
+    Prefix_Hash[1:] = numpy.bitwise_xor.accumulate(Hash_Arr)
+  return Prefix_Hash
+
+#----------------------------------------------------
+"""
+this function estimates the supertree edge lengths from the edges of the source trees
+clades are compared by their hash values, so that every source tree needs only array operations
+over the supertree edges (plus one pass over its own nodes)
+parameters: Source_Treelist - source trees (dendropy trees, or trees read by the lightweight newick reader)
+State - state containing the supertree (Supertree_Info), the couplet store and the weights of the source trees
+returns the list of edge lengths (indexed as in Supertree_Array)
+"""
+def Get_Source_Edge_Len_Init(Source_Treelist, State=Default_State):
+  Supertree_Info = State.Supertree_Info
+  Leaf_Taxa_Idx, Span_Start, Span_End, Edge_Idx = Supertree_Info._GetEdgeSpans()
+  Taxa_Hash = numpy.random.RandomState(CLADE_HASH_SEED).randint(1, 1 << 62, size=State.Couplet_Info.no_of_taxa, \
+								 dtype=numpy.int64)
+  valid_leaf = (Leaf_Taxa_Idx >= 0)
+  Len_Sum = numpy.zeros(Supertree_Info.no_of_edges)
+  Weight_Sum = numpy.zeros(Supertree_Info.no_of_edges)
+
+  for tr in range(len(Source_Treelist)):
+    Tree_Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List = Get_Tree_Leaf_Spans(Source_Treelist[tr], State)
+    Clade_Start, Clade_End, Clade_Len = Get_Source_Tree_Clades(Leaf_Root_Dist, Internal_Node_List)
+    defined = ~numpy.isnan(Clade_Len)
+    # taxa absent in the supertree are left out of the clades
+    In_Supertree = (Supertree_Info.Taxon_Leaf_Node[Tree_Leaf_Taxa_Idx] >= 0)
+    Tree_Prefix_Hash = Get_Prefix_Hash(numpy.where(In_Supertree, Taxa_Hash[Tree_Leaf_Taxa_Idx], 0))
+    Clade_Hash = Tree_Prefix_Hash[Clade_End[defined]] ^ Tree_Prefix_Hash[Clade_Start[defined]]
+    Clade_Len = Clade_Len[defined]
+    if (len(Clade_Hash) == 0):
+      continue
+
+    # clades of the supertree edges, restricted to the taxa of this source tree
+    In_Tree = numpy.zeros(State.Couplet_Info.no_of_taxa, dtype=bool)
+    In_Tree[Tree_Leaf_Taxa_Idx] = True
+    leaf_in_tree = valid_leaf & In_Tree[numpy.maximum(Leaf_Taxa_Idx, 0)]
+    Prefix_Hash = Get_Prefix_Hash(numpy.where(leaf_in_tree, Taxa_Hash[numpy.maximum(Leaf_Taxa_Idx, 0)], 0))
+    Prefix_Count = numpy.zeros(len(Leaf_Taxa_Idx) + 1, dtype=numpy.int64)
+    Prefix_Count[1:] = numpy.cumsum(leaf_in_tree)
+    Edge_Hash = Prefix_Hash[Span_End] ^ Prefix_Hash[Span_Start]
+    Edge_Count = Prefix_Count[Span_End] - Prefix_Count[Span_Start]
+
+    # supertree edges whose restricted clades are clades of the source tree (other than the complete taxa set)
+    order = numpy.argsort(Clade_Hash)
+    Clade_Hash = Clade_Hash[order]
+    Clade_Len = Clade_Len[order]
+    pos = numpy.minimum(numpy.searchsorted(Clade_Hash, Edge_Hash), len(Clade_Hash) - 1)
+    match = (Clade_Hash[pos] == Edge_Hash) & (Edge_Count > 0) & (Edge_Count < numpy.count_nonzero(In_Supertree))
+    match_pos = pos[match]
+    # a source edge matched by multiple supertree edges (a path of the supertree) is shared equally
+    Share_Count = numpy.bincount(match_pos, minlength=len(Clade_Hash))
+    tree_weight = State.Matrix_Weight_Val[tr]
+    Len_Sum[Edge_Idx[match]] += tree_weight * Clade_Len[match_pos] / Share_Count[match_pos]
+    Weight_Sum[Edge_Idx[match]] += tree_weight
+
+  Edge_Len = numpy.zeros(Supertree_Info.no_of_edges)
+  estimated = (Weight_Sum > 0)
+  Edge_Len[estimated] = numpy.maximum(Len_Sum[estimated] / Weight_Sum[estimated], 0)
+  return Edge_Len.tolist()
+
+#----------------------------------------------------
+"""
+this function returns the sum of the entries of a matrix over the rows [r0, r1) and the columns [c0, c1)
+from the two dimensional prefix sums of that matrix
+"""
+def Get_Block_Sum(Prefix_Sum, r0, r1, c0, c1):
+  return Prefix_Sum[r1, c1] - Prefix_Sum[r0, c1] - Prefix_Sum[r1, c0] + Prefix_Sum[r0, c0]
+
+#----------------------------------------------------
+"""
+this function returns the average couplet distance between two groups of leaves (lists of leaf spans)
+or None if no couplet between the groups is supported
+"""
+def Get_Group_Avg_Dist(Dist_Prefix_Sum, Count_Prefix_Sum, Span_List1, Span_List2):
+  dist_sum = 0.0
+  count = 0.0
+  for r0, r1 in Span_List1:
+    for c0, c1 in Span_List2:
+      dist_sum = dist_sum + Get_Block_Sum(Dist_Prefix_Sum, r0, r1, c0, c1)
+      count = count + Get_Block_Sum(Count_Prefix_Sum, r0, r1, c0, c1)
+  if (count < 0.5):
+    return None
+  return dist_sum / count
+
+#----------------------------------------------------
+"""
+this function estimates the supertree edge lengths from the weighted average couplet distances
+(neighbor joining style three point estimate, see the description of this file)
+the couplet values between the supertree leaves are stored as dense matrices (as for the normal equations)
+returns the list of edge lengths (indexed as in Supertree_Array)
+"""
+def Get_Couplet_Edge_Len_Init(State=Default_State):
+  Supertree_Info = State.Supertree_Info
+  Couplet_Info = State.Couplet_Info
+  Leaf_Taxa_Idx = Supertree_Info._GetEdgeSpans()[0]
+  no_of_leaves = len(Leaf_Taxa_Idx)
+
+  # two dimensional prefix sums of the couplet distances and of the support indicators
+  Dist_Prefix_Sum = numpy.zeros((no_of_leaves + 1, no_of_leaves + 1))
+  Leaf_Matrix = QP_Solver.Get_Leaf_Couplet_Matrix(Leaf_Taxa_Idx, Couplet_Info._GetAvgDistMatVal(), State)
+  numpy.cumsum(numpy.cumsum(Leaf_Matrix, axis=0), axis=1, out=Dist_Prefix_Sum[1:, 1:])
+  Count_Prefix_Sum = numpy.zeros((no_of_leaves + 1, no_of_leaves + 1))
+  Leaf_Matrix = QP_Solver.Get_Leaf_Couplet_Matrix(Leaf_Taxa_Idx, (Couplet_Info.Support_Count > 0).astype(numpy.float64), State)
+  numpy.cumsum(numpy.cumsum(Leaf_Matrix, axis=0), axis=1, out=Count_Prefix_Sum[1:, 1:])
+  del Leaf_Matrix
+
+  Span_Start, Span_End = Get_Supertree_Node_Spans(Supertree_Info)
+  Span_Start = Span_Start.tolist()
+  Span_End = Span_End.tolist()
+  Parent = Supertree_Info.Parent.tolist()
+  Edge_Len = [0.0] * Supertree_Info.no_of_edges
+  # for individual nodes, the sum (over the leaves under it) of the estimated distances to these leaves
+  Leaf_Dist_Sum = [0.0] * Supertree_Info.no_of_edges
+
+  # nodes are in postorder, so the children of a node are processed before the node
+  for node_idx in range(Supertree_Info.no_of_edges):
+    parent_idx = Parent[node_idx]
+    if (parent_idx < 0):
+      continue
+    no_of_leaves_under = Span_End[node_idx] - Span_Start[node_idx]
+    C = [(Span_Start[node_idx], Span_End[node_idx])]
+    S = [x for x in [(Span_Start[parent_idx], Span_Start[node_idx]), (Span_End[node_idx], Span_End[parent_idx])] if (x[0] < x[1])]
+    O = [x for x in [(0, Span_Start[parent_idx]), (Span_End[parent_idx], no_of_leaves)] if (x[0] < x[1])]
+    d_CS = Get_Group_Avg_Dist(Dist_Prefix_Sum, Count_Prefix_Sum, C, S)
+    d_CO = Get_Group_Avg_Dist(Dist_Prefix_Sum, Count_Prefix_Sum, C, O)
+    d_SO = Get_Group_Avg_Dist(Dist_Prefix_Sum, Count_Prefix_Sum, S, O)
+    if (d_CS is not None) and (d_CO is not None) and (d_SO is not None):
+      parent_dist = (d_CS + d_CO - d_SO) / 2.0
+    elif (d_CS is not None):
+      # no outgroup (such as for the children of the root): the distance is shared equally
+      parent_dist = d_CS / 2.0
+    else:
+      parent_dist = None
+    node_dist = Leaf_Dist_Sum[node_idx] / no_of_leaves_under
+    if parent_dist is not None:
+      Edge_Len[node_idx] = max(parent_dist - node_dist, 0.0)
+    Leaf_Dist_Sum[parent_idx] = Leaf_Dist_Sum[parent_idx] + Leaf_Dist_Sum[node_idx] + no_of_leaves_under * Edge_Len[node_idx]
+
+  return Edge_Len
+
+#----------------------------------------------------
+"""
+this function returns the initial edge lengths of the in-process solvers (or None to start from zero)
+parameters: Init_Method - one of INIT_EDGE_LEN_PREVIOUS, INIT_EDGE_LEN_ZERO, INIT_EDGE_LEN_SOURCE, INIT_EDGE_LEN_COUPLET
+Source_Treelist - source trees (None if they are not kept in memory; then the couplet estimate is used instead
+of the source tree estimate)
+Prev_Edge_Len - edge lengths of a previous solve of the same topology (or None)
+returns the edge lengths and the name of the method employed
+"""
+def Get_Initial_Edge_Len(Init_Method, Source_Treelist, Prev_Edge_Len, State=Default_State):
+  if (Init_Method == INIT_EDGE_LEN_PREVIOUS):
+    if Prev_Edge_Len is None:
+      return None, INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_ZERO]
+    return Prev_Edge_Len, INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_PREVIOUS]
+  if (Init_Method == INIT_EDGE_LEN_SOURCE):
+    if Source_Treelist is not None:
+      return Get_Source_Edge_Len_Init(Source_Treelist, State), INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_SOURCE]
+    print 'source trees are not kept in memory - initial edge lengths are estimated from the couplet distances'
+    Init_Method = INIT_EDGE_LEN_COUPLET
+  if (Init_Method == INIT_EDGE_LEN_COUPLET):
+    return Get_Couplet_Edge_Len_Init(State), INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_COUPLET]
+  return None, INIT_EDGE_LEN_NAME[INIT_EDGE_LEN_ZERO]
@@ -7,20 +7,43 @@ import os
 import sys
 from optparse import OptionParser
 import math
+from array import array
+import multiprocessing
+import numpy
+import json
+try:
+  import resource
+except ImportError:
+  resource = None
 
 # this is the path of QP executable based on GNU C library
 #QP_Executable = './GNU_BFGS2'
 
-""" 
-this dictionary defines the taxa pair relations
-each entry is indexed by two leaves 
-"""
-TaxaPair_Reln_Dict = dict()
+# these are the solvers (of the quadratic programming) employed for branch length assignment
+# 1 - external QP executable (GNU_BFGS2), whose path is provided by the user
+# 2 - in-process sparse non-negative least squares solver (requires scipy)
+# 3 - in-process solver of the normal equations, built directly from the supertree topology
+QP_SOLVER_EXTERNAL_EXEC = 1
+QP_SOLVER_SPARSE_LSQ = 2
+QP_SOLVER_NORMAL_EQN = 3
 
-""" 
-this list contains the complete set of taxa present in the input source trees 
-"""
-COMPLETE_INPUT_TAXA_LIST = []
+# formats of the files exchanged with the external QP executable
+# 1 - text files (GLS_input.txt and GLS_output.txt)
+# 2 - binary files (GLS_input.bin and GLS_output.bin), written and read as memory mapped arrays
+QP_FILE_FORMAT_TEXT = 1
+QP_FILE_FORMAT_BINARY = 2
+
+# initial edge lengths of the in-process solvers
+# 1 - edge lengths of a previous solve of the same topology (such as a saved state), if available; otherwise zero
+# 2 - zero (cold start)
+# 3 - averaged lengths of the matching edges (clades) of the source trees
+# 4 - neighbor joining style estimate from the weighted average couplet distances
+INIT_EDGE_LEN_PREVIOUS = 1
+INIT_EDGE_LEN_ZERO = 2
+INIT_EDGE_LEN_SOURCE = 3
+INIT_EDGE_LEN_COUPLET = 4
+INIT_EDGE_LEN_NAME = {INIT_EDGE_LEN_PREVIOUS: 'previous', INIT_EDGE_LEN_ZERO: 'zero', \
+		      INIT_EDGE_LEN_SOURCE: 'source', INIT_EDGE_LEN_COUPLET: 'couplet'}
 
 # this is the debug level
 # set for printing the necessary information
@@ -34,103 +57,530 @@ objective_function_string = ''
 # employed for the above mentioned quadratic programming
 deriv_objective_function_string = ''
 
-# this dictionary stores the edge information
-# key of the dictionary: (terminal_node1, terminal_node2)
-# value of the element: array index (which will be used to denote corresponding variable with respect to the branch)
-# variables are stored as x[0], x[1], .....
-# they are employed in a quadratic programming
-EdgeInfoDict = dict()
-
-""" this variable associates weight of matrix corresponding to individual source trees """
-Matrix_Weight_Val = []
-
 # this is the corrected edge length for the output weighted supertree
 # when the QP computation returns a negative edge length
 CORRECTED_POSITIVE_EDGE_LEN = 0.00001
 
+
 ##-----------------------------------------------------
 """ 
-this class defines a pair of taxa
-key of this class --- taxa1, taxa2  
+this class stores the relations of all the couplets (taxa pairs)
+individual taxa are mapped to dense integer indices (0 to N-1) once
+a couplet of taxa indices (i, j) with i < j is mapped to a single (canonical) index 
+of the condensed upper triangular matrix having N(N-1)/2 entries
+per couplet statistics are stored in flat numpy arrays over this index
 """
-class Reln_TaxaPair(object):
-  def __init__(self):    
-            
-    """ 
-    with respect to the output supertree, this array stores the branches between this couplet
-    (indexed by some mechanism) which are between this couplet and their MRCA node
-    """    
-    self.Branch_Array_Idx_List = []
+class Couplet_Store(object):
+  def __init__(self):
+    self._Clear()
+
+  """
+  clears the stored information and taxa indexing
+  """
+  def _Clear(self):
+    # list of taxa labels - position of a label within this list is its taxon index
+    self.Taxa_Label_List = []
+    # dictionary mapping individual taxon labels to their indices
+    self.Taxa_Idx_Dict = dict()
+    self.no_of_taxa = 0
+    self.no_of_couplets = 0
     
     """
-    with respect to the input treelist, this list stores the input tree indices
-    where the taxa pair is supported
+    for individual couplets, this array stores the number of input trees supporting it
     """
-    self.Supported_Tree_Idx_List = []
-
-    """ 
-    this list stores the distance values between these taxa pairs
-    as supported by the source trees
+    self.Support_Count = numpy.zeros(0, dtype=numpy.int32)
+    
     """
-    self.DistMatValues = []
-            
-  """ 
-  add branch length distance value (for an input tree)
-  to a list
+    weights of the input trees are computed (from the support counts) before the couplet distances 
+    are extracted, so for individual couplets only the running sums of the weighted distances 
+    and of the weights of the supporting trees are stored
+    """
+    self.Weighted_Dist_Sum = numpy.zeros(0)
+    self.Weight_Sum = numpy.zeros(0)
+    
+    """
+    if this flag is set, the couplet indices and the couplet distances of individual input trees
+    are also kept (in Tree_Couplet_Values, indexed by the input tree) for diagnostics
+    otherwise, the memory per couplet does not depend on the number of input trees
+    """
+    self.Keep_Tree_Values = False
+    self.Tree_Couplet_Values = dict()
+    
+    """
+    with respect to the output supertree, these arrays store the branches (indices of the supertree edges)
+    which are between a couplet and their MRCA node, in a compressed (CSR) format
+    branches between the couplet with index k are Path_Edge_Idx[Path_Offset[k]:Path_Offset[k+1]]
+    """
+    self.Path_Offset = None
+    self.Path_Edge_Idx = numpy.zeros(0, dtype=numpy.int32)
+    
+  """
+  assigns the taxa indices and allocates the per couplet arrays
+  parameters: taxa_label_list - complete set of taxa present in the input source trees
+  keep_tree_values - if True, the couplet distances of individual input trees are also kept
+  """
+  def _Initialize(self, taxa_label_list, keep_tree_values=False):
+    self._Clear()
+    self.Keep_Tree_Values = keep_tree_values
+    self.Taxa_Label_List = list(taxa_label_list)
+    for i in range(len(self.Taxa_Label_List)):
+      self.Taxa_Idx_Dict[self.Taxa_Label_List[i]] = i
+    self.no_of_taxa = len(self.Taxa_Label_List)
+    self.no_of_couplets = (self.no_of_taxa * (self.no_of_taxa - 1)) // 2
+    self.Support_Count = numpy.zeros(self.no_of_couplets, dtype=numpy.int32)
+    self.Weighted_Dist_Sum = numpy.zeros(self.no_of_couplets)
+    self.Weight_Sum = numpy.zeros(self.no_of_couplets)
+
+  """
+  assigns the taxa indices and the per couplet arrays, which are already computed
+  (for example, loaded from the couplet statistics cache)
   """
-  def _AddDistMatValue(self, val):
-    self.DistMatValues.append(val)
+  def _InitializeFromArrays(self, taxa_label_list, Support_Count, Weighted_Dist_Sum, Weight_Sum):
+    self._Initialize(taxa_label_list)
+    self.Support_Count = Support_Count
+    self.Weighted_Dist_Sum = Weighted_Dist_Sum
+    self.Weight_Sum = Weight_Sum
 
   """
-  adds supporting tree
+  returns the index of a taxon (given its label)
   """
-  def _AddSupportTreeIndex(self, idx):
-    self.Supported_Tree_Idx_List.append(idx)
+  def _GetTaxonIdx(self, label):
+    return self.Taxa_Idx_Dict[label]
   
   """
-  returns the indices of trees supporting this couplet
+  returns the canonical couplet index of two taxa indices
+  the index does not depend on the order of the taxa
   """
-  def _GetSupportTreeList(self):
-    return self.Supported_Tree_Idx_List
+  def _GetCoupletIdxFromTaxaIdx(self, idx1, idx2):
+    if (idx1 > idx2):
+      idx1, idx2 = idx2, idx1
+    return idx1 * self.no_of_taxa - (idx1 * (idx1 + 1)) // 2 + (idx2 - idx1 - 1)
   
   """
-  returns the number of trees supporting this couplet
+  returns the canonical couplet index of two taxa labels
   """
-  def _GetNoSupportTrees(self):
-    return len(self.Supported_Tree_Idx_List)
-    
+  def _GetCoupletIdx(self, label1, label2):
+    return self._GetCoupletIdxFromTaxaIdx(self.Taxa_Idx_Dict[label1], self.Taxa_Idx_Dict[label2])
+  
   """
-  returns the branch indices of the supertree between this couplet
+  returns the canonical couplet indices of two arrays of taxa indices (element wise)
   """
-  def _GetBranchArrayIdxList(self):
-    return self.Branch_Array_Idx_List
+  def _GetCoupletIdxArr(self, idx1_arr, idx2_arr):
+    i = numpy.minimum(idx1_arr, idx2_arr).astype(numpy.int64)
+    j = numpy.maximum(idx1_arr, idx2_arr).astype(numpy.int64)
+    return i * self.no_of_taxa - (i * (i + 1)) // 2 + (j - i - 1)
+  
+  """
+  returns the pair of taxa indices (i, j), i < j, of a couplet index
+  """
+  def _GetTaxaIdxFromCoupletIdx(self, couplet_idx):
+    i = 0
+    while (couplet_idx >= (self.no_of_taxa - 1 - i)):
+      couplet_idx = couplet_idx - (self.no_of_taxa - 1 - i)
+      i = i + 1
+    return i, i + 1 + couplet_idx
+  
+  """
+  notes an input tree as a supporting tree of all the couplets formed by its taxa
+  (every pair of taxa of an input tree is a couplet of that tree)
+  parameter: taxa_idx_list - indices of the taxa of the input tree
+  """
+  def _AddTreeTaxaSupport(self, taxa_idx_list):
+    taxa_idx_arr = numpy.asarray(taxa_idx_list, dtype=numpy.int64)
+    i, j = numpy.triu_indices(len(taxa_idx_arr), 1)
+    self.Support_Count[self._GetCoupletIdxArr(taxa_idx_arr[i], taxa_idx_arr[j])] += 1
+  
+  """
+  adds the distance values of all the couplets of an input tree, to the running weighted sums
+  parameters: tree_idx - index of the input tree
+  tree_weight - weight of the input tree
+  couplet_idx_arr - indices of the couplets present in this tree (each couplet occurs once)
+  dist_arr - distance values of these couplets with respect to this tree
+  """
+  def _AddTreeCouplets(self, tree_idx, tree_weight, couplet_idx_arr, dist_arr):
+    self.Weighted_Dist_Sum[couplet_idx_arr] += dist_arr * tree_weight
+    self.Weight_Sum[couplet_idx_arr] += tree_weight
+    if (self.Keep_Tree_Values == True):
+      self.Tree_Couplet_Values[tree_idx] = (numpy.asarray(couplet_idx_arr, dtype=numpy.int32), \
+					    numpy.asarray(dist_arr, dtype=numpy.float64))
+  
+  """
+  removes an input tree from the supporting trees of all the couplets formed by its taxa
+  parameter: taxa_idx_list - indices of the taxa of the input tree
+  """
+  def _RemoveTreeTaxaSupport(self, taxa_idx_list):
+    taxa_idx_arr = numpy.asarray(taxa_idx_list, dtype=numpy.int64)
+    i, j = numpy.triu_indices(len(taxa_idx_arr), 1)
+    self.Support_Count[self._GetCoupletIdxArr(taxa_idx_arr[i], taxa_idx_arr[j])] -= 1
+  
+  """
+  subtracts the distance values of all the couplets of an input tree from the running weighted sums
+  parameters are same as _AddTreeCouplets (tree_weight is the weight with which the tree was added)
+  """
+  def _RemoveTreeCouplets(self, tree_weight, couplet_idx_arr, dist_arr):
+    self.Weighted_Dist_Sum[couplet_idx_arr] -= dist_arr * tree_weight
+    self.Weight_Sum[couplet_idx_arr] -= tree_weight
+  
+  """
+  adds new taxa (labels which are not yet indexed) after the existing taxa
+  the per couplet arrays are extended to the new number of taxa, retaining the statistics 
+  of the existing couplets (whose canonical indices change with the number of taxa)
+  returns the list of the new taxa labels
+  """
+  def _AddTaxa(self, taxa_label_list):
+    new_label_list = []
+    for label in taxa_label_list:
+      if (label not in self.Taxa_Idx_Dict):
+	self.Taxa_Idx_Dict[label] = len(self.Taxa_Label_List)
+	self.Taxa_Label_List.append(label)
+	new_label_list.append(label)
+    if (len(new_label_list) == 0):
+      return new_label_list
     
+    # condensed indices of the existing couplets are in the order of numpy.triu_indices
+    i, j = numpy.triu_indices(self.no_of_taxa, 1)
+    self.no_of_taxa = len(self.Taxa_Label_List)
+    self.no_of_couplets = (self.no_of_taxa * (self.no_of_taxa - 1)) // 2
+    new_couplet_idx = self._GetCoupletIdxArr(i, j)
+    del i, j
+    for attr_name in ['Support_Count', 'Weighted_Dist_Sum', 'Weight_Sum']:
+      old_arr = getattr(self, attr_name)
+      new_arr = numpy.zeros(self.no_of_couplets, dtype=old_arr.dtype)
+      new_arr[new_couplet_idx] = old_arr
+      setattr(self, attr_name, new_arr)
+    for tree_idx in self.Tree_Couplet_Values:
+      couplet_idx_arr, dist_arr = self.Tree_Couplet_Values[tree_idx]
+      self.Tree_Couplet_Values[tree_idx] = (new_couplet_idx[couplet_idx_arr].astype(numpy.int32), dist_arr)
+    self._ClearBranchArrayIdx()
+    return new_label_list
+  
+  """
+  returns the number of trees supporting a couplet
   """
-  adds index of one particular branch between this couplet
+  def _GetNoSupportTrees(self, couplet_idx):
+    return self.Support_Count[couplet_idx]
+  
+  """
+  returns the indices (in increasing order) of the couplets supported by at least one input tree
+  """
+  def _GetSupportedCoupletIdx(self):
+    return numpy.nonzero(self.Support_Count)[0]
+  
+  """
+  returns the number of couplets supported by at least one input tree
+  """
+  def _GetNoSupportedCouplets(self):
+    return numpy.count_nonzero(self.Support_Count)
+  
+  """
+  sets the branch indices of the supertree for all the couplets, in a compressed (CSR) format
+  parameters: Offset - int64 array of (number of couplets + 1) entries
+  Branch_Idx - int32 array; branches between the couplet with index k are Branch_Idx[Offset[k]:Offset[k+1]]
   """
-  def _AddBranchArrayIdx(self, idx):
-    if idx not in self.Branch_Array_Idx_List:
-      self.Branch_Array_Idx_List.append(idx)
-          
+  def _SetBranchArrayIdxCSR(self, Offset, Branch_Idx):
+    self.Path_Offset = Offset
+    self.Path_Edge_Idx = Branch_Idx
+
+  """
+  removes the branch indices of all the couplets (when the supertree is changed)
+  the couplet statistics are retained
+  """
+  def _ClearBranchArrayIdx(self):
+    self.Path_Offset = None
+    self.Path_Edge_Idx = numpy.zeros(0, dtype=numpy.int32)
+
   """
-  returns the average distance between current taxa pair
+  returns the branch indices of the supertree for all the couplets, in a compressed (CSR) format
+  branches between the couplet with index k are Branch_Idx[Offset[k]:Offset[k+1]]
+  """
+  def _GetBranchArrayIdxCSR(self):
+    if self.Path_Offset is None:
+      return numpy.zeros(self.no_of_couplets + 1, dtype=numpy.int64), self.Path_Edge_Idx
+    return self.Path_Offset, self.Path_Edge_Idx
+  
+  """
+  returns the average distance of a couplet
   with respect to all the supporting input trees
   this is the weighted average distance
   where weights of individual trees supporting this couplet are considered
   """
+  def _GetCoupletAvgDistMatVal(self, couplet_idx):
+    return self.Weighted_Dist_Sum[couplet_idx] / self.Weight_Sum[couplet_idx]
+  
+  """
+  returns the (weighted) average distance of all the couplets, as an array indexed by the couplet index
+  couplets not supported by any input tree get the value 0
+  """
   def _GetAvgDistMatVal(self):
-    num = 0
-    denom = 0
-    for i in range(len(self.DistMatValues)):
-      num = num + self.DistMatValues[i] * Matrix_Weight_Val[self.Supported_Tree_Idx_List[i]]
-      denom = denom + Matrix_Weight_Val[self.Supported_Tree_Idx_List[i]]
-    return (num * 1.0) / denom
-      
-  """ 
-  this function adds branch length distance information between a couplet
-  with respect to a particular input tree and their MRCA node with respect to that tree
-  """
-  def _Add_Edge_Distance(self, node1_dist_from_mrca_node, node2_dist_from_mrca_node):
-    self._AddDistMatValue(node1_dist_from_mrca_node + node2_dist_from_mrca_node)
-        
-    
\ No newline at end of file
+    AvgDistMatVal = numpy.zeros(self.no_of_couplets)
+    supp = (self.Weight_Sum > 0)
+    AvgDistMatVal[supp] = self.Weighted_Dist_Sum[supp] / self.Weight_Sum[supp]
+    return AvgDistMatVal
+
+##-----------------------------------------------------
+"""
+this class stores the (unweighted) supertree as flat arrays
+nodes are numbered in postorder (children before their parent, and the root is the last node)
+the edge above a node has the same index as the node; this index denotes the variable 
+(of the quadratic programming) corresponding to the length of that edge
+for individual nodes, the arrays contain:
+1) Parent: index of the parent node (-1 for the root)
+2) Depth: number of edges between the node and the root
+3) Subtree_Start: index of the first node of its subtree (the subtree of a node v consists of the nodes
+Subtree_Start[v], ..., v), so that the leaves under any node form a contiguous span
+4) Leaf_Taxa_Idx: taxon index of the leaf (-1 for the internal nodes, and for the taxa absent in the input trees)
+Taxon_Leaf_Node maps individual taxa indices to their leaf nodes (-1 if the taxon is not in the supertree)
+the dendropy edges are kept (in the same order) only to write the assigned lengths back to the tree
+"""
+class Supertree_Array(object):
+  def __init__(self, Inp_Tree, Couplet_Info):
+    Parent = []
+    Subtree_Start = []
+    Leaf_Taxa_Idx = []
+    self.Edge_List = []
+    # in postorder, the children of a node are the latest nodes whose parents are not yet known
+    Open_Node_Stack = []
+    for curr_node in Inp_Tree.postorder_node_iter():
+      node_idx = len(Parent)
+      Parent.append(-1)
+      self.Edge_List.append(curr_node.edge)
+      no_of_children = len(curr_node.child_nodes())
+      if (no_of_children == 0):
+	Subtree_Start.append(node_idx)
+	Leaf_Taxa_Idx.append(Couplet_Info.Taxa_Idx_Dict.get(curr_node.taxon.label, -1))
+      else:
+	child_idx_list = Open_Node_Stack[-no_of_children:]
+	del Open_Node_Stack[-no_of_children:]
+	for x in child_idx_list:
+	  Parent[x] = node_idx
+	Subtree_Start.append(Subtree_Start[child_idx_list[0]])
+	Leaf_Taxa_Idx.append(-1)
+      Open_Node_Stack.append(node_idx)
+    
+    # depth of the nodes, from the root (last node) downwards
+    Depth = [0] * len(Parent)
+    for node_idx in range(len(Parent) - 2, -1, -1):
+      Depth[node_idx] = Depth[Parent[node_idx]] + 1
+    
+    self.no_of_edges = len(Parent)
+    self.Parent = numpy.array(Parent, dtype=numpy.int64)
+    self.Depth = numpy.array(Depth, dtype=numpy.int64)
+    self.Subtree_Start = numpy.array(Subtree_Start, dtype=numpy.int64)
+    self.Leaf_Taxa_Idx = numpy.array(Leaf_Taxa_Idx, dtype=numpy.int64)
+    self.Is_Leaf = (self.Subtree_Start == numpy.arange(self.no_of_edges))
+    self.Taxon_Leaf_Node = numpy.zeros(Couplet_Info.no_of_taxa, dtype=numpy.int64) - 1
+    valid_leaf = numpy.nonzero(self.Leaf_Taxa_Idx >= 0)[0]
+    self.Taxon_Leaf_Node[self.Leaf_Taxa_Idx[valid_leaf]] = valid_leaf
+    # ancestors of individual nodes at the distances 1, 2, 4, ... (computed when required)
+    self.Ancestor_Table = None
+
+  """
+  returns the binary lifting table of the ancestors: the k th array contains the ancestors 
+  of individual nodes at the distance 2^k (the root is its own ancestor)
+  """
+  def _GetAncestorTable(self):
+    if self.Ancestor_Table is None:
+      Ancestor = numpy.where(self.Parent >= 0, self.Parent, numpy.arange(self.no_of_edges))
+      self.Ancestor_Table = [Ancestor]
+      max_depth = int(self.Depth.max()) if (self.no_of_edges > 0) else 0
+      while ((1 << len(self.Ancestor_Table)) <= max_depth):
+	Ancestor = Ancestor[Ancestor]
+	self.Ancestor_Table.append(Ancestor)
+    return self.Ancestor_Table
+
+  """
+  returns the lowest common ancestors (MRCA nodes) of two arrays of nodes (element wise)
+  the deeper node is first lifted to the depth of the other node, then both nodes are lifted
+  as long as their ancestors differ, using O(log(depth)) array operations
+  """
+  def _GetLCA(self, node1_arr, node2_arr):
+    Ancestor_Table = self._GetAncestorTable()
+    swap = (self.Depth[node1_arr] < self.Depth[node2_arr])
+    deep_node = numpy.where(swap, node2_arr, node1_arr)
+    other_node = numpy.where(swap, node1_arr, node2_arr)
+    depth_diff = self.Depth[deep_node] - self.Depth[other_node]
+    for k in range(len(Ancestor_Table)):
+      sel = numpy.nonzero((depth_diff >> k) & 1)[0]
+      deep_node[sel] = Ancestor_Table[k][deep_node[sel]]
+    for k in range(len(Ancestor_Table) - 1, -1, -1):
+      anc1 = Ancestor_Table[k][deep_node]
+      anc2 = Ancestor_Table[k][other_node]
+      differ = (anc1 != anc2)
+      deep_node = numpy.where(differ, anc1, deep_node)
+      other_node = numpy.where(differ, anc2, other_node)
+    return numpy.where(deep_node == other_node, deep_node, Ancestor_Table[0][deep_node])
+
+  """
+  returns 1) taxa indices of the leaves, in postorder (-1 if the taxon is not present in the input trees)
+  2) Span_Start, Span_End: leaf span of the nodes having a parent (that is, of the heads of the supertree edges)
+  3) Edge_Idx: indices of the edges from these nodes to their parents
+  """
+  def _GetEdgeSpans(self):
+    Leaf_Count = numpy.cumsum(self.Is_Leaf)
+    Span_Start = (Leaf_Count - self.Is_Leaf)[self.Subtree_Start]
+    Edge_Idx = numpy.nonzero(self.Parent >= 0)[0]
+    return self.Leaf_Taxa_Idx[self.Is_Leaf], Span_Start[Edge_Idx], Leaf_Count[Edge_Idx], Edge_Idx
+
+  """
+  assigns the edge lengths (indexed by the edge index) to the edges of the dendropy supertree
+  """
+  def _AssignEdgeLengths(self, edge_value_list):
+    for curr_edge, edge_len in zip(self.Edge_List, edge_value_list):
+      curr_edge.length = edge_len
+
+# file (in the output directory) containing the profile of the phases (--profile option)
+PROFILE_FILENAME = 'Profile.json'
+
+##-----------------------------------------------------
+"""
+this class records the wall clock time, the CPU time and the memory usage of the pipeline phases,
+and counters (such as the number of couplets and edges) of the branch length assignment
+a disabled recorder (the default of a state) records nothing
+the peak resident set size is maintained by the operating system for the complete process,
+so for a phase, both the peak at its end and the increase of the peak during it are reported
+CPU time of the worker processes (such as with the -j option) is reported separately, once the workers are finished
+"""
+class Phase_Recorder(object):
+  def __init__(self, enabled=True):
+    self.enabled = enabled
+    self.Phase_List = []
+    self.Counter_Dict = dict()
+    # phases which are started but not yet ended (phases may be nested)
+    self.Open_Phase_List = []
+    self.start_time = time.time()
+
+  """
+  returns the peak resident set size of this process (in KB), or None if it is not available
+  """
+  def _GetPeakRSS(self):
+    if resource is None:
+      return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == 'darwin'):
+      # reported in bytes
+      peak_rss = peak_rss // 1024
+    return peak_rss
+
+  """
+  returns the current resident set size of this process (in KB), or None if it is not available
+  """
+  def _GetCurrentRSS(self):
+    try:
+      fp = open('/proc/self/statm', 'r')
+      no_of_pages = int(fp.read().split()[1])
+      fp.close()
+    except (IOError, IndexError, ValueError):
+      return None
+    return no_of_pages * (os.sysconf('SC_PAGE_SIZE') // 1024)
+
+  """
+  returns the CPU time (user and system, in seconds) of this process and of its finished worker processes
+  """
+  def _GetCPUTime(self):
+    if resource is None:
+      return time.clock(), 0.0
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (self_usage.ru_utime + self_usage.ru_stime), (child_usage.ru_utime + child_usage.ru_stime)
+
+  def _Start(self, phase_name):
+    if (self.enabled == False):
+      return
+    cpu_time, child_cpu_time = self._GetCPUTime()
+    self.Open_Phase_List.append((phase_name, time.time(), cpu_time, child_cpu_time, self._GetPeakRSS()))
+
+  def _End(self):
+    if (self.enabled == False):
+      return
+    phase_name, start_wall, start_cpu, start_child_cpu, start_peak_rss = self.Open_Phase_List.pop()
+    cpu_time, child_cpu_time = self._GetCPUTime()
+    end_peak_rss = self._GetPeakRSS()
+    self.Phase_List.append({'phase': phase_name, \
+			    'depth': len(self.Open_Phase_List), \
+			    'wall_time_sec': time.time() - start_wall, \
+			    'cpu_time_sec': cpu_time - start_cpu, \
+			    'child_cpu_time_sec': child_cpu_time - start_child_cpu, \
+			    'peak_rss_kb': end_peak_rss, \
+			    'peak_rss_increase_kb': (None if end_peak_rss is None else end_peak_rss - start_peak_rss), \
+			    'rss_kb': self._GetCurrentRSS()})
+
+  """
+  sets the value of a counter (the last value is reported)
+  """
+  def _SetCounter(self, counter_name, value):
+    if (self.enabled == True):
+      self.Counter_Dict[counter_name] = value
+
+  """
+  returns the recorded phases and counters (and the other fields in Extra_Dict) as a dictionary
+  """
+  def _GetReport(self, Extra_Dict=None):
+    Report = {'phases': self.Phase_List, \
+	      'counters': self.Counter_Dict, \
+	      'total_wall_time_sec': time.time() - self.start_time, \
+	      'peak_rss_kb': self._GetPeakRSS()}
+    if Extra_Dict is not None:
+      Report.update(Extra_Dict)
+    return Report
+
+  """
+  writes the report (see _GetReport) in a JSON file
+  """
+  def _WriteReport(self, report_filename, Extra_Dict=None):
+    fp = open(report_filename, 'w')
+    fp.write(json.dumps(self._GetReport(Extra_Dict), indent=2, sort_keys=True) + '\n')
+    fp.close()
+
+##-----------------------------------------------------
+""" 
+this class contains the complete state of a branch length assignment 
+(input taxa, tree weights, couplet relations, and the edges of the supertree)
+the functions of this package operate on the state passed to them (by default, Default_State)
+so that independent branch length assignments can be carried out within a single process
+"""
+class CSTBL_State(object):
+  def __init__(self):
+    """ 
+    this list contains the complete set of taxa present in the input source trees 
+    """
+    self.COMPLETE_INPUT_TAXA_LIST = []
+    
+    # this structure stores the edges of the supertree (Supertree_Array)
+    # the index of an edge is used to denote the corresponding variable of the quadratic programming
+    # variables are stored as x[0], x[1], .....
+    self.Supertree_Info = None
+    
+    """ this variable associates weight of matrix corresponding to individual source trees """
+    self.Matrix_Weight_Val = []
+    
+    """ this list contains the number of taxa of individual source trees """
+    self.Tree_Taxa_Count = []
+    
+    """ 
+    this structure stores the relations of all the couplets (taxa pairs)
+    it is initialized once the complete set of input taxa is known
+    """
+    self.Couplet_Info = Couplet_Store()
+    
+    """ time and memory usage of the phases (disabled unless profiling is requested) """
+    self.Profiler = Phase_Recorder(False)
+    
+  """
+  clears the stored information (the containers are cleared in place)
+  """
+  def _Clear(self):
+    self.Couplet_Info._Clear()
+    self.Supertree_Info = None
+    self.COMPLETE_INPUT_TAXA_LIST[:] = []
+    self.Matrix_Weight_Val[:] = []
+    self.Tree_Taxa_Count[:] = []
+
+"""
+state used when no other state is specified
+the following module level names refer to its members
+"""
+Default_State = CSTBL_State()
+COMPLETE_INPUT_TAXA_LIST = Default_State.COMPLETE_INPUT_TAXA_LIST
+Matrix_Weight_Val = Default_State.Matrix_Weight_Val
+Tree_Taxa_Count = Default_State.Tree_Taxa_Count
+Couplet_Info = Default_State.Couplet_Info
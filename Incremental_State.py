@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+"""
+this file contains the incremental update of the couplet statistics, when source trees are added or removed
+the state of a branch length assignment is saved in a directory:
+1) the couplet statistics and the weights of the source trees (same binary format as the couplet statistics cache)
+2) the newick strings of the source trees (one tree per line, in the order of the tree indices)
+3) the taxa indices of individual source trees, the edge lengths of the last solve, and the key of its topology
+when a few source trees are added or removed, only the couplets of these trees are updated, and the weights
+of the other trees are recomputed only if they contain a couplet whose support count crossed 2
+(only such trees are read again from the saved newick strings)
+the branch lengths are then computed starting from the previous edge lengths of the same topology
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import Edge_Len_Adjust
+from Edge_Len_Adjust import *
+import Newick_Reader
+from Newick_Reader import Newick_Format_Error
+import Couplet_Cache
+import hashlib
+
+# names of the files of a saved state
+STATE_STATISTICS_FILENAME = 'Couplet_Statistics' + Couplet_Cache.CACHE_FILE_EXTENSION
+STATE_TREE_FILENAME = 'Source_Trees.tre'
+STATE_ARRAY_FILENAME = 'Incremental_State.npz'
+
+#----------------------------------------------------
+"""
+this function returns the key of a supertree topology (a hash of its newick string without the edge lengths)
+edge lengths of a previous solve are used as the initial values only for the same topology
+"""
+def Get_Topology_Key(Inp_Tree):
+  return hashlib.sha1(Inp_Tree.as_newick_string(suppress_edge_lengths=True)).hexdigest()
+
+#----------------------------------------------------
+"""
+this function returns the newick strings of the trees of a treelist file (one string per tree)
+newick files are split by the lightweight newick reader, which keeps the strings of the file;
+other files (such as NEXUS files) are read by dendropy, and the trees are written as newick strings
+"""
+def Get_Source_Tree_Strings(INPUT_FILENAME, INPUT_FILE_FORMAT, ROOTED_TREE, PRESERVE_UNDERSCORE):
+  if (INPUT_FILE_FORMAT == 'newick'):
+    fp = open(INPUT_FILENAME, 'r')
+    newick_text = fp.read()
+    fp.close()
+    try:
+      return Newick_Reader.Split_Newick_Tree_Strings(newick_text)
+    except Newick_Format_Error:
+      pass
+  return [curr_tree.as_newick_string() + ';' for curr_tree in \
+	  Stream_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME)]
+
+#----------------------------------------------------
+"""
+this function reads trees from their newick strings
+taxa labels of the state are assigned first, so that the labels of the trees are matched
+(case insensitively) with the existing taxa
+returns the list of trees (array based trees of the lightweight reader, or dendropy trees
+if the strings are not supported by that reader)
+"""
+def Parse_Tree_Strings(Tree_String_List, taxa_label_list, ROOTED_TREE, PRESERVE_UNDERSCORE):
+  if (len(Tree_String_List) == 0):
+    return []
+  newick_text = '\n'.join(Tree_String_List)
+  Label_Set = Newick_Reader.Newick_Label_Set()
+  for label in taxa_label_list:
+    Label_Set._GetLabelId(label)
+  try:
+    return list(Newick_Reader.Parse_Newick_Trees(newick_text, Label_Set, PRESERVE_UNDERSCORE))
+  except Newick_Format_Error:
+    pass
+  return dendropy.TreeList.get_from_string(newick_text, schema='newick', \
+					    taxon_set=dendropy.TaxonSet(taxa_label_list), \
+					    preserve_underscores=PRESERVE_UNDERSCORE, \
+					    default_as_rooted=ROOTED_TREE)
+
+#----------------------------------------------------
+"""
+this function returns the taxa indices of individual trees (in the order of infer_taxa())
+"""
+def Get_Tree_Taxa_Idx_List(Input_Treelist, State=Default_State):
+  return [numpy.array([State.Couplet_Info._GetTaxonIdx(label) for label in Get_Tree_Taxa_Labels(curr_tree)], \
+		      dtype=numpy.int32) for curr_tree in Input_Treelist]
+
+#----------------------------------------------------
+"""
+this function returns True if a state is saved in the directory
+"""
+def Has_Saved_State(state_dir):
+  for curr_filename in [STATE_STATISTICS_FILENAME, STATE_TREE_FILENAME, STATE_ARRAY_FILENAME]:
+    if (os.path.isfile(os.path.join(state_dir, curr_filename)) == False):
+      return False
+  return True
+
+#----------------------------------------------------
+"""
+this function saves the state of a branch length assignment in a directory
+parameters: Tree_String_List - newick strings of the source trees
+Tree_Taxa_Idx_List - taxa indices of the source trees
+Edge_Len - edge lengths of the last solve (indexed as in Supertree_Array), or None
+topology_key - key of the topology of these edge lengths (Get_Topology_Key)
+"""
+def Write_State(state_dir, Tree_String_List, Tree_Taxa_Idx_List, Edge_Len, topology_key, State=Default_State):
+  if (os.path.isdir(state_dir) == False):
+    os.makedirs(state_dir)
+  Tree_Taxa_Offset = numpy.zeros(len(Tree_Taxa_Idx_List) + 1, dtype=numpy.int64)
+  Tree_Taxa_Offset[1:] = numpy.cumsum([len(x) for x in Tree_Taxa_Idx_List])
+  if (len(Tree_Taxa_Idx_List) > 0):
+    Tree_Taxa_Idx = numpy.concatenate(Tree_Taxa_Idx_List).astype(numpy.int32)
+  else:
+    Tree_Taxa_Idx = numpy.zeros(0, dtype=numpy.int32)
+  if Edge_Len is None:
+    Edge_Len = []
+    topology_key = ''
+  fp = open(os.path.join(state_dir, STATE_ARRAY_FILENAME), 'wb')
+  numpy.savez(fp, Tree_Taxa_Offset=Tree_Taxa_Offset, Tree_Taxa_Idx=Tree_Taxa_Idx, \
+	      Edge_Len=numpy.array(Edge_Len, dtype=numpy.float64), Topology_Key=numpy.array(topology_key))
+  fp.close()
+
+  # newick strings are written one per line
+  fp = open(os.path.join(state_dir, STATE_TREE_FILENAME), 'w')
+  for tree_str in Tree_String_List:
+    fp.write(tree_str.replace('\r', ' ').replace('\n', ' ') + '\n')
+  fp.close()
+
+  Couplet_Cache.Write_Couplet_Statistics_File(os.path.join(state_dir, STATE_STATISTICS_FILENAME), State)
+
+#----------------------------------------------------
+"""
+this function loads a saved state: the couplet statistics and the weights of the source trees are loaded
+into the given state (as in Couplet_Cache.Read_Couplet_Statistics_File)
+returns the newick strings and the taxa indices of the source trees, the edge lengths of the last solve
+(None if not saved) and the key of its topology
+"""
+def Read_State(state_dir, State=Default_State):
+  no_of_trees = Couplet_Cache.Read_Couplet_Statistics_File(os.path.join(state_dir, STATE_STATISTICS_FILENAME), State)
+  fp = open(os.path.join(state_dir, STATE_TREE_FILENAME), 'r')
+  Tree_String_List = [line.strip() for line in fp if (line.strip() != '')]
+  fp.close()
+  State_Arrays = numpy.load(os.path.join(state_dir, STATE_ARRAY_FILENAME))
+  Tree_Taxa_Offset = State_Arrays['Tree_Taxa_Offset']
+  Tree_Taxa_Idx = State_Arrays['Tree_Taxa_Idx']
+  Edge_Len = State_Arrays['Edge_Len'].tolist()
+  topology_key = str(State_Arrays['Topology_Key'])
+  State_Arrays.close()
+  if (len(Tree_String_List) != no_of_trees) or (len(Tree_Taxa_Offset) != no_of_trees + 1):
+    raise ValueError('inconsistent saved state: ' + state_dir)
+  Tree_Taxa_Idx_List = [Tree_Taxa_Idx[Tree_Taxa_Offset[tr]:Tree_Taxa_Offset[tr+1]] for tr in range(no_of_trees)]
+  if (len(Edge_Len) == 0):
+    Edge_Len = None
+  return Tree_String_List, Tree_Taxa_Idx_List, Edge_Len, topology_key
+
+#----------------------------------------------------
+"""
+this function returns the couplet indices and the taxa indices (i, j) of all the couplets of the given trees
+"""
+def Get_Tree_Set_Couplets(Tree_Taxa_Idx_List, State=Default_State):
+  couplet_idx_list = [numpy.zeros(0, dtype=numpy.int64)]
+  taxa1_idx_list = [numpy.zeros(0, dtype=numpy.int64)]
+  taxa2_idx_list = [numpy.zeros(0, dtype=numpy.int64)]
+  for taxa_idx_arr in Tree_Taxa_Idx_List:
+    taxa_idx_arr = numpy.asarray(taxa_idx_arr, dtype=numpy.int64)
+    i, j = numpy.triu_indices(len(taxa_idx_arr), 1)
+    couplet_idx_list.append(State.Couplet_Info._GetCoupletIdxArr(taxa_idx_arr[i], taxa_idx_arr[j]))
+    taxa1_idx_list.append(taxa_idx_arr[i])
+    taxa2_idx_list.append(taxa_idx_arr[j])
+  return numpy.concatenate(couplet_idx_list), numpy.concatenate(taxa1_idx_list), numpy.concatenate(taxa2_idx_list)
+
+#----------------------------------------------------
+"""
+this function updates the couplet statistics and the tree weights of a state, when source trees are
+added or removed; the result is same as deriving the statistics again from the updated set of source trees
+(except the order of the taxa indices, since the new taxa are placed after the existing ones,
+and the taxa of the removed trees are retained, possibly without any support)
+parameters: Tree_String_List, Tree_Taxa_Idx_List - newick strings and taxa indices of the current source trees
+Add_Tree_String_List - newick strings of the trees to be added
+Remove_Idx_List - indices of the trees to be removed
+returns the newick strings and the taxa indices of the updated source trees (the remaining trees in their
+order, followed by the added trees), and the number of remaining trees whose weights are changed
+"""
+def Update_Couplet_Statistics(Tree_String_List, Tree_Taxa_Idx_List, Add_Tree_String_List, Remove_Idx_List, \
+			      ROOTED_TREE, PRESERVE_UNDERSCORE, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Matrix_Weight_Val = State.Matrix_Weight_Val
+  Remove_Idx_List = sorted(set(Remove_Idx_List))
+  Remove_Tree_Set = set(Remove_Idx_List)
+
+  # taxa of the added trees which are not yet indexed are placed after the existing taxa
+  Add_Treelist = Parse_Tree_Strings(Add_Tree_String_List, Couplet_Info.Taxa_Label_List, ROOTED_TREE, PRESERVE_UNDERSCORE)
+  Add_Label_List = []
+  for curr_tree in Add_Treelist:
+    Add_Label_List.extend(Get_Tree_Taxa_Labels(curr_tree))
+  State.COMPLETE_INPUT_TAXA_LIST.extend(Couplet_Info._AddTaxa(Add_Label_List))
+  Add_Taxa_Idx_List = Get_Tree_Taxa_Idx_List(Add_Treelist, State)
+
+  """
+  support counts change only for the couplets of the removed and the added trees
+  among them, the couplets whose support count crossed 2 may change the weights of the other trees
+  """
+  Update_Couplet_Idx, Update_Taxa1_Idx, Update_Taxa2_Idx = \
+    Get_Tree_Set_Couplets([Tree_Taxa_Idx_List[tr] for tr in Remove_Idx_List] + Add_Taxa_Idx_List, State)
+  Prev_Multi_Support = (Couplet_Info.Support_Count[Update_Couplet_Idx] >= 2)
+  for tr in Remove_Idx_List:
+    Couplet_Info._RemoveTreeTaxaSupport(Tree_Taxa_Idx_List[tr])
+  for taxa_idx_arr in Add_Taxa_Idx_List:
+    Couplet_Info._AddTreeTaxaSupport(taxa_idx_arr)
+  changed_mask = ((Couplet_Info.Support_Count[Update_Couplet_Idx] >= 2) != Prev_Multi_Support)
+  Changed_Taxa = numpy.zeros(Couplet_Info.no_of_taxa, dtype=bool)
+  Changed_Taxa[Update_Taxa1_Idx[changed_mask]] = True
+  Changed_Taxa[Update_Taxa2_Idx[changed_mask]] = True
+  del Prev_Multi_Support, changed_mask, Update_Taxa1_Idx, Update_Taxa2_Idx
+
+  # couplet distances of the removed trees are subtracted, with the weights they were added with
+  Remove_Treelist = Parse_Tree_Strings([Tree_String_List[tr] for tr in Remove_Idx_List], \
+				      Couplet_Info.Taxa_Label_List, ROOTED_TREE, PRESERVE_UNDERSCORE)
+  for k in range(len(Remove_Idx_List)):
+    couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Remove_Treelist[k], State)
+    Couplet_Info._RemoveTreeCouplets(Matrix_Weight_Val[Remove_Idx_List[k]], couplet_idx_arr, dist_arr)
+  del Remove_Treelist
+
+  """
+  weight of a remaining tree can change only if it contains (at least two taxa of) a changed couplet
+  only the trees whose weights are changed are read again, and their couplet distances
+  are added with the difference of their new and previous weights
+  """
+  Reweight_Tree_List = []
+  for tr in range(len(Tree_Taxa_Idx_List)):
+    if (tr in Remove_Tree_Set) or (numpy.count_nonzero(Changed_Taxa[Tree_Taxa_Idx_List[tr]]) < 2):
+      continue
+    curr_tree_weight = Compute_Tree_Weight(Tree_Taxa_Idx_List[tr], State)
+    if (curr_tree_weight != Matrix_Weight_Val[tr]):
+      Reweight_Tree_List.append((tr, curr_tree_weight))
+  Reweight_Treelist = Parse_Tree_Strings([Tree_String_List[x[0]] for x in Reweight_Tree_List], \
+					Couplet_Info.Taxa_Label_List, ROOTED_TREE, PRESERVE_UNDERSCORE)
+  for k in range(len(Reweight_Tree_List)):
+    tr, curr_tree_weight = Reweight_Tree_List[k]
+    couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Reweight_Treelist[k], State)
+    Couplet_Info._AddTreeCouplets(tr, curr_tree_weight - Matrix_Weight_Val[tr], couplet_idx_arr, dist_arr)
+    Matrix_Weight_Val[tr] = curr_tree_weight
+  del Reweight_Treelist
+
+  # removed trees are discarded (the lists of the state are updated in place), and the added trees are appended
+  Keep_Tree_Idx = [tr for tr in range(len(Tree_String_List)) if tr not in Remove_Tree_Set]
+  Matrix_Weight_Val[:] = [Matrix_Weight_Val[tr] for tr in Keep_Tree_Idx]
+  State.Tree_Taxa_Count[:] = [State.Tree_Taxa_Count[tr] for tr in Keep_Tree_Idx]
+  Tree_String_List = [Tree_String_List[tr] for tr in Keep_Tree_Idx]
+  Tree_Taxa_Idx_List = [Tree_Taxa_Idx_List[tr] for tr in Keep_Tree_Idx]
+  for k in range(len(Add_Treelist)):
+    curr_tree_weight = Compute_Tree_Weight(Add_Taxa_Idx_List[k], State)
+    couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Add_Treelist[k], State)
+    Couplet_Info._AddTreeCouplets(len(Matrix_Weight_Val), curr_tree_weight, couplet_idx_arr, dist_arr)
+    Matrix_Weight_Val.append(curr_tree_weight)
+    State.Tree_Taxa_Count.append(len(Add_Taxa_Idx_List[k]))
+  Tree_String_List.extend(Add_Tree_String_List)
+  Tree_Taxa_Idx_List.extend(Add_Taxa_Idx_List)
+
+  # couplets without any remaining support get exactly zero sums (instead of the rounding residue)
+  unsupp_couplet_idx = Update_Couplet_Idx[Couplet_Info.Support_Count[Update_Couplet_Idx] == 0]
+  Couplet_Info.Weighted_Dist_Sum[unsupp_couplet_idx] = 0
+  Couplet_Info.Weight_Sum[unsupp_couplet_idx] = 0
+
+  return Tree_String_List, Tree_Taxa_Idx_List, len(Reweight_Tree_List)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+"""
+this file contains a lightweight reader of newick treelists, which does not use dendropy
+individual trees are stored as flat arrays (parent index, branch length and leaf label id of the nodes)
+since the couplet statistics only need the topology, the branch lengths and the leaf labels
+of the input trees, building dendropy objects (nodes, edges, taxa) for every input tree is avoided
+
+the reader follows the interpretation of the newick strings by dendropy (such as the case insensitive
+matching of taxa labels, and the replacement of underscores), so that the trees are equivalent
+inputs which are not supported (such as the NEXUS format, comments within labels, missing or repeated
+leaf labels, or non numeric branch lengths) raise Newick_Format_Error, and should be read by dendropy
+"""
+
+import Header
+from Header import *
+import re
+
+# newick tokens: 1) parenthesis, comma or semicolon 2) branch length (following a colon)
+# 3) quoted label 4) unquoted label 5) start of a comment
+# unquoted labels (and branch lengths) are delimited by the whitespace and the punctuation characters of dendropy
+NEWICK_WHITESPACE = ' \t\r\n\0'
+NEWICK_TOKEN_RE = re.compile(r"""[ \t\r\n\0]*(?:([(),;])|:[ \t\r\n\0]*([^ \t\r\n\0()\[\]{}\\/,;:=*'"`<>]+)"""
+			     r"""|'((?:[^']|'')*)'|([^ \t\r\n\0()\[\]{}\\/,;:=*'"`+<>]+)|(\[))""")
+
+##-----------------------------------------------------
+"""
+this exception denotes a newick string which is not supported by the lightweight reader
+"""
+class Newick_Format_Error(Exception):
+  pass
+
+##-----------------------------------------------------
+"""
+this class stores the taxa labels of a treelist, and assigns them integer ids
+labels differing only in case denote the same taxon (as in dendropy), whose label is the first occurrence
+"""
+class Newick_Label_Set(object):
+  def __init__(self):
+    self.Label_List = []
+    self.Label_Id_Dict = dict()
+
+  """
+  returns the id of a label, adding it if required
+  """
+  def _GetLabelId(self, label):
+    key = label.lower()
+    label_id = self.Label_Id_Dict.get(key)
+    if label_id is None:
+      label_id = len(self.Label_List)
+      self.Label_Id_Dict[key] = label_id
+      self.Label_List.append(label)
+    return label_id
+
+##-----------------------------------------------------
+"""
+this class defines a tree by flat arrays, with the nodes numbered in postorder (children before their parent)
+the children of a node are numbered in the order of the newick string, and the root is the last node
+for individual nodes, the arrays contain:
+1) Parent: index of the parent node (-1 for the root)
+2) Edge_Len: length of the edge to the parent node (nan if the length is not specified)
+3) Leaf_Label_Id: id of the leaf label (-1 for the internal nodes), in the label set of the treelist
+4) Subtree_Start: index of the first node of the subtree (the subtree of a node v consists of the nodes
+Subtree_Start[v], ..., v, and the node Subtree_Start[v] is its leftmost leaf)
+"""
+class Newick_Array_Tree(object):
+  def __init__(self, Parent, Edge_Len, Leaf_Label_Id, Subtree_Start, Label_Set):
+    self.Parent = numpy.array(Parent, dtype=numpy.int64)
+    self.Edge_Len = numpy.array(Edge_Len, dtype=numpy.float64)
+    self.Leaf_Label_Id = numpy.array(Leaf_Label_Id, dtype=numpy.int64)
+    self.Subtree_Start = numpy.array(Subtree_Start, dtype=numpy.int64)
+    self.Label_Set = Label_Set
+
+  """
+  returns the number of nodes
+  """
+  def _GetNodeCount(self):
+    return len(self.Parent)
+
+  """
+  returns the indices of the leaf nodes (in postorder)
+  """
+  def _GetLeafNodes(self):
+    return numpy.nonzero(self.Leaf_Label_Id >= 0)[0]
+
+  """
+  returns the taxa labels of the leaves, in postorder (same as infer_taxa() of the dendropy tree)
+  """
+  def _GetTaxaLabels(self):
+    return [self.Label_Set.Label_List[x] for x in self.Leaf_Label_Id[self.Leaf_Label_Id >= 0]]
+
+##-----------------------------------------------------
+"""
+this function returns the position after a (possibly nested) comment, starting at the given position
+"""
+def Skip_Newick_Comment(newick_text, pos):
+  depth = 0
+  while (pos < len(newick_text)):
+    if (newick_text[pos] == '['):
+      depth = depth + 1
+    elif (newick_text[pos] == ']'):
+      depth = depth - 1
+      if (depth == 0):
+	return pos + 1
+    pos = pos + 1
+  raise Newick_Format_Error('unterminated comment')
+
+##-----------------------------------------------------
+"""
+this function parses newick trees from a string
+parameters: newick_text - newick string containing one or more trees (each terminated by a semicolon)
+Label_Set - label set shared by the trees of the treelist
+PRESERVE_UNDERSCORE - if False, underscores of the unquoted labels are replaced by spaces (as in dendropy)
+yields individual trees (Newick_Array_Tree)
+"""
+def Parse_Newick_Trees(newick_text, Label_Set, PRESERVE_UNDERSCORE=True):
+  pos = 0
+  while True:
+    Parent = []
+    Edge_Len = []
+    Leaf_Label_Id = []
+    Subtree_Start = []
+    # child lists of the open (not yet closed) internal nodes, and the index of their first descendant
+    Open_Node_Stack = []
+    Open_Node_Start = []
+    # label ids of the leaves of the current tree
+    tree_label_id_set = set()
+    # last completed node (-1 at the start of a new node), and whether its label and length are read
+    last_node = -1
+    last_node_label = False
+    last_node_length = False
+    root_node = -1
+
+    while True:
+      m = NEWICK_TOKEN_RE.match(newick_text, pos)
+      if m is None:
+	if (newick_text[pos:].strip(NEWICK_WHITESPACE) != ''):
+	  raise Newick_Format_Error('unsupported character at position ' + str(pos))
+	if (len(Parent) > 0) or (len(Open_Node_Stack) > 0):
+	  raise Newick_Format_Error('tree is not terminated by a semicolon')
+	return
+      pos = m.end()
+      punct, length_str, quoted_label, label, comment = m.groups()
+
+      if comment is not None:
+	pos = Skip_Newick_Comment(newick_text, pos - 1)
+	continue
+
+      if length_str is not None:
+	if (last_node < 0) or (last_node_length == True):
+	  raise Newick_Format_Error('branch length without a node')
+	try:
+	  Edge_Len[last_node] = float(length_str)
+	except ValueError:
+	  raise Newick_Format_Error('non numeric branch length ' + length_str)
+	last_node_length = True
+	continue
+
+      if (quoted_label is not None) or (label is not None):
+	if quoted_label is not None:
+	  label = quoted_label.replace("''", "'")
+	elif (PRESERVE_UNDERSCORE == False):
+	  label = label.replace('_', ' ')
+	if (label == '') or (last_node_label == True) or (last_node_length == True):
+	  raise Newick_Format_Error('misplaced label ' + label)
+	if (last_node >= 0):
+	  # label of an internal node, which is not a taxon
+	  last_node_label = True
+	  continue
+	if (root_node >= 0):
+	  raise Newick_Format_Error('misplaced label ' + label)
+	label_id = Label_Set._GetLabelId(label)
+	if label_id in tree_label_id_set:
+	  raise Newick_Format_Error('taxon ' + label + ' occurs multiple times in a tree')
+	tree_label_id_set.add(label_id)
+	last_node = len(Parent)
+	Parent.append(-1)
+	Edge_Len.append(numpy.nan)
+	Leaf_Label_Id.append(label_id)
+	Subtree_Start.append(last_node)
+	last_node_label = True
+	if (len(Open_Node_Stack) > 0):
+	  Open_Node_Stack[-1].append(last_node)
+	else:
+	  root_node = last_node
+	continue
+
+      if (punct == '('):
+	if (last_node >= 0) or (root_node >= 0):
+	  raise Newick_Format_Error('misplaced opening parenthesis')
+	Open_Node_Stack.append([])
+	Open_Node_Start.append(len(Parent))
+      elif (punct == ','):
+	if (last_node < 0) or (len(Open_Node_Stack) == 0):
+	  raise Newick_Format_Error('missing node before a comma')
+	last_node = -1
+	last_node_label = False
+	last_node_length = False
+      elif (punct == ')'):
+	if (last_node < 0) or (len(Open_Node_Stack) == 0):
+	  raise Newick_Format_Error('missing node before a closing parenthesis')
+	last_node = len(Parent)
+	for child_idx in Open_Node_Stack.pop():
+	  Parent[child_idx] = last_node
+	Parent.append(-1)
+	Edge_Len.append(numpy.nan)
+	Leaf_Label_Id.append(-1)
+	Subtree_Start.append(Open_Node_Start.pop())
+	last_node_label = False
+	last_node_length = False
+	if (len(Open_Node_Stack) > 0):
+	  Open_Node_Stack[-1].append(last_node)
+	else:
+	  root_node = last_node
+      else:
+	# semicolon: end of the current tree
+	if (root_node < 0) or (len(Open_Node_Stack) > 0):
+	  raise Newick_Format_Error('incomplete tree before a semicolon')
+	yield Newick_Array_Tree(Parent, Edge_Len, Leaf_Label_Id, Subtree_Start, Label_Set)
+	break
+
+##-----------------------------------------------------
+"""
+this function reads a newick treelist file
+parameters: INPUT_FILENAME - file containing the trees
+PRESERVE_UNDERSCORE - whether the underscores of the taxa labels are preserved
+returns the list of trees (Newick_Array_Tree), sharing one label set
+raises Newick_Format_Error if the file cannot be read by the lightweight reader
+"""
+def Read_Newick_Array_Treelist(INPUT_FILENAME, PRESERVE_UNDERSCORE=True):
+  fp = open(INPUT_FILENAME, 'r')
+  newick_text = fp.read()
+  fp.close()
+  if newick_text.lstrip(NEWICK_WHITESPACE)[:6].upper() == '#NEXUS':
+    raise Newick_Format_Error('NEXUS file')
+  Label_Set = Newick_Label_Set()
+  return list(Parse_Newick_Trees(newick_text, Label_Set, PRESERVE_UNDERSCORE))
+
+##-----------------------------------------------------
+"""
+this function splits a newick string into the strings of individual trees (each terminated by a semicolon)
+comments before a tree (such as the rooting comment [&R]) are kept within the string of that tree
+raises Newick_Format_Error if the text cannot be split by the lightweight reader
+"""
+def Split_Newick_Tree_Strings(newick_text):
+  if newick_text.lstrip(NEWICK_WHITESPACE)[:6].upper() == '#NEXUS':
+    raise Newick_Format_Error('NEXUS file')
+  Tree_String_List = []
+  pos = 0
+  tree_start = -1
+  while True:
+    m = NEWICK_TOKEN_RE.match(newick_text, pos)
+    if m is None:
+      if (newick_text[pos:].strip(NEWICK_WHITESPACE) != ''):
+	raise Newick_Format_Error('unsupported character at position ' + str(pos))
+      if (tree_start >= 0):
+	raise Newick_Format_Error('tree is not terminated by a semicolon')
+      return Tree_String_List
+    if (tree_start < 0):
+      tree_start = pos
+    pos = m.end()
+    if m.group(5) is not None:
+      pos = Skip_Newick_Comment(newick_text, pos - 1)
+    elif (m.group(1) == ';'):
+      Tree_String_List.append(newick_text[tree_start:pos].strip(NEWICK_WHITESPACE))
+      tree_start = -1
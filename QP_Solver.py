@@ -0,0 +1,865 @@
+#!/usr/bin/env python
+
+"""
+this file contains the in-process solver for the branch length assignment
+the couplet by edge path matrix (with respect to the output supertree) is built as a sparse matrix
+and the non-negative least squares problem is solved without any external executable
+"""
+
+import Header
+from Header import *
+import json
+
+"""
+scipy is needed only for the in-process solver
+the external GNU_BFGS2 executable can still be used if scipy is not installed
+"""
+try:
+  import scipy.sparse
+  from scipy.optimize import lsq_linear
+  from scipy.linalg import solve_triangular
+  SCIPY_AVAILABLE = True
+except ImportError:
+  SCIPY_AVAILABLE = False
+
+# tolerance and maximum number of iterations of the sparse least squares solver
+LSQ_SOLVER_TOL = 1e-12
+LSQ_SOLVER_MAX_ITER = 100000
+# maximum number of edges for which the non-negative sparse problem is solved from the (dense) normal equations
+NNLS_FALLBACK_MAX_EDGES = 4000
+
+# ridge term of the active set solver, relative to the largest diagonal entry of A^T A
+NNLS_RIDGE_TOL = 1e-10
+# relative tolerance below which a column of A^T A is taken as linearly dependent on the passive set
+NNLS_DEPENDENCE_TOL = 1e-12
+# number of edges added together to the Cholesky factor of the passive set (such as the initial passive set)
+NNLS_FACTOR_BLOCK_SIZE = 256
+
+# name of the solver log (JSON lines), placed in the output directory
+SOLVER_LOG_FILENAME = 'Solver_Log.jsonl'
+
+#----------------------------------------------------
+"""
+this class contains the iteration and tolerance budgets of the in-process solvers, and notes their convergence
+if write_log is True, the records are written (one JSON object per line) in the solver log file:
+1) a 'start' record for every solver run (solver name, initial edge lengths, number of edges and couplets)
+2) an 'iteration' record for every iteration (iteration count, objective value, gradient norm, elapsed time),
+if the solver reports its iterations (the external executable does not)
+3) an 'end' record (number of iterations, final objective value and gradient norm, elapsed time, convergence)
+the objective value is the least square error, and the gradient norm is the norm of its (projected) gradient
+the 'end' records are also kept in Summary_List
+parameters: max_iter - maximum number of iterations (None for the default of individual solvers)
+tol - relative tolerance of the convergence tests (None for LSQ_SOLVER_TOL)
+"""
+class Solver_Telemetry(object):
+  def __init__(self, write_log=False, max_iter=None, tol=None):
+    self.write_log = write_log
+    self.max_iter = max_iter
+    self.tol = tol
+    self.fp = None
+    self.solver_name = ''
+    self.start_time = time.time()
+    self.Summary_List = []
+
+  """
+  returns the iteration budget (default_max_iter if it is not specified) and the tolerance
+  """
+  def _GetBudget(self, default_max_iter):
+    max_iter = default_max_iter if (self.max_iter is None) else self.max_iter
+    tol = LSQ_SOLVER_TOL if (self.tol is None) else self.tol
+    return max_iter, tol
+
+  """
+  opens the log file (if write_log is set) for the solves of one supertree; previous records are discarded
+  """
+  def _OpenLog(self, log_filename):
+    self._CloseLog()
+    self.Summary_List = []
+    if (self.write_log == True):
+      self.fp = open(log_filename, 'w')
+
+  def _CloseLog(self):
+    if self.fp is not None:
+      self.fp.close()
+      self.fp = None
+
+  def _WriteRecord(self, record):
+    if self.fp is not None:
+      self.fp.write(json.dumps(record, sort_keys=True) + '\n')
+
+  """
+  notes the start of a solver run
+  """
+  def _Start(self, solver_name, init_name, no_of_edges, no_of_couplets=None):
+    self.solver_name = solver_name
+    self.start_time = time.time()
+    self._WriteRecord({'event': 'start', 'solver': solver_name, 'init': init_name, \
+			'no_of_edges': no_of_edges, 'no_of_couplets': no_of_couplets})
+
+  """
+  notes an iteration of the current solver run
+  """
+  def _LogIteration(self, iteration, objective, gradient_norm):
+    self._WriteRecord({'event': 'iteration', 'solver': self.solver_name, 'iteration': iteration, \
+			'objective': float(objective), 'gradient_norm': float(gradient_norm), \
+			'time': time.time() - self.start_time})
+
+  """
+  notes the end of the current solver run
+  parameters: converged - False if the solver stopped because of the iteration budget
+  gradient_norm - None if it is not reported by the solver
+  """
+  def _End(self, no_of_iter, objective, gradient_norm, converged, message=''):
+    record = {'event': 'end', 'solver': self.solver_name, 'iterations': no_of_iter, \
+	      'objective': float(objective), 'gradient_norm': (None if gradient_norm is None else float(gradient_norm)), \
+	      'time': time.time() - self.start_time, 'converged': bool(converged), 'message': message}
+    self.Summary_List.append(record)
+    self._WriteRecord(record)
+
+#----------------------------------------------------
+"""
+this function returns the indices of the couplets forming the rows of the least squares system:
+the couplets supported by the input trees whose both taxa are in the supertree (in increasing couplet index)
+a couplet with a taxon missing from the supertree has no path (and no branch information), so its distance
+can not be fitted by any edge length; such couplets are excluded, as in Build_Normal_Equations, so that
+every solver reports the same least square error
+"""
+def Get_Path_Couplet_Idx(State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Offset = Couplet_Info._GetBranchArrayIdxCSR()[0]
+  supp_couplet_idx = Couplet_Info._GetSupportedCoupletIdx()
+  return supp_couplet_idx[Offset[supp_couplet_idx + 1] > Offset[supp_couplet_idx]]
+
+#----------------------------------------------------
+"""
+this function returns the least squares system of the branch length assignment, in compressed (CSR) format
+rows correspond to the couplets of Get_Path_Couplet_Idx (in increasing couplet index)
+columns correspond to the edges of the supertree (indexed as in Supertree_Array)
+an entry of the matrix is 1 if the edge is between the couplet
+returns the row pointers and the column (edge) indices of the couplet by edge matrix, 
+and the vector of weighted average couplet distances
+"""
+def Get_Couplet_Edge_CSR(State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Offset, Branch_Idx = Couplet_Info._GetBranchArrayIdxCSR()
+  path_couplet_idx = Get_Path_Couplet_Idx(State)
+  """
+  couplets which are not rows of the matrix do not have any branch information
+  so the offsets of the row couplets directly form the row pointers of the matrix
+  """
+  row_ptr = numpy.append(Offset[path_couplet_idx], Offset[-1])
+  AvgDistMatVal = Couplet_Info._GetAvgDistMatVal()[path_couplet_idx]
+  return row_ptr, Branch_Idx, AvgDistMatVal
+
+#----------------------------------------------------
+"""
+this function returns the sparse (CSR) path matrix: row k has the entries 1 at the edges col_idx[row_ptr[k]:row_ptr[k+1]]
+"""
+def Get_Path_Matrix(row_ptr, col_idx, no_of_edges):
+  return scipy.sparse.csr_matrix((numpy.ones(len(col_idx)), col_idx, row_ptr), shape=(len(row_ptr) - 1, no_of_edges))
+
+#----------------------------------------------------
+"""
+this function builds the least squares system of the branch length assignment
+returns the sparse (CSR) couplet by edge matrix and the vector of weighted average couplet distances
+parameter: no_of_edges - number of edges of the supertree
+"""
+def Build_Couplet_Edge_Matrix(no_of_edges, State=Default_State):
+  row_ptr, col_idx, AvgDistMatVal = Get_Couplet_Edge_CSR(State)
+  return Get_Path_Matrix(row_ptr, col_idx, no_of_edges), AvgDistMatVal
+
+#----------------------------------------------------
+"""
+this function returns the least square error of a set of edge lengths
+that is, the sum of squared differences between the couplet distances in the supertree
+and the weighted average couplet distances of the input trees
+"""
+def Compute_LSQ_Error(Path_Matrix, AvgDistMatVal, edge_value_arr):
+  residual = Path_Matrix.dot(edge_value_arr) - AvgDistMatVal
+  return float(numpy.dot(residual, residual))
+
+#----------------------------------------------------
+"""
+this function returns the least square error of a set of edge lengths (such as the output of
+the external QP executable), using the branches between the couplets (numpy arrays only)
+parameter: edge_value_arr - edge lengths, indexed as in Supertree_Array
+"""
+def Compute_Couplet_Path_LSQ_Error(edge_value_arr, State=Default_State):
+  row_ptr, col_idx, AvgDistMatVal = Get_Couplet_Edge_CSR(State)
+  row_idx = numpy.repeat(numpy.arange(len(AvgDistMatVal)), numpy.diff(row_ptr))
+  path_len = numpy.bincount(row_idx, weights=numpy.asarray(edge_value_arr)[col_idx], minlength=len(AvgDistMatVal))
+  residual = path_len - AvgDistMatVal
+  return float(numpy.dot(residual, residual))
+
+#----------------------------------------------------
+"""
+this function returns the Givens rotation (c, s, r) such that [c s; -s c] [a; b] = [r; 0] (r non-negative)
+"""
+def Sym_Ortho(a, b):
+  if (b == 0):
+    return numpy.sign(a), 0, abs(a)
+  elif (a == 0):
+    return 0, numpy.sign(b), abs(b)
+  elif (abs(b) > abs(a)):
+    tau = a / b
+    s = numpy.sign(b) / math.sqrt(1 + tau * tau)
+    c = s * tau
+    r = b / s
+  else:
+    tau = b / a
+    c = numpy.sign(a) / math.sqrt(1 + tau * tau)
+    s = c * tau
+    r = a / c
+  return c, s, r
+
+#----------------------------------------------------
+"""
+this function solves the (unconstrained) sparse least squares problem min ||Ax - b|| by LSMR 
+(D. C.-L. Fong and M. A. Saunders, "LSMR: an iterative algorithm for sparse least-squares problems", 2011),
+with the same iterations and stopping tests as scipy.sparse.linalg.lsmr (without damping, conlim 1e8), 
+so that the residual norm ||r|| and the gradient norm ||A^T r|| estimated by the recurrences 
+of every iteration are logged ('iteration' records of Telemetry, with the objective ||r||^2)
+parameters: atol, btol - tolerances of the stopping tests, maxiter - maximum number of iterations
+x0 - initial solution (None for zero)
+returns the solution, the stopping reason (istop of scipy lsmr: 7 if the iteration budget is exhausted),
+the number of iterations, ||r|| and ||A^T r||
+"""
+def Solve_LSMR(A, b, atol, btol, maxiter, x0=None, Telemetry=None, conlim=1e8):
+  no_of_cols = A.shape[1]
+  u = b
+  normb = numpy.linalg.norm(b)
+  if x0 is None:
+    x = numpy.zeros(no_of_cols)
+    beta = normb.copy()
+  else:
+    x = numpy.atleast_1d(x0)
+    u = u - A.dot(x)
+    beta = numpy.linalg.norm(u)
+  if (beta > 0):
+    u = (1 / beta) * u
+    v = A.T.dot(u)
+    alpha = numpy.linalg.norm(v)
+  else:
+    v = numpy.zeros(no_of_cols)
+    alpha = 0
+  if (alpha > 0):
+    v = (1 / alpha) * v
+
+  # variables of the bidiagonalization, of the QR factorizations and of the estimates of the norms
+  itn = 0
+  zetabar = alpha * beta
+  alphabar = alpha
+  rho = 1
+  rhobar = 1
+  cbar = 1
+  sbar = 0
+  h = v.copy()
+  hbar = numpy.zeros(no_of_cols)
+  betadd = beta
+  betad = 0
+  rhodold = 1
+  tautildeold = 0
+  thetatilde = 0
+  zeta = 0
+  d = 0
+  normA2 = alpha * alpha
+  maxrbar = 0
+  minrbar = 1e+100
+  istop = 0
+  ctol = (1.0 / conlim) if (conlim > 0) else 0
+  normr = beta
+  normar = alpha * beta
+  if (normar == 0):
+    return x, istop, itn, normr, normar
+
+  while (itn < maxiter):
+    itn = itn + 1
+    # next step of the bidiagonalization
+    u = A.dot(v) - alpha * u
+    beta = numpy.linalg.norm(u)
+    if (beta > 0):
+      u = (1 / beta) * u
+      v = A.T.dot(u) - beta * v
+      alpha = numpy.linalg.norm(v)
+      if (alpha > 0):
+	v = (1 / alpha) * v
+    
+    # rotations of the (lower bidiagonal) matrix to upper bidiagonal, and to upper triangular
+    chat, shat, alphahat = Sym_Ortho(alphabar, 0)
+    rhoold = rho
+    c, s, rho = Sym_Ortho(alphahat, beta)
+    thetanew = s * alpha
+    alphabar = c * alpha
+    rhobarold = rhobar
+    zetaold = zeta
+    thetabar = sbar * rho
+    rhotemp = cbar * rho
+    cbar, sbar, rhobar = Sym_Ortho(cbar * rho, thetanew)
+    zeta = cbar * zetabar
+    zetabar = - sbar * zetabar
+    
+    # update of the solution
+    hbar = h - (thetabar * rho / (rhoold * rhobarold)) * hbar
+    x = x + (zeta / (rho * rhobar)) * hbar
+    h = v - (thetanew / rho) * h
+    
+    # estimate of ||r||
+    betaacute = chat * betadd
+    betacheck = -shat * betadd
+    betahat = c * betaacute
+    betadd = -s * betaacute
+    thetatildeold = thetatilde
+    ctildeold, stildeold, rhotildeold = Sym_Ortho(rhodold, thetabar)
+    thetatilde = stildeold * rhobar
+    rhodold = ctildeold * rhobar
+    betad = - stildeold * betad + ctildeold * betahat
+    tautildeold = (zetaold - thetatildeold * tautildeold) / rhotildeold
+    taud = (zeta - thetatilde * tautildeold) / rhodold
+    d = d + betacheck * betacheck
+    normr = math.sqrt(d + (betad - taud) ** 2 + betadd * betadd)
+    
+    # estimates of ||A||, cond(A), ||A^T r|| and ||x||
+    normA2 = normA2 + beta * beta
+    normA = math.sqrt(normA2)
+    normA2 = normA2 + alpha * alpha
+    maxrbar = max(maxrbar, rhobarold)
+    if (itn > 1):
+      minrbar = min(minrbar, rhobarold)
+    condA = max(maxrbar, rhotemp) / min(minrbar, rhotemp)
+    normar = abs(zetabar)
+    normx = numpy.linalg.norm(x)
+    if Telemetry is not None:
+      Telemetry._LogIteration(itn, normr * normr, normar)
+    
+    # stopping tests (the last satisfied test in the order of scipy lsmr gives the reason)
+    test1 = normr / normb
+    if ((normA * normr) != 0):
+      test2 = normar / (normA * normr)
+    else:
+      test2 = numpy.inf
+    test3 = 1 / condA
+    t1 = test1 / (1 + normA * normx / normb)
+    rtol = btol + atol * normA * normx / normb
+    if (itn >= maxiter):
+      istop = 7
+    if (1 + test3 <= 1):
+      istop = 6
+    if (1 + test2 <= 1):
+      istop = 5
+    if (1 + t1 <= 1):
+      istop = 4
+    if (test3 <= ctol):
+      istop = 3
+    if (test2 <= atol):
+      istop = 2
+    if (test1 <= rtol):
+      istop = 1
+    if (istop > 0):
+      break
+  
+  return x, istop, itn, normr, normar
+
+#----------------------------------------------------
+"""
+this function solves the sparse least squares problem with non-negative edge lengths
+first the unconstrained (minimum norm) solution is computed by LSMR, which uses the sparse matrix 
+only through matrix vector products; if it has any negative edge length, the non-negative problem is solved
+from the normal equations (A^T A, as a dense matrix) by the active set method, whose initial passive set
+is formed by the positive edges of the unconstrained solution; if the number of edges exceeds 
+NNLS_FALLBACK_MAX_EDGES, a bounded (trust region reflective) least squares method is used instead
+if the unconstrained solver stops at its iteration budget, negative edge lengths are set to zero instead
+a message is printed if the non-negative solver stops at its iteration budget
+parameters: edge_value_init - initial edge lengths of LSMR (such as the solution of a previous, slightly 
+different, problem); if None, LSMR starts from zero
+Telemetry - budgets and log of the solver (Solver_Telemetry), or None; every iteration of LSMR is logged
+(see Solve_LSMR)
+init_name - name of the initial edge lengths (for the log)
+returns the array of edge lengths
+"""
+def Solve_Sparse_LSQ_System(Path_Matrix, AvgDistMatVal, edge_value_init=None, Telemetry=None, init_name='zero'):
+  if Telemetry is None:
+    Telemetry = Solver_Telemetry()
+  max_iter, tol = Telemetry._GetBudget(LSQ_SOLVER_MAX_ITER)
+  if edge_value_init is not None:
+    edge_value_init = numpy.asarray(edge_value_init, dtype=numpy.float64)
+  Telemetry._Start('lsmr', init_name, Path_Matrix.shape[1], Path_Matrix.shape[0])
+  edge_value_arr, istop, no_of_iter, norm_r, norm_ar = Solve_LSMR(Path_Matrix, AvgDistMatVal, tol, tol, max_iter, \
+								  edge_value_init, Telemetry)
+  Telemetry._End(no_of_iter, norm_r * norm_r, norm_ar, (istop != 7))
+  if (edge_value_arr.min() < 0) and (Telemetry.Summary_List[-1]['converged'] == False):
+    print 'iteration budget of the solver is exhausted - negative edge lengths are set to zero'
+    return numpy.maximum(edge_value_arr, 0)
+  elif (edge_value_arr.min() < 0) and (Path_Matrix.shape[1] <= NNLS_FALLBACK_MAX_EDGES):
+    AtA = Path_Matrix.T.dot(Path_Matrix).toarray()
+    edge_value_arr = Solve_NNLS_Normal_Equations(AtA, Path_Matrix.T.dot(AvgDistMatVal), numpy.maximum(edge_value_arr, 0), \
+						 Telemetry, float(numpy.dot(AvgDistMatVal, AvgDistMatVal)), 'clipped')
+  elif (edge_value_arr.min() < 0):
+    Telemetry._Start('lsq_linear', 'none', Path_Matrix.shape[1], Path_Matrix.shape[0])
+    res = lsq_linear(Path_Matrix, AvgDistMatVal, bounds=(0, numpy.inf), method='trf', \
+		      lsq_solver='lsmr', lsmr_tol='auto', tol=tol, max_iter=max_iter)
+    if (DEBUG_LEVEL > 1):
+      print 'bounded least squares solver - status: ', res.status, ' message: ', res.message, ' iterations: ', res.nit
+    Telemetry._End(res.nit, 2 * res.cost, res.optimality, (res.status > 0), res.message)
+    edge_value_arr = res.x
+  else:
+    return edge_value_arr
+  if (Telemetry.Summary_List[-1]['converged'] == False):
+    print 'iteration budget of the non-negative solver (' + Telemetry.solver_name + \
+	  ') is exhausted - the edge lengths may not be optimal'
+  return edge_value_arr
+
+#----------------------------------------------------
+"""
+this function computes the branch lengths of the supertree
+by solving the sparse least squares problem with non-negative edge lengths
+parameters: edge_value_init - initial edge lengths (warm start), or None
+Telemetry, init_name - budgets and log of the solver (see Solve_Sparse_LSQ_System)
+returns the list of edge lengths (indexed as in Supertree_Array) and the least square error
+"""
+def Solve_Sparse_LSQ(no_of_edges, State=Default_State, edge_value_init=None, Telemetry=None, init_name='zero'):
+  Path_Matrix, AvgDistMatVal = Build_Couplet_Edge_Matrix(no_of_edges, State)
+  edge_value_arr = Solve_Sparse_LSQ_System(Path_Matrix, AvgDistMatVal, edge_value_init, Telemetry, init_name)
+  return edge_value_arr.tolist(), Compute_LSQ_Error(Path_Matrix, AvgDistMatVal, edge_value_arr)
+
+#----------------------------------------------------
+"""
+binary format of the QP input file (all values are in native byte order)
+1) header: the 8 byte signature QP_BINARY_SIGNATURE, followed by 4 int64 values: 
+format version, number of edges (unknowns), number of rows (couplets), number of nonzero entries
+2) row pointers of the couplet by edge matrix: int64 array of (number of rows + 1) entries
+3) edge indices of individual rows: int32 array of (number of nonzero entries) entries, 
+padded with zeros to a multiple of 8 bytes
+4) weighted average couplet distances: float64 array of (number of rows) entries
+the QP output file is a raw float64 array of (number of edges) entries
+"""
+QP_BINARY_SIGNATURE = 'CSTBLGLS'
+QP_BINARY_VERSION = 1
+QP_BINARY_HEADER_SIZE = 40
+
+#----------------------------------------------------
+"""
+this function returns the byte offsets of the arrays within a binary QP input file
+"""
+def Get_QP_Binary_Offsets(no_of_rows, nnz):
+  row_ptr_offset = QP_BINARY_HEADER_SIZE
+  col_idx_offset = row_ptr_offset + 8 * (no_of_rows + 1)
+  dist_offset = col_idx_offset + 8 * ((4 * nnz + 7) // 8)
+  file_size = dist_offset + 8 * no_of_rows
+  return row_ptr_offset, col_idx_offset, dist_offset, file_size
+
+#----------------------------------------------------
+"""
+this function writes the least squares system of the branch length assignment
+in the binary QP input format, using memory mapped arrays
+parameters: Out_Binary_GLS_input_file - output file name, no_of_edges - number of edges of the supertree
+"""
+def WriteObjectiveFunctionBinaryFile(Out_Binary_GLS_input_file, no_of_edges, State=Default_State):
+  row_ptr, col_idx, AvgDistMatVal = Get_Couplet_Edge_CSR(State)
+  no_of_rows = len(AvgDistMatVal)
+  nnz = len(col_idx)
+  row_ptr_offset, col_idx_offset, dist_offset, file_size = Get_QP_Binary_Offsets(no_of_rows, nnz)
+  
+  fp = open(Out_Binary_GLS_input_file, 'wb')
+  fp.write(QP_BINARY_SIGNATURE)
+  numpy.array([QP_BINARY_VERSION, no_of_edges, no_of_rows, nnz], dtype=numpy.int64).tofile(fp)
+  fp.truncate(file_size)
+  fp.close()
+  
+  mm = numpy.memmap(Out_Binary_GLS_input_file, dtype=numpy.int64, mode='r+', offset=row_ptr_offset, shape=(no_of_rows + 1,))
+  mm[:] = row_ptr
+  del mm
+  if (nnz > 0):
+    mm = numpy.memmap(Out_Binary_GLS_input_file, dtype=numpy.int32, mode='r+', offset=col_idx_offset, shape=(nnz,))
+    mm[:] = col_idx
+    del mm
+  if (no_of_rows > 0):
+    mm = numpy.memmap(Out_Binary_GLS_input_file, dtype=numpy.float64, mode='r+', offset=dist_offset, shape=(no_of_rows,))
+    mm[:] = AvgDistMatVal
+    mm.flush()
+    del mm
+
+#----------------------------------------------------
+"""
+this function reads a binary QP input file, as (read only) memory mapped arrays
+returns the number of edges, the row pointers, the edge indices and the couplet distances
+"""
+def ReadObjectiveFunctionBinaryFile(Inp_Binary_GLS_input_file):
+  fp = open(Inp_Binary_GLS_input_file, 'rb')
+  signature = fp.read(len(QP_BINARY_SIGNATURE))
+  header = numpy.fromfile(fp, dtype=numpy.int64, count=4)
+  fp.close()
+  if (signature != QP_BINARY_SIGNATURE) or (len(header) < 4) or (header[0] != QP_BINARY_VERSION):
+    raise ValueError('not a binary QP input file (or unsupported version): ' + Inp_Binary_GLS_input_file)
+  no_of_edges, no_of_rows, nnz = int(header[1]), int(header[2]), int(header[3])
+  row_ptr_offset, col_idx_offset, dist_offset, file_size = Get_QP_Binary_Offsets(no_of_rows, nnz)
+  row_ptr = numpy.memmap(Inp_Binary_GLS_input_file, dtype=numpy.int64, mode='r', offset=row_ptr_offset, shape=(no_of_rows + 1,))
+  if (nnz > 0):
+    col_idx = numpy.memmap(Inp_Binary_GLS_input_file, dtype=numpy.int32, mode='r', offset=col_idx_offset, shape=(nnz,))
+  else:
+    col_idx = numpy.zeros(0, dtype=numpy.int32)
+  if (no_of_rows > 0):
+    AvgDistMatVal = numpy.memmap(Inp_Binary_GLS_input_file, dtype=numpy.float64, mode='r', offset=dist_offset, shape=(no_of_rows,))
+  else:
+    AvgDistMatVal = numpy.zeros(0)
+  return no_of_edges, row_ptr, col_idx, AvgDistMatVal
+
+#----------------------------------------------------
+"""
+this function writes the edge lengths in the binary QP output format (raw float64 array)
+"""
+def WriteEdgeValueBinaryFile(Out_Binary_GLS_output_file, edge_value_arr):
+  numpy.asarray(edge_value_arr, dtype=numpy.float64).tofile(Out_Binary_GLS_output_file)
+
+#----------------------------------------------------
+"""
+this function reads the edge lengths from a binary QP output file
+returns the list of edge lengths (indexed as in Supertree_Array)
+"""
+def ReadEdgeValueBinaryFile(Inp_Binary_GLS_output_file, no_of_edges):
+  edge_value_arr = numpy.memmap(Inp_Binary_GLS_output_file, dtype=numpy.float64, mode='r', shape=(no_of_edges,))
+  return edge_value_arr.tolist()
+
+#----------------------------------------------------
+"""
+this function returns the leaf spans of the supertree edges (from the flat arrays of the supertree)
+leaves are numbered in postorder, so that the leaves under any node form a contiguous span
+returns 
+1) Leaf_Taxa_Idx: taxa indices of the leaves, in postorder (-1 if the taxon is not present in the input trees)
+2) Span_Start, Span_End: leaf span of the nodes having a parent (that is, of the heads of the supertree edges)
+3) Edge_Idx: indices of the edges from these nodes to their parents
+"""
+def Get_Supertree_Edge_Spans(Inp_Tree, State=Default_State):
+  if State.Supertree_Info is None:
+    State.Supertree_Info = Supertree_Array(Inp_Tree, State.Couplet_Info)
+  return State.Supertree_Info._GetEdgeSpans()
+
+#----------------------------------------------------
+"""
+this function returns a matrix indexed by the supertree leaves (in postorder)
+whose entries are the values of the corresponding couplets (taxa pairs)
+parameters: Leaf_Taxa_Idx - taxa indices of the supertree leaves (-1 if absent in the input trees)
+couplet_val - per couplet values (indexed by couplet index)
+"""
+def Get_Leaf_Couplet_Matrix(Leaf_Taxa_Idx, couplet_val, State=Default_State):
+  no_of_leaves = len(Leaf_Taxa_Idx)
+  Leaf_Matrix = numpy.zeros((no_of_leaves, no_of_leaves))
+  valid_pos = numpy.nonzero(Leaf_Taxa_Idx >= 0)[0]
+  for i in valid_pos:
+    other_pos = valid_pos[valid_pos != i]
+    Leaf_Matrix[i, other_pos] = couplet_val[State.Couplet_Info._GetCoupletIdxArr(Leaf_Taxa_Idx[i], Leaf_Taxa_Idx[other_pos])]
+  return Leaf_Matrix
+
+#----------------------------------------------------
+"""
+this function sums the rows of a leaf couplet matrix over the leaf span of individual edges
+that is, the entry (v, a) is the sum of the couplet values between the taxon a 
+and the taxa under the edge v
+returns this matrix, with a leading column of zeros and cumulative sums along the columns
+so that the sum over any leaf span [s, e) of the edge v is the difference of the entries (v, e) and (v, s)
+"""
+def Get_Edge_Span_Cumulative_Sum(Leaf_Matrix, Span_Start, Span_End):
+  Row_Cum_Sum = numpy.zeros((Leaf_Matrix.shape[0] + 1, Leaf_Matrix.shape[1]))
+  numpy.cumsum(Leaf_Matrix, axis=0, out=Row_Cum_Sum[1:])
+  Edge_Leaf_Sum = Row_Cum_Sum[Span_End] - Row_Cum_Sum[Span_Start]
+  del Row_Cum_Sum
+  Edge_Cum_Sum = numpy.zeros((Edge_Leaf_Sum.shape[0], Edge_Leaf_Sum.shape[1] + 1))
+  numpy.cumsum(Edge_Leaf_Sum, axis=1, out=Edge_Cum_Sum[:, 1:])
+  return Edge_Cum_Sum
+
+#----------------------------------------------------
+"""
+this function builds the normal equations (A^T A) x = A^T d of the branch length assignment
+directly from the supertree topology and the couplet statistics
+without storing the branches between individual couplets
+here a couplet path crosses the edge above a node v if exactly one taxon of the couplet is under v
+so, for two edges u and v, the entry of A^T A is the number of supported couplets
+1) with one taxon under v and the other taxon outside u, if u is an ancestor of v (or u = v)
+2) with one taxon under u and the other taxon under v, if u and v are not related
+A^T d is accumulated similarly from the weighted average couplet distances
+returns A^T A, A^T d, and d^T d (required to compute the least square error)
+parameters:
+1) Inp_Tree: derived unweighted supertree
+2) no_of_edges: number of edges of the supertree
+"""
+def Build_Normal_Equations(Inp_Tree, no_of_edges, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Leaf_Taxa_Idx, Span_Start, Span_End, Edge_Idx = Get_Supertree_Edge_Spans(Inp_Tree, State)
+  
+  # support indicator and weighted average distance of the couplets between the supertree leaves
+  Support_Matrix = Get_Leaf_Couplet_Matrix(Leaf_Taxa_Idx, (Couplet_Info.Support_Count > 0).astype(numpy.float64), State)
+  Dist_Matrix = Get_Leaf_Couplet_Matrix(Leaf_Taxa_Idx, Couplet_Info._GetAvgDistMatVal(), State)
+  dtd = 0.5 * float(numpy.sum(Dist_Matrix * Dist_Matrix))
+  
+  # A^T A restricted to the edges having a head node with a parent
+  Cum_Sum = Get_Edge_Span_Cumulative_Sum(Support_Matrix, Span_Start, Span_End)
+  del Support_Matrix
+  Total_Count = Cum_Sum[:, -1]
+  # Span_Count[v, u]: number of supported couplets with one taxon under v and the other under u
+  Span_Count = Cum_Sum[:, Span_End] - Cum_Sum[:, Span_Start]
+  del Cum_Sum
+  # Is_Anc[u, v]: True if u is an ancestor of v, or u = v
+  Is_Anc = (Span_Start[:, numpy.newaxis] <= Span_Start[numpy.newaxis, :]) & \
+	    (Span_End[:, numpy.newaxis] >= Span_End[numpy.newaxis, :])
+  Sub_AtA = Span_Count.T.copy()
+  Sub_AtA[Is_Anc] = (Total_Count[numpy.newaxis, :] - Span_Count.T)[Is_Anc]
+  Is_Anc = Is_Anc.T
+  Sub_AtA[Is_Anc] = (Total_Count[:, numpy.newaxis] - Span_Count)[Is_Anc]
+  del Span_Count, Is_Anc
+  
+  # A^T d restricted to the same edges
+  Cum_Sum = Get_Edge_Span_Cumulative_Sum(Dist_Matrix, Span_Start, Span_End)
+  del Dist_Matrix
+  edge_pos = numpy.arange(len(Edge_Idx))
+  Sub_Atd = Cum_Sum[:, -1] - (Cum_Sum[edge_pos, Span_End] - Cum_Sum[edge_pos, Span_Start])
+  del Cum_Sum
+  
+  # other edges (such as the edge above the root) are not between any couplet
+  AtA = numpy.zeros((no_of_edges, no_of_edges))
+  AtA[numpy.ix_(Edge_Idx, Edge_Idx)] = Sub_AtA
+  Atd = numpy.zeros(no_of_edges)
+  Atd[Edge_Idx] = Sub_Atd
+  return AtA, Atd, dtd
+
+#----------------------------------------------------
+"""
+this function solves the triangular system R x = b (or R^T x = b if trans is True), R being upper triangular
+if scipy is not installed, a general (dense) solver is used
+"""
+def Solve_Upper_Triangular(R, b, trans=False):
+  if (SCIPY_AVAILABLE == True):
+    return solve_triangular(R, b, trans=(1 if trans else 0), lower=False, check_finite=False)
+  return numpy.linalg.solve((R.T if trans else R), b)
+
+#----------------------------------------------------
+"""
+this class contains the (upper triangular) Cholesky factor R of A^T A + ridge * I restricted to the passive set 
+of the active set method, that is, R^T R = (A^T A + ridge * I)[P, P], where P is the list of passive edges 
+(Passive_Idx[:k]); adding an edge extends R by one column, and removing an edge restores the triangular form
+of R by Givens rotations, so that both (and the passive least squares solution) need O(E^2) operations
+instead of solving the passive subsystem again
+an edge whose column is (numerically) linearly dependent on the passive columns is not added
+"""
+class NNLS_Cholesky_Factor(object):
+  def __init__(self, AtA, ridge=0.0):
+    self.AtA = AtA
+    self.ridge = ridge
+    no_of_edges = AtA.shape[0]
+    self.R = numpy.zeros((no_of_edges, no_of_edges))
+    self.Passive_Idx = numpy.zeros(no_of_edges, dtype=numpy.int64)
+    self.k = 0
+
+  """
+  adds the edges of Edge_Idx (in this order) to the passive set, skipping the edges whose columns are linearly
+  dependent on the passive columns; the edges are processed in blocks of NNLS_FACTOR_BLOCK_SIZE edges, so that
+  the passive part of the new columns is computed by one (multiple right hand side) triangular solve per block
+  returns the boolean array of the added edges
+  """
+  def _AddEdges(self, Edge_Idx):
+    added = numpy.zeros(len(Edge_Idx), dtype=bool)
+    for start in range(0, len(Edge_Idx), NNLS_FACTOR_BLOCK_SIZE):
+      Block_Idx = Edge_Idx[start:(start + NNLS_FACTOR_BLOCK_SIZE)]
+      k = self.k
+      if (k > 0):
+	W = Solve_Upper_Triangular(self.R[:k, :k], self.AtA[numpy.ix_(self.Passive_Idx[:k], Block_Idx)], trans=True)
+      else:
+	W = numpy.zeros((0, len(Block_Idx)))
+      # the new edges are factored (one at a time) within the Schur complement S
+      S = self.AtA[numpy.ix_(Block_Idx, Block_Idx)] - W.T.dot(W) + self.ridge * numpy.eye(len(Block_Idx))
+      Block_R = numpy.zeros((len(Block_Idx), len(Block_Idx)))
+      Added_Pos = []
+      for i in range(len(Block_Idx)):
+	m = len(Added_Pos)
+	diag_val = S[i, i]
+	if (m > 0):
+	  r = Solve_Upper_Triangular(Block_R[:m, :m], S[Added_Pos, i], trans=True)
+	  diag_val = diag_val - r.dot(r)
+	if (diag_val <= NNLS_DEPENDENCE_TOL * (self.AtA[Block_Idx[i], Block_Idx[i]] + self.ridge)):
+	  continue
+	if (m > 0):
+	  Block_R[:m, m] = r
+	Block_R[m, m] = numpy.sqrt(diag_val)
+	Added_Pos.append(i)
+      m = len(Added_Pos)
+      self.R[:k, k:(k+m)] = W[:, Added_Pos]
+      self.R[k:(k+m), k:(k+m)] = Block_R[:m, :m]
+      self.Passive_Idx[k:(k+m)] = Block_Idx[Added_Pos]
+      self.k = k + m
+      added[start + numpy.array(Added_Pos, dtype=numpy.int64)] = True
+    return added
+
+  """
+  adds the edge j to the passive set
+  returns False (and the factor is not changed) if its column is linearly dependent on the passive columns
+  """
+  def _AddEdge(self, j):
+    return self._AddEdges(numpy.array([j]))[0]
+
+  """
+  removes the edge j from the passive set
+  """
+  def _RemoveEdge(self, j):
+    k = self.k
+    R = self.R
+    pos = int(numpy.nonzero(self.Passive_Idx[:k] == j)[0][0])
+    R[:k, pos:(k-1)] = R[:k, (pos+1):k]
+    R[:k, k-1] = 0
+    self.Passive_Idx[pos:(k-1)] = self.Passive_Idx[(pos+1):k]
+    # the columns after the removed one have a nonzero entry below the diagonal, which is eliminated
+    for i in range(pos, k - 1):
+      a = R[i, i]
+      b = R[i+1, i]
+      h = numpy.hypot(a, b)
+      c = a / h
+      s = b / h
+      row_i = R[i, i:(k-1)].copy()
+      row_next = R[i+1, i:(k-1)]
+      R[i, i:(k-1)] = c * row_i + s * row_next
+      R[i+1, i:(k-1)] = c * row_next - s * row_i
+      R[i+1, i] = 0
+    R[k-1, :k] = 0
+    self.k = k - 1
+
+  """
+  returns the least squares solution restricted to the passive set (zero outside the passive set)
+  """
+  def _Solve(self, Atd):
+    k = self.k
+    z = numpy.zeros(len(Atd))
+    if (k > 0):
+      p_idx = self.Passive_Idx[:k]
+      y = Solve_Upper_Triangular(self.R[:k, :k], Atd[p_idx], trans=True)
+      z[p_idx] = Solve_Upper_Triangular(self.R[:k, :k], y)
+    return z
+
+#----------------------------------------------------
+"""
+this function is the inner loop of the active set method of Lawson and Hanson
+the least squares solution restricted to the passive set (edges allowed to be positive) is computed,
+and the feasible x is moved towards it, removing the edges which become zero from the passive set, 
+until the restricted solution is positive
+parameters: x - current (non-negative) edge lengths, which are zero outside the passive set
+passive - boolean array of the passive set (modified in place)
+Factor - Cholesky factor of the passive set (NNLS_Cholesky_Factor), updated together with passive
+returns the new edge lengths
+"""
+def Solve_NNLS_Passive_Set(Atd, x, passive, tol, Factor):
+  while True:
+    z = Factor._Solve(Atd)
+    p_idx = numpy.nonzero(passive)[0]
+    if (z[p_idx].min() > 0):
+      break
+    neg_idx = p_idx[z[p_idx] <= 0]
+    alpha = numpy.min(x[neg_idx] / numpy.maximum(x[neg_idx] - z[neg_idx], numpy.finfo(numpy.float64).tiny))
+    x = x + alpha * (z - x)
+    for j in p_idx[x[p_idx] <= tol]:
+      passive[j] = False
+      Factor._RemoveEdge(j)
+    x[~passive] = 0
+    if not numpy.any(passive):
+      z = x
+      break
+  return z
+
+#----------------------------------------------------
+"""
+this function solves the normal equations (A^T A) x = A^T d with non-negative x
+using the active set method of Lawson and Hanson, which needs only A^T A and A^T d
+first the unconstrained (minimum norm) solution is checked; otherwise, the passive subsystems are solved
+by the Cholesky factor of the passive set (NNLS_Cholesky_Factor), updated as edges are added and removed
+parameters: edge_value_init - initial edge lengths (warm start), or None; the edges having positive 
+initial lengths form the initial passive set, so that a solution close to the initial one needs
+only a few iterations (instead of adding the positive edges one at a time)
+Telemetry - budgets and log of the solver (Solver_Telemetry), or None; every iteration (adding an edge
+to the passive set) is logged, with the norm of the projected gradient
+dtd - d^T d, so that the logged objective values are the least square errors
+init_name - name of the initial edge lengths (for the log)
+"""
+def Solve_NNLS_Normal_Equations(AtA, Atd, edge_value_init=None, Telemetry=None, dtd=0.0, init_name='zero'):
+  if Telemetry is None:
+    Telemetry = Solver_Telemetry()
+  no_of_edges = len(Atd)
+  max_iter, tol = Telemetry._GetBudget(3 * no_of_edges)
+  Telemetry._Start('nnls', init_name, no_of_edges)
+  x = numpy.linalg.lstsq(AtA, Atd, rcond=None)[0]
+  if (x.min() >= 0):
+    w = Atd - AtA.dot(x)
+    Telemetry._End(0, dtd - x.dot(Atd) - x.dot(w), numpy.linalg.norm(w), True, 'unconstrained solution')
+    return x
+  
+  """
+  a small ridge term is added to A^T A, so that the solution is unique: for rank deficient systems (such as
+  the two edges below the root, or a sample of the couplets), it is close to the minimum norm solution, 
+  and the least square error is not changed significantly
+  """
+  ridge = NNLS_RIDGE_TOL * max(0.0, float(numpy.max(numpy.diag(AtA))))
+  Factor = NNLS_Cholesky_Factor(AtA, ridge)
+  x = numpy.zeros(no_of_edges)
+  passive = numpy.zeros(no_of_edges, dtype=bool)
+  tol = tol * max(1.0, numpy.abs(Atd).max())
+  if edge_value_init is not None:
+    edge_value_init = numpy.asarray(edge_value_init, dtype=numpy.float64)
+    Init_Idx = numpy.nonzero(edge_value_init > tol)[0]
+    Init_Idx = Init_Idx[Factor._AddEdges(Init_Idx)]
+    passive[Init_Idx] = True
+    x[Init_Idx] = edge_value_init[Init_Idx]
+    if numpy.any(passive):
+      x = Solve_NNLS_Passive_Set(Atd, x, passive, tol, Factor)
+  # w is the negative gradient (of half the objective); its projection is zero at the solution
+  # the objective x^T (A^T A) x - 2 x^T (A^T d) + d^T d is computed from w, as d^T d - x^T (A^T d) - x^T w
+  # the optimality tests use the gradient including the ridge term (w - ridge * x)
+  w = Atd - AtA.dot(x)
+  # edges which are linearly dependent on the passive set are excluded, until the passive set changes
+  excluded = numpy.zeros(no_of_edges, dtype=bool)
+  Telemetry._LogIteration(0, dtd - x.dot(Atd) - x.dot(w), numpy.linalg.norm(numpy.where(passive, w, numpy.maximum(w, 0))))
+  no_of_iter = 0
+  while (no_of_iter < max_iter) and numpy.any((w - ridge * x)[~(passive | excluded)] > tol):
+    j = numpy.argmax(numpy.where(passive | excluded, -numpy.inf, w - ridge * x))
+    if (Factor._AddEdge(j) == False):
+      excluded[j] = True
+      continue
+    no_of_iter = no_of_iter + 1
+    passive[j] = True
+    x = Solve_NNLS_Passive_Set(Atd, x, passive, tol, Factor)
+    excluded[:] = False
+    # an edge which is removed at once (no decrease of the objective) is not added again
+    excluded[j] = (passive[j] == False)
+    w = Atd - AtA.dot(x)
+    Telemetry._LogIteration(no_of_iter, dtd - x.dot(Atd) - x.dot(w), \
+			    numpy.linalg.norm(numpy.where(passive, w, numpy.maximum(w, 0))))
+  
+  Telemetry._End(no_of_iter, dtd - x.dot(Atd) - x.dot(w), numpy.linalg.norm(numpy.where(passive, w, numpy.maximum(w, 0))), \
+		 (numpy.any((w - ridge * x)[~(passive | excluded)] > tol) == False))
+  return x
+
+#----------------------------------------------------
+"""
+this function computes the branch lengths of the supertree from the normal equations
+built directly from the supertree topology (without the branches between individual couplets)
+parameters: edge_value_init - initial edge lengths (warm start), or None
+Telemetry, init_name - budgets and log of the solver (see Solve_NNLS_Normal_Equations)
+returns the list of edge lengths (indexed as in Supertree_Array) and the least square error
+"""
+def Solve_Normal_Equations(Inp_Tree, no_of_edges, State=Default_State, edge_value_init=None, Telemetry=None, \
+			  init_name='zero'):
+  AtA, Atd, dtd = Build_Normal_Equations(Inp_Tree, no_of_edges, State)
+  edge_value_arr = Solve_NNLS_Normal_Equations(AtA, Atd, edge_value_init, Telemetry, dtd, init_name)
+  # the least square error is x^T (A^T A) x - 2 x^T (A^T d) + d^T d
+  lsq_error = float(edge_value_arr.dot(AtA.dot(edge_value_arr)) - 2 * edge_value_arr.dot(Atd) + dtd)
+  return edge_value_arr.tolist(), max(lsq_error, 0.0)
+
+#----------------------------------------------------
+"""
+this file can also be executed as a QP solver for the binary QP input format
+usage: QP_Solver.py <binary QP input file> <binary QP output file>
+so that it can be provided with the -Q option (together with the binary format option)
+"""
+if __name__ == "__main__":
+  if (len(sys.argv) != 3):
+    print 'usage: ', sys.argv[0], ' <binary QP input file> <binary QP output file>'
+    sys.exit(1)
+  if (SCIPY_AVAILABLE == False):
+    print '******** THIS SOLVER REQUIRES SCIPY, WHICH IS NOT INSTALLED **********'
+    sys.exit(1)
+  no_of_edges, row_ptr, col_idx, AvgDistMatVal = ReadObjectiveFunctionBinaryFile(sys.argv[1])
+  Path_Matrix = Get_Path_Matrix(row_ptr, col_idx, no_of_edges)
+  WriteEdgeValueBinaryFile(sys.argv[2], Solve_Sparse_LSQ_System(Path_Matrix, AvgDistMatVal))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+this file evaluates a weighted supertree against the source trees
+1) least square error: for every source tree, the sum of squared differences between its couplet distances
+and the patristic distances of the same couplets in the supertree; the patristic distances of all the couplets
+of the supertree are computed once (as an array indexed by the couplet index)
+2) RF distance: clades of the supertree restricted to the taxa of a source tree are compared with the clades
+of the source tree; clades are compared by their hash values (XOR of random 64 bit values of their taxa,
+see Edge_Len_Init.py), so that the supertree is neither copied nor pruned for individual source trees
+both trees are restricted to their common taxa; clades of single taxa and of all the common taxa are not compared
+"""
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import Edge_Len_Init
+import Incremental_State
+
+# file (in the output directory) containing the evaluation of the supertree
+EVALUATION_FILENAME = 'Supertree_Evaluation.txt'
+
+# maximum number of leaf pairs processed at a time (see Get_Leaf_Pair_Dist)
+LEAF_PAIR_BLOCK_SIZE = (1 << 22)
+
+# columns of the evaluation of individual source trees
+EVALUATION_COLUMN_LIST = ['tree_idx', 'no_of_taxa', 'no_of_couplets', 'lsq_error', 'rms_error', \
+			  'weighted_lsq_error', 'FP', 'FN', 'RF', 'norm_RF']
+
+#----------------------------------------------------
+"""
+this function returns the patristic distances of the supertree for all the couplets
+(as an array indexed by the couplet index); couplets with a taxon absent in the supertree get nan
+parameters: Supertree_Info - weighted supertree as flat arrays (Supertree_Array, containing the dendropy edges)
+"""
+def Get_Supertree_Couplet_Dist(Supertree_Info, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Edge_Len = numpy.array([numpy.nan if (x.length is None) else float(x.length) for x in Supertree_Info.Edge_List])
+  Root_Dist = Compute_Root_Distances(Supertree_Info.Parent, Edge_Len)
+  Couplet_Dist = numpy.zeros(Couplet_Info.no_of_couplets) + numpy.nan
+  Present_Taxa_Idx = numpy.nonzero(Supertree_Info.Taxon_Leaf_Node >= 0)[0]
+  for k in range(len(Present_Taxa_Idx) - 1):
+    other_taxa_idx = Present_Taxa_Idx[(k+1):]
+    node2 = Supertree_Info.Taxon_Leaf_Node[other_taxa_idx]
+    node1 = numpy.repeat(Supertree_Info.Taxon_Leaf_Node[Present_Taxa_Idx[k]], len(node2))
+    mrca_node = Supertree_Info._GetLCA(node1, node2)
+    Couplet_Dist[Couplet_Info._GetCoupletIdxArr(Present_Taxa_Idx[k], other_taxa_idx)] = \
+      Root_Dist[node1] + Root_Dist[node2] - 2 * Root_Dist[mrca_node]
+  return Couplet_Dist
+
+#----------------------------------------------------
+"""
+this function returns the couplet indices and the couplet distances of one tree (from its leaf spans,
+see Get_Tree_Leaf_Spans), same as Get_Tree_Couplet_Arrays, but deriving all the couplets together
+leaves are in postorder, so the MRCA of the leaves i < j is the MRCA of the adjacent leaves (k, k+1), i <= k < j,
+which is latest in postorder; MRCA nodes of all the couplets are thus derived by running maximums
+over the MRCA nodes of the adjacent leaves (a few rows of leaf pairs at a time)
+"""
+def Get_Leaf_Pair_Dist(Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, State=Default_State):
+  no_of_leaves = len(Leaf_Taxa_Idx)
+  if (no_of_leaves < 2):
+    return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+  # MRCA of the adjacent leaves (k, k+1), as the position of the node in Internal_Node_List (postorder)
+  Adjacent_MRCA = numpy.zeros(no_of_leaves - 1, dtype=numpy.int64)
+  Node_Root_Dist = numpy.zeros(len(Internal_Node_List))
+  for node_pos in range(len(Internal_Node_List)):
+    node_dist_from_root, boundary_list = Internal_Node_List[node_pos]
+    Node_Root_Dist[node_pos] = node_dist_from_root
+    for k in boundary_list[1:-1]:
+      Adjacent_MRCA[k-1] = node_pos
+
+  no_of_rows = max(1, LEAF_PAIR_BLOCK_SIZE // no_of_leaves)
+  couplet_idx_block_list = []
+  dist_block_list = []
+  for row_start in range(0, no_of_leaves - 1, no_of_rows):
+    row_arr = numpy.arange(row_start, min(row_start + no_of_rows, no_of_leaves - 1))
+    col_arr = numpy.arange(row_start, no_of_leaves - 1)
+    upper = (col_arr[numpy.newaxis, :] >= row_arr[:, numpy.newaxis])
+    MRCA_Matrix = numpy.maximum.accumulate(numpy.where(upper, Adjacent_MRCA[col_arr][numpy.newaxis, :], -1), axis=1)
+    row_pos, col_pos = numpy.nonzero(upper)
+    leaf1 = row_arr[row_pos]
+    leaf2 = col_arr[col_pos] + 1
+    mrca_root_dist = Node_Root_Dist[MRCA_Matrix[row_pos, col_pos]]
+    couplet_idx_block_list.append(State.Couplet_Info._GetCoupletIdxArr(Leaf_Taxa_Idx[leaf1], Leaf_Taxa_Idx[leaf2]))
+    dist_block_list.append((Leaf_Root_Dist[leaf1] - mrca_root_dist) + (Leaf_Root_Dist[leaf2] - mrca_root_dist))
+  return numpy.concatenate(couplet_idx_block_list), numpy.concatenate(dist_block_list)
+
+#----------------------------------------------------
+"""
+this function returns the distinct hash values of the clades formed by the leaf spans [Span_Start, Span_End)
+restricted to the selected leaves, leaving out the clades of at most one and of all the selected leaves
+parameters: Leaf_Hash - hash values of the leaves (zero for the leaves which are not selected)
+Leaf_Selected - boolean array of the selected leaves
+"""
+def Get_Restricted_Clade_Hash(Leaf_Hash, Leaf_Selected, Span_Start, Span_End):
+  Prefix_Hash = Edge_Len_Init.Get_Prefix_Hash(Leaf_Hash)
+  Prefix_Count = numpy.zeros(len(Leaf_Selected) + 1, dtype=numpy.int64)
+  Prefix_Count[1:] = numpy.cumsum(Leaf_Selected)
+  Clade_Count = Prefix_Count[Span_End] - Prefix_Count[Span_Start]
+  valid = (Clade_Count > 1) & (Clade_Count < Prefix_Count[-1])
+  return numpy.unique(Prefix_Hash[Span_End[valid]] ^ Prefix_Hash[Span_Start[valid]])
+
+#----------------------------------------------------
+"""
+this function evaluates the weighted supertree against the source trees
+parameters: Weighted_Supertree - supertree (dendropy tree) with the assigned branch lengths
+Source_Tree_Iter - source trees (any iterable, in the order of the tree weights of the state)
+State - state containing the couplet store (taxa indices) and the tree weights
+returns the list of evaluations of individual source trees (dictionaries with the keys EVALUATION_COLUMN_LIST)
+and a dictionary of the summary of the evaluation
+"""
+def Evaluate_Supertree(Weighted_Supertree, Source_Tree_Iter, State=Default_State):
+  start_timestamp = time.time()
+  Couplet_Info = State.Couplet_Info
+  Supertree_Info = Supertree_Array(Weighted_Supertree, Couplet_Info)
+  Supertree_Dist = Get_Supertree_Couplet_Dist(Supertree_Info, State)
+
+  # clades of the supertree nodes, as leaf spans (leaves in postorder)
+  Leaf_Taxa_Idx = Supertree_Info._GetEdgeSpans()[0]
+  Span_Start, Span_End = Edge_Len_Init.Get_Supertree_Node_Spans(Supertree_Info)
+  Taxa_Hash = numpy.random.RandomState(Edge_Len_Init.CLADE_HASH_SEED).randint(1, 1 << 62, \
+								size=Couplet_Info.no_of_taxa, dtype=numpy.int64)
+  valid_leaf_pos = numpy.nonzero(Leaf_Taxa_Idx >= 0)[0]
+
+  Eval_List = []
+  for tr, Curr_tree in enumerate(Source_Tree_Iter):
+    Tree_Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List = Get_Tree_Leaf_Spans(Curr_tree, State)
+
+    # least square error of the couplets (common to the supertree)
+    couplet_idx_arr, dist_arr = Get_Leaf_Pair_Dist(Tree_Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List, State)
+    diff_arr = dist_arr - Supertree_Dist[couplet_idx_arr]
+    diff_arr = diff_arr[~numpy.isnan(diff_arr)]
+    lsq_error = float(numpy.dot(diff_arr, diff_arr))
+    rms_error = math.sqrt(lsq_error / len(diff_arr)) if (len(diff_arr) > 0) else 0.0
+    tree_weight = State.Matrix_Weight_Val[tr] if (tr < len(State.Matrix_Weight_Val)) else 1.0
+
+    # clades of both trees, restricted to their common taxa
+    In_Tree = numpy.zeros(Couplet_Info.no_of_taxa, dtype=bool)
+    In_Tree[Tree_Leaf_Taxa_Idx] = True
+    Common_Leaf = numpy.zeros(len(Leaf_Taxa_Idx), dtype=bool)
+    Common_Leaf[valid_leaf_pos] = In_Tree[Leaf_Taxa_Idx[valid_leaf_pos]]
+    Supertree_Clade_Hash = Get_Restricted_Clade_Hash(numpy.where(Common_Leaf, Taxa_Hash[numpy.maximum(Leaf_Taxa_Idx, 0)], 0), \
+						     Common_Leaf, Span_Start, Span_End)
+    Tree_Common_Leaf = (Supertree_Info.Taxon_Leaf_Node[Tree_Leaf_Taxa_Idx] >= 0)
+    Clade_Start, Clade_End = Edge_Len_Init.Get_Source_Tree_Clades(Leaf_Root_Dist, Internal_Node_List)[:2]
+    Tree_Clade_Hash = Get_Restricted_Clade_Hash(numpy.where(Tree_Common_Leaf, Taxa_Hash[Tree_Leaf_Taxa_Idx], 0), \
+						Tree_Common_Leaf, Clade_Start, Clade_End)
+    FP = len(Supertree_Clade_Hash) - int(numpy.count_nonzero(numpy.in1d(Supertree_Clade_Hash, Tree_Clade_Hash)))
+    FN = len(Tree_Clade_Hash) - int(numpy.count_nonzero(numpy.in1d(Tree_Clade_Hash, Supertree_Clade_Hash)))
+    no_of_common_taxa = int(numpy.count_nonzero(Tree_Common_Leaf))
+    # a rooted tree of n taxa has at most n - 2 clades (of 2 to n - 1 taxa), so the RF distance is at most 2n - 4
+    norm_RF = ((FP + FN) * 1.0) / (2 * no_of_common_taxa - 4) if (no_of_common_taxa > 2) else 0.0
+
+    Eval_List.append({'tree_idx': tr, 'no_of_taxa': len(Tree_Leaf_Taxa_Idx), 'no_of_couplets': len(diff_arr), \
+		      'lsq_error': lsq_error, 'rms_error': rms_error, 'weighted_lsq_error': tree_weight * lsq_error, \
+		      'FP': FP, 'FN': FN, 'RF': FP + FN, 'norm_RF': norm_RF})
+
+  no_of_trees = len(Eval_List)
+  Summary = {'no_of_trees': no_of_trees, \
+	     'lsq_error': sum([x['lsq_error'] for x in Eval_List]), \
+	     'weighted_lsq_error': sum([x['weighted_lsq_error'] for x in Eval_List]), \
+	     'mean_RF': (sum([x['RF'] for x in Eval_List]) * 1.0 / no_of_trees) if (no_of_trees > 0) else 0.0, \
+	     'mean_norm_RF': (sum([x['norm_RF'] for x in Eval_List]) / no_of_trees) if (no_of_trees > 0) else 0.0, \
+	     'time_sec': time.time() - start_timestamp}
+  return Eval_List, Summary
+
+#----------------------------------------------------
+"""
+this function writes the evaluation of the supertree (see Evaluate_Supertree) as a tab separated table,
+followed by the summary
+"""
+def Write_Supertree_Evaluation(Out_Filename, Eval_List, Summary):
+  fp = open(Out_Filename, 'w')
+  fp.write('\t'.join(EVALUATION_COLUMN_LIST))
+  for Curr_Eval in Eval_List:
+    fp.write('\n' + '\t'.join([str(Curr_Eval[x]) for x in EVALUATION_COLUMN_LIST]))
+  fp.write('\n\n# no of source trees: ' + str(Summary['no_of_trees']))
+  fp.write('\n# total least square error: ' + str(Summary['lsq_error']))
+  fp.write('\n# total weighted least square error: ' + str(Summary['weighted_lsq_error']))
+  fp.write('\n# mean RF distance: ' + str(Summary['mean_RF']))
+  fp.write('\n# mean normalized RF distance: ' + str(Summary['mean_norm_RF']))
+  fp.write('\n# time of the evaluation: ' + str(Summary['time_sec']) + '\n')
+  fp.close()
+
+#----------------------------------------------------
+"""
+this function returns the source trees of the state, in the order of the tree weights:
+trees kept in memory, trees of an incremental state (parsed from their newick strings),
+or otherwise the trees streamed from the input file (streaming mode, or statistics loaded from the cache)
+"""
+def Get_Source_Tree_Iter(State, INPUT_FILENAME, INPUT_FILE_FORMAT='newick'):
+  if State.Source_Treelist is not None:
+    return State.Source_Treelist
+  if State.Tree_String_List is not None:
+    return Incremental_State.Parse_Tree_Strings(State.Tree_String_List, State.COMPLETE_INPUT_TAXA_LIST, \
+						State.ROOTED_TREE, State.PRESERVE_UNDERSCORE)
+  return Stream_Input_Treelist(State.ROOTED_TREE, State.PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME)
@@ -2,76 +2,274 @@
 
 import Header
 from Header import *
+import Newick_Reader
+from Newick_Reader import Newick_Array_Tree, Newick_Format_Error
                      
 #--------------------------------------------------------
-# this function defines relationship between a pair of nodes in a tree
-# the relationship is either ancestor / descendant, or siblings, or no relationship 
-# parameters: 1) node1 and node2 are two nodes
-# node1_dist_from_mrca_node is the distance of node 1 from MRCA
-# node2_dist_from_mrca_node is the distance of node 2 from MRCA
-def DefineLeafPairReln(node1, node2, node1_dist_from_mrca_node, node2_dist_from_mrca_node, tree_idx):
-  key1 = (node1.taxon.label, node2.taxon.label)
-  key2 = (node2.taxon.label, node1.taxon.label)
-  if key1 in TaxaPair_Reln_Dict:
-    TaxaPair_Reln_Dict[key1]._AddSupportTreeIndex(tree_idx)
-    TaxaPair_Reln_Dict[key1]._Add_Edge_Distance(node1_dist_from_mrca_node, node2_dist_from_mrca_node)
-  elif key2 in TaxaPair_Reln_Dict:
-    TaxaPair_Reln_Dict[key2]._AddSupportTreeIndex(tree_idx)
-    TaxaPair_Reln_Dict[key2]._Add_Edge_Distance(node1_dist_from_mrca_node, node2_dist_from_mrca_node)
-  else:
-    TaxaPair_Reln_Dict.setdefault(key1, Reln_TaxaPair())
-    TaxaPair_Reln_Dict[key1]._AddSupportTreeIndex(tree_idx)
-    TaxaPair_Reln_Dict[key1]._Add_Edge_Distance(node1_dist_from_mrca_node, node2_dist_from_mrca_node)
-      
-  return      
-      
+# this function computes the distance of individual nodes from the root
+# parameters: Parent_Idx - index of the parent of individual nodes (-1 for the root)
+# Edge_Len - length of the edge from individual nodes to their parent (nan if the length is not specified)
+# distances are summed from the node towards the root, in the same order as dendropy distance_from_root()
+# so that the computed values are identical to the ones returned by dendropy
+# nodes at the same depth are processed together, so that the cost is one array operation per level
+def Compute_Root_Distances(Parent_Idx, Edge_Len):
+  len_defined = numpy.logical_not(numpy.isnan(Edge_Len))
+  len_or_zero = numpy.where(len_defined, Edge_Len, 0.0)
+  has_parent = (Parent_Idx >= 0)
+  
+  Root_Dist = numpy.zeros(len(Parent_Idx))
+  # root node: its own edge length, if specified
+  Root_Dist[~has_parent] = len_or_zero[~has_parent]
+  # node with parent but with no edge length: length of the edge of its parent node
+  undef = numpy.nonzero(has_parent & ~len_defined)[0]
+  Root_Dist[undef] = Edge_Len[Parent_Idx[undef]]
+  
+  # other nodes: accumulate the edge lengths from the node upto the root
+  active = numpy.nonzero(has_parent & len_defined)[0]
+  Root_Dist[active] = Edge_Len[active]
+  curr_anc = Parent_Idx[active]
+  while (len(active) > 0):
+    Root_Dist[active] = Root_Dist[active] + len_or_zero[curr_anc]
+    curr_anc = Parent_Idx[curr_anc]
+    keep = (curr_anc >= 0)
+    active = active[keep]
+    curr_anc = curr_anc[keep]
+  
+  return Root_Dist
+
+#--------------------------------------------------------
+# this function converts one tree into flat arrays, using a single postorder traversal
+# leaves are numbered in postorder, so that the leaves under any node form a contiguous span
+# returns 1) Leaf_Taxa_Idx: taxa indices of the leaves (in postorder)
+# 2) Leaf_Root_Dist: distance of the leaves from the root
+# 3) Internal_Node_List: for individual internal nodes (in postorder), a pair 
+# (distance of the node from the root, list of leaf span boundaries of its children)
+# children of a node cover the leaves [b[0], b[1]), [b[1], b[2]), ... where b is the boundary list
+# taxa indices are taken from the couplet store of the given state
+# trees read by the lightweight newick reader are converted by Get_Array_Tree_Leaf_Spans
+def Get_Tree_Leaf_Spans(Curr_tree, State=Default_State):
+  if isinstance(Curr_tree, Newick_Array_Tree):
+    return Get_Array_Tree_Leaf_Spans(Curr_tree, State)
+  Couplet_Info = State.Couplet_Info
+  Node_Idx_Dict = dict()
+  Parent_Idx = []
+  Edge_Len = []
+  Leaf_Taxa_Idx = []
+  Leaf_Node_Idx = []
+  # leaf span (start, end) of individual nodes
+  Span_Start = []
+  Span_End = []
+  Internal_Node_Children = []
+  
+  for curr_node in Curr_tree.postorder_node_iter():
+    node_idx = len(Parent_Idx)
+    Node_Idx_Dict[curr_node] = node_idx
+    Parent_Idx.append(-1)
+    if curr_node.edge.length is None:
+      Edge_Len.append(numpy.nan)
+    else:
+      Edge_Len.append(float(curr_node.edge.length))
+    child_idx_list = [Node_Idx_Dict[x] for x in curr_node.child_nodes()]
+    if (len(child_idx_list) == 0):
+      Span_Start.append(len(Leaf_Taxa_Idx))
+      Span_End.append(len(Leaf_Taxa_Idx) + 1)
+      Leaf_Taxa_Idx.append(Couplet_Info._GetTaxonIdx(curr_node.taxon.label))
+      Leaf_Node_Idx.append(node_idx)
+    else:
+      for x in child_idx_list:
+        Parent_Idx[x] = node_idx
+      Span_Start.append(Span_Start[child_idx_list[0]])
+      Span_End.append(Span_End[child_idx_list[-1]])
+      Internal_Node_Children.append((node_idx, child_idx_list))
+  
+  Root_Dist = Compute_Root_Distances(numpy.array(Parent_Idx, dtype=numpy.int64), numpy.array(Edge_Len))
+  
+  Internal_Node_List = []
+  for node_idx, child_idx_list in Internal_Node_Children:
+    boundary_list = [Span_Start[x] for x in child_idx_list]
+    boundary_list.append(Span_End[child_idx_list[-1]])
+    Internal_Node_List.append((Root_Dist[node_idx], boundary_list))
+  
+  return numpy.array(Leaf_Taxa_Idx, dtype=numpy.int64), Root_Dist[Leaf_Node_Idx], Internal_Node_List
+
+#--------------------------------------------------------
+# this function returns the same arrays as Get_Tree_Leaf_Spans, for a tree read by the lightweight newick reader
+# nodes of such a tree are already numbered in postorder, and the subtree of a node v consists of the nodes
+# Subtree_Start[v], ..., v; so the leaf spans of all the nodes are derived by array operations
+def Get_Array_Tree_Leaf_Spans(Curr_tree, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Parent_Idx = Curr_tree.Parent
+  Is_Leaf = (Curr_tree.Leaf_Label_Id >= 0)
+  Leaf_Node_Idx = numpy.nonzero(Is_Leaf)[0]
+  Label_List = Curr_tree.Label_Set.Label_List
+  Leaf_Taxa_Idx = numpy.array([Couplet_Info._GetTaxonIdx(Label_List[x]) for x in Curr_tree.Leaf_Label_Id[Leaf_Node_Idx]], \
+			      dtype=numpy.int64)
+  # leaf span (start, end) of individual nodes
+  Leaf_Count = numpy.cumsum(Is_Leaf)
+  Span_End = Leaf_Count
+  Span_Start = (Leaf_Count - Is_Leaf)[Curr_tree.Subtree_Start]
+  
+  Root_Dist = Compute_Root_Distances(Parent_Idx, Curr_tree.Edge_Len)
+  
+  # children of individual nodes are grouped (in the order of the node indices) by a stable sort on their parents
+  child_order = numpy.argsort(Parent_Idx, kind='mergesort')
+  child_order = child_order[Parent_Idx[child_order] >= 0]
+  child_parent = Parent_Idx[child_order]
+  child_span_start = Span_Start[child_order].tolist()
+  Internal_Node_Idx = numpy.nonzero(~Is_Leaf)[0]
+  child_first = numpy.searchsorted(child_parent, Internal_Node_Idx, 'left').tolist()
+  child_last = numpy.searchsorted(child_parent, Internal_Node_Idx, 'right').tolist()
+  Span_End_List = Span_End.tolist()
+  
+  Internal_Node_List = []
+  for k, node_idx in enumerate(Internal_Node_Idx.tolist()):
+    boundary_list = child_span_start[child_first[k]:child_last[k]]
+    boundary_list.append(Span_End_List[node_idx])
+    Internal_Node_List.append((Root_Dist[node_idx], boundary_list))
+  
+  return Leaf_Taxa_Idx, Root_Dist[Leaf_Node_Idx], Internal_Node_List
+
+#--------------------------------------------------------
+# this function returns the taxa labels of a tree (in the order of infer_taxa() of dendropy)
+# for both the dendropy trees and the trees read by the lightweight newick reader
+def Get_Tree_Taxa_Labels(Curr_tree):
+  if isinstance(Curr_tree, Newick_Array_Tree):
+    return Curr_tree._GetTaxaLabels()
+  return Curr_tree.infer_taxa().labels()
+
+#--------------------------------------------------------
+# this function returns the couplets whose MRCA is one node of a tree (see Get_Tree_Leaf_Spans)
+# leaves under the later children of the node form one contiguous span, so that for every child
+# all the couplets between its leaves and the leaves of the later children are emitted in one block
+# parameters: curr_node_dist_from_root, boundary_list - distance of the node from the root, and leaf span
+# boundaries of its children; returns the couplet indices and the couplet distances as arrays (None for a node
+# having a single child, which is not the MRCA of any couplet)
+def Get_Node_Couplet_Block(Leaf_Taxa_Idx, Leaf_Root_Dist, curr_node_dist_from_root, boundary_list, State=Default_State):
+  if (len(boundary_list) < 3):
+    return None
+  # distance of individual leaves (under this node) from the current node
+  span_dist_from_mrca_node = Leaf_Root_Dist[boundary_list[0]:boundary_list[-1]] - curr_node_dist_from_root
+  node1_pos_list = []
+  node2_pos_list = []
+  for i in range(len(boundary_list) - 2):
+    node1_pos = numpy.arange(boundary_list[i], boundary_list[i+1])
+    node2_pos = numpy.arange(boundary_list[i+1], boundary_list[-1])
+    node1_pos_list.append(numpy.repeat(node1_pos, len(node2_pos)))
+    node2_pos_list.append(numpy.tile(node2_pos, len(node1_pos)))
+  node1_pos = numpy.concatenate(node1_pos_list)
+  node2_pos = numpy.concatenate(node2_pos_list)
+  node1_dist_from_mrca_node = span_dist_from_mrca_node[node1_pos - boundary_list[0]]
+  node2_dist_from_mrca_node = span_dist_from_mrca_node[node2_pos - boundary_list[0]]
+  return State.Couplet_Info._GetCoupletIdxArr(Leaf_Taxa_Idx[node1_pos], Leaf_Taxa_Idx[node2_pos]), \
+	  node1_dist_from_mrca_node + node2_dist_from_mrca_node
+
+#--------------------------------------------------------
+# this function derives couplet relations belonging to one tree
+# every couplet is related at its MRCA node, where the two taxa descend from different children
+# (see Get_Node_Couplet_Block)
+# returns the couplet indices and the couplet distances (for the given tree) as arrays
+def Get_Tree_Couplet_Arrays(Curr_tree, State=Default_State):
+  Leaf_Taxa_Idx, Leaf_Root_Dist, Internal_Node_List = Get_Tree_Leaf_Spans(Curr_tree, State)
+  
+  couplet_idx_block_list = []
+  dist_block_list = []
+  for curr_node_dist_from_root, boundary_list in Internal_Node_List:
+    Block = Get_Node_Couplet_Block(Leaf_Taxa_Idx, Leaf_Root_Dist, curr_node_dist_from_root, boundary_list, State)
+    if Block is not None:
+      couplet_idx_block_list.append(Block[0])
+      dist_block_list.append(Block[1])
+  
+  if (len(couplet_idx_block_list) == 0):
+    return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+  return numpy.concatenate(couplet_idx_block_list), numpy.concatenate(dist_block_list)
+
+#--------------------------------------------------------
+# this function notes the couplet support counts of all the input trees
+# every pair of taxa of an input tree is a couplet supported by that tree
+# so the support counts are derived only from the taxa sets, before the couplet distances are extracted
+def DeriveCoupletSupport(Input_Treelist, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  for tr_idx in range(len(Input_Treelist)):
+    taxa_labels_curr_tree = Get_Tree_Taxa_Labels(Input_Treelist[tr_idx])
+    Couplet_Info._AddTreeTaxaSupport([Couplet_Info._GetTaxonIdx(label) for label in taxa_labels_curr_tree])
+
 #--------------------------------------------------------
-# this function derives coupket relations belonging to one tree
+# this function derives couplet relations belonging to one tree
 # that is provided as an input argument to this function
-def DeriveCoupletRelations(Curr_tree, tree_idx):
-    
-  # traverse the internal nodes of the tree in postorder fashion
-  for curr_node in Curr_tree.postorder_internal_node_iter():
-    # distance of this node from the root node
-    curr_node_dist_from_root = curr_node.distance_from_root()
-
-    # list the leaf and internal children of the current node
-    curr_node_child_leaf_nodes = []
-    curr_node_child_internal_nodes = []
-    for x in curr_node.child_nodes():
-      if (x.is_leaf() == True):
-	curr_node_child_leaf_nodes.append(x)
-      else:
-	curr_node_child_internal_nodes.append(x)
-    
-    # pair of leaf nodes will be related by sibling relations
-    if (len(curr_node_child_leaf_nodes) > 1):
-      for i in range(len(curr_node_child_leaf_nodes) - 1):
-	node1_dist_from_mrca_node = curr_node_child_leaf_nodes[i].distance_from_root() - curr_node_dist_from_root
-	for j in range(i+1, len(curr_node_child_leaf_nodes)):
-	  node2_dist_from_mrca_node = curr_node_child_leaf_nodes[j].distance_from_root() - curr_node_dist_from_root
-	  DefineLeafPairReln(curr_node_child_leaf_nodes[i], curr_node_child_leaf_nodes[j], \
-	    node1_dist_from_mrca_node, node2_dist_from_mrca_node, tree_idx)
-    
-    # one leaf node (direct descendant) and another leaf node (under one internal node)
-    # will be related by ancestor / descendant relations
-    if (len(curr_node_child_leaf_nodes) > 0) and (len(curr_node_child_internal_nodes) > 0):
-      for p in curr_node_child_leaf_nodes:
-	node1_dist_from_mrca_node = p.distance_from_root() - curr_node_dist_from_root
-	for q in curr_node_child_internal_nodes:
-	  for r in q.leaf_nodes():
-	    node2_dist_from_mrca_node = r.distance_from_root() - curr_node_dist_from_root
-	    DefineLeafPairReln(p, r, node1_dist_from_mrca_node, node2_dist_from_mrca_node, tree_idx)
-    
-    # finally a pair of leaf nodes which are descendant of internal nodes will be related by NO_EDGE relation
-    if (len(curr_node_child_internal_nodes) > 1):
-      for i in range(len(curr_node_child_internal_nodes) - 1):
-	for j in range(i+1, len(curr_node_child_internal_nodes)):
-	  for p in curr_node_child_internal_nodes[i].leaf_nodes():
-	    node1_dist_from_mrca_node = p.distance_from_root() - curr_node_dist_from_root
-	    for q in curr_node_child_internal_nodes[j].leaf_nodes():
-	      node2_dist_from_mrca_node = q.distance_from_root() - curr_node_dist_from_root
-	      DefineLeafPairReln(p, q, node1_dist_from_mrca_node, node2_dist_from_mrca_node, tree_idx)
+# the weight of the tree (in Matrix_Weight_Val) should already be computed
+def DeriveCoupletRelations(Curr_tree, tree_idx, State=Default_State):
+  couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Curr_tree, State)
+  State.Couplet_Info._AddTreeCouplets(tree_idx, State.Matrix_Weight_Val[tree_idx], couplet_idx_arr, dist_arr)
+
+# input treelist and state (containing the taxa indices) accessed by the worker processes 
+# of the couplet extraction; they are set by the initializer of individual (forked) workers
+# so neither the trees nor the couplet store need to be sent to them
+Worker_Treelist = []
+Worker_State = Default_State
+
+#--------------------------------------------------------
+# this function initializes a worker process of the couplet extraction
+def Worker_Initialize(Input_Treelist, State):
+  global Worker_Treelist
+  global Worker_State
+  Worker_Treelist = Input_Treelist
+  Worker_State = State
+
+#--------------------------------------------------------
+# this function is executed by a worker process, for one input tree
+# returns the index of the tree, the couplet indices and the couplet distances of the tree
+def Worker_Get_Tree_Couplet_Arrays(tree_idx):
+  couplet_idx_arr, dist_arr = Get_Tree_Couplet_Arrays(Worker_Treelist[tree_idx], Worker_State)
+  return tree_idx, couplet_idx_arr.astype(numpy.int32), dist_arr
+
+#--------------------------------------------------------
+# this function derives couplet relations of all the input trees
+# parameters: Input_Treelist - input trees
+# no_of_jobs - number of worker processes; individual trees are processed by the workers,
+# and their (couplet index, couplet distance) arrays are merged into the couplet store
+# merging follows the order of the input trees, so the results do not depend on the number of workers
+# weights of the input trees (in Matrix_Weight_Val) should already be computed
+def DeriveCoupletRelations_AllTrees(Input_Treelist, no_of_jobs=1, State=Default_State):
+  if (no_of_jobs <= 1) or (len(Input_Treelist) <= 1):
+    for tr_idx in range(len(Input_Treelist)):
+      DeriveCoupletRelations(Input_Treelist[tr_idx], tr_idx, State)
+    return
+  
+  pool = multiprocessing.Pool(processes=min(no_of_jobs, len(Input_Treelist)), \
+			      initializer=Worker_Initialize, initargs=(list(Input_Treelist), State))
+  try:
+    chunk_size = max(1, len(Input_Treelist) // (4 * no_of_jobs))
+    for tr_idx, couplet_idx_arr, dist_arr in pool.imap(Worker_Get_Tree_Couplet_Arrays, \
+							  range(len(Input_Treelist)), chunk_size):
+      State.Couplet_Info._AddTreeCouplets(tr_idx, State.Matrix_Weight_Val[tr_idx], couplet_idx_arr, dist_arr)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+#--------------------------------------------------------
+# this function writes the distance values of individual couplets with respect to 
+# their supporting input trees, for diagnostics
+# these values are available only if the couplet store keeps the values of individual trees
+def WriteCoupletTreeValues(Out_Filename, State=Default_State):
+  Couplet_Info = State.Couplet_Info
+  Couplet_Tree_Dict = dict()
+  for tr_idx in sorted(Couplet_Info.Tree_Couplet_Values):
+    couplet_idx_arr, dist_arr = Couplet_Info.Tree_Couplet_Values[tr_idx]
+    for k in range(len(couplet_idx_arr)):
+      Couplet_Tree_Dict.setdefault(couplet_idx_arr[k], []).append((tr_idx, dist_arr[k]))
+  
+  fp = open(Out_Filename, 'w')
+  for couplet_idx in sorted(Couplet_Tree_Dict):
+    i, j = Couplet_Info._GetTaxaIdxFromCoupletIdx(couplet_idx)
+    fp.write(Couplet_Info.Taxa_Label_List[i] + '\t' + Couplet_Info.Taxa_Label_List[j] + \
+      '\t' + str(Couplet_Info._GetCoupletAvgDistMatVal(couplet_idx)))
+    for tr_idx, dist_val in Couplet_Tree_Dict[couplet_idx]:
+      fp.write('\t' + str(tr_idx) + ':' + str(dist_val))
+    fp.write('\n')
+  fp.close()
 
 ##-----------------------------------------------------
 # this function reads the input tree list file
@@ -79,8 +277,17 @@ def DeriveCoupletRelations(Curr_tree, tree_idx):
 # PRESERVE_UNDERSCORE: whether underscores of the taxa name will be preserved or not
 # INPUT_FILE_FORMAT: data is read from the file according to NEWICK or NEXUS format
 # INPUT_FILENAME: file containing the input treelist
+# FAST_NEWICK: if True, a newick treelist is read by the lightweight newick reader, which returns a list of 
+# array based trees (Newick_Array_Tree) instead of a dendropy TreeList; the file is read by dendropy
+# if it is not supported by the lightweight reader (such as NEXUS files)
 
-def Read_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME):
+def Read_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME, FAST_NEWICK=False):
+  if (FAST_NEWICK == True) and (INPUT_FILE_FORMAT == 'newick'):
+    try:
+      return Newick_Reader.Read_Newick_Array_Treelist(INPUT_FILENAME, PRESERVE_UNDERSCORE)
+    except Newick_Format_Error, e:
+      print 'Input trees are read by dendropy (not supported by the fast newick reader: ' + str(e) + ')'
+  
   Inp_TreeList = dendropy.TreeList.get_from_path(INPUT_FILENAME, schema=INPUT_FILE_FORMAT, \
 						  preserve_underscores=PRESERVE_UNDERSCORE, \
 						  default_as_rooted=ROOTED_TREE)
@@ -88,6 +295,21 @@ def Read_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INP
   return Inp_TreeList
       
       
+##-----------------------------------------------------
+# this function iterates over the trees of the input tree list file, reading one tree at a time
+# so that the complete treelist is not held in memory
+# parameters are same as the function Read_Input_Treelist
+
+def Stream_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_FILENAME):
+  fp = open(INPUT_FILENAME, 'r')
+  try:
+    for curr_tree in dendropy.tree_source_iter(fp, schema=INPUT_FILE_FORMAT, \
+						preserve_underscores=PRESERVE_UNDERSCORE, \
+						default_as_rooted=ROOTED_TREE):
+      yield curr_tree
+  finally:
+    fp.close()
+      
 ##-----------------------------------------------------
 # this function reads an input tree from a specified file
 # parameters: ROOTED_TREE - whether the treelist to be read as rooted format
@@ -102,9 +324,37 @@ def Read_Input_Tree(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_F
   
   return Inp_Tree
       
+##-----------------------------------------------------
+# this function reads one or more candidate supertree topologies
+# parameters: ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT - same as Read_Input_Tree
+# INPUT_PATH: either a file containing one or more trees, or a directory whose files contain the trees
+# returns a list of (name, tree) pairs, where the name is the file name (followed by the 
+# position of the tree, if the file contains multiple trees)
+
+def Read_Input_Topologies(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, INPUT_PATH):
+  if (os.path.isdir(INPUT_PATH) == True):
+    Filename_List = [os.path.join(INPUT_PATH, x) for x in sorted(os.listdir(INPUT_PATH)) \
+		      if (x.startswith('.') == False) and (os.path.isfile(os.path.join(INPUT_PATH, x)) == True)]
+  else:
+    Filename_List = [INPUT_PATH]
+  
+  Topology_List = []
+  for curr_filename in Filename_List:
+    Curr_TreeList = Read_Input_Treelist(ROOTED_TREE, PRESERVE_UNDERSCORE, INPUT_FILE_FORMAT, curr_filename)
+    topology_name = os.path.basename(curr_filename)
+    if (len(Curr_TreeList) == 1):
+      Topology_List.append((topology_name, Curr_TreeList[0]))
+    else:
+      for tr_idx in range(len(Curr_TreeList)):
+	Topology_List.append((topology_name + '_' + str(tr_idx + 1), Curr_TreeList[tr_idx]))
+  
+  return Topology_List
+      
 ##-----------------------------------------------------
 """ this function computes the false positive, false negative
-and symmetric difference between the inferred supertree and an input tree """
+and symmetric difference between the inferred supertree and an input tree 
+(the supertree is copied for every input tree; Supertree_Evaluation.py evaluates all the input trees 
+against the supertree without copying it) """
 def Compute_FP_FN_RF_SingleTree(Src_Tree, Derived_Tree):
   curr_src_tree_taxa = Src_Tree.infer_taxa().labels()
   pruned_tree = dendropy.Tree(Derived_Tree)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+this file checks that concurrent solves within one process do not interfere with each other
+two synthetic treelists (of different numbers of taxa) are loaded by the server (CSTBL_Server.py, standard input mode);
+a request on the larger treelist is sent, and requests on the smaller treelist are sent one after another until
+its response is received, so that they are solved while the first request is being solved; the responses
+(branch lengths and least square errors) must be the same as those of the requests served one at a time,
+and the standard output of the server must contain only the responses
+similarly, the bootstrap of the branch lengths (see Bootstrap.py) of the two treelists is executed by two engine 
+objects (CSTBL_Context) in different threads of this process
+the script prints the result of every check, and exits with a non-zero status if any check fails
+"""
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import shutil
+import threading
+from optparse import OptionParser
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import Header
+from Header import *
+import CSTBL_Engine
+from CSTBL_Engine import CSTBL_Context
+import Bootstrap
+import Supertree_Evaluation
+import Tree_Generator
+
+# number of bootstrap replicates of the larger treelist
+NO_OF_REPLICATES = 20
+
+# server program
+SERVER_PROGRAM = os.path.join(os.path.dirname(BENCHMARK_DIR), 'CSTBL_Server.py')
+
+##-----------------------------------------------------
+"""
+reads the next response of a server; returns the response (dictionary), or None if the line is not JSON
+(the line is then appended to Diff_List)
+"""
+def Read_Server_Response(Server_Process, Diff_List):
+  line = Server_Process.stdout.readline()
+  try:
+    return json.loads(line)
+  except ValueError:
+    Diff_List.append('response stream contains a line which is not JSON: ' + line.strip()[:80])
+    return None
+
+##-----------------------------------------------------
+"""
+sends the requests to a server in the standard input mode, serving at most no_of_threads requests at a time,
+with the treelist of the short requests also loaded at the start (-I option, whose messages must not be in the response stream):
+the load requests (their responses are awaited), the long request, and then the short requests one after another 
+(each sent once the response of the previous one is received) until the response of the long request is received
+the ids of the short requests are numbered
+returns the list of the differences found in the response stream, the response of the long request, 
+and the list of the responses of the short requests
+"""
+def Run_Server_Requests(Load_Request_List, Long_Request, Short_Request, no_of_threads):
+  Server_Process = subprocess.Popen([sys.executable, SERVER_PROGRAM, '--threads', str(no_of_threads), \
+				     '-I', Short_Request['input_file']], \
+				    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+  Diff_List = []
+  Long_Response = None
+  Short_Response_List = []
+  try:
+    for Request in Load_Request_List + [Long_Request]:
+      Server_Process.stdin.write(json.dumps(Request) + '\n')
+    Server_Process.stdin.flush()
+    for Request in Load_Request_List:
+      Read_Server_Response(Server_Process, Diff_List)
+    while True:
+      Request = dict(Short_Request)
+      Request['id'] = Short_Request['id'] + str(len(Short_Response_List))
+      Server_Process.stdin.write(json.dumps(Request) + '\n')
+      Server_Process.stdin.flush()
+      Response = Read_Server_Response(Server_Process, Diff_List)
+      if (Response is not None) and (Response.get('id') == Long_Request['id']):
+	Long_Response = Response
+	Response = Read_Server_Response(Server_Process, Diff_List)
+      Short_Response_List.append(Response)
+      if (Long_Response is not None) or (len(Diff_List) > 0):
+	break
+  finally:
+    Server_Process.stdin.close()
+    Server_Process.wait()
+  return Diff_List, Long_Response, Short_Response_List
+
+##-----------------------------------------------------
+"""
+checks that a response of the concurrent requests is the same as the response of the request served alone
+"""
+def Compare_Responses(Response, Serial_Response, request_name, Diff_List):
+  if (Serial_Response is None) or (Serial_Response.get('status') != 'ok'):
+    Diff_List.append(request_name + ' fails when served alone')
+  elif (Response is None) or (Response.get('status') != 'ok'):
+    Diff_List.append(request_name + ' fails when served concurrently' + \
+		     ('' if (Response is None) else (': ' + str(Response.get('message')))))
+  elif (Response.get('newick') != Serial_Response.get('newick')) or \
+       (Response.get('lsq_error') != Serial_Response.get('lsq_error')):
+    Diff_List.append(request_name + ' gives different branch lengths when served concurrently')
+
+##-----------------------------------------------------
+"""
+checks the concurrent requests of the block solver (block_size) on two treelists (see the description
+of this file); requests start from zero edge lengths, so that their results do not depend on the previous 
+requests on the same treelist
+"""
+def Check_Block_Requests(Dataset_List, block_size):
+  Load_Request_List = [{'id': 'load' + str(dataset_idx), 'command': 'load', 'input_file': Dataset_List[dataset_idx][0]} \
+		       for dataset_idx in range(len(Dataset_List))]
+  Request_List = [{'id': 'AB'[dataset_idx], 'input_file': Dataset_List[dataset_idx][0], \
+		   'topology_file': Dataset_List[dataset_idx][1], 'solver': 2, 'block_size': block_size, 'init_edge_len': 2} \
+		  for dataset_idx in range(len(Dataset_List))]
+  Diff_List, Serial_Long_Response, Serial_Short_Response_List = Run_Server_Requests(Load_Request_List, \
+									Request_List[0], Request_List[1], 1)
+  Curr_Diff_List, Long_Response, Short_Response_List = Run_Server_Requests(Load_Request_List, Request_List[0], \
+									  Request_List[1], 4)
+  Diff_List.extend(Curr_Diff_List)
+  Compare_Responses(Long_Response, Serial_Long_Response, 'request on the larger treelist', Diff_List)
+  for Response in Short_Response_List:
+    Compare_Responses(Response, Serial_Short_Response_List[0], 'request ' + str((Response or {}).get('id')), Diff_List)
+  if (len(Short_Response_List) < 2):
+    Diff_List.append('requests on the smaller treelist are not solved concurrently')
+  return Diff_List
+
+##-----------------------------------------------------
+"""
+returns the engine object of a dataset, with the branch lengths of its topology assigned,
+and the function returning the bootstrap edge lengths of the engine object (with no_of_replicates replicates)
+"""
+def Get_Bootstrap_Context(INPUT_FILENAME, TOPOLOGY_FILENAME):
+  Curr_Context = CSTBL_Context()
+  Curr_Context._ReadSourceTrees(INPUT_FILENAME)
+  Curr_Context._ReadTopology(TOPOLOGY_FILENAME)
+  Weighted_Supertree = Curr_Context._Solve()
+  def Get_Replicate_Edge_Len(no_of_replicates):
+    return Bootstrap.Bootstrap_Edge_Len(Weighted_Supertree, \
+					Supertree_Evaluation.Get_Source_Tree_Iter(Curr_Context, INPUT_FILENAME, 'newick'), \
+					no_of_replicates, Bootstrap.DEFAULT_BOOTSTRAP_SEED, 1, Curr_Context)[1]
+  return Get_Replicate_Edge_Len
+
+##-----------------------------------------------------
+"""
+checks the concurrent bootstrap of two treelists: the bootstrap of the first (larger) treelist is executed 
+in a thread, while the bootstrap of the other treelist is repeated in another thread until it completes
+"""
+def Check_Bootstrap(Dataset_List):
+  Long_Bootstrap = Get_Bootstrap_Context(Dataset_List[0][0], Dataset_List[0][1])
+  Short_Bootstrap = Get_Bootstrap_Context(Dataset_List[1][0], Dataset_List[1][1])
+  Serial_Long_Edge_Len = Long_Bootstrap(NO_OF_REPLICATES)
+  Serial_Short_Edge_Len = Short_Bootstrap(2)
+  
+  Result_Dict = dict()
+  def Run_Long_Bootstrap():
+    try:
+      Result_Dict['long'] = Long_Bootstrap(NO_OF_REPLICATES)
+    except Exception, e:
+      Result_Dict['long'] = (type(e).__name__ + ': ' + str(e)).strip()
+  Long_Thread = threading.Thread(target=Run_Long_Bootstrap)
+  Long_Thread.start()
+  Short_Result_List = []
+  while (Long_Thread.is_alive() == True) or (len(Short_Result_List) == 0):
+    try:
+      Short_Result_List.append(Short_Bootstrap(2))
+    except Exception, e:
+      Short_Result_List.append((type(e).__name__ + ': ' + str(e)).strip())
+  Long_Thread.join()
+
+  Diff_List = []
+  for name, Result, Serial_Result in [('larger treelist', Result_Dict.get('long'), Serial_Long_Edge_Len)] + \
+				     [('smaller treelist', x, Serial_Short_Edge_Len) for x in Short_Result_List]:
+    if isinstance(Result, str):
+      Diff_List.append('bootstrap of the ' + name + ' fails when executed concurrently: ' + Result)
+    elif (numpy.array_equal(Result, Serial_Result) == False):
+      Diff_List.append('bootstrap of the ' + name + ' gives different edge lengths when executed concurrently')
+  if (len(Short_Result_List) < 2):
+    Diff_List.append('bootstraps of the smaller treelist are not executed concurrently')
+  return Diff_List
+
+##-----------------------------------------------------
+# this function is useful to parse various options for the check
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("-n", "--taxa", type="int", action="store", dest="no_of_taxa", default=200, \
+			  help="number of taxa of the larger synthetic dataset (default 200)")
+  parser.add_option("-m", "--trees", type="int", action="store", dest="no_of_trees", default=30, \
+			  help="number of source trees of the larger synthetic dataset (default 30)")
+  parser.add_option("-b", "--block-size", type="int", action="store", dest="block_size", default=20, \
+			  help="maximum number of edges of a block of the block solver (default 20)")
+  parser.add_option("-r", "--seed", type="int", action="store", dest="seed", default=1, \
+			  help="seed of the random number generator (default 1)")
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+''' main function '''
+def main():
+  opts, args = parse_options()
+  work_dir = tempfile.mkdtemp(prefix='CSTBL_concurrency_')
+  no_of_failed = 0
+  try:
+    Dataset_List = [Tree_Generator.Generate_Dataset(os.path.join(work_dir, 'large'), opts.no_of_taxa, opts.no_of_trees, \
+						    0.3, 'random', 0.1, opts.seed), \
+		    Tree_Generator.Generate_Dataset(os.path.join(work_dir, 'small'), 25, 10, 0.5, 'random', 0.1, opts.seed)]
+    for check_name, Diff_List in [('block solver requests', Check_Block_Requests(Dataset_List, opts.block_size)), \
+				  ('bootstrap', Check_Bootstrap(Dataset_List))]:
+      if (len(Diff_List) == 0):
+	print check_name + ': OK'
+      else:
+	no_of_failed = no_of_failed + 1
+	print check_name + ': FAILED - ' + '; '.join(Diff_List)
+  finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
+  if (no_of_failed > 0):
+    sys.exit(1)
+
+##-----------------------------------------------------
+if __name__ == "__main__":
+  main()
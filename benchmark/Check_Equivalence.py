@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+"""
+this file checks that the optimized derivations of the couplet statistics give the same results
+as the plain derivation, on a synthetic (or user provided) input treelist
+1) tree weights (Compute_Tree_Weight) are compared with the original loop over the taxa pairs (bit identical)
+2) couplet statistics updated incrementally (source trees added and removed, see Incremental_State.py)
+are compared with the statistics derived from the resulting treelist
+3) couplet statistics derived with the deduplication of identical trees and repeated clades (see Couplet_Dedup.py)
+are compared with the statistics derived without it, on the treelist extended by repeated and rotated trees
+support counts and tree weights must be identical; the weighted couplet distance sums are compared up to
+the rounding of the floating point sums (SUM_REL_TOL), since they are accumulated in a different order
+the script prints the result of every check, and exits with a non-zero status if any check fails
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+from optparse import OptionParser
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import Edge_Len_Adjust
+import Incremental_State
+import CSTBL_Engine
+from CSTBL_Engine import CSTBL_Context
+import Tree_Generator
+
+# relative tolerance of the weighted couplet distance sums
+SUM_REL_TOL = 1e-12
+
+##-----------------------------------------------------
+"""
+original computation of the weight of a source tree (loop over the taxa pairs, in the order of the taxa)
+which is the reference of the vectorized Compute_Tree_Weight
+"""
+def Reference_Tree_Weight(curr_tree_taxa_idx_list, State):
+  supp_taxa_count = 0
+  number_of_taxa = len(curr_tree_taxa_idx_list)
+  for i in range(number_of_taxa - 1):
+    t1_idx = curr_tree_taxa_idx_list[i]
+    for j in range(i+1, number_of_taxa):
+      t2_idx = curr_tree_taxa_idx_list[j]
+      couplet_idx = State.Couplet_Info._GetCoupletIdxFromTaxaIdx(t1_idx, t2_idx)
+      if (State.Couplet_Info._GetNoSupportTrees(couplet_idx) >= 2):
+	supp_taxa_count = supp_taxa_count + 2
+	break
+  return (1.0 / supp_taxa_count)
+
+##-----------------------------------------------------
+"""
+derives the couplet statistics of a treelist file (plain derivation, without deduplication)
+returns the context containing the statistics
+"""
+def Derive_Statistics(INPUT_FILENAME, dedup=False):
+  Curr_Context = CSTBL_Context(dedup=dedup)
+  Curr_Context._ReadSourceTrees(INPUT_FILENAME)
+  Curr_Context._DeriveCoupletStatistics()
+  return Curr_Context
+
+##-----------------------------------------------------
+"""
+compares the couplet statistics and the tree weights of two states
+the taxa of the states may be indexed differently (such as the taxa appended by an incremental update),
+so the couplets are matched by the taxa labels
+returns the list of the differences found (empty if the states are equivalent)
+"""
+def Compare_Statistics(State1, State2):
+  Diff_List = []
+  Info1 = State1.Couplet_Info
+  Info2 = State2.Couplet_Info
+  if (sorted(Info1.Taxa_Label_List) != sorted(Info2.Taxa_Label_List)):
+    Diff_List.append('taxa sets differ')
+    return Diff_List
+  Label_Pos = dict([(Info2.Taxa_Label_List[x], x) for x in range(len(Info2.Taxa_Label_List))])
+  Taxa_Map = numpy.array([Label_Pos[label] for label in Info1.Taxa_Label_List], dtype=numpy.int64)
+  i, j = numpy.triu_indices(len(Taxa_Map), 1)
+  couplet_idx1 = Info1._GetCoupletIdxArr(i, j)
+  couplet_idx2 = Info2._GetCoupletIdxArr(Taxa_Map[i], Taxa_Map[j])
+  if (numpy.array_equal(Info1.Support_Count[couplet_idx1], Info2.Support_Count[couplet_idx2]) == False):
+    Diff_List.append('support counts differ')
+  if (list(State1.Matrix_Weight_Val) != list(State2.Matrix_Weight_Val)):
+    Diff_List.append('tree weights differ')
+  if (list(State1.Tree_Taxa_Count) != list(State2.Tree_Taxa_Count)):
+    Diff_List.append('numbers of taxa of the trees differ')
+  for name in ['Weight_Sum', 'Weighted_Dist_Sum']:
+    val1 = getattr(Info1, name)[couplet_idx1]
+    val2 = getattr(Info2, name)[couplet_idx2]
+    max_diff = numpy.abs(val1 - val2).max() if (len(val1) > 0) else 0.0
+    if (max_diff > SUM_REL_TOL * max(1.0, numpy.abs(val2).max())):
+      Diff_List.append(name + ' differs (max difference ' + str(max_diff) + ')')
+  return Diff_List
+
+##-----------------------------------------------------
+"""
+checks the vectorized tree weights against the reference loop
+"""
+def Check_Tree_Weights(INPUT_FILENAME):
+  Curr_Context = Derive_Statistics(INPUT_FILENAME)
+  Diff_List = []
+  for tr in range(len(Curr_Context.Source_Treelist)):
+    curr_tree_taxa_idx_list = [Curr_Context.Couplet_Info._GetTaxonIdx(label) \
+				for label in Get_Tree_Taxa_Labels(Curr_Context.Source_Treelist[tr])]
+    if (Edge_Len_Adjust.Compute_Tree_Weight(curr_tree_taxa_idx_list, Curr_Context) != \
+	Reference_Tree_Weight(curr_tree_taxa_idx_list, Curr_Context)):
+      Diff_List.append('weight of the tree ' + str(tr) + ' differs')
+  return Diff_List
+
+##-----------------------------------------------------
+"""
+checks the incremental update of the couplet statistics: the first half of the trees is saved as a state,
+every third of these trees is removed and the other half of the trees is added; the result is compared
+with the statistics derived from the remaining trees
+"""
+def Check_Incremental_Update(INPUT_FILENAME, work_dir):
+  Tree_String_List = Incremental_State.Get_Source_Tree_Strings(INPUT_FILENAME, 'newick', True, True)
+  no_of_base_trees = len(Tree_String_List) // 2
+  Remove_Idx_List = range(0, no_of_base_trees, 3)
+  Base_Filename = os.path.join(work_dir, 'base_trees.tre')
+  Final_Filename = os.path.join(work_dir, 'final_trees.tre')
+  fp = open(Base_Filename, 'w')
+  fp.write('\n'.join(Tree_String_List[:no_of_base_trees]) + '\n')
+  fp.close()
+  Final_Tree_String_List = [Tree_String_List[x] for x in range(no_of_base_trees) if x not in Remove_Idx_List] + \
+			    Tree_String_List[no_of_base_trees:]
+  fp = open(Final_Filename, 'w')
+  fp.write('\n'.join(Final_Tree_String_List) + '\n')
+  fp.close()
+
+  state_dir = os.path.join(work_dir, 'state')
+  Base_Context = Derive_Statistics(Base_Filename)
+  Base_Context._SaveState(state_dir, Tree_String_List[:no_of_base_trees])
+  Inc_Context = CSTBL_Context()
+  Inc_Context._LoadState(state_dir)
+  if (Inc_Context._UpdateSourceTrees(Tree_String_List[no_of_base_trees:], Remove_Idx_List) < 0):
+    return ['incremental update failed']
+  return Compare_Statistics(Inc_Context, Derive_Statistics(Final_Filename))
+
+##-----------------------------------------------------
+"""
+checks the deduplication: the treelist is extended by copies of some trees, and by the same trees
+with the children of every node in the reverse order; statistics with and without the deduplication are compared
+"""
+def Check_Dedup(INPUT_FILENAME, work_dir):
+  Input_Treelist = Read_Input_Treelist(True, True, 'newick', INPUT_FILENAME)
+  Tree_String_List = [curr_tree.as_newick_string() + ';' for curr_tree in Input_Treelist]
+  for curr_tree in Input_Treelist[::2]:
+    for curr_node in curr_tree.postorder_node_iter():
+      if (curr_node.is_leaf() == False):
+	curr_node.set_child_nodes(list(reversed(curr_node.child_nodes())))
+    Tree_String_List.append(curr_tree.as_newick_string() + ';')
+  Tree_String_List.extend(Tree_String_List[:len(Input_Treelist):3])
+  Dup_Filename = os.path.join(work_dir, 'repeated_trees.tre')
+  fp = open(Dup_Filename, 'w')
+  fp.write('\n'.join(Tree_String_List) + '\n')
+  fp.close()
+
+  Dedup_Context = Derive_Statistics(Dup_Filename, True)
+  Diff_List = Compare_Statistics(Dedup_Context, Derive_Statistics(Dup_Filename))
+  if (Dedup_Context.Dedup_Info['no_of_distinct_trees'] != len(Input_Treelist)):
+    Diff_List.append('repeated trees are not grouped (' + str(Dedup_Context.Dedup_Info['no_of_distinct_trees']) + \
+		     ' distinct trees instead of ' + str(len(Input_Treelist)) + ')')
+  return Diff_List
+
+##-----------------------------------------------------
+# this function is useful to parse various options for the check
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("-I", "--INPFILE", type="string", action="store", dest="INP_FILENAME", default="", \
+			  help="file containing the input trees (newick); if not specified, a synthetic dataset is generated")
+  parser.add_option("-n", "--taxa", type="int", action="store", dest="no_of_taxa", default=60, \
+			  help="number of taxa of the synthetic dataset (default 60)")
+  parser.add_option("-m", "--trees", type="int", action="store", dest="no_of_trees", default=30, \
+			  help="number of source trees of the synthetic dataset (default 30)")
+  parser.add_option("-f", "--overlap", type="float", action="store", dest="overlap", default=0.3, \
+			  help="fraction of the taxa retained in individual source trees (default 0.3)")
+  parser.add_option("-r", "--seed", type="int", action="store", dest="seed", default=1, \
+			  help="seed of the random number generator (default 1)")
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+''' main function '''
+def main():
+  opts, args = parse_options()
+  work_dir = tempfile.mkdtemp(prefix='CSTBL_equivalence_')
+  try:
+    if (opts.INP_FILENAME == ""):
+      INPUT_FILENAME = Tree_Generator.Generate_Dataset(work_dir, opts.no_of_taxa, opts.no_of_trees, \
+						       opts.overlap, 'random', 0.1, opts.seed)[0]
+    else:
+      INPUT_FILENAME = os.path.abspath(opts.INP_FILENAME)
+    no_of_failed = 0
+    for check_name, Diff_List in [('tree weights', Check_Tree_Weights(INPUT_FILENAME)), \
+				  ('incremental update', Check_Incremental_Update(INPUT_FILENAME, work_dir)), \
+				  ('deduplication', Check_Dedup(INPUT_FILENAME, work_dir))]:
+      if (len(Diff_List) == 0):
+	print check_name + ': OK'
+      else:
+	no_of_failed = no_of_failed + 1
+	print check_name + ': FAILED - ' + '; '.join(Diff_List)
+  finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
+  if (no_of_failed > 0):
+    sys.exit(1)
+
+##-----------------------------------------------------
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+"""
+this file benchmarks the CSTBL pipeline on synthetic (or user provided) inputs
+the pipeline phases (reading the input trees, couplet support and tree weights, couplet relations,
+couplet to branch mapping, and the QP solve) are executed one by one, as in CSTBL.py
+for individual phases, the wall clock time, the CPU time and the peak memory (resident set size) are
+reported in JSON format, so that the performance of different versions can be compared
+"""
+
+import os
+import sys
+import time
+import json
+import platform
+import subprocess
+import tempfile
+import shutil
+from optparse import OptionParser
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import Header
+from Header import *
+import UtilFunc
+from UtilFunc import *
+import Edge_Len_Adjust
+from Edge_Len_Adjust import *
+import QP_Solver
+import Tree_Generator
+
+##-----------------------------------------------------
+"""
+returns the git revision of the package, if available
+"""
+def Get_Package_Version():
+  try:
+    fnull = open(os.devnull, 'w')
+    rev = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], \
+				  cwd=os.path.dirname(BENCHMARK_DIR), stderr=fnull)
+    fnull.close()
+    return rev.strip()
+  except Exception:
+    return None
+
+##-----------------------------------------------------
+"""
+this function executes the pipeline phases on the given input files and records the phases
+parameters:
+1) INPUT_FILENAME: file containing the input treelist (newick)
+2) TOPOLOGY_FILENAME: file containing the supertree topology (newick)
+3) QP_Method: in-process solver (QP_SOLVER_SPARSE_LSQ or QP_SOLVER_NORMAL_EQN)
+4) no_of_jobs: number of worker processes to extract the couplets
+5) out_dir: directory of the output files
+6) fast_newick: if True, the input trees are read by the lightweight newick reader
+returns the Phase_Recorder object (see Header.py) and the least square error of the solution
+"""
+def Run_Pipeline(INPUT_FILENAME, TOPOLOGY_FILENAME, QP_Method, no_of_jobs, out_dir, fast_newick=False):
+  Recorder = Phase_Recorder()
+  Output_Text_File = os.path.join(out_dir, 'Complete_Output_Description.txt')
+  Curr_State = CSTBL_State()
+
+  Recorder._Start('read_input_trees')
+  Input_Treelist = Read_Input_Treelist(True, True, 'newick', INPUT_FILENAME, fast_newick)
+  taxa_label_set = set()
+  for tr_idx in range(len(Input_Treelist)):
+    for label in Get_Tree_Taxa_Labels(Input_Treelist[tr_idx]):
+      if label not in taxa_label_set:
+	taxa_label_set.add(label)
+	Curr_State.COMPLETE_INPUT_TAXA_LIST.append(label)
+  Recorder._End()
+
+  Recorder._Start('couplet_support')
+  Curr_State.Couplet_Info._Initialize(Curr_State.COMPLETE_INPUT_TAXA_LIST)
+  DeriveCoupletSupport(Input_Treelist, Curr_State)
+  Recorder._End()
+
+  Recorder._Start('assign_matrix_weights')
+  AssignMatrixWeights(Input_Treelist, Curr_State)
+  Recorder._End()
+
+  Recorder._Start('derive_couplet_relations')
+  DeriveCoupletRelations_AllTrees(Input_Treelist, no_of_jobs, Curr_State)
+  Recorder._End()
+
+  Recorder._Start('read_topology')
+  Final_Supertree = Read_Input_Tree(True, True, 'newick', TOPOLOGY_FILENAME)
+  Initialize_Edge_Dict(Final_Supertree, Output_Text_File, Curr_State)
+  Recorder._End()
+
+  if (QP_Method != QP_SOLVER_NORMAL_EQN):
+    Recorder._Start('initialize_taxa_pair_branches')
+    Initialize_TaxaPairBranches(Final_Supertree, Curr_State)
+    Recorder._End()
+
+  Recorder._Start('solve')
+  no_of_edges = Curr_State.Supertree_Info.no_of_edges
+  if (QP_Method == QP_SOLVER_SPARSE_LSQ):
+    edge_value_list, lsq_error = QP_Solver.Solve_Sparse_LSQ(no_of_edges, Curr_State)
+  else:
+    edge_value_list, lsq_error = QP_Solver.Solve_Normal_Equations(Final_Supertree, no_of_edges, Curr_State)
+  Curr_State.Supertree_Info._AssignEdgeLengths(edge_value_list)
+  Recorder._End()
+
+  outfile = open(os.path.join(out_dir, 'CUSTOM_SUPERTREE_with_branch_length_newick.tre'), 'w')
+  outfile.write(Final_Supertree.as_newick_string())
+  outfile.close()
+
+  return Recorder, lsq_error
+
+##-----------------------------------------------------
+# this function is useful to parse various options for the benchmark
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("-I", "--INPFILE", type="string", action="store", dest="INP_FILENAME", default="", \
+			  help="file containing the input trees (newick); if not specified, a synthetic dataset is generated")
+  parser.add_option("-T", "--topology", type="string", action="store", dest="topology_input_tree_file", default="", \
+			  help="file containing the supertree topology (newick), required with -I option")
+  parser.add_option("-n", "--taxa", type="int", action="store", dest="no_of_taxa", default=100, \
+			  help="number of taxa of the synthetic dataset (default 100)")
+  parser.add_option("-m", "--trees", type="int", action="store", dest="no_of_trees", default=50, \
+			  help="number of source trees of the synthetic dataset (default 50)")
+  parser.add_option("-f", "--overlap", type="float", action="store", dest="overlap", default=0.5, \
+			  help="fraction of the taxa retained in individual source trees (default 0.5)")
+  parser.add_option("-s", "--shape", type="choice", choices=Tree_Generator.TREE_SHAPE_LIST, action="store", \
+			  dest="shape", default='random', \
+			  help="shape of the synthetic species tree: balanced, caterpillar or random (default)")
+  parser.add_option("-e", "--noise", type="float", action="store", dest="noise", default=0.1, \
+			  help="relative perturbation of the source tree branch lengths (default 0.1)")
+  parser.add_option("-r", "--seed", type="int", action="store", dest="seed", default=1, \
+			  help="seed of the random number generator (default 1)")
+  parser.add_option("-S", "--solver", type="int", action="store", dest="QP_Solver_Method", \
+			  default=QP_SOLVER_SPARSE_LSQ, \
+			  help="2 - in-process sparse least squares solver (default), 3 - normal equations solver")
+  parser.add_option("-j", "--jobs", type="int", action="store", dest="no_of_jobs", default=1, \
+			  help="number of worker processes used to extract the couplets (default 1)")
+  parser.add_option("-N", "--fast-newick", action="store_true", dest="fast_newick", default=False, \
+			  help="read the input trees by the lightweight newick reader (instead of dendropy)")
+  parser.add_option("-o", "--output", type="string", action="store", dest="out_json_file", default="", \
+			  help="file to write the JSON report (default: standard output)")
+  parser.add_option("-k", "--keep", type="string", action="store", dest="keep_dir", default="", \
+			  help="directory to keep the generated dataset and the output files (default: temporary, removed)")
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+''' main function '''
+def main():
+  opts, args = parse_options()
+
+  if (opts.QP_Solver_Method == QP_SOLVER_SPARSE_LSQ):
+    if (QP_Solver.SCIPY_AVAILABLE == False):
+      print '******** IN-PROCESS SOLVER REQUIRES SCIPY, WHICH IS NOT INSTALLED - RETURN **********'
+      return
+  elif (opts.QP_Solver_Method != QP_SOLVER_NORMAL_EQN):
+    print '******** INVALID QP SOLVER OPTION (ONLY IN-PROCESS SOLVERS ARE BENCHMARKED) - RETURN **********'
+    return
+
+  if (opts.keep_dir != ""):
+    work_dir = os.path.abspath(opts.keep_dir)
+    if (os.path.isdir(work_dir) == False):
+      os.makedirs(work_dir)
+  else:
+    work_dir = tempfile.mkdtemp(prefix='CSTBL_benchmark_')
+
+  Report = {'version': Get_Package_Version(), \
+	    'python': platform.python_version(), \
+	    'solver': opts.QP_Solver_Method, \
+	    'jobs': opts.no_of_jobs, \
+	    'fast_newick': opts.fast_newick}
+
+  if (opts.INP_FILENAME == ""):
+    start_timestamp = time.time()
+    INPUT_FILENAME, TOPOLOGY_FILENAME = Tree_Generator.Generate_Dataset(work_dir, opts.no_of_taxa, \
+			opts.no_of_trees, opts.overlap, opts.shape, opts.noise, opts.seed)
+    Report['dataset'] = {'synthetic': True, 'taxa': opts.no_of_taxa, 'trees': opts.no_of_trees, \
+			  'overlap': opts.overlap, 'shape': opts.shape, 'noise': opts.noise, 'seed': opts.seed, \
+			  'generation_time_sec': time.time() - start_timestamp}
+  else:
+    if (opts.topology_input_tree_file == ""):
+      print '******** THERE IS NO CUSTOM SUPERTREE TOPOLOGY FILE SPECIFIED - RETURN **********'
+      return
+    INPUT_FILENAME = os.path.abspath(opts.INP_FILENAME)
+    TOPOLOGY_FILENAME = os.path.abspath(opts.topology_input_tree_file)
+    Report['dataset'] = {'synthetic': False, 'input_file': INPUT_FILENAME, 'topology_file': TOPOLOGY_FILENAME}
+
+  start_timestamp = time.time()
+  Recorder, lsq_error = Run_Pipeline(INPUT_FILENAME, TOPOLOGY_FILENAME, opts.QP_Solver_Method, \
+				      opts.no_of_jobs, work_dir, opts.fast_newick)
+  Report['phases'] = Recorder.Phase_List
+  Report['total_wall_time_sec'] = time.time() - start_timestamp
+  Report['peak_rss_kb'] = Recorder._GetPeakRSS()
+  Report['lsq_error'] = lsq_error
+
+  if (opts.keep_dir == ""):
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+  report_str = json.dumps(Report, indent=2, sort_keys=True)
+  if (opts.out_json_file == ""):
+    print report_str
+  else:
+    fp = open(opts.out_json_file, 'w')
+    fp.write(report_str + '\n')
+    fp.close()
+
+#-----------------------------------------------------
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""
+this file generates synthetic inputs for benchmarking CSTBL
+a random weighted species tree is generated, and the source trees are its subtrees
+(restricted to random subsets of the taxa), with optionally perturbed branch lengths
+the supertree topology is the unweighted species tree
+"""
+
+import random
+import os
+from optparse import OptionParser
+
+# shapes of the species tree
+TREE_SHAPE_LIST = ['balanced', 'caterpillar', 'random']
+
+##-----------------------------------------------------
+"""
+this class defines a rooted tree by flat arrays
+node 0 is the root; for individual nodes, the parent index, the branch length (to the parent)
+the list of children, and the label (leaf nodes) are stored
+"""
+class Array_Tree(object):
+  def __init__(self):
+    self.Parent = []
+    self.Length = []
+    self.Children = []
+    self.Label = []
+
+  """
+  adds a node and returns its index
+  """
+  def _AddNode(self, parent_idx, length, label=None):
+    node_idx = len(self.Parent)
+    self.Parent.append(parent_idx)
+    self.Length.append(length)
+    self.Children.append([])
+    self.Label.append(label)
+    if (parent_idx >= 0):
+      self.Children[parent_idx].append(node_idx)
+    return node_idx
+
+  """
+  returns the node indices in postorder (children before their parent), without recursion
+  """
+  def _PostorderNodes(self):
+    node_list = []
+    stack = [0]
+    while (len(stack) > 0):
+      node_idx = stack.pop()
+      node_list.append(node_idx)
+      stack.extend(self.Children[node_idx])
+    node_list.reverse()
+    return node_list
+
+  """
+  returns the newick string of the tree restricted to the leaves having labels in keep_label_set
+  nodes having a single retained child are suppressed (their branch lengths are summed)
+  parameters: keep_label_set - labels of the retained leaves (None to retain all the leaves)
+  with_length - if False, branch lengths are not written (unweighted topology)
+  length_func - function applied to individual branch lengths (such as a random perturbation)
+  """
+  def _GetNewick(self, keep_label_set=None, with_length=True, length_func=None):
+    # for individual nodes: (newick string of the subtree, accumulated branch length) or None
+    sub_newick = dict()
+    for node_idx in self._PostorderNodes():
+      if (len(self.Children[node_idx]) == 0):
+	if (keep_label_set is not None) and (self.Label[node_idx] not in keep_label_set):
+	  sub_newick[node_idx] = None
+	else:
+	  sub_newick[node_idx] = (self.Label[node_idx], self.Length[node_idx])
+	continue
+      child_list = [sub_newick.pop(x) for x in self.Children[node_idx]]
+      child_list = [x for x in child_list if x is not None]
+      if (len(child_list) == 0):
+	sub_newick[node_idx] = None
+      elif (len(child_list) == 1):
+	sub_newick[node_idx] = (child_list[0][0], child_list[0][1] + self.Length[node_idx])
+      else:
+	child_str_list = []
+	for child_str, child_len in child_list:
+	  if (with_length == True):
+	    if length_func is not None:
+	      child_len = length_func(child_len)
+	    child_str_list.append(child_str + ':' + repr(round(child_len, 6)))
+	  else:
+	    child_str_list.append(child_str)
+	sub_newick[node_idx] = ('(' + ','.join(child_str_list) + ')', self.Length[node_idx])
+    if sub_newick[0] is None:
+      return None
+    return sub_newick[0][0] + ';'
+
+##-----------------------------------------------------
+"""
+this function generates a random weighted species tree
+parameters: no_of_taxa - number of leaves
+shape - 'balanced', 'caterpillar', or 'random' (random joining of subtrees)
+rng - random number generator
+returns the tree (Array_Tree) and the list of taxa labels
+"""
+def Generate_Species_Tree(no_of_taxa, shape, rng):
+  taxa_label_list = ['t' + str(i) for i in range(no_of_taxa)]
+  Species_Tree = Array_Tree()
+  rand_len = lambda: rng.uniform(0.1, 1.0)
+  root_idx = Species_Tree._AddNode(-1, 0.0)
+
+  if (shape == 'caterpillar'):
+    curr_idx = root_idx
+    for i in range(no_of_taxa - 2):
+      Species_Tree._AddNode(curr_idx, rand_len(), taxa_label_list[i])
+      curr_idx = Species_Tree._AddNode(curr_idx, rand_len())
+    Species_Tree._AddNode(curr_idx, rand_len(), taxa_label_list[no_of_taxa - 2])
+    Species_Tree._AddNode(curr_idx, rand_len(), taxa_label_list[no_of_taxa - 1])
+  elif (shape == 'balanced'):
+    # stack of (node index, taxa labels under this node)
+    stack = [(root_idx, taxa_label_list)]
+    while (len(stack) > 0):
+      node_idx, curr_label_list = stack.pop()
+      half = len(curr_label_list) // 2
+      for sub_label_list in [curr_label_list[:half], curr_label_list[half:]]:
+	if (len(sub_label_list) == 1):
+	  Species_Tree._AddNode(node_idx, rand_len(), sub_label_list[0])
+	else:
+	  stack.append((Species_Tree._AddNode(node_idx, rand_len()), sub_label_list))
+  else:
+    # join random pairs of subtrees from the leaves upwards, then build the tree from the root
+    subtree_list = [[label] for label in taxa_label_list]
+    while (len(subtree_list) > 2):
+      i, j = rng.sample(range(len(subtree_list)), 2)
+      merged = [subtree_list[i], subtree_list[j]]
+      subtree_list = [subtree_list[k] for k in range(len(subtree_list)) if k != i and k != j]
+      subtree_list.append(merged)
+    stack = [(root_idx, subtree_list)]
+    while (len(stack) > 0):
+      node_idx, child_list = stack.pop()
+      for child in child_list:
+	if (len(child) == 1) and (not isinstance(child[0], list)):
+	  Species_Tree._AddNode(node_idx, rand_len(), child[0])
+	else:
+	  stack.append((Species_Tree._AddNode(node_idx, rand_len()), child))
+
+  return Species_Tree, taxa_label_list
+
+##-----------------------------------------------------
+"""
+this function generates a benchmark dataset and writes it to the output directory
+files: source_trees.tre (input treelist), supertree_topology.tre (unweighted supertree topology)
+and species_tree.tre (the weighted species tree)
+parameters:
+1) out_dir: output directory
+2) no_of_taxa: number of taxa
+3) no_of_trees: number of source trees
+4) overlap: fraction of the taxa retained in individual source trees
+5) shape: shape of the species tree
+6) noise: relative perturbation of the branch lengths of the source trees
+7) seed: seed of the random number generator
+returns the names of the input treelist file and the supertree topology file
+"""
+def Generate_Dataset(out_dir, no_of_taxa, no_of_trees, overlap, shape, noise=0.0, seed=1):
+  rng = random.Random(seed)
+  Species_Tree, taxa_label_list = Generate_Species_Tree(no_of_taxa, shape, rng)
+  if (os.path.isdir(out_dir) == False):
+    os.makedirs(out_dir)
+
+  perturb_len = lambda x: x * (1.0 + rng.uniform(-noise, noise))
+  no_of_src_taxa = min(no_of_taxa, max(4, int(round(overlap * no_of_taxa))))
+  Source_Treelist_File = os.path.join(out_dir, 'source_trees.tre')
+  fp = open(Source_Treelist_File, 'w')
+  for tr_idx in range(no_of_trees):
+    keep_label_set = set(rng.sample(taxa_label_list, no_of_src_taxa))
+    fp.write(Species_Tree._GetNewick(keep_label_set, True, perturb_len) + '\n')
+  fp.close()
+
+  Topology_File = os.path.join(out_dir, 'supertree_topology.tre')
+  fp = open(Topology_File, 'w')
+  fp.write(Species_Tree._GetNewick(None, False) + '\n')
+  fp.close()
+
+  fp = open(os.path.join(out_dir, 'species_tree.tre'), 'w')
+  fp.write(Species_Tree._GetNewick(None, True) + '\n')
+  fp.close()
+
+  return Source_Treelist_File, Topology_File
+
+##-----------------------------------------------------
+# this function is useful to parse various options for dataset generation
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("-o", "--outdir", type="string", action="store", dest="out_dir", default="", \
+			  help="output directory of the generated dataset")
+  parser.add_option("-n", "--taxa", type="int", action="store", dest="no_of_taxa", default=100, \
+			  help="number of taxa (default 100)")
+  parser.add_option("-m", "--trees", type="int", action="store", dest="no_of_trees", default=50, \
+			  help="number of source trees (default 50)")
+  parser.add_option("-f", "--overlap", type="float", action="store", dest="overlap", default=0.5, \
+			  help="fraction of the taxa retained in individual source trees (default 0.5)")
+  parser.add_option("-s", "--shape", type="choice", choices=TREE_SHAPE_LIST, action="store", dest="shape", \
+			  default='random', help="shape of the species tree: balanced, caterpillar or random (default)")
+  parser.add_option("-e", "--noise", type="float", action="store", dest="noise", default=0.1, \
+			  help="relative perturbation of the source tree branch lengths (default 0.1)")
+  parser.add_option("-r", "--seed", type="int", action="store", dest="seed", default=1, \
+			  help="seed of the random number generator (default 1)")
+  opts, args = parser.parse_args()
+  return opts, args
+
+##-----------------------------------------------------
+if __name__ == "__main__":
+  opts, args = parse_options()
+  if (opts.out_dir == ""):
+    print '******** THERE IS NO OUTPUT DIRECTORY SPECIFIED - RETURN **********'
+  else:
+    Generate_Dataset(opts.out_dir, opts.no_of_taxa, opts.no_of_trees, opts.overlap, opts.shape, opts.noise, opts.seed)